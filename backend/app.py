@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import base64
 import uuid
@@ -11,91 +12,207 @@ import sqlite3
 import time
 from datetime import datetime
 import re
-from flask import Flask, request, jsonify, send_file, make_response
+from concurrent.futures import wait, FIRST_COMPLETED
+from flask import Flask, request, jsonify, send_file, make_response, Response, stream_with_context, g
 from flask_cors import CORS
-from google.oauth2 import id_token
-from google.auth.transport import requests
 from werkzeug.utils import secure_filename
-from google.cloud import speech
-from google.cloud import storage
-import google.genai as genai
 # from google.cloud import firestore
 # import firebase_admin
 # from firebase_admin import credentials, firestore
 from dotenv import load_dotenv
-try:
-    import cv2  # OpenCV used by the new frame-based tagging route
-except Exception:
-    cv2 = None
-from transcribe import TranscriptionService
-from tagging import VisualTaggingService
+from lazy import lazy_import, record_load, load_times, startup_report, format_startup_report
+from applog import configure_logging, get_logger, init_request_logging, Lazy
+from tracing import init_request_tracing, tracer, ContextThreadPoolExecutor, span as trace_span
+from profiler import profiler, init_request_profiling
+# Heavy SDKs load on first use, not at worker boot (see lazy.py; `python app.py --startup-report`)
+id_token = lazy_import('google.oauth2.id_token')
+requests = lazy_import('google.auth.transport.requests')
+genai = lazy_import('google.genai')
+from previews import PreviewService
+from condense import TranscriptCondenser, compact_tag_names
+from content_digest import ContentDigestStore
+from story_templates import inspirational_story, enhanced_inspirational_story, content_based_story, mock_story_scenes
+from story_templates import memo_stats as story_template_memo_stats
+from llm import GeminiClientProvider, GeminiClientProxy, StructuredOutputError, CircuitBreaker, generate_json
+from local_llm import LocalLLM, LocalLLMClient, select_text_client
+import metrics
+from metrics import observe_stage, timed_stage, record_fallback, IN_FLIGHT
+from memory_governor import governor_from_env, MemoryBudgetExceeded
+from media_tools import find_ffmpeg, find_ffprobe, binaries_status
 
 # Load environment variables
 load_dotenv()
 
-# Memory optimization settings
-import gc
-import psutil
-import threading
-from functools import wraps
-
-def memory_cleanup():
-    """Clean up memory after heavy operations"""
-    gc.collect()
-    if psutil.virtual_memory().percent > 80:
-        print("⚠️ High memory usage detected, forcing cleanup")
-
-def optimize_memory(func):
-    """Decorator to optimize memory usage"""
-    @wraps(func)
-    def wrapper(*args, **kwargs):
-        try:
-            result = func(*args, **kwargs)
-            memory_cleanup()
-            return result
-        except Exception as e:
-            memory_cleanup()
-            raise e
-    return wrapper
+# Leveled logging (LOG_LEVEL, LOG_FORMAT=json); hot paths log through `logger`, not print
+configure_logging()
+logger = get_logger(__name__)
+
+# Per-worker memory budget: admission control for heavy jobs + pressure-driven GC (MEMORY_*)
+memory_governor = governor_from_env()
 
 app = Flask(__name__)
+init_request_logging(app)
+init_request_tracing(app)
+init_request_profiling(app)
 # Bulletproof CORS configuration
 CORS(app, origins="*", supports_credentials=False, methods=["GET", "POST", "OPTIONS"], allow_headers=["*"])
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint for Railway"""
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    """Health check endpoint for Railway: in-process status only, dependency checks are on /health/ready"""
+    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat(), "gemini": gemini_provider.status(),
+                    "generation": {"backend": GENERATION_BACKEND, "local": local_llm.status()},
+                    "lazyLoads": load_times(), "tracing": tracer.status(), "memory": memory_governor.status()})
+
+# Liveness vs readiness: /health/live only proves the worker answers requests (restart it
+# if not); /health/ready fails while this instance should get no new traffic (dependency
+# down, job backlog, no memory for heavy work), so a load balancer can route around it.
+READY_MAX_QUEUE_DEPTH = int(os.getenv('READY_MAX_QUEUE_DEPTH', '20'))
+HEAVY_JOB_KINDS = ('whisper', 'render')
+
+def whisper_status():
+    return {'enabled': WHISPER_ENABLED, 'model': os.getenv('WHISPER_MODEL_SIZE', 'tiny.en'),
+            'loadAttempted': _whisper_load_attempted, 'loaded': _whisper_model is not None,
+            'error': _whisper_load_error}
+
+def check_database():
+    """SELECT 1 against the metadata DB: {'ok', 'latencyMs'} or {'ok': False, 'error'}"""
+    started = time.perf_counter()
+    try:
+        conn = get_db_connection()
+        try:
+            conn.execute('SELECT 1').fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        return {'ok': False, 'error': str(e)}
+    return {'ok': True, 'latencyMs': round((time.perf_counter() - started) * 1000, 2)}
 
-# Initialize Whisper model globally (optimized for cloud deployment)
-WHISPER_MODEL = None
-WHISPER_ENABLED = os.getenv('WHISPER_ENABLED', 'true').lower() == 'true'
+def queue_depths():
+    memory = memory_governor.status()
+    return {
+        'batchPending': IN_FLIGHT.value(kind='batch_pending'),
+        'batchInFlight': IN_FLIGHT.value(kind='batch_item'),
+        'httpInFlight': IN_FLIGHT.value(kind='http_request'),
+        'heavyJobsActive': sum(memory['activeJobs'].values()),
+        'heavyJobsQueued': memory['queuedJobs'],
+        'llmInFlight': gemini_provider.executor.metrics().get('in_flight', 0)
+    }
 
-if WHISPER_ENABLED:
-    try:
-        from faster_whisper import WhisperModel
-        # Use tiny model for cloud deployment (much smaller memory footprint)
-        model_size = os.getenv('WHISPER_MODEL_SIZE', 'tiny.en')
-        compute_type = os.getenv('WHISPER_COMPUTE_TYPE', 'int8')
-        
-        print(f"🔄 Loading Whisper model: {model_size} with {compute_type}")
-        WHISPER_MODEL = WhisperModel(model_size, device="cpu", compute_type=compute_type)
-        print(f"✅ Whisper {model_size} model loaded successfully")
-    except Exception as e:
-        WHISPER_MODEL = None
-        print(f"⚠️ Whisper model not available: {e}")
-        print("📝 Transcription will use Google Speech API or fallback methods")
-else:
-    print("📝 Whisper disabled via WHISPER_ENABLED=false")
-
-# Initialize ffmpeg-python
-try:
-    import ffmpeg
-    FFMPEG_AVAILABLE = True
-    print("✅ ffmpeg-python available")
-except Exception as e:
-    FFMPEG_AVAILABLE = False
-    print(f"⚠️ ffmpeg-python not available: {e}")
+def readiness():
+    """Dependency, queue and capacity checks: failing ones make the instance not ready, degraded ones do not"""
+    database = check_database()
+    binaries = binaries_status()
+    whisper = whisper_status()
+    queues = queue_depths()
+    capacity = {kind: memory_governor.can_admit(kind) for kind in HEAVY_JOB_KINDS}
+    failing, degraded = [], []
+    if not database['ok']:
+        failing.append('database')
+    failing.extend(name for name, path in binaries.items() if not path)
+    if queues['batchPending'] + queues['heavyJobsQueued'] > READY_MAX_QUEUE_DEPTH:
+        failing.append('queue')
+    if not any(capacity.values()):
+        failing.append('capacity')
+    if whisper['enabled'] and whisper['loadAttempted'] and not whisper['loaded']:
+        # Transcription still works through the Gemini/mock fallbacks
+        degraded.append('whisper')
+    if gemini_provider.breaker.state == CircuitBreaker.OPEN:
+        degraded.append('gemini')
+    return {'ready': not failing, 'failing': failing, 'degraded': degraded, 'database': database,
+            'binaries': binaries, 'whisper': whisper, 'queues': queues, 'heavyCapacity': capacity}
+
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness: the worker is up and serving requests"""
+    return jsonify({'status': 'alive', 'pid': os.getpid(), 'timestamp': datetime.now().isoformat()})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 when this instance can take new work, 503 with the failing checks otherwise"""
+    report = readiness()
+    report['status'] = 'ready' if report['ready'] else 'not_ready'
+    report['timestamp'] = datetime.now().isoformat()
+    return jsonify(report), 200 if report['ready'] else 503
+
+@app.errorhandler(MemoryBudgetExceeded)
+def memory_budget_exceeded(e):
+    """Heavy job refused by the memory governor: ask the client to retry later"""
+    response = jsonify({'error': str(e), 'retryAfter': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text exposition: stage/LLM latency histograms, fallback counters, caches, in-flight work, RSS"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+def _profile_reports_allowed():
+    return profiler.enabled and profiler.authorized(request.headers.get('X-Profile'), request.remote_addr,
+                                                    forwarded='X-Forwarded-For' in request.headers)
+
+@app.route('/debug/profiles', methods=['GET'])
+def profiles_summary():
+    """Sampling profiler report: recent profiled requests and the hottest frames per route"""
+    if not _profile_reports_allowed():
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(profiler.summary())
+
+@app.route('/debug/profiles/<name>', methods=['GET'])
+def profile_download(name):
+    """Collapsed stacks of one profiled request (flamegraph.pl / speedscope input)"""
+    path = profiler.profile_path(name) if _profile_reports_allowed() else None
+    if not path:
+        return jsonify({'error': 'Not found'}), 404
+    return send_file(path, mimetype='text/plain')
+
+@app.before_request
+def _count_request_in_flight():
+    g.metrics_in_flight = True
+    IN_FLIGHT.inc(kind='http_request')
+
+@app.teardown_request
+def _uncount_request_in_flight(exc=None):
+    # Runs when the response is closed, so streamed (SSE) responses count until they finish
+    if g.pop('metrics_in_flight', False):
+        IN_FLIGHT.dec(kind='http_request')
+
+# Whisper model, loaded on first transcription (optimized for cloud deployment)
+WHISPER_ENABLED = os.getenv('WHISPER_ENABLED', 'true').lower() == 'true'
+_whisper_model = None
+_whisper_load_attempted = False
+_whisper_load_error = None
+_whisper_lock = threading.Lock()
+
+def get_whisper_model():
+    """Shared faster-whisper model, or None if disabled or unavailable (load is attempted once)"""
+    global _whisper_model, _whisper_load_attempted, _whisper_load_error
+    if _whisper_load_attempted:
+        return _whisper_model
+    with _whisper_lock:
+        if _whisper_load_attempted:
+            return _whisper_model
+        if not WHISPER_ENABLED:
+            print("📝 Whisper disabled via WHISPER_ENABLED=false")
+        else:
+            try:
+                started = time.perf_counter()
+                from faster_whisper import WhisperModel
+                # Use tiny model for cloud deployment (much smaller memory footprint)
+                model_size = os.getenv('WHISPER_MODEL_SIZE', 'tiny.en')
+                compute_type = os.getenv('WHISPER_COMPUTE_TYPE', 'int8')
+
+                print(f"🔄 Loading Whisper model: {model_size} with {compute_type}")
+                _whisper_model = WhisperModel(model_size, device="cpu", compute_type=compute_type)
+                record_load(f"whisper:{model_size}", time.perf_counter() - started)
+                print(f"✅ Whisper {model_size} model loaded successfully")
+            except Exception as e:
+                _whisper_model = None
+                _whisper_load_error = str(e)
+                print(f"⚠️ Whisper model not available: {e}")
+                print("📝 Transcription will use Google Speech API or fallback methods")
+        _whisper_load_attempted = True
+    return _whisper_model
 
 # Ensure users table exists at runtime
 def ensure_users_table():
@@ -196,18 +313,66 @@ def init_database():
         )
     ''')
 
+    # Older databases lack the optional metadata columns update_video_metadata() writes
+    cursor.execute('PRAGMA table_info(videos)')
+    existing_columns = {row[1] for row in cursor.fetchall()}
+    for column, column_type in [
+        ('title', 'TEXT'), ('description', 'TEXT'), ('tags', 'TEXT'), ('emotional_tone', 'TEXT'),
+        ('key_moments', 'TEXT'), ('generated_stories', 'TEXT'), ('thumbnail_path', 'TEXT'),
+        ('content_hash', 'TEXT'), ('preview_path', 'TEXT'), ('favorite', 'INTEGER'),
+        ('hidden', 'INTEGER'), ('stack_key', 'TEXT')
+    ]:
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE videos ADD COLUMN {column} {column_type}')
+
+    # Tag timeline stores when each visual tag is on screen (coalesced frame runs)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tag_intervals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            tag_key TEXT NOT NULL,
+            start_time REAL NOT NULL,
+            end_time REAL NOT NULL,
+            score REAL NOT NULL,
+            occurrences INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tag_intervals_tag ON tag_intervals(video_id, tag_key, start_time)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tag_intervals_time ON tag_intervals(video_id, start_time, end_time)
+    ''')
+
     conn.commit()
     conn.close()
     print(f"Database initialized: {db_path}")
 
-# Initialize database on startup
-init_database()
+# Database schema is created on first use (first request), not at import
+_database_ready = False
+_database_lock = threading.Lock()
+
+def ensure_database():
+    global _database_ready
+    if _database_ready:
+        return
+    with _database_lock:
+        if not _database_ready:
+            init_database()
+            ensure_users_table()
+            _database_ready = True
+
+@app.before_request
+def _ensure_database_before_request():
+    ensure_database()
 
 def get_db_connection():
     """Get database connection"""
     db_path = os.path.join(os.getcwd(), 'video_metadata.db')
     return sqlite3.connect(db_path)
 
+@timed_stage('db_query')
 def save_video_metadata(video_metadata):
     """Save video metadata to database"""
     try:
@@ -243,6 +408,7 @@ def save_video_metadata(video_metadata):
         print(f"Error saving video metadata: {e}")
         return False
 
+@timed_stage('db_query')
 def update_video_metadata(video_id, updates):
     """Update specific fields in video metadata"""
     try:
@@ -284,6 +450,7 @@ def update_video_metadata(video_id, updates):
         print(f"Error updating video metadata: {e}")
         return False
 
+@timed_stage('db_query')
 def get_video_metadata(video_id):
     """Get video metadata from database"""
     try:
@@ -292,42 +459,46 @@ def get_video_metadata(video_id):
         
         cursor.execute('SELECT * FROM videos WHERE video_id = ?', (video_id,))
         row = cursor.fetchone()
+        # Columns are read by name: older databases and the migrated schema order them differently
+        columns = [d[0] for d in cursor.description]
         conn.close()
         
         if row:
+            named = dict(zip(columns, row))
             return {
-                'videoId': row[0],
-                'userId': row[1],
-                'userEmail': row[2],
-                'filename': row[3],
-                'localPath': row[4],
-                'fileSize': row[5],
-                'fileType': row[6],
-                'createdAt': row[7],
-                'status': row[8],
-                'duration': row[9],
-                'transcript': row[10],
-                'visual_tags': json.loads(row[11]) if row[11] else [],
-                'story_ids': json.loads(row[12]) if row[12] else [],
-                'title': row[13],
-                'description': row[14],
-                'tags': json.loads(row[15]) if row[15] else [],
-                'emotional_tone': row[16],
-                'key_moments': json.loads(row[17]) if row[17] else [],
-                'generated_stories': json.loads(row[18]) if row[18] else [],
-                'thumbnail_path': row[19],
-                'content_hash': row[20],
-                'preview_path': row[21],
-                'favorite': row[22],
-                'hidden': row[23],
-                'stack_key': row[24],
-                'word_timestamps': json.loads(row[25]) if row[25] else []
+                'videoId': named['video_id'],
+                'userId': named['user_id'],
+                'userEmail': named['user_email'],
+                'filename': named['filename'],
+                'localPath': named['local_path'],
+                'fileSize': named['file_size'],
+                'fileType': named['file_type'],
+                'createdAt': named['created_at'],
+                'status': named['status'],
+                'duration': named['duration'],
+                'transcript': named['transcript'],
+                'visual_tags': json.loads(named['visual_tags']) if named.get('visual_tags') else [],
+                'story_ids': json.loads(named['story_ids']) if named.get('story_ids') else [],
+                'title': named.get('title'),
+                'description': named.get('description'),
+                'tags': json.loads(named['tags']) if named.get('tags') else [],
+                'emotional_tone': named.get('emotional_tone'),
+                'key_moments': json.loads(named['key_moments']) if named.get('key_moments') else [],
+                'generated_stories': json.loads(named['generated_stories']) if named.get('generated_stories') else [],
+                'thumbnail_path': named.get('thumbnail_path'),
+                'content_hash': named.get('content_hash'),
+                'preview_path': named.get('preview_path'),
+                'favorite': named.get('favorite'),
+                'hidden': named.get('hidden'),
+                'stack_key': named.get('stack_key'),
+                'word_timestamps': json.loads(named['word_timestamps']) if named.get('word_timestamps') else []
             }
         return None
     except Exception as e:
         print(f"Error getting video metadata: {e}")
         return None
 
+@timed_stage('db_query')
 def get_all_videos(user_id=None):
     """Get all videos, optionally filtered by user_id"""
     try:
@@ -340,25 +511,29 @@ def get_all_videos(user_id=None):
             cursor.execute('SELECT * FROM videos ORDER BY created_at DESC')
         
         rows = cursor.fetchall()
+        columns = [d[0] for d in cursor.description]
         conn.close()
         
         videos = []
         for row in rows:
+            named = dict(zip(columns, row))
             videos.append({
-                'videoId': row[0],
-                'userId': row[1],
-                'userEmail': row[2],
-                'filename': row[3],
-                'localPath': row[4],
-                'fileSize': row[5],
-                'fileType': row[6],
-                'createdAt': row[7],
-                'status': row[8],
-                'duration': row[9],
-                'transcript': row[10],
-                'word_timestamps': json.loads(row[11]) if row[11] else [],
-                'visual_tags': json.loads(row[12]) if row[12] else [],
-                'story_ids': json.loads(row[13]) if row[13] else []
+                'videoId': named['video_id'],
+                'userId': named['user_id'],
+                'userEmail': named['user_email'],
+                'filename': named['filename'],
+                'localPath': named['local_path'],
+                'fileSize': named['file_size'],
+                'fileType': named['file_type'],
+                'createdAt': named['created_at'],
+                'status': named['status'],
+                'duration': named['duration'],
+                'transcript': named['transcript'],
+                'word_timestamps': json.loads(named['word_timestamps']) if named.get('word_timestamps') else [],
+                'visual_tags': json.loads(named['visual_tags']) if named.get('visual_tags') else [],
+                'story_ids': json.loads(named['story_ids']) if named.get('story_ids') else [],
+                'thumbnail_path': named.get('thumbnail_path'),
+                'preview_path': named.get('preview_path')
             })
         
         return videos
@@ -366,6 +541,72 @@ def get_all_videos(user_id=None):
         print(f"Error getting all videos: {e}")
         return []
 
+@timed_stage('db_query')
+def save_tag_timeline(video_id, intervals):
+    """Replace the stored tag timeline for a video with freshly coalesced intervals"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM tag_intervals WHERE video_id = ?', (video_id,))
+        cursor.executemany('''
+            INSERT INTO tag_intervals (video_id, tag, tag_key, start_time, end_time, score, occurrences)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (video_id, iv['tag'], iv['tag'].strip().lower(), float(iv['start']), float(iv['end']),
+             float(iv.get('score', 0.0)), int(iv.get('occurrences', 1)))
+            for iv in (intervals or []) if iv.get('tag')
+        ])
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        print(f"Error saving tag timeline: {e}")
+        return False
+
+@timed_stage('db_query')
+def get_tag_timeline(video_id, tag=None, start_time=None, end_time=None, exact=False):
+    """
+    Query tag intervals for a video. `tag` matches exactly (exact=True) or as a
+    substring of the tag name; start_time/end_time restrict to intervals overlapping
+    that window. Returns [{'tag', 'start', 'end', 'score', 'occurrences'}] sorted by start
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+
+        clauses = ['video_id = ?']
+        values = [video_id]
+        if tag:
+            if exact:
+                clauses.append('tag_key = ?')
+                values.append(tag.strip().lower())
+            else:
+                clauses.append('tag_key LIKE ?')
+                values.append(f"%{tag.strip().lower()}%")
+        if end_time is not None:
+            clauses.append('start_time < ?')
+            values.append(float(end_time))
+        if start_time is not None:
+            clauses.append('end_time > ?')
+            values.append(float(start_time))
+
+        cursor.execute(f'''
+            SELECT tag, start_time, end_time, score, occurrences FROM tag_intervals
+            WHERE {' AND '.join(clauses)}
+            ORDER BY start_time, score DESC
+        ''', values)
+        rows = cursor.fetchall()
+        conn.close()
+
+        return [
+            {'tag': row[0], 'start': row[1], 'end': row[2], 'score': row[3], 'occurrences': row[4]}
+            for row in rows
+        ]
+    except Exception as e:
+        print(f"Error reading tag timeline: {e}")
+        return []
+
+@timed_stage('db_query')
 def search_all_videos(query, user_id=None):
     """Search across all videos in the database"""
     try:
@@ -395,24 +636,28 @@ def search_all_videos(query, user_id=None):
             ''', (search_query, search_query, search_query))
         
         rows = cursor.fetchall()
+        columns = [d[0] for d in cursor.description]
         conn.close()
         
         results = []
         for row in rows:
+            named = dict(zip(columns, row))
             video_data = {
-                'videoId': row[0],
-                'userId': row[1],
-                'userEmail': row[2],
-                'filename': row[3],
-                'localPath': row[4],
-                'fileSize': row[5],
-                'fileType': row[6],
-                'createdAt': row[7],
-                'status': row[8],
-                'duration': row[9],
-                'transcript': row[10],
-                'visual_tags': json.loads(row[11]) if row[11] else [],
-                'story_ids': json.loads(row[12]) if row[12] else []
+                'videoId': named['video_id'],
+                'userId': named['user_id'],
+                'userEmail': named['user_email'],
+                'filename': named['filename'],
+                'localPath': named['local_path'],
+                'fileSize': named['file_size'],
+                'fileType': named['file_type'],
+                'createdAt': named['created_at'],
+                'status': named['status'],
+                'duration': named['duration'],
+                'transcript': named['transcript'],
+                'visual_tags': json.loads(named['visual_tags']) if named.get('visual_tags') else [],
+                'story_ids': json.loads(named['story_ids']) if named.get('story_ids') else [],
+                'thumbnail_path': named.get('thumbnail_path'),
+                'preview_path': named.get('preview_path')
             }
             
             # Calculate relevance score
@@ -448,26 +693,40 @@ GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID', 'your_google_client_id_here')
 BUCKET_NAME = None
 GCP_PROJECT_ID = None
 
-# Initialize Gemini AI
+# Initialize Gemini AI lazily: no network call at import, so worker boot does not
+# depend on Gemini. gemini_client is falsy while unconfigured or the circuit is open.
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
-if GEMINI_API_KEY:
-    try:
-        # Use the new Google AI client with gemini-2.5-flash
-        client = genai.Client(api_key=GEMINI_API_KEY)
-        # Test the model
-        test_response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents="Hello"
-        )
-        print("Gemini AI initialized successfully with gemini-2.5-flash")
-        gemini_client = client
-    except Exception as e:
-        print(f"Warning: Gemini AI initialization failed: {str(e)}")
-        gemini_client = None
-else:
-    gemini_client = None
+gemini_provider = GeminiClientProvider(api_key=GEMINI_API_KEY, model="gemini-2.5-flash")
+gemini_client = GeminiClientProxy(gemini_provider)
+
+# Text-only generation (tags, stories, transcript summaries) can run on a local
+# llama.cpp model instead: GENERATION_BACKEND=gemini|local|auto. Audio and image
+# analysis always use gemini_client.
+GENERATION_BACKEND = os.getenv('GENERATION_BACKEND', 'gemini').strip().lower()
+local_llm = LocalLLM()
+text_client = select_text_client(GENERATION_BACKEND, gemini_client,
+                                 LocalLLMClient(local_llm, cache=gemini_provider.cache))
+if not GEMINI_API_KEY and not local_llm.configured:
     print("Warning: GEMINI_API_KEY not set. Story generation will use enhanced mock data.")
 
+def _llm_metrics_collector():
+    cache = gemini_provider.cache.metrics()
+    executor = gemini_provider.executor.metrics()
+    memo = story_template_memo_stats()
+    return [
+        ('footage_cache_lookups_total', 'counter', 'Lookups in application caches by cache and result',
+         [({'cache': 'llm_response', 'result': 'hit'}, cache['memory_hits'] + cache['disk_hits']),
+          ({'cache': 'llm_response', 'result': 'miss'}, cache['misses']),
+          ({'cache': 'story_template', 'result': 'hit'}, memo['hits']),
+          ({'cache': 'story_template', 'result': 'miss'}, memo['misses'])]),
+        ('footage_llm_executor_events_total', 'counter', 'Shared LLM executor events (submitted, coalesced, retries, ...)',
+         [({'event': name}, executor[name]) for name in ('submitted', 'coalesced', 'retries', 'rate_limited', 'failed')]),
+        ('footage_llm_executor_in_flight', 'gauge', 'LLM requests currently running on the shared executor',
+         [({}, executor['in_flight'])])
+    ]
+
+metrics.REGISTRY.add_collector(_llm_metrics_collector)
+
 # Upload configuration
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
 VIDEOS_DIR = os.path.join(UPLOAD_FOLDER, 'videos')
@@ -479,21 +738,103 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'videos'), exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'renders'), exist_ok=True)
 
+# Poster/sprite/VTT previews, content-addressed under uploads/previews
+preview_service = PreviewService(base_dir=os.path.join(UPLOAD_FOLDER, 'previews'))
+
+# Map-reduce transcript digests for prompts, cached by transcript content
+transcript_condenser = TranscriptCondenser(text_client, cache_dir=os.path.join(UPLOAD_FOLDER, 'transcript_summaries'))
+
+# Per-video content digests (keywords, emotions, key moments, tag names), rebuilt when metadata changes
+content_digest_store = ContentDigestStore(base_dir=os.path.join(UPLOAD_FOLDER, 'content_digests'))
+
+def read_metadata_json(path, encoding=None):
+    """Load a JSON metadata file, timed as the metadata_io stage"""
+    with observe_stage('metadata_io', {'file.path': path}):
+        with open(path, 'r', encoding=encoding) as f:
+            return json.load(f)
+
+def write_metadata_json(path, data):
+    """Write a JSON metadata file (indent=2), timed as the metadata_io stage"""
+    with observe_stage('metadata_io', {'file.path': path}):
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+def get_content_digest(video_id, metadata_file=None, metadata=None):
+    """Precomputed content digest for a video, or None if its metadata file cannot be found"""
+    metadata_file = metadata_file or find_video_metadata_file(video_id)
+    if not metadata_file:
+        return None
+    return content_digest_store.get(video_id, metadata_file, metadata)
+
+def refresh_content_digest(video_id, metadata_file, metadata=None):
+    """Recompute the digest right after transcription/tagging rewrote the metadata file"""
+    try:
+        content_digest_store.refresh(video_id, metadata_file, metadata)
+    except Exception as e:
+        print(f"Content digest refresh error: {str(e)}")
+
+def condense_transcript(transcript, word_timestamps=None, max_chars=None):
+    """Bounded-size, time-anchored transcript digest for prompts (unchanged if already short)"""
+    try:
+        return transcript_condenser.condense(transcript, word_timestamps, max_chars=max_chars)
+    except Exception as e:
+        print(f"Transcript condensation error: {str(e)}")
+        return (transcript or '')[:max_chars or transcript_condenser.max_chars]
+
 # Initialize services (Using Gemini API for everything)
 # transcription_service = TranscriptionService(BUCKET_NAME, GCP_PROJECT_ID)
 # tagging_service = VisualTaggingService(GCP_PROJECT_ID)
 
 # Use Gemini API services
 transcription_service = None  # Will be replaced with Gemini
-tagging_service = None        # Will be replaced with Gemini
+tagging_service = None        # Created on first use by get_visual_tagging_service()
+_tagging_service_lock = threading.Lock()
+
+def get_visual_tagging_service():
+    """Return the shared VisualTaggingService (frame extraction + per-frame analysis store)."""
+    global tagging_service
+    if tagging_service is None:
+        with _tagging_service_lock:
+            if tagging_service is None:
+                # tagging imports the Vision SDK, so it is loaded with the first tagging request
+                from tagging import VisualTaggingService, FrameAnalysisStore
+                tagging_service = VisualTaggingService(
+                    GCP_PROJECT_ID,
+                    frame_store=FrameAnalysisStore(base_dir=os.path.join(UPLOAD_FOLDER, 'frame_analyses')),
+                    video_info_provider=get_video_info
+                )
+    return tagging_service
+
+FRAME_EMBEDDING_ENABLED = os.getenv('FRAME_EMBEDDING_ENABLED', 'false').lower() == 'true'
+frame_embedding_service = None  # Created on first use by get_frame_embedding_service()
+_frame_embedding_lock = threading.Lock()
+
+def get_frame_embedding_service():
+    """Return the shared local FrameEmbeddingService, or None when disabled or the model is missing."""
+    global frame_embedding_service
+    if not FRAME_EMBEDDING_ENABLED:
+        return None
+    if frame_embedding_service is None:
+        with _frame_embedding_lock:
+            if frame_embedding_service is None:
+                from embeddings import FrameEmbeddingService, FrameEmbeddingStore
+                frame_embedding_service = FrameEmbeddingService(
+                    store=FrameEmbeddingStore(base_dir=os.path.join(UPLOAD_FOLDER, 'frame_embeddings'))
+                )
+    return frame_embedding_service if frame_embedding_service.is_available() else None
 
-# Import universal video processor for 100% compatibility
-try:
-    from enhanced_video_processor import universal_processor, process_any_video, is_video_supported
-    print("✅ Universal video processor loaded - 100% video compatibility enabled")
-except ImportError as e:
-    print(f"⚠️  Universal video processor not available: {e}")
-    universal_processor = None
+# Universal video processor for 100% compatibility (imports cv2/numpy and probes
+# ffmpeg, so it is loaded on first use)
+video_processor = lazy_import('enhanced_video_processor')
+
+def get_video_info(video_path):
+    """Parsed stream/format info from the cached ffprobe probe ({} if unavailable)"""
+    if video_processor:
+        try:
+            return video_processor.get_video_info(video_path)
+        except Exception as e:
+            print(f"Video probe error: {str(e)}")
+    return {}
 
 # Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -503,25 +844,148 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def _extract_json_block(raw_text: str) -> str:
-    """Best-effort extraction of a JSON object from LLM output."""
-    try:
-        if not isinstance(raw_text, str):
-            return ''
-        text = raw_text.strip()
-        # Remove common code fences
-        if text.startswith('```'):
-            # Strip leading and trailing backticks blocks
-            lines = [l for l in text.split('\n') if not l.strip().startswith('```') and not l.strip().endswith('```')]
-            text = '\n'.join(lines).strip()
-        # Find outermost JSON braces
-        start = text.find('{')
-        end = text.rfind('}')
-        if start != -1 and end != -1 and end > start:
-            return text[start:end + 1]
-        return text
-    except Exception:
-        return ''
+# Response schemas for Gemini JSON mode (OpenAPI subset accepted by response_schema)
+TEXT_TAGS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {'tags': {'type': 'ARRAY', 'items': {'type': 'STRING'}}},
+    'required': ['tags']
+}
+
+PACKED_TEXT_TAGS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'results': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'id': {'type': 'STRING'},
+                    'tags': {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+                },
+                'required': ['id', 'tags']
+            }
+        }
+    },
+    'required': ['results']
+}
+
+FRAME_TAGS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'tags': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {'tag': {'type': 'STRING'}, 'confidence': {'type': 'NUMBER'}},
+                'required': ['tag']
+            }
+        }
+    },
+    'required': ['tags']
+}
+
+VISUAL_TAGS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'tags': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'tag': {'type': 'STRING'},
+                    'confidence': {'type': 'NUMBER'},
+                    'category': {'type': 'STRING'}
+                },
+                'required': ['tag']
+            }
+        }
+    },
+    'required': ['tags']
+}
+
+TRANSCRIPT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'transcript': {'type': 'STRING'},
+        'word_timestamps': {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'word': {'type': 'STRING'},
+                    'start_time': {'type': 'NUMBER'},
+                    'end_time': {'type': 'NUMBER'},
+                    'confidence': {'type': 'NUMBER'}
+                },
+                'required': ['word', 'start_time', 'end_time']
+            }
+        },
+        'confidence': {'type': 'NUMBER'}
+    },
+    'required': ['transcript']
+}
+
+STORY_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'storyId': {'type': 'STRING'},
+        'scenes': {
+            'type': 'ARRAY',
+            'minItems': 1,
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'start': {'type': 'NUMBER'},
+                    'end': {'type': 'NUMBER'},
+                    'caption': {'type': 'STRING'},
+                    'narration': {'type': 'STRING'}
+                },
+                'required': ['start', 'end', 'caption', 'narration']
+            }
+        }
+    },
+    'required': ['storyId', 'scenes']
+}
+
+CONTRASTING_STORIES_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'positivePath': {'type': 'STRING'},
+        'negativePath': {'type': 'STRING'}
+    },
+    'required': ['positivePath', 'negativePath']
+}
+
+
+def _text_tagging_focus(emotion: str) -> str:
+    return (f"""
+- If an emotion is provided (\"{emotion}\"), prioritize tags that reflect that emotion.
+- Include at least 2 emotion-aligned tags when supported by the input.
+- Do not invent facts; only use concepts present or clearly implied by the input.
+""" if emotion else "")
+
+
+def _clean_text_tags(tags) -> list:
+    """Normalize model tags (strings or {'tag': ...}) to stripped strings, de-duplicated in order"""
+    cleaned = []
+    for t in tags or []:
+        if isinstance(t, str):
+            s = t.strip()
+            if s:
+                cleaned.append(s)
+        elif isinstance(t, dict) and 'tag' in t and isinstance(t['tag'], str):
+            s = t['tag'].strip()
+            if s:
+                cleaned.append(s)
+    # Deduplicate preserving order
+    seen = set()
+    unique = []
+    for s in cleaned:
+        key = s.lower()
+        if key not in seen:
+            seen.add(key)
+            unique.append(s)
+    return unique
 
 
 def generate_text_tags_with_gemini(transcript_or_description: str, emotion: str = "") -> list:
@@ -535,13 +999,9 @@ def generate_text_tags_with_gemini(transcript_or_description: str, emotion: str
             return []
 
         # Try Gemini first if available
-        if gemini_client:
+        if text_client:
             try:
-                focus_line = (f"""
-- If an emotion is provided (\"{emotion}\"), prioritize tags that reflect that emotion.
-- Include at least 2 emotion-aligned tags when supported by the input.
-- Do not invent facts; only use concepts present or clearly implied by the input.
-""" if emotion else "")
+                focus_line = _text_tagging_focus(emotion)
                 input_excerpt = text[:4000]
                 tagging_prompt = f"""
 You are an AI tagging assistant for video content.
@@ -568,41 +1028,9 @@ Now analyze this input:
 {input_excerpt}
 """
 
-                response = gemini_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=tagging_prompt
-                )
-                raw = getattr(response, 'text', '') or ''
-                json_block = _extract_json_block(raw)
-                try:
-                    data = json.loads(json_block)
-                except Exception:
-                    # Try a second attempt: wrap as JSON if model returned a plain list
-                    try:
-                        data = {"tags": json.loads(json_block)}
-                    except Exception:
-                        data = {"tags": []}
-
-                tags = data.get('tags') or []
-                # Normalize to strings
-                cleaned = []
-                for t in tags:
-                    if isinstance(t, str):
-                        s = t.strip()
-                        if s:
-                            cleaned.append(s)
-                    elif isinstance(t, dict) and 'tag' in t and isinstance(t['tag'], str):
-                        s = t['tag'].strip()
-                        if s:
-                            cleaned.append(s)
-                # Deduplicate preserving order
-                seen = set()
-                unique = []
-                for s in cleaned:
-                    key = s.lower()
-                    if key not in seen:
-                        seen.add(key)
-                        unique.append(s)
+                data = generate_json(text_client, "gemini-2.5-flash", tagging_prompt, TEXT_TAGS_SCHEMA)
+
+                unique = _clean_text_tags(data.get('tags'))
                 if len(unique) >= 10:
                     return unique[:20]  # Return up to 20 tags
             except Exception as e:
@@ -615,11 +1043,86 @@ Now analyze this input:
         print(f"Text tagging failed: {str(e)}")
         return generate_intelligent_tags_from_text(text, emotion)
 
+
+TEXT_TAG_PACK_SIZE = int(os.getenv('TEXT_TAG_PACK_SIZE', '8'))
+TEXT_TAG_PACK_CHARS = int(os.getenv('TEXT_TAG_PACK_CHARS', '16000'))
+
+
+def pack_text_tag_inputs(items: list) -> list:
+    """
+    Group [(key, text)] into packs for generate_text_tags_packed: at most TEXT_TAG_PACK_SIZE
+    items and about TEXT_TAG_PACK_CHARS of input per pack (each text is capped at its share).
+    """
+    size = max(1, TEXT_TAG_PACK_SIZE)
+    excerpt_chars = max(500, min(4000, TEXT_TAG_PACK_CHARS // size))
+    packs = []
+    current = []
+    current_chars = 0
+    for key, text in items:
+        excerpt = (text or '').strip()[:excerpt_chars]
+        if current and (len(current) >= size or current_chars + len(excerpt) > TEXT_TAG_PACK_CHARS):
+            packs.append(current)
+            current, current_chars = [], 0
+        current.append((key, excerpt))
+        current_chars += len(excerpt)
+    if current:
+        packs.append(current)
+    return packs
+
+
+def generate_text_tags_packed(pack: list, emotion: str = "") -> dict:
+    """
+    Text tags for several inputs [(key, text)] with a single Gemini call; returns {key: tags}.
+    Items the packed answer leaves out (or gives fewer than 10 tags) are tagged one by one
+    through generate_text_tags_with_gemini, which also covers the no-Gemini case.
+    """
+    results = {}
+    pending = [(key, text) for key, text in pack if text]
+    for key, text in pack:
+        if not text:
+            results[key] = []
+
+    if text_client and len(pending) > 1:
+        labels = {f"item{i + 1}": key for i, (key, _) in enumerate(pending)}
+        inputs = "\n\n".join(f"[item{i + 1}]\n{text}" for i, (_, text) in enumerate(pending))
+        tagging_prompt = f"""
+You are an AI tagging assistant for video content.
+
+Instruction:
+Automatically analyze each video's content and tag important objects, people, locations, actions, and emotions. Use clear, specific keywords to make searching and organizing easy.
+
+Requirements:
+- Output must be JSON only: {{"results": [{{"id": "item1", "tags": ["..."]}}]}} with exactly one entry per input item, using the item ids given below.
+- Tag every item independently; never carry tags from one item to another.
+- Each tag must be a single word or short phrase (1–3 words), lowercase except proper nouns.
+- Avoid duplicates, generic words, and full sentences. No explanations outside the JSON.
+- Generate 15-20 comprehensive tags per item covering all aspects of its content.
+{_text_tagging_focus(emotion)}
+
+Items:
+{inputs}
+"""
+        try:
+            data = generate_json(text_client, "gemini-2.5-flash", tagging_prompt, PACKED_TEXT_TAGS_SCHEMA)
+            for entry in data.get('results') or []:
+                key = labels.get(str(entry.get('id', '')).strip())
+                tags = _clean_text_tags(entry.get('tags'))
+                if key is not None and len(tags) >= 10:
+                    results[key] = tags[:20]
+        except Exception as e:
+            print(f"Gemini packed text tagging failed ({len(pending)} items): {str(e)}")
+
+    for key, text in pending:
+        if key not in results:
+            results[key] = generate_text_tags_with_gemini(text, emotion)
+    return results
+
 def generate_intelligent_tags_from_text(text: str, emotion: str = "") -> list:
     """
     Generate comprehensive tags from text using intelligent content analysis.
     Returns 15-20 meaningful tags based on actual content.
     """
+    record_fallback('fallback_text_tags')
     import re
     
     text_lower = text.lower()
@@ -712,37 +1215,6 @@ def generate_intelligent_tags_from_text(text: str, emotion: str = "") -> list:
     return final_tags[:20]  # Return up to 20 tags
 
 
-def generate_video_text_tags(video_metadata: dict, emotion: str = "") -> list:
-    """Combine transcript/description text from saved metadata and generate emotion-biased text tags.
-
-    Expects metadata shaped like what's stored in <video_id>_metadata.json, e.g.:
-    {
-        "transcription": {"transcript": "...", ...},
-        "description": "...",
-        ...
-    }
-    """
-    try:
-        text_sources = []
-        tr_block = video_metadata.get('transcription') or {}
-        if isinstance(tr_block, dict):
-            transcript_text = tr_block.get('transcript', '') or ''
-            if isinstance(transcript_text, str) and transcript_text.strip():
-                text_sources.append(transcript_text.strip())
-        desc = video_metadata.get('description') or ''
-        if isinstance(desc, str) and desc.strip():
-            text_sources.append(desc.strip())
-
-        # If there is any other textual signal in metadata, append here in the future
-        combined_text = ' '.join([t for t in text_sources if t])
-        if not combined_text.strip():
-            return []
-        return generate_text_tags_with_gemini(combined_text, emotion)
-    except Exception as e:
-        print(f"generate_video_text_tags failed: {str(e)}")
-        return []
-
-
 def transcribe_video_with_gemini(video_path: str, video_id: str) -> dict:
     """
     Transcribe video using Gemini AI by analyzing video frames and audio.
@@ -762,12 +1234,13 @@ def transcribe_video_with_gemini(video_path: str, video_id: str) -> dict:
         
         # Extract audio
         cmd = ['ffmpeg', '-i', video_path, '-vn', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', '16000', '-y', temp_audio_path]
-        subprocess.run(cmd, capture_output=True, check=True)
+        with observe_stage('audio_extraction', {'process.command': cmd[0]}):
+            subprocess.run(cmd, capture_output=True, check=True)
         
         # Get video duration
-        duration_cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', video_path]
-        duration_result = subprocess.run(duration_cmd, capture_output=True, text=True, check=True)
-        duration = float(duration_result.stdout.strip())
+        duration = get_video_duration(video_path)
+        if duration is None:
+            raise RuntimeError("Could not determine video duration")
         
         # Create Gemini prompt for transcription
         prompt = f"""
@@ -792,22 +1265,17 @@ def transcribe_video_with_gemini(video_path: str, video_id: str) -> dict:
         }}
         """
         
-        # Call Gemini API
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
-        
-        raw_text = getattr(response, 'text', '') or ''
-        json_block = _extract_json_block(raw_text)
-        
+        # Call Gemini API in JSON mode
         try:
-            result = json.loads(json_block)
+            result = generate_json(gemini_client, "gemini-2.5-flash", prompt, TRANSCRIPT_SCHEMA)
+            result.setdefault('word_timestamps', [])
+            result.setdefault('confidence', 0.8)
             # Clean up temp file
             os.unlink(temp_audio_path)
             return result
-        except Exception:
+        except StructuredOutputError:
             # Fallback to mock transcript
+            record_fallback('mock_transcript')
             words = ["This", "is", "a", "transcript", "of", "the", "video", "content"]
             word_timestamps = []
             time_per_word = duration / len(words)
@@ -836,6 +1304,48 @@ def transcribe_video_with_gemini(video_path: str, video_id: str) -> dict:
         return None
 
 
+def _gemini_image_part(img_bytes: bytes):
+    """Build an image part for google-genai, tolerating SDK version differences."""
+    try:
+        # Preferred in newer google-genai versions
+        return genai.types.Image(data=img_bytes, mime_type="image/jpeg")
+    except Exception:
+        try:
+            # Fallback for older SDKs
+            return genai.types.Blob(mime_type="image/jpeg", data=img_bytes)
+        except Exception:
+            return None
+
+
+def analyze_frame_with_gemini(frame_path: str) -> list:
+    """
+    Label a single extracted frame with Gemini for incremental (windowed) tagging.
+    Returns [{'tag', 'score'}] like VisualTaggingService.analyze_frame_with_vision_api.
+    """
+    try:
+        if not gemini_client:
+            return get_visual_tagging_service().analyze_frame_with_vision_api(frame_path)
+
+        with open(frame_path, 'rb') as img_file:
+            image_part = _gemini_image_part(img_file.read())
+        if image_part is None:
+            return get_visual_tagging_service().analyze_frame_with_vision_api(frame_path)
+
+        prompt = (
+            "List the specific objects, people, setting, activities and mood visible in this video frame. "
+            "Return JSON only: {\"tags\": [{\"tag\": \"short phrase\", \"confidence\": 0.0-1.0}]} with 8-15 tags."
+        )
+        data = generate_json(gemini_client, "gemini-2.5-flash", [image_part, prompt], FRAME_TAGS_SCHEMA)
+        labels = []
+        for t in data.get('tags', []):
+            if t['tag'].strip():
+                labels.append({'tag': t['tag'].strip(), 'score': float(t.get('confidence', 0.8))})
+        return labels
+    except Exception as e:
+        print(f"Gemini frame analysis failed for {frame_path}: {str(e)}")
+        return get_visual_tagging_service().analyze_frame_with_vision_api(frame_path)
+
+
 def tag_video_with_gemini(video_path: str, video_id: str) -> list:
     """
     Generate comprehensive visual tags for video using Gemini AI by analyzing video frames.
@@ -854,7 +1364,8 @@ def tag_video_with_gemini(video_path: str, video_id: str) -> list:
             # Extract 5 frames evenly spaced
             frame_pattern = os.path.join(temp_dir, 'frame_%03d.jpg')
             cmd = ['ffmpeg', '-i', video_path, '-vf', 'fps=1/5', '-y', frame_pattern]
-            subprocess.run(cmd, capture_output=True, check=True)
+            with observe_stage('frame_extraction', {'process.command': cmd[0]}):
+                subprocess.run(cmd, capture_output=True, check=True)
             
             # Get list of extracted frames
             frames = [f for f in os.listdir(temp_dir) if f.endswith('.jpg')]
@@ -933,42 +1444,21 @@ def tag_video_with_gemini(video_path: str, video_id: str) -> list:
             with open(frame_path, 'rb') as img_file:
                 img_bytes = img_file.read()
 
-                image_part = None
-                try:
-                    # Preferred in newer google-genai versions
-                    image_part = genai.types.Image(data=img_bytes, mime_type="image/jpeg")
-                except Exception:
-                    try:
-                        # Fallback for older SDKs
-                        image_part = genai.types.Blob(mime_type="image/jpeg", data=img_bytes)
-                    except Exception:
-                        image_part = None
-
-                if image_part is not None:
-                    response = gemini_client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=[image_part, prompt]
-                    )
-                else:
-                    # Last-resort fallback: text-only (no image part)
-                    response = gemini_client.models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=prompt
-                    )
-            
-            raw_text = getattr(response, 'text', '') or ''
-            json_block = _extract_json_block(raw_text)
-            
+                image_part = _gemini_image_part(img_bytes)
+
+            # Last-resort fallback: text-only (no image part)
+            contents = [image_part, prompt] if image_part is not None else prompt
             try:
-                result = json.loads(json_block)
-                tags = result.get('tags', [])
-                if len(tags) >= 10:
-                    return tags
-                else:
-                    # If Gemini didn't generate enough tags, use fallback
-                    return generate_comprehensive_visual_tags_fallback(video_path, video_id)
-            except Exception:
-                # Fallback to comprehensive tags
+                result = generate_json(gemini_client, "gemini-2.5-flash", contents, VISUAL_TAGS_SCHEMA)
+            except StructuredOutputError as e:
+                print(f"Gemini visual tags invalid: {str(e)}")
+                return generate_comprehensive_visual_tags_fallback(video_path, video_id)
+
+            tags = result.get('tags', [])
+            if len(tags) >= 10:
+                return tags
+            else:
+                # If Gemini didn't generate enough tags, use fallback
                 return generate_comprehensive_visual_tags_fallback(video_path, video_id)
                 
     except Exception as e:
@@ -980,6 +1470,7 @@ def generate_comprehensive_visual_tags_fallback(video_path: str, video_id: str)
     Generate comprehensive visual tags when Gemini fails.
     Creates 20+ meaningful tags based on ACTUAL video content analysis.
     """
+    record_fallback('fallback_visual_tags')
     try:
         # Get video metadata and transcript - THIS IS THE KEY TO CONTENT-BASED TAGGING
         video_metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
@@ -987,10 +1478,9 @@ def generate_comprehensive_visual_tags_fallback(video_path: str, video_id: str)
         word_timestamps = []
         
         if os.path.exists(video_metadata_file):
-            with open(video_metadata_file, 'r') as f:
-                metadata = json.load(f)
-                transcript = metadata.get('transcript', '')
-                word_timestamps = metadata.get('word_timestamps', [])
+            metadata = read_metadata_json(video_metadata_file)
+            transcript = metadata.get('transcript', '')
+            word_timestamps = metadata.get('word_timestamps', [])
         
         # CONTENT-BASED ANALYSIS - Focus on actual content, not just duration
         tags = []
@@ -1093,11 +1583,8 @@ def generate_comprehensive_visual_tags_fallback(video_path: str, video_id: str)
         
         # PRIORITY 3: VIDEO CHARACTERISTICS (Only if no content-based tags)
         if len(tags) < 10:  # Only add duration-based tags if we don't have enough content-based tags
-            # Get video duration using ffprobe
-            import subprocess
-            duration_cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', video_path]
-            duration_result = subprocess.run(duration_cmd, capture_output=True, text=True)
-            duration = float(duration_result.stdout.strip()) if duration_result.stdout.strip() else 30
+            # Get video duration from the cached probe
+            duration = get_video_duration(video_path) or 30
             
             if duration < 30:
                 tags.extend([
@@ -1158,171 +1645,10 @@ def generate_comprehensive_visual_tags_fallback(video_path: str, video_id: str)
 
 
 def _generate_inspirational_story_fallback(prompt: str, mode: str) -> str:
-    """Return an inspirational story without external AI, styled by `mode`.
-
-    The output varies meaningfully across modes and lightly with the prompt.
-    We keep it concise but rich (≈220–320 words) so the UI feels responsive
-    even when the AI model is unavailable.
-    """
-    import random
-    from hashlib import sha256
-
-    prompt_clean = (prompt or 'your journey').strip()
-
-    # Seed pseudo-randomness using prompt+mode so similar prompts feel
-    # consistent yet distinct across modes.
-    seed = int(sha256(f"{prompt_clean}|{mode}".encode("utf-8")).hexdigest(), 16) % (2**32)
-    rnd = random.Random(seed)
-
-    vocab = {
-        'Hopeful': {
-            'openers': [
-                "It began quietly, like a window opening to softer light.",
-                "Morning arrived with a gentle kind of clarity.",
-                "A small brightness found its way into the room."
-            ],
-            'metaphors': [
-                "paths unfolding like pages not yet written",
-                "seedlings pushing up through patient soil",
-                "new sky after passing rain"
-            ],
-            'verbs': ["invite", "nurture", "grow", "open"],
-            'closers': [
-                "Tomorrow will meet you halfway.",
-                "Even small light can guide a long way.",
-                "What you tend today becomes a horizon."
-            ],
-        },
-        'Motivational': {
-            'openers': [
-                "It started when you decided to move—no applause, just action.",
-                "The day sharpened the moment you took control.",
-                "Momentum noticed the instant you showed up."
-            ],
-            'metaphors': [
-                "gears catching, power building",
-                "distance closing with every step",
-                "sparks stacking into bright flame"
-            ],
-            'verbs': ["commit", "build", "push", "advance"],
-            'closers': [
-                "Discipline writes the ending you want.",
-                "Progress rewards the ones who keep showing up.",
-                "You're closer because you chose to move."
-            ],
-        },
-        'Funny': {
-            'openers': [
-                "It kicked off with a plan that looked suspiciously like improvisation.",
-                "You announced a brilliant idea; the universe replied, 'Interesting, proceed.'",
-                "Step one was confidence. Step two was Googling how to do step one."
-            ],
-            'metaphors': [
-                "a circus of tiny miracles",
-                "plot twists tripping over each other",
-                "chaos politely waiting its turn"
-            ],
-            'verbs': ["wing", "juggle", "tumble", "sparkle"],
-            'closers': [
-                "If life is a sitcom, today's episode ends with a fist‑pump.",
-                "You laughed, learned, and somehow it worked.",
-                "Comedy aside, look at you—actually nailing it."
-            ],
-        },
-        'Emotional': {
-            'openers': [
-                "It began with a feeling you could almost name.",
-                "A quiet ache turned into a gentle vow.",
-                "You carried it carefully, like a photograph you didn't want to bend."
-            ],
-            'metaphors': [
-                "memory threading itself through the present",
-                "tides returning to the shore they trust",
-                "warmth finding a hand in the dark"
-            ],
-            'verbs': ["listen", "hold", "honor", "heal"],
-            'closers': [
-                "What matters is held here, and it remains.",
-                "The heart remembers, and it keeps going.",
-                "You are allowed to feel this and still move forward."
-            ],
-        },
-        'Reflective': {
-            'openers': [
-                "You paused long enough for the day to make sense.",
-                "Questions settled like dust, revealing shape.",
-                "A little distance turned noise into meaning."
-            ],
-            'metaphors': [
-                "a map redrawn with truer lines",
-                "water clearing until the stones show",
-                "threads weaving into a patient pattern"
-            ],
-            'verbs': ["observe", "clarify", "align", "tend"],
-            'closers': [
-                "Clarity is quiet progress.",
-                "Understanding is also a kind of arrival.",
-                "You leave the day more aligned than you found it."
-            ],
-        },
-    }
-
-    style = vocab.get(mode, vocab['Hopeful'])
-
-    opener = rnd.choice(style['openers'])
-    metaphor = rnd.choice(style['metaphors'])
-    verb_pair = ", ".join(rnd.sample(style['verbs'], k=min(2, len(style['verbs']))))
-    closer = rnd.choice(style['closers'])
-
-    p1 = (
-        f"{opener} You looked at {prompt_clean} and the day tilted in your favor,"
-        f" {metaphor}. What seemed distant stepped a little closer,"
-        f" and you decided to {verb_pair}."
-    )
-
-    p2 = (
-        f"You tried, adjusted, and tried again. The imperfect first draft of action"
-        f" became a clearer sketch: smaller goals, steadier breaths, a rhythm you could keep."
-        f" Setbacks didn't erase progress; they revealed where strength belonged."
-        f" With each pass, {prompt_clean} felt more possible, more yours."
-    )
+    """Return an inspirational story without external AI, styled by `mode` (see story_templates)."""
+    record_fallback('template_story')
+    return inspirational_story(prompt, mode)
 
-    p3 = (
-        f"By evening there was proof—subtle but real. You learned what to keep and what to let go."
-        f" You closed the day with gratitude and a simple promise to continue. {closer}"
-    )
-
-    story = "\n\n".join([p1, p2, p3])
-
-    # If a bit short, extend with a concise third paragraph tailored to the mode
-    # to keep the reading experience satisfying.
-    word_count = len(story.split())
-    if word_count < 220:
-        extra = {
-            'Hopeful': (
-                "Tomorrow's plan is small and kind to your future self: one focused task,"
-                " one mindful pause, and permission to celebrate what goes right."
-            ),
-            'Motivational': (
-                "Set the next rep now: clear target, short deadline, honest effort."
-                " Consistency will do the heavy lifting if you show up."
-            ),
-            'Funny': (
-                "Note to self: label your boxes, hydrate, and keep the soundtrack upbeat."
-                " Hero arcs love good snacks."
-            ),
-            'Emotional': (
-                "You honor where you've been and trust where you're going."
-                " That tenderness is strength making room for growth."
-            ),
-            'Reflective': (
-                "You mark a lesson or two in the margins and travel lighter."
-                " Insight quietly changes the route."
-            ),
-        }.get(mode, "Tomorrow will meet you halfway.")
-        story = story + "\n\n" + extra
-
-    return story
 
 def requires_auth(f):
     """Decorator to verify Google ID token"""
@@ -1545,7 +1871,6 @@ def get_user_profile():
         return jsonify({'error': f'Failed to get user profile: {str(e)}'}), 500
 
 @app.route('/upload', methods=['POST'])
-@optimize_memory
 def upload_video():
     """Handle video upload"""
     try:
@@ -1560,9 +1885,9 @@ def upload_video():
             return jsonify({'error': 'No file selected'}), 400
         
         # Validate file type with universal compatibility
-        if universal_processor:
+        if video_processor:
             # Use universal processor for 100% compatibility
-            if not is_video_supported(file.filename):
+            if not video_processor.is_video_supported(file.filename):
                 return jsonify({'error': 'File format not supported'}), 400
         else:
             # Fallback to original validation
@@ -1639,14 +1964,10 @@ def upload_video():
         
         # Also save to JSON file for backward compatibility
         metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
-        with open(metadata_file, 'w') as f:
-            json.dump(video_metadata, f, indent=2)
+        write_metadata_json(metadata_file, video_metadata)
         
         print(f"Video uploaded: {video_id} by user {user_email}")
 
-        # Clean up memory after upload
-        memory_cleanup()
-
         # Skip heavy background processing for reliability
         print(f"[BG] Skipping heavy video processing for {video_id} to ensure reliability")
         
@@ -1654,17 +1975,22 @@ def upload_video():
         basic_tags = [{"tag": "video", "confidence": 0.8}, {"tag": "content", "confidence": 0.7}]
         try:
             if os.path.exists(metadata_file):
-                with open(metadata_file, 'r') as mf:
-                    meta = json.load(mf)
+                meta = read_metadata_json(metadata_file)
             else:
                 meta = {}
             meta['visual_tags'] = basic_tags
-            with open(metadata_file, 'w') as mf:
-                json.dump(meta, mf, indent=2)
+            write_metadata_json(metadata_file, meta)
             update_video_metadata(video_id, {'visual_tags': basic_tags})
             print(f"[BG] Added basic tags for {video_id}")
         except Exception as e:
             print(f"[BG] Error adding basic tags: {e}")
+
+        # Poster + scrub sprite + VTT track in one decode pass, off the request path
+        threading.Thread(
+            target=generate_video_previews,
+            args=(video_id, local_path, duration, metadata_file),
+            daemon=True
+        ).start()
         
         return jsonify({
             'success': True,
@@ -1676,9 +2002,53 @@ def upload_video():
         
     except Exception as e:
         print(f"Upload error: {str(e)}")
-        memory_cleanup()
         return jsonify({'error': f'Upload failed: {str(e)}'}), 500
 
+def preview_url(path):
+    """Public URL for a file under the previews directory (None if not generated)"""
+    if not path:
+        return None
+    rel_path = os.path.relpath(path, preview_service.base_dir)
+    if rel_path.startswith('..'):
+        return None
+    return f"/previews/{rel_path.replace(os.sep, '/')}"
+
+def generate_video_previews(video_id, local_path, duration, metadata_file):
+    """Upload-time preview stage: store poster/sprite/VTT paths and content hash on the video"""
+    try:
+        previews = preview_service.generate(local_path, duration)
+        if not previews:
+            return
+        update_video_metadata(video_id, {
+            'thumbnail_path': previews['posterPath'],
+            'preview_path': previews['vttPath'],
+            'content_hash': previews['contentHash']
+        })
+        if os.path.exists(metadata_file):
+            meta = read_metadata_json(metadata_file)
+            meta['thumbnail_path'] = previews['posterPath']
+            meta['sprite_path'] = previews['spritePath']
+            meta['preview_path'] = previews['vttPath']
+            meta['content_hash'] = previews['contentHash']
+            write_metadata_json(metadata_file, meta)
+        print(f"[BG] Previews ready for {video_id} (reused: {previews['reused']})")
+    except Exception as e:
+        print(f"[BG] Error generating previews for {video_id}: {e}")
+
+@app.route('/previews/<path:filename>')
+def serve_preview(filename):
+    """Serve poster, sprite sheet and WebVTT thumbnail track files"""
+    base_dir = os.path.abspath(preview_service.base_dir)
+    preview_path = os.path.abspath(os.path.join(base_dir, filename))
+    if not preview_path.startswith(base_dir + os.sep) or not os.path.isfile(preview_path):
+        return jsonify({'error': 'Preview not found'}), 404
+
+    mimetype = 'text/vtt' if preview_path.endswith('.vtt') else 'image/jpeg'
+    response = send_file(preview_path, mimetype=mimetype)
+    # Content-addressed: the same path never changes
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
     """Handle video transcription using TranscriptionService"""
@@ -1710,8 +2080,7 @@ def transcribe():
                 return jsonify({"success": False, "error": "Video not found"}), 404
             video_metadata_file = found
         
-        with open(video_metadata_file, 'r') as f:
-            video_metadata = json.load(f)
+        video_metadata = read_metadata_json(video_metadata_file)
         
         video_path = video_metadata.get('localPath')
         if not video_path or not os.path.exists(video_path):
@@ -1720,10 +2089,12 @@ def transcribe():
         print(f"[DEBUG] Starting transcription for {video_path}")
 
         # Initialize TranscriptionService
+        from transcribe import TranscriptionService
         transcription_service = TranscriptionService(BUCKET_NAME, GCP_PROJECT_ID)
         
         # Use local audio-based transcription first
-        transcript = transcription_service.transcribe_video(video_path, video_id, output_format)
+        with memory_governor.job('whisper'):
+            transcript = transcription_service.transcribe_video(video_path, video_id, output_format)
         
         if not transcript:
             # Fallback to Gemini text-only if local audio transcription fails
@@ -1761,8 +2132,8 @@ def transcribe():
             })
             
             # Also save to JSON file for backward compatibility
-            with open(video_metadata_file, 'w') as f:
-                json.dump(video_metadata, f, indent=2)
+            write_metadata_json(video_metadata_file, video_metadata)
+            refresh_content_digest(video_id, video_metadata_file, video_metadata)
             
             print(f"Transcription completed for video: {video_id}")
             print(f"DEBUG: Saved {len(word_timestamps)} word timestamps to metadata")
@@ -1776,6 +2147,8 @@ def transcribe():
         else:
             return jsonify({"success": False, "error": "Transcription failed"}), 500
 
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
         print(f"[ERROR] /transcribe exception: {e}")
         import traceback
@@ -1803,23 +2176,27 @@ def transcribe_direct():
             audio_path = video_path.replace(".mp4", ".wav")  # Just for naming
             
             # DIRECT TRANSCRIPTION - Use the same approach that worked in debug
-            if WHISPER_MODEL:
+            whisper_model = get_whisper_model()
+            if whisper_model:
                 print("🔄 Starting DIRECT TRANSCRIPTION (proven to work)...")
                 print(f"🎬 Video file: {video_path}")
                 print(f"🕐 Timestamp: {time.time()}")  # Force reload
                 
                 # Use the exact same approach that worked in debug script
                 try:
-                    segments, info = WHISPER_MODEL.transcribe(
-                        video_path,  # Transcribe video directly
-                        beam_size=25,
-                        best_of=25,
-                        temperature=0.0,
-                        condition_on_previous_text=False,
-                        word_timestamps=True,
-                        vad_filter=False,
-                        language="en"
-                    )
+                    with memory_governor.job('whisper'), observe_stage('whisper_inference'):
+                        segments, info = whisper_model.transcribe(
+                            video_path,  # Transcribe video directly
+                            beam_size=25,
+                            best_of=25,
+                            temperature=0.0,
+                            condition_on_previous_text=False,
+                            word_timestamps=True,
+                            vad_filter=False,
+                            language="en"
+                        )
+                        # Segments are decoded lazily; consume them inside the timed block
+                        segments = list(segments)
                     
                     # Process results exactly like debug script
                     transcript_parts = []
@@ -1844,6 +2221,8 @@ def transcribe_direct():
                     print(f"🎉 DIRECT TRANSCRIPTION COMPLETE: {len(transcript_text.split())} words")
                     print(f"📝 Full transcript: {transcript_text}")
                     
+                except MemoryBudgetExceeded:
+                    raise
                 except Exception as e:
                     print(f"❌ Direct transcription failed: {e}")
                     transcript_text = ""
@@ -1870,6 +2249,8 @@ def transcribe_direct():
             except Exception as e:
                 print(f"Warning: Could not clean up temp files: {e}")
 
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1906,7 +2287,8 @@ def transcribe_direct_video():
         
         # Use ultra-lightweight transcription
         try:
-            if WHISPER_MODEL:
+            whisper_model = get_whisper_model()
+            if whisper_model:
                 print(f"🎯 Using ultra-light Whisper settings for {video_id}")
                 
                 # Extract audio first to reduce processing time
@@ -1915,25 +2297,28 @@ def transcribe_direct_video():
                 
                 # Convert video to audio using ffmpeg (much faster)
                 try:
-                    subprocess.run([
-                        'ffmpeg', '-i', video_path, 
-                        '-vn', '-acodec', 'pcm_s16le', 
-                        '-ar', '16000', '-ac', '1', 
-                        audio_path, '-y'
-                    ], check=True, capture_output=True)
+                    with observe_stage('audio_extraction', {'process.command': 'ffmpeg'}):
+                        subprocess.run([
+                            'ffmpeg', '-i', video_path, 
+                            '-vn', '-acodec', 'pcm_s16le', 
+                            '-ar', '16000', '-ac', '1', 
+                            audio_path, '-y'
+                        ], check=True, capture_output=True)
                     print(f"✅ Audio extracted to {audio_path}")
                     
                     # Use Whisper on audio (much faster than video)
-                    segments, info = WHISPER_MODEL.transcribe(
-                        audio_path,
-                        beam_size=1,
-                        best_of=1,
-                        temperature=0.0,
-                        condition_on_previous_text=False,
-                        word_timestamps=False,
-                        vad_filter=False,
-                        language="en"
-                    )
+                    with memory_governor.job('whisper'), observe_stage('whisper_inference'):
+                        segments, info = whisper_model.transcribe(
+                            audio_path,
+                            beam_size=1,
+                            best_of=1,
+                            temperature=0.0,
+                            condition_on_previous_text=False,
+                            word_timestamps=False,
+                            vad_filter=False,
+                            language="en"
+                        )
+                        segments = list(segments)
                     
                     # Clean up audio file
                     try:
@@ -1961,6 +2346,8 @@ def transcribe_direct_video():
             else:
                 transcript_text = "Whisper model not available. Video processed successfully."
                 
+        except MemoryBudgetExceeded:
+            raise
         except Exception as e:
             print(f"❌ Light transcription failed: {e}")
             transcript_text = "Video transcription completed with optimized processing."
@@ -1969,14 +2356,13 @@ def transcribe_direct_video():
         try:
             metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
             if os.path.exists(metadata_file):
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
+                metadata = read_metadata_json(metadata_file)
                 
                 metadata['transcript'] = transcript_text
                 metadata['transcribedAt'] = datetime.now().isoformat()
                 
-                with open(metadata_file, 'w') as f:
-                    json.dump(metadata, f, indent=2)
+                write_metadata_json(metadata_file, metadata)
+                refresh_content_digest(video_id, metadata_file, metadata)
                 
                 print(f"✅ Real transcription saved to metadata file")
         except Exception as save_error:
@@ -1990,6 +2376,8 @@ def transcribe_direct_video():
             "method": "real_whisper_light"
         })
                 
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
         print(f"❌ Transcription error: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -2024,8 +2412,7 @@ def get_transcript(video_id):
             else:
                 return jsonify({'error': 'Video not found'}), 404
         
-        with open(video_metadata_file, 'r') as f:
-            video_metadata = json.load(f)
+        video_metadata = read_metadata_json(video_metadata_file)
         
         transcription = video_metadata.get('transcription')
         if not transcription:
@@ -2041,6 +2428,128 @@ def get_transcript(video_id):
         print(f"Get transcript error: {str(e)}")
         return jsonify({'error': f'Failed to get transcript: {str(e)}'}), 500
 
+@memory_governor.governed('frames')
+def _tag_video(video_id, emotion_bias='', start_time=None, end_time=None, text_tags=None):
+    """
+    Visual + text tagging for one video, persisted to metadata and the DB.
+    Returns (response body, HTTP status); shared by /generate-tags and /batch/generate-tags.
+    """
+    # Find the video file
+    video_metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
+    if not os.path.exists(video_metadata_file):
+        return {'error': 'Video not found'}, 404
+    
+    video_metadata = read_metadata_json(video_metadata_file)
+    
+    video_path = video_metadata.get('localPath')
+    if not os.path.exists(video_path):
+        return {'error': 'Video file not found'}, 404
+    
+    print(f"Starting visual tagging for video: {video_id}")
+
+    window = None
+    embedding_service = get_frame_embedding_service()
+    if start_time is not None or end_time is not None or embedding_service:
+        # Focused re-tagging: only frames in the window that were never analyzed
+        # are sent to the model; the rest is aggregated from stored analyses.
+        # The local embedding model (when enabled) labels frames in batches on-box.
+        window_result = get_visual_tagging_service().tag_video_incremental(
+            video_path, video_id,
+            start_time=start_time, end_time=end_time,
+            analyze_frame=analyze_frame_with_gemini if gemini_client else None,
+            analyze_batch=embedding_service.analyze_frame_batch if embedding_service else None,
+            frame_embedder=embedding_service
+        )
+        visual_tags = window_result['tags']
+        if start_time is not None or end_time is not None:
+            window = {
+                'startTime': window_result['start_time'],
+                'endTime': window_result['end_time'],
+                'framesAnalyzed': window_result['analyzed'],
+                'framesReused': window_result['reused']
+            }
+        timeline = window_result.get('timeline')
+    else:
+        # Visual tags using Gemini AI: one call for the whole video; the tag timeline
+        # comes from frames already analyzed by earlier windowed requests
+        visual_tags = tag_video_with_gemini(video_path, video_id)
+        timeline = get_visual_tagging_service().stored_timeline(video_id)
+    if timeline:
+        save_tag_timeline(video_id, timeline)
+
+    # Fallback to basic tags if Gemini fails
+    if not visual_tags:
+        visual_tags = [{"tag": "video", "confidence": 0.8}, {"tag": "content", "confidence": 0.7}]
+
+    # Text-based tags with Gemini using transcript/description (batch callers pass them precomputed)
+    if text_tags is None:
+        text_tags = []
+        try:
+            digest = get_content_digest(video_id, video_metadata_file, video_metadata) or {}
+            transcript_text = digest.get('tag_text', '')
+            text_tags = generate_text_tags_with_gemini(transcript_text, emotion_bias)
+        except Exception as te:
+            print(f"Text tagging pipeline error: {str(te)}")
+
+    if visual_tags or text_tags:
+        # Merge visual dict tags and text string tags
+        merged = {}
+        for vt in (visual_tags or []):
+            if isinstance(vt, dict) and 'tag' in vt:
+                # annotate source without mutating original deeply
+                item = dict(vt)
+                item.setdefault('source', 'visual')
+                merged[item['tag'].lower()] = item
+        for ts in (text_tags or []):
+            key = str(ts).strip().lower()
+            if key and key not in merged:
+                merged[key] = {
+                    'tag': ts,
+                    'score': 0.9,
+                    'timestamp': 0.0,
+                    'occurrences': 1,
+                    'source': 'text'
+                }
+        combined_tags = list(merged.values())
+
+        # Build allTags (with 'All' first)
+        unique_tag_names = []
+        for v in combined_tags:
+            name = (v.get('tag') or '').strip()
+            if name and name.lower() not in [t.lower() for t in unique_tag_names]:
+                unique_tag_names.append(name)
+        all_tags = ['All'] + unique_tag_names
+
+        # Save to metadata and DB (windowed results live in the frame analysis
+        # store and must not replace the whole-video tags)
+        if window is None:
+            video_metadata['visual_tags'] = visual_tags
+        if text_tags:
+            video_metadata['ai_text_tags'] = text_tags
+        video_metadata['taggedAt'] = datetime.now().isoformat()
+
+        db_updates = {'ai_text_tags': text_tags}
+        if window is None:
+            db_updates['visual_tags'] = visual_tags
+        update_video_metadata(video_id, db_updates)
+
+        write_metadata_json(video_metadata_file, video_metadata)
+        refresh_content_digest(video_id, video_metadata_file, video_metadata)
+
+        print(f"Tagging completed for video: {video_id} (visual {len(visual_tags or [])}, text {len(text_tags or [])})")
+
+        response_body = {
+            'success': True,
+            'tags': combined_tags,
+            'videoId': video_id,
+            'allTags': all_tags
+        }
+        if window is not None:
+            response_body['window'] = window
+        return response_body, 200
+    else:
+        return {'error': 'Tagging failed'}, 500
+
 @app.route('/generate-tags', methods=['POST'])
 @app.route('/generate_tags', methods=['POST'])
 def generate_tags():
@@ -2064,92 +2573,11 @@ def generate_tags():
         if not video_id:
             return jsonify({'error': 'Video ID is required'}), 400
         
-        # Find the video file
-        video_metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
-        if not os.path.exists(video_metadata_file):
-            return jsonify({'error': 'Video not found'}), 404
-        
-        with open(video_metadata_file, 'r') as f:
-            video_metadata = json.load(f)
-        
-        video_path = video_metadata.get('localPath')
-        if not os.path.exists(video_path):
-            return jsonify({'error': 'Video file not found'}), 404
-        
-        print(f"Starting visual tagging for video: {video_id}")
-
-        # Visual tags using Gemini AI
-        visual_tags = tag_video_with_gemini(video_path, video_id)
-        
-        # Fallback to basic tags if Gemini fails
-        if not visual_tags:
-            visual_tags = [{"tag": "video", "confidence": 0.8}, {"tag": "content", "confidence": 0.7}]
-
-        # Text-based tags with Gemini using transcript/description
-        text_tags = []
-        try:
-            tr_block = video_metadata.get('transcription') or {}
-            transcript_text = tr_block.get('transcript', '') if isinstance(tr_block, dict) else ''
-            if not transcript_text:
-                transcript_text = video_metadata.get('description') or ''
-            text_tags = generate_text_tags_with_gemini(transcript_text, emotion_bias)
-        except Exception as te:
-            print(f"Text tagging pipeline error: {str(te)}")
-
-        if visual_tags or text_tags:
-            # Merge visual dict tags and text string tags
-            merged = {}
-            for vt in (visual_tags or []):
-                if isinstance(vt, dict) and 'tag' in vt:
-                    # annotate source without mutating original deeply
-                    item = dict(vt)
-                    item.setdefault('source', 'visual')
-                    merged[item['tag'].lower()] = item
-            for ts in (text_tags or []):
-                key = str(ts).strip().lower()
-                if key and key not in merged:
-                    merged[key] = {
-                        'tag': ts,
-                        'score': 0.9,
-                        'timestamp': 0.0,
-                        'occurrences': 1,
-                        'source': 'text'
-                    }
-            combined_tags = list(merged.values())
-
-            # Build allTags (with 'All' first)
-            unique_tag_names = []
-            for v in combined_tags:
-                name = (v.get('tag') or '').strip()
-                if name and name.lower() not in [t.lower() for t in unique_tag_names]:
-                    unique_tag_names.append(name)
-            all_tags = ['All'] + unique_tag_names
-
-            # Save to metadata and DB
-            video_metadata['visual_tags'] = visual_tags
-            if text_tags:
-                video_metadata['ai_text_tags'] = text_tags
-            video_metadata['taggedAt'] = datetime.now().isoformat()
-
-            update_video_metadata(video_id, {
-                'visual_tags': visual_tags,
-                'ai_text_tags': text_tags
-            })
-
-            with open(video_metadata_file, 'w') as f:
-                json.dump(video_metadata, f, indent=2)
-
-            print(f"Tagging completed for video: {video_id} (visual {len(visual_tags or [])}, text {len(text_tags or [])})")
-
-            return jsonify({
-                'success': True,
-                'tags': combined_tags,
-                'videoId': video_id,
-                'allTags': all_tags
-            })
-        else:
-            return jsonify({'error': 'Tagging failed'}), 500
+        body, status = _tag_video(video_id, emotion_bias, start_time, end_time)
+        return jsonify(body), status
         
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
         import traceback
         print("Visual tagging error:")
@@ -2170,8 +2598,7 @@ def get_tags():
         try:
             video_metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
             if os.path.exists(video_metadata_file):
-                with open(video_metadata_file, 'r') as f:
-                    metadata = json.load(f)
+                metadata = read_metadata_json(video_metadata_file)
                 visual_tags = metadata.get('visual_tags', [])
                 text_tags = metadata.get('ai_text_tags', [])
                 tags = visual_tags + text_tags
@@ -2188,6 +2615,32 @@ def get_tags():
         print(f"Get tags error: {str(e)}")
         return jsonify({'error': f'Failed to get tags: {str(e)}'}), 500
 
+@app.route('/tag-timeline', methods=['GET'])
+def get_tag_timeline_route():
+    """GET /tag-timeline?videoId=<id>[&tag=<name>][&start=<s>&end=<s>] returns tag intervals"""
+    try:
+        video_id = request.args.get('videoId')
+        if not video_id:
+            return jsonify({'error': 'videoId parameter is required'}), 400
+
+        tag = (request.args.get('tag') or '').strip() or None
+        try:
+            start_time = float(request.args['start']) if request.args.get('start') else None
+            end_time = float(request.args['end']) if request.args.get('end') else None
+        except ValueError:
+            return jsonify({'error': 'start and end must be numbers (seconds)'}), 400
+
+        intervals = get_tag_timeline(video_id, tag=tag, start_time=start_time, end_time=end_time)
+        return jsonify({
+            'videoId': video_id,
+            'intervals': intervals,
+            'totalIntervals': len(intervals)
+        })
+
+    except Exception as e:
+        print(f"Get tag timeline error: {str(e)}")
+        return jsonify({'error': f'Failed to get tag timeline: {str(e)}'}), 500
+
 
 @app.route('/ai-tags', methods=['GET'])
 def generate_ai_tags_on_demand():
@@ -2203,13 +2656,12 @@ def generate_ai_tags_on_demand():
             return jsonify({'error': 'videoId parameter is required'}), 400
 
         metadata_path = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
-        if not os.path.exists(metadata_path):
+        digest = get_content_digest(video_id, metadata_path) if os.path.exists(metadata_path) else None
+        if digest is None:
             return jsonify({'error': 'Video not found'}), 404
 
-        with open(metadata_path, 'r') as f:
-            video_metadata = json.load(f)
-
-        tags = generate_video_text_tags(video_metadata, emotion)
+        # Transcript + description text comes precomputed from the content digest
+        tags = generate_text_tags_with_gemini(digest['tag_text'], emotion) if digest['tag_text'] else []
         return jsonify({
             'videoId': video_id,
             'emotion': emotion,
@@ -2244,8 +2696,7 @@ def analyze_emotions():
             try:
                 metadata_path = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
                 if os.path.exists(metadata_path):
-                    with open(metadata_path, 'r') as f:
-                        meta = json.load(f)
+                    meta = read_metadata_json(metadata_path)
                 # Check for direct transcript field first
                 transcript = transcript or meta.get('transcript', '')
                 word_timestamps = word_timestamps or meta.get('word_timestamps', [])
@@ -2436,17 +2887,27 @@ def extract_video_clip():
         video_id = data.get('videoId')
         start_time = data.get('startTime', 0)  # seconds
         duration = data.get('duration', 0.5)   # seconds, default 0.5 seconds for tag clips
+        tag = (data.get('tag') or '').strip()
         
         if not video_id:
             return jsonify({'error': 'Video ID is required'}), 400
         
+        # Clip a tag by name: use its best interval from the tag timeline
+        if tag and data.get('startTime') is None:
+            intervals = get_tag_timeline(video_id, tag=tag, exact=True) or get_tag_timeline(video_id, tag=tag)
+            if not intervals:
+                return jsonify({'error': f"Tag '{tag}' not found in tag timeline"}), 404
+            best = max(intervals, key=lambda x: (x['score'], x['end'] - x['start']))
+            start_time = best['start']
+            if data.get('duration') is None:
+                duration = round(best['end'] - best['start'], 3)
+        
         # Find the video file
         video_metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
         if not os.path.exists(video_metadata_file):
             return jsonify({'error': 'Video not found'}), 404
         
-        with open(video_metadata_file, 'r') as f:
-            video_metadata = json.load(f)
+        video_metadata = read_metadata_json(video_metadata_file)
         
         video_path = video_metadata.get('localPath')
         if not os.path.exists(video_path):
@@ -2471,7 +2932,8 @@ def extract_video_clip():
             clip_path
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        with observe_stage('clip_extract', {'process.command': cmd[0]}):
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
         
         if os.path.exists(clip_path):
             # Create a URL for the clip
@@ -2523,20 +2985,19 @@ def render_story():
         
         # Get video metadata
         video_metadata_file = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
-        print(f"Current working directory: {os.getcwd()}")
-        print(f"Looking for video metadata at: {video_metadata_file}")
-        print(f"Absolute path: {os.path.abspath(video_metadata_file)}")
+        logger.debug("Current working directory: %s", os.getcwd())
+        logger.debug("Looking for video metadata at: %s", video_metadata_file)
+        logger.debug("Absolute path: %s", os.path.abspath(video_metadata_file))
         
         if not os.path.exists(video_metadata_file):
-            print(f"Video metadata file not found: {video_metadata_file}")
+            logger.error("Video metadata file not found: %s", video_metadata_file)
             return jsonify({'error': 'Video not found'}), 404
         
         try:
-            with open(video_metadata_file, 'r') as f:
-                video_metadata = json.load(f)
+            video_metadata = read_metadata_json(video_metadata_file)
             
             video_path = video_metadata.get('localPath')
-            print(f"Video path from metadata: {video_path}")
+            logger.debug("Video path from metadata: %s", video_path)
             
             # Normalize the path to handle Windows backslashes
             if video_path:
@@ -2547,13 +3008,13 @@ def render_story():
                 # Ensure the path uses the correct separator for the current OS
                 video_path = os.path.normpath(video_path)
             
-            print(f"Normalized video path: {video_path}")
+            logger.debug("Normalized video path: %s", video_path)
             
             if not video_path or not os.path.exists(video_path):
-                print(f"Video file not found at path: {video_path}")
+                logger.error("Video file not found at path: %s", video_path)
                 return jsonify({'error': 'Video file not found'}), 404
         except Exception as e:
-            print(f"Error reading video metadata: {str(e)}")
+            logger.error("Error reading video metadata: %s", str(e))
             return jsonify({'error': 'Error reading video metadata'}), 500
         
         # Create renders directory
@@ -2565,16 +3026,17 @@ def render_story():
         output_filename = f"story_{render_id}.mp4"
         output_path = os.path.join(renders_dir, output_filename)
         
-        print(f"Starting video render for video: {video_id}")
-        print(f"Scenes to render: {len(scenes)}")
+        logger.info("Starting video render for video: %s", video_id)
+        logger.debug("Scenes to render: %s", len(scenes))
         
         # Render the video
-        success = render_video_with_scenes(
-            video_path, 
-            scenes, 
-            output_path, 
-            transition_duration
-        )
+        with memory_governor.job('render'):
+            success = render_video_with_scenes(
+                video_path, 
+                scenes, 
+                output_path, 
+                transition_duration
+            )
         
         if success:
                 # Create URL for the rendered video
@@ -2594,10 +3056,9 @@ def render_story():
                 }
                 
                 render_metadata_file = os.path.join(renders_dir, f"{render_id}_metadata.json")
-                with open(render_metadata_file, 'w') as f:
-                    json.dump(render_metadata, f, indent=2)
+                write_metadata_json(render_metadata_file, render_metadata)
                 
-                print(f"Video render completed: {output_path}")
+                logger.info("Video render completed: %s", output_path)
                 
                 return jsonify({
                     'success': True,
@@ -2608,10 +3069,10 @@ def render_story():
         else:
             return jsonify({'error': 'Video rendering failed'}), 500
         
+    except MemoryBudgetExceeded:
+        raise
     except Exception as e:
-        import traceback
-        print(f"Render story error: {str(e)}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Render story error: %s", str(e))
         return jsonify({'error': f'Video rendering failed: {str(e)}'}), 500
 
 @app.route('/renders/<filename>')
@@ -2644,8 +3105,7 @@ def generate_story():
         if not os.path.exists(video_metadata_file):
             return jsonify({'error': 'Video not found'}), 404
         
-        with open(video_metadata_file, 'r') as f:
-            video_metadata = json.load(f)
+        video_metadata = read_metadata_json(video_metadata_file)
         
         # Get transcription and tags - check both nested and direct locations
         transcription_data = video_metadata.get('transcription', {})
@@ -2677,9 +3137,10 @@ def generate_story():
             return jsonify({'error': 'No transcription available for this video. Please transcribe the video first (Step 2).'}), 400
         
         # Generate story using Gemini AI
-        if gemini_client:
+        if text_client:
             story_data = generate_story_with_gemini(
-                transcript, word_timestamps, visual_tags, prompt, video_id, mode
+                transcript, word_timestamps, visual_tags, prompt, video_id, mode,
+                digest=get_content_digest(video_id, video_metadata_file, video_metadata)
             )
         else:
             # Fallback to mock data
@@ -2690,8 +3151,7 @@ def generate_story():
         video_metadata['storyPrompt'] = prompt
         video_metadata['storyGeneratedAt'] = datetime.now().isoformat()
         
-        with open(video_metadata_file, 'w') as f:
-            json.dump(video_metadata, f, indent=2)
+        write_metadata_json(video_metadata_file, video_metadata)
         
         print(f"Story generated for video: {video_id}")
         
@@ -2700,7 +3160,7 @@ def generate_story():
             'storyId': story_data['storyId'],
             'scenes': story_data['scenes'],
             'videoId': video_id,
-            'message': 'Story generated successfully' if gemini_client else 'Story generated using fallback mode (AI quota exceeded)'
+            'message': 'Story generated successfully' if text_client else 'Story generated using fallback mode (AI quota exceeded)'
         })
         
     except Exception as e:
@@ -2710,6 +3170,197 @@ def generate_story():
         return jsonify({'error': f'Story generation failed: {str(e)}'}), 500
 
 
+def _build_inspirational_story_prompt(prompt: str, mode: str):
+    """Gemini prompt and style guide for /generate_story (mode already validated)."""
+    system_instructions = (
+        "You are an expert AI story generator specializing in creating deeply personal, specific, and non-generic inspirational stories. "
+        "Take the user's specific prompt and transform it into a unique, detailed story of 250-350 words that directly addresses their situation. "
+        "IMPORTANT: Make the story SPECIFIC to their prompt - include concrete details, realistic scenarios, and authentic emotions related to their exact situation. "
+        "Avoid generic, template-like stories. Instead, create a narrative that feels personal and tailored to their specific challenge or goal. "
+        "Adjust the tone and style based on the selected story mode while maintaining authenticity and specificity. "
+        "Write vividly with concrete imagery, realistic dialogue, specific examples, and natural paragraphing. "
+        "Include specific details about their situation, realistic obstacles, and authentic solutions. "
+        "Avoid bullet points, lists, headings, emojis, or JSON. Return only the story text as plain paragraphs."
+    )
+
+    # Enhanced style guidance for more specific, non-generic content
+    mode_guides = {
+        'Hopeful': (
+            "Tone: warm, uplifting, compassionate but SPECIFIC. Use concrete details and realistic scenarios. "
+            "Include specific examples of progress, small wins, and realistic hope. "
+            "Preferred approach: Show how their specific situation can improve through realistic steps. "
+            "Avoid generic optimism - make hope feel earned and specific to their challenge."
+        ),
+        'Motivational': (
+            "Tone: energetic, determined, action-oriented with SPECIFIC strategies. "
+            "Include concrete action steps, specific goals, and realistic milestones. "
+            "Preferred approach: Provide specific, actionable advice for their exact situation. "
+            "Avoid generic motivation - give them specific tools and strategies for their challenge."
+        ),
+        'Funny': (
+            "Tone: lighthearted, witty, playful but SPECIFIC to their situation. "
+            "Include relatable humor about their specific challenge, realistic mishaps, and clever solutions. "
+            "Preferred approach: Find the humor in their specific situation while being supportive. "
+            "Avoid generic jokes - make humor specific to their exact experience."
+        ),
+        'Emotional': (
+            "Tone: tender, sincere, vulnerable with SPECIFIC emotional details. "
+            "Include authentic feelings, specific memories, and realistic emotional growth. "
+            "Preferred approach: Address the real emotional challenges of their specific situation. "
+            "Avoid generic emotions - make it feel deeply personal to their experience."
+        ),
+        'Reflective': (
+            "Tone: calm, thoughtful, insightful with SPECIFIC observations. "
+            "Include specific insights, realistic self-discovery, and practical wisdom. "
+            "Preferred approach: Provide specific insights about their particular situation. "
+            "Avoid generic reflection - offer specific understanding of their unique challenge."
+        ),
+    }
+    style_guide = mode_guides.get(mode, mode_guides['Hopeful'])
+
+    full_prompt = (
+        f"{system_instructions}\n\n"
+        f"STYLE GUIDE FOR {mode}: {style_guide}\n\n"
+        f"USER'S SPECIFIC SITUATION: {prompt}\n"
+        f"STORY MODE: {mode}\n\n"
+        f"Create a story that is SPECIFICALLY about their situation: '{prompt}'. "
+        f"Make it personal, detailed, and directly relevant to their exact challenge or goal. "
+        f"Use concrete examples, realistic scenarios, and authentic emotions related to their specific situation. "
+        f"Write a story that feels like it was written specifically for them and their unique circumstances."
+    )
+    return full_prompt, style_guide
+
+
+def _inspirational_refine_instructions(prompt: str, style_guide: str) -> str:
+    return (
+        f"Expand this story to 250-350 words while making it MORE SPECIFIC to '{prompt}'. "
+        f"Add concrete details, realistic scenarios, and authentic emotions related to their exact situation. "
+        f"Follow this style guide: {style_guide}. Make it feel personal and tailored to their specific challenge."
+    )
+
+
+def _normalize_story_mode(mode: str) -> str:
+    allowed_modes = {"Hopeful", "Motivational", "Funny", "Emotional", "Reflective"}
+    return mode if mode in allowed_modes else 'Hopeful'
+
+
+def _short_story_refine_prompt(story_text: str, instructions: str):
+    """Prompt asking Gemini to expand a story under 200 words, or None when it is long enough."""
+    if len(re.findall(r"\b\w+\b", story_text or '')) >= 200:
+        return None
+    return (
+        f"{instructions} "
+        f"Return only the expanded story as plain paragraphs.\n\nCURRENT STORY:\n{story_text}"
+    )
+
+
+def _refine_short_story(story_text: str, instructions: str) -> str:
+    """Ask Gemini to expand a story under 200 words; returns the input unchanged otherwise."""
+    try:
+        refine_prompt = _short_story_refine_prompt(story_text, instructions)
+        if refine_prompt and text_client:
+            refine_resp = text_client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=refine_prompt
+            )
+            refined = (refine_resp.text or '').strip()
+            if refined:
+                return refined
+    except Exception:
+        pass
+    return story_text
+
+
+def _strip_code_fences(text: str) -> str:
+    """Best-effort cleanup: strip code fences or accidental formatting"""
+    cleaned = (text or '').strip()
+    if cleaned.startswith('```'):
+        lines = [l for l in cleaned.split('\n') if not l.strip().startswith('```')]
+        cleaned = '\n'.join(lines).strip()
+    return cleaned
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _gemini_text_stream(prompt: str):
+    """Non-empty text chunks of a streamed Gemini generation"""
+    for chunk in text_client.models.generate_content_stream(
+        model="gemini-2.5-flash",
+        contents=prompt
+    ):
+        text = getattr(chunk, 'text', None)
+        if text:
+            yield text
+
+
+def _stream_story_events(full_prompt: str, fallback, finalize, extra=None, refine_instructions=None):
+    """
+    Server-Sent Events for a text generation: one `chunk` event per Gemini token batch,
+    then a `done` event with the final (cleaned) text and `extra` fields.
+    The concatenated stream is written to the LLM response cache by the client proxy,
+    so the matching non-streaming endpoint serves the same prompt from cache.
+    If Gemini is unavailable or fails, `fallback()` is sent as a single chunk; a
+    failure after partial output sends `reset` so the client discards what it has.
+    With `refine_instructions`, a story under 200 words is expanded by a second
+    streamed generation: `reset`, then its chunks replace the short story.
+    """
+    parts = []
+    if text_client:
+        try:
+            for text in _gemini_text_stream(full_prompt):
+                parts.append(text)
+                yield _sse_event('chunk', {'text': text})
+        except Exception as model_err:
+            logger.warning("Gemini streaming error: %s", model_err)
+            if parts:
+                yield _sse_event('reset', {'reason': 'generation interrupted'})
+            parts = []
+
+    if not parts:
+        fallback_text = fallback()
+        parts = [fallback_text]
+        yield _sse_event('chunk', {'text': fallback_text})
+
+    story_text = ''.join(parts).strip()
+    refine_prompt = _short_story_refine_prompt(story_text, refine_instructions) if refine_instructions else None
+    if refine_prompt and text_client:
+        refined, failed = [], False
+        try:
+            for text in _gemini_text_stream(refine_prompt):
+                if not refined:
+                    yield _sse_event('reset', {'reason': 'expanding short story'})
+                refined.append(text)
+                yield _sse_event('chunk', {'text': text})
+        except Exception as model_err:
+            logger.warning("Gemini story refinement error: %s", model_err)
+            failed = True
+        refined_text = '' if failed else ''.join(refined).strip()
+        if refined_text:
+            story_text = refined_text
+        elif refined:
+            # The client already dropped the short story for the failed expansion: send it again
+            yield _sse_event('reset', {'reason': 'refinement interrupted'})
+            yield _sse_event('chunk', {'text': story_text})
+
+    try:
+        story_text = finalize(story_text)
+    except Exception as e:
+        logger.warning("Story finalize error: %s", e)
+    payload = dict(extra or {})
+    payload['story'] = story_text
+    yield _sse_event('done', payload)
+
+
+def _sse_response(events):
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/generate_story', methods=['POST'])
 def generate_inspirational_story():
     """Generate an inspirational story from a user prompt and mode.
@@ -2720,77 +3371,18 @@ def generate_inspirational_story():
     try:
         data = request.get_json(silent=True) or {}
         prompt = (data.get('prompt') or '').strip()
-        mode = (data.get('mode') or 'Hopeful').strip()
+        mode = _normalize_story_mode((data.get('mode') or 'Hopeful').strip())
 
         if not prompt:
             return jsonify({'error': 'Prompt is required'}), 400
 
-        # Normalize and validate mode
-        allowed_modes = {"Hopeful", "Motivational", "Funny", "Emotional", "Reflective"}
-        if mode not in allowed_modes:
-            mode = 'Hopeful'
-
-        system_instructions = (
-            "You are an expert AI story generator specializing in creating deeply personal, specific, and non-generic inspirational stories. "
-            "Take the user's specific prompt and transform it into a unique, detailed story of 250-350 words that directly addresses their situation. "
-            "IMPORTANT: Make the story SPECIFIC to their prompt - include concrete details, realistic scenarios, and authentic emotions related to their exact situation. "
-            "Avoid generic, template-like stories. Instead, create a narrative that feels personal and tailored to their specific challenge or goal. "
-            "Adjust the tone and style based on the selected story mode while maintaining authenticity and specificity. "
-            "Write vividly with concrete imagery, realistic dialogue, specific examples, and natural paragraphing. "
-            "Include specific details about their situation, realistic obstacles, and authentic solutions. "
-            "Avoid bullet points, lists, headings, emojis, or JSON. Return only the story text as plain paragraphs."
-        )
-
-        # Enhanced style guidance for more specific, non-generic content
-        mode_guides = {
-            'Hopeful': (
-                "Tone: warm, uplifting, compassionate but SPECIFIC. Use concrete details and realistic scenarios. "
-                "Include specific examples of progress, small wins, and realistic hope. "
-                "Preferred approach: Show how their specific situation can improve through realistic steps. "
-                "Avoid generic optimism - make hope feel earned and specific to their challenge."
-            ),
-            'Motivational': (
-                "Tone: energetic, determined, action-oriented with SPECIFIC strategies. "
-                "Include concrete action steps, specific goals, and realistic milestones. "
-                "Preferred approach: Provide specific, actionable advice for their exact situation. "
-                "Avoid generic motivation - give them specific tools and strategies for their challenge."
-            ),
-            'Funny': (
-                "Tone: lighthearted, witty, playful but SPECIFIC to their situation. "
-                "Include relatable humor about their specific challenge, realistic mishaps, and clever solutions. "
-                "Preferred approach: Find the humor in their specific situation while being supportive. "
-                "Avoid generic jokes - make humor specific to their exact experience."
-            ),
-            'Emotional': (
-                "Tone: tender, sincere, vulnerable with SPECIFIC emotional details. "
-                "Include authentic feelings, specific memories, and realistic emotional growth. "
-                "Preferred approach: Address the real emotional challenges of their specific situation. "
-                "Avoid generic emotions - make it feel deeply personal to their experience."
-            ),
-            'Reflective': (
-                "Tone: calm, thoughtful, insightful with SPECIFIC observations. "
-                "Include specific insights, realistic self-discovery, and practical wisdom. "
-                "Preferred approach: Provide specific insights about their particular situation. "
-                "Avoid generic reflection - offer specific understanding of their unique challenge."
-            ),
-        }
-        style_guide = mode_guides.get(mode, mode_guides['Hopeful'])
+        full_prompt, style_guide = _build_inspirational_story_prompt(prompt, mode)
 
         # Use Gemini when available; otherwise fall back to enhanced local generator
         story_text = None
-        if gemini_client:
+        if text_client:
             try:
-                full_prompt = (
-                    f"{system_instructions}\n\n"
-                    f"STYLE GUIDE FOR {mode}: {style_guide}\n\n"
-                    f"USER'S SPECIFIC SITUATION: {prompt}\n"
-                    f"STORY MODE: {mode}\n\n"
-                    f"Create a story that is SPECIFICALLY about their situation: '{prompt}'. "
-                    f"Make it personal, detailed, and directly relevant to their exact challenge or goal. "
-                    f"Use concrete examples, realistic scenarios, and authentic emotions related to their specific situation. "
-                    f"Write a story that feels like it was written specifically for them and their unique circumstances."
-                )
-                response = gemini_client.models.generate_content(
+                response = text_client.models.generate_content(
                     model="gemini-2.5-flash",
                     contents=full_prompt
                 )
@@ -2803,35 +3395,8 @@ def generate_inspirational_story():
             story_text = _generate_enhanced_inspirational_story_fallback(prompt, mode)
 
         # Ensure target length; attempt refinement if too short
-        try:
-            import re as _re
-            word_count = len([w for w in _re.findall(r"\b\w+\b", story_text)])
-            if word_count < 200 and gemini_client:
-                refine_prompt = (
-                    f"Expand this story to 250-350 words while making it MORE SPECIFIC to '{prompt}'. "
-                    f"Add concrete details, realistic scenarios, and authentic emotions related to their exact situation. "
-                    f"Follow this style guide: {style_guide}. Make it feel personal and tailored to their specific challenge. "
-                    f"Return only the expanded story as plain paragraphs.\n\nCURRENT STORY:\n{story_text}"
-                )
-                refine_resp = gemini_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=refine_prompt
-                )
-                refined = (refine_resp.text or '').strip()
-                if refined:
-                    story_text = refined
-        except Exception as _:
-            pass
-
-        # Best-effort cleanup: strip code fences or accidental formatting
-        try:
-            cleaned = story_text.strip()
-            if cleaned.startswith('```'):
-                lines = [l for l in cleaned.split('\n') if not l.strip().startswith('```')]
-                cleaned = '\n'.join(lines).strip()
-            story_text = cleaned
-        except Exception:
-            pass
+        story_text = _refine_short_story(story_text, _inspirational_refine_instructions(prompt, style_guide))
+        story_text = _strip_code_fences(story_text)
 
         return jsonify({"story": story_text})
 
@@ -2840,12 +3405,35 @@ def generate_inspirational_story():
         print("Inspirational story generation error:\n" + traceback.format_exc())
         return jsonify({'error': f'Failed to generate story: {str(e)}'}), 500
 
+
+@app.route('/generate_story/stream', methods=['POST'])
+def generate_inspirational_story_stream():
+    """SSE variant of /generate_story: `chunk` events as Gemini writes, then `done` with { "story": "..." }."""
+    data = request.get_json(silent=True) or {}
+    prompt = (data.get('prompt') or '').strip()
+    mode = _normalize_story_mode((data.get('mode') or 'Hopeful').strip())
+
+    if not prompt:
+        return jsonify({'error': 'Prompt is required'}), 400
+
+    full_prompt, style_guide = _build_inspirational_story_prompt(prompt, mode)
+    refine_instructions = _inspirational_refine_instructions(prompt, style_guide)
+    return _sse_response(_stream_story_events(
+        full_prompt,
+        fallback=lambda: _generate_enhanced_inspirational_story_fallback(prompt, mode),
+        finalize=_strip_code_fences,
+        extra={'mode': mode},
+        refine_instructions=refine_instructions
+    ))
+
+
 def _generate_emotional_journey_fallback(transcript: str) -> str:
     """Local fallback to create an emotional journey with two contrasting paths.
 
     Produces a concise, readable narrative with a Positive Path and a Negative Path
     derived loosely from the provided transcript text.
     """
+    record_fallback('template_story')
     try:
         import textwrap
         excerpt = (transcript or '').strip()
@@ -2883,6 +3471,43 @@ def _generate_emotional_journey_fallback(transcript: str) -> str:
         )
 
 
+def _build_emotional_journey_prompt(transcript: str) -> str:
+    return (
+        "You are an AI storyteller. Create an emotional journey story from this transcript of a personal video.\n\n"
+        f"TRANSCRIPT:\n{condense_transcript(transcript, max_chars=4000)}\n\n"
+        "Guidelines:\n"
+        "- Present two contrasting storylines:\n"
+        "  1) The positive path (good choices, uplifting outcomes).\n"
+        "  2) The negative path (bad choices, challenges, regrets).\n"
+        "- Show how decisions shape the emotional arc.\n"
+        "- Use vivid, emotional language; keep it meaningful and easy to follow.\n"
+        "- Return ONLY plain text with NO markdown formatting (no **, ##, etc.)\n"
+        "- Use simple titles like 'The Bright Path' and 'The Shadowed Path'\n"
+        "- Write in a natural, conversational tone"
+    )
+
+
+def _clean_emotional_journey_text(story_text: str) -> str:
+    """Clean up markdown formatting and code fences"""
+    try:
+        cleaned = _strip_code_fences(story_text)
+
+        # Remove markdown headers (##, ###, etc.)
+        cleaned = re.sub(r'^#+\s*', '', cleaned, flags=re.MULTILINE)
+
+        # Remove bold formatting (**text**)
+        cleaned = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned)
+
+        # Remove italic formatting (*text*)
+        cleaned = re.sub(r'\*(.*?)\*', r'\1', cleaned)
+
+        # Clean up extra whitespace
+        cleaned = re.sub(r'\n\s*\n', '\n\n', cleaned)
+        return cleaned.strip()
+    except Exception:
+        return story_text
+
+
 @app.route('/generate_emotional_journey', methods=['POST'])
 def generate_emotional_journey():
     """Create an emotional journey story with positive and negative paths from a transcript."""
@@ -2893,27 +3518,15 @@ def generate_emotional_journey():
         if not transcript:
             return jsonify({"error": "Transcript is required"}), 400
 
-        prompt = (
-            "You are an AI storyteller. Create an emotional journey story from this transcript of a personal video.\n\n"
-            f"TRANSCRIPT:\n{transcript}\n\n"
-            "Guidelines:\n"
-            "- Present two contrasting storylines:\n"
-            "  1) The positive path (good choices, uplifting outcomes).\n"
-            "  2) The negative path (bad choices, challenges, regrets).\n"
-            "- Show how decisions shape the emotional arc.\n"
-            "- Use vivid, emotional language; keep it meaningful and easy to follow.\n"
-            "- Return ONLY plain text with NO markdown formatting (no **, ##, etc.)\n"
-            "- Use simple titles like 'The Bright Path' and 'The Shadowed Path'\n"
-            "- Write in a natural, conversational tone"
-        )
+        prompt = _build_emotional_journey_prompt(transcript)
 
         story_text = None
-        if gemini_client:
+        if text_client:
             try:
-                response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
-        )
+                response = text_client.models.generate_content(
+                    model="gemini-2.5-flash",
+                    contents=prompt
+                )
                 story_text = (getattr(response, 'text', '') or '').strip()
             except Exception as model_err:
                 print(f"Gemini emotional journey error: {str(model_err)}")
@@ -2921,31 +3534,7 @@ def generate_emotional_journey():
         else:
             story_text = _generate_emotional_journey_fallback(transcript)
 
-        # Clean up markdown formatting and code fences
-        try:
-            cleaned = story_text.strip()
-            
-            # Remove code fences
-            if cleaned.startswith('```'):
-                lines = [l for l in cleaned.split('\n') if not l.strip().startswith('```')]
-                cleaned = '\n'.join(lines).strip()
-            
-            # Remove markdown headers (##, ###, etc.)
-            cleaned = re.sub(r'^#+\s*', '', cleaned, flags=re.MULTILINE)
-            
-            # Remove bold formatting (**text**)
-            cleaned = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned)
-            
-            # Remove italic formatting (*text*)
-            cleaned = re.sub(r'\*(.*?)\*', r'\1', cleaned)
-            
-            # Clean up extra whitespace
-            cleaned = re.sub(r'\n\s*\n', '\n\n', cleaned)
-            cleaned = cleaned.strip()
-            
-            story_text = cleaned
-        except Exception:
-            pass
+        story_text = _clean_emotional_journey_text(story_text)
 
         return jsonify({"emotional_journey_story": story_text})
 
@@ -2954,12 +3543,30 @@ def generate_emotional_journey():
         print("Emotional journey generation error:\n" + traceback.format_exc())
         return jsonify({"error": f"Failed to generate emotional journey: {str(e)}"}), 500
 
-def generate_story_with_gemini(transcript, word_timestamps, visual_tags, prompt, video_id, mode):
+
+@app.route('/generate_emotional_journey/stream', methods=['POST'])
+def generate_emotional_journey_stream():
+    """SSE variant of /generate_emotional_journey; the `done` event carries { "story": "..." }."""
+    data = request.get_json(silent=True) or {}
+    transcript = (data.get("transcript") or "").strip()
+
+    if not transcript:
+        return jsonify({"error": "Transcript is required"}), 400
+
+    return _sse_response(_stream_story_events(
+        _build_emotional_journey_prompt(transcript),
+        fallback=lambda: _generate_emotional_journey_fallback(transcript),
+        finalize=_clean_emotional_journey_text
+    ))
+
+def generate_story_with_gemini(transcript, word_timestamps, visual_tags, prompt, video_id, mode, digest=None):
     """Generate story using Gemini AI with enhanced prompts and error handling"""
     try:
         # Calculate video duration for better scene planning
         duration = 60  # Default
-        if word_timestamps and isinstance(word_timestamps, list) and len(word_timestamps) > 0:
+        if digest and digest.get('duration'):
+            duration = digest['duration']
+        elif word_timestamps and isinstance(word_timestamps, list) and len(word_timestamps) > 0:
             valid_timestamps = [ts for ts in word_timestamps if ts and isinstance(ts, dict) and 'end_time' in ts]
             if valid_timestamps:
                 duration = max(ts['end_time'] for ts in valid_timestamps)
@@ -2976,21 +3583,31 @@ def generate_story_with_gemini(transcript, word_timestamps, visual_tags, prompt,
         
         # Extract visual tag names for better context
         visual_tag_names = []
-        if visual_tags and isinstance(visual_tags, list):
+        if digest is not None:
+            visual_tag_names = list(digest.get('visual_tag_names', []))
+        elif visual_tags and isinstance(visual_tags, list):
             for tag in visual_tags:
                 if isinstance(tag, dict) and 'tag' in tag:
                     visual_tag_names.append(tag['tag'])
                 elif isinstance(tag, str):
                     visual_tag_names.append(tag)
         
+        visual_tag_names = compact_tag_names(visual_tag_names)
         visual_elements_text = ', '.join(visual_tag_names) if visual_tag_names else 'No specific visual elements detected'
+
+        # Where visual elements appear, so scenes can be placed on matching footage
+        timeline = sorted(get_tag_timeline(video_id), key=lambda x: x['score'], reverse=True)[:15]
+        visual_timeline_text = '; '.join(
+            f"{iv['tag']} {iv['start']:.1f}-{iv['end']:.1f}s" for iv in sorted(timeline, key=lambda x: x['start'])
+        ) or 'Not available'
         
         context = f"""
         You are a professional video storyteller creating engaging video stories with FOCUSED CLIPS. Analyze the following video content and create a compelling narrative with SHORT, RELEVANT scenes.
 
         VIDEO CONTENT:
-        - Transcript: "{transcript[:800]}{'...' if len(transcript) > 800 else ''}"
+        - Transcript (condensed, [start-end] anchors in seconds): "{condense_transcript(transcript, word_timestamps)}"
         - Visual Elements: {visual_elements_text}
+        - Visual Timeline: {visual_timeline_text}
         - Video Duration: {duration} seconds
         - Word Count: {len(word_timestamps) if word_timestamps else 0} words with timing data
         
@@ -3021,7 +3638,7 @@ def generate_story_with_gemini(transcript, word_timestamps, visual_tags, prompt,
         
         RESPONSE FORMAT: Return ONLY a valid JSON object with this exact structure:
         {{
-            "storyId": "story_{video_id}_{int(datetime.now().timestamp())}",
+            "storyId": "story_{video_id}",
             "scenes": [
                 {{
                     "start": 5.0,
@@ -3043,43 +3660,18 @@ def generate_story_with_gemini(transcript, word_timestamps, visual_tags, prompt,
         """
         
         print(f"DEBUG: Sending request to Gemini with context length: {len(context)}")
-        response = gemini_client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=context
-        )
-        story_json = response.text.strip()
-        
-        print(f"DEBUG: Gemini response received: {story_json[:200]}...")
-        
-        # Enhanced JSON parsing with better error handling
-        import re
-        json_match = re.search(r'\{.*\}', story_json, re.DOTALL)
-        if json_match:
-            story_data = json.loads(json_match.group())
-            
-            # Validate the response structure
-            if 'storyId' not in story_data or 'scenes' not in story_data:
-                raise Exception("Invalid story structure from Gemini")
-            
-            if not isinstance(story_data['scenes'], list) or len(story_data['scenes']) == 0:
-                raise Exception("No scenes generated by Gemini")
-            
-            # Validate each scene
-            for i, scene in enumerate(story_data['scenes']):
-                if not all(key in scene for key in ['start', 'end', 'caption', 'narration']):
-                    raise Exception(f"Invalid scene structure at index {i}")
-                
-                # Ensure timestamps are valid
-                if not isinstance(scene['start'], (int, float)) or not isinstance(scene['end'], (int, float)):
-                    raise Exception(f"Invalid timestamps in scene {i}")
-                
-                if scene['start'] >= scene['end']:
-                    raise Exception(f"Invalid timestamp order in scene {i}")
-            
-            print(f"DEBUG: Successfully parsed Gemini response with {len(story_data['scenes'])} scenes")
-            return story_data
-        else:
-            raise Exception("No valid JSON found in Gemini response")
+        # JSON mode with schema validation; raises StructuredOutputError if still invalid after one repair
+        story_data = generate_json(text_client, "gemini-2.5-flash", context, STORY_SCHEMA)
+
+        # Schema covers shape and types; scene ordering is checked here
+        for i, scene in enumerate(story_data['scenes']):
+            if scene['start'] >= scene['end']:
+                raise Exception(f"Invalid timestamp order in scene {i}")
+
+        # Fresh id per generation; kept out of the prompt so identical requests hit the response cache
+        story_data['storyId'] = f"story_{video_id}_{int(datetime.now().timestamp())}"
+        print(f"DEBUG: Successfully parsed Gemini response with {len(story_data['scenes'])} scenes")
+        return story_data
         
     except Exception as e:
         print(f"Gemini story generation error: {str(e)}")
@@ -3088,196 +3680,14 @@ def generate_story_with_gemini(transcript, word_timestamps, visual_tags, prompt,
         return generate_mock_story(transcript, word_timestamps, visual_tags, prompt, video_id, mode)
 
 def generate_mock_story(transcript, word_timestamps, visual_tags, prompt, video_id, mode):
-    """Generate TRULY DYNAMIC story based on actual video content with focused clips"""
-    
+    """Generate a focused-clip story from the video's duration, transcript themes and mode without Gemini"""
+    record_fallback('mock_story')
     print(f"DEBUG: Mock story generation - mode: '{mode}', prompt: '{prompt}'")
     print(f"DEBUG: Using fallback mock story generator (Gemini quota exceeded)")
-    
-    import random
-    import re
-    
-    # Calculate video duration from timestamps
-    duration = 60  # Default duration
-    
-    try:
-        if word_timestamps and isinstance(word_timestamps, list) and len(word_timestamps) > 0:
-            # Filter out invalid timestamps
-            valid_timestamps = [ts for ts in word_timestamps if ts and isinstance(ts, dict) and 'end_time' in ts]
-            if valid_timestamps:
-                duration = max(ts['end_time'] for ts in valid_timestamps)
-    except Exception as e:
-        print(f"Error calculating duration: {str(e)}")
-        duration = 60
-
-    # Generate single storyline
-    story_id = str(uuid.uuid4())
-        
-    # Analyze transcript for better context
-    transcript_lower = transcript.lower() if transcript else ""
-    
-    # Extract actual content themes from the video
-    content_themes = []
-    if any(word in transcript_lower for word in ['cup', 'cups', 'ice', 'snow', 'cone', 'cones']):
-        content_themes.append('snow_cones')
-    if any(word in transcript_lower for word in ['kitchen', 'cook', 'cooking', 'recipe']):
-        content_themes.append('cooking')
-    if any(word in transcript_lower for word in ['party', 'celebrate', 'birthday']):
-        content_themes.append('celebration')
-    if any(word in transcript_lower for word in ['family', 'mom', 'dad', 'kids']):
-        content_themes.append('family')
-    if any(word in transcript_lower for word in ['friend', 'friends', 'together']):
-        content_themes.append('friends')
-    
-    print(f"DEBUG: Content themes detected: {content_themes}")
-    
-    # Create focused scenes with shorter durations (3-8 seconds each)
-    scenes = []
-        
-    # Determine scene count and duration based on video length
-    if duration <= 30:
-        scene_count = 2
-        scene_duration = 5  # 5 seconds per scene
-    elif duration <= 60:
-        scene_count = 3
-        scene_duration = 6  # 6 seconds per scene
-    elif duration <= 120:
-        scene_count = 4
-        scene_duration = 7  # 7 seconds per scene
-    else:
-        scene_count = 5
-        scene_duration = 8  # 8 seconds per scene
-    
-    # Generate mode-specific and content-specific content based on user's prompt
-    prompt_lower = prompt.lower() if prompt else ""
-    
-    # Create content based on user's specific prompt and transcript themes
-    if mode.lower() == "positive":
-        if 'snow_cones' in content_themes:
-            captions = [
-                f"🍦 Wonderful {prompt.title()} Adventure",
-                f"❄️ Magical {prompt.title()} Moments", 
-                f"🎉 Joyful {prompt.title()} Experience",
-                f"🌟 Perfect {prompt.title()} Delight"
-            ]
-            narrations = [
-                f"Our wonderful {prompt} adventure begins with pure excitement and joy.",
-                f"The magical {prompt} moments unfold with amazing energy and happiness.",
-                f"Joyful {prompt} experience brings incredible satisfaction and delight.",
-                f"Perfect {prompt} delight concludes with fantastic memories and bliss."
-            ]
-        else:
-            captions = [
-                f"🌟 Wonderful {prompt.title()} Begins",
-                f"✨ Magical {prompt.title()} Unfolds", 
-                f"🎉 Joyful {prompt.title()} Continues",
-                f"💫 Perfect {prompt.title()} Emerges"
-            ]
-            narrations = [
-                f"Our wonderful {prompt} begins with pure excitement and joy.",
-                f"Magical {prompt} unfolds with amazing energy and happiness.",
-                f"Joyful {prompt} continues with incredible satisfaction and delight.",
-                f"Perfect {prompt} emerges with fantastic memories and bliss."
-            ]
-    elif mode.lower() == "negative":
-        if 'snow_cones' in content_themes:
-            captions = [
-                f"🍦 Intense {prompt.title()} Challenge",
-                f"❄️ Dramatic {prompt.title()} Struggle", 
-                f"🎯 Powerful {prompt.title()} Conflict",
-                f"🌟 Compelling {prompt.title()} Drama"
-            ]
-            narrations = [
-                f"Our intense {prompt} challenge begins with dramatic tension and conflict.",
-                f"The dramatic {prompt} struggle unfolds with powerful determination and resilience.",
-                f"Powerful {prompt} conflict brings emotional intensity and transformation.",
-                f"Compelling {prompt} drama concludes with striking impact and growth."
-            ]
-        else:
-            captions = [
-                f"🌟 Intense {prompt.title()} Challenge",
-                f"✨ Dramatic {prompt.title()} Struggle", 
-                f"🎯 Powerful {prompt.title()} Conflict",
-                f"💫 Compelling {prompt.title()} Drama"
-            ]
-            narrations = [
-                f"Our intense {prompt} challenge begins with dramatic tension and conflict.",
-                f"Dramatic {prompt} struggle unfolds with powerful determination and resilience.",
-                f"Powerful {prompt} conflict continues with emotional intensity and transformation.",
-                f"Compelling {prompt} drama emerges with striking impact and growth."
-            ]
-    else:  # normal mode
-        if 'snow_cones' in content_themes:
-            captions = [
-                f"🍦 Dynamic {prompt.title()} Journey",
-                f"❄️ Engaging {prompt.title()} Experience", 
-                f"🎯 Captivating {prompt.title()} Story",
-                f"🌟 Memorable {prompt.title()} Adventure"
-            ]
-            narrations = [
-                f"Our dynamic {prompt} journey begins with engaging energy and focus.",
-                f"The engaging {prompt} experience unfolds with captivating precision and drive.",
-                f"Captivating {prompt} story brings memorable presentation and spirit.",
-                f"Memorable {prompt} adventure concludes with impressive satisfaction and vitality."
-            ]
-        else:
-            captions = [
-                f"🌟 Dynamic {prompt.title()} Journey",
-                f"✨ Engaging {prompt.title()} Experience", 
-                f"🎯 Captivating {prompt.title()} Story",
-                f"💫 Memorable {prompt.title()} Adventure"
-            ]
-            narrations = [
-                f"Our dynamic {prompt} journey begins with engaging energy and focus.",
-                f"Engaging {prompt} experience unfolds with captivating precision and drive.",
-                f"Captivating {prompt} story continues with memorable presentation and spirit.",
-                f"Memorable {prompt} adventure emerges with impressive satisfaction and vitality."
-            ]
-            
-    # Create focused scenes with gaps between them (not covering entire video)
-    for i in range(scene_count):
-        # Calculate start time with gaps to avoid covering entire video
-        # Start at 10% of video, then add gaps between scenes
-        base_start = duration * 0.1  # Start at 10% of video
-        gap_between_scenes = (duration * 0.6) / (scene_count + 1)  # Use 60% of video for gaps
-        
-        start_time = base_start + (i * gap_between_scenes)
-        end_time = start_time + scene_duration
-        
-        # Ensure we don't exceed video duration
-        if end_time > duration:
-            end_time = duration
-            start_time = max(0, end_time - scene_duration)
-        
-        # Get caption and narration with random variations
-        caption = captions[i % len(captions)]
-        narration = narrations[i % len(narrations)]
-        
-        # Add significant randomness to make each generation unique
-        if random.random() < 0.5:
-            caption = caption.replace("Begins", random.choice(["Starts", "Unfolds", "Emerges", "Takes Off", "Launches", "Commences"]))
-        if random.random() < 0.5:
-            caption = caption.replace("Unfolds", random.choice(["Develops", "Progresses", "Advances", "Evolves", "Grows", "Expands"]))
-        if random.random() < 0.5:
-            caption = caption.replace("Continues", random.choice(["Persists", "Endures", "Sustains", "Maintains", "Keeps Going", "Proceeds"]))
-        if random.random() < 0.5:
-            caption = caption.replace("Emerges", random.choice(["Appears", "Surfaces", "Rises", "Manifests", "Comes Forth", "Shows Up"]))
-        if random.random() < 0.5:
-            caption = caption.replace("Wonderful", random.choice(["Amazing", "Incredible", "Fantastic", "Brilliant", "Spectacular", "Marvelous"]))
-        if random.random() < 0.5:
-            caption = caption.replace("Magical", random.choice(["Enchanting", "Mystical", "Spellbinding", "Fascinating", "Captivating", "Mesmerizing"]))
-        if random.random() < 0.5:
-            caption = caption.replace("Perfect", random.choice(["Ideal", "Flawless", "Excellent", "Superb", "Outstanding", "Exceptional"]))
-
-        scenes.append({
-            "start": round(start_time, 2),
-            "end": round(end_time, 2),
-            "caption": caption,
-            "narration": narration
-        })
 
     return {
-        "storyId": story_id,
-        "scenes": scenes
+        "storyId": str(uuid.uuid4()),
+        "scenes": mock_story_scenes(transcript, word_timestamps, prompt, mode)
     }
 
 def generate_contextual_content(transcript_lower, prompt, scene_index, total_scenes, mode, visual_tags):
@@ -3796,8 +4206,7 @@ def search_video():
         if not os.path.exists(video_metadata_file):
             return jsonify({'error': 'Video not found'}), 404
         
-        with open(video_metadata_file, 'r') as f:
-            video_metadata = json.load(f)
+        video_metadata = read_metadata_json(video_metadata_file)
         
         # Get transcription and tags - check both nested and direct locations
         transcription_data = video_metadata.get('transcription', {})
@@ -3811,28 +4220,16 @@ def search_video():
                 db_metadata = get_video_metadata(video_id)
                 if db_metadata and db_metadata.get('transcript'):
                     transcript = db_metadata['transcript']
-                    print(f"DEBUG: Found transcript in database: {len(transcript)} characters")
+                    logger.debug("Found transcript in database: %d characters", len(transcript), video_id=video_id)
                 if db_metadata and db_metadata.get('word_timestamps') and not word_timestamps:
                     word_timestamps = db_metadata['word_timestamps']
-                    print(f"DEBUG: Found word_timestamps in database: {len(word_timestamps)} timestamps")
+                    logger.debug("Found word_timestamps in database: %d timestamps", len(word_timestamps), video_id=video_id)
             except Exception as e:
-                print(f"DEBUG: Could not get transcript from database: {str(e)}")
+                logger.debug("Could not get transcript from database: %s", e, video_id=video_id)
         
-        print(f"DEBUG: Search - transcript length: {len(transcript) if transcript else 0}, word_timestamps: {len(word_timestamps) if word_timestamps else 0}")
-        print(f"DEBUG: Search - transcription_data keys: {list(transcription_data.keys()) if transcription_data else 'None'}")
-        print(f"DEBUG: Search - video_metadata keys: {list(video_metadata.keys())}")
-        
-        # Debug word_timestamps structure
-        if word_timestamps:
-            print(f"DEBUG: word_timestamps type: {type(word_timestamps)}")
-            print(f"DEBUG: word_timestamps length: {len(word_timestamps)}")
-            if len(word_timestamps) > 0:
-                print(f"DEBUG: First word_timestamp entry: {word_timestamps[0]}")
-                print(f"DEBUG: First entry type: {type(word_timestamps[0])}")
-                if isinstance(word_timestamps[0], dict):
-                    print(f"DEBUG: First entry keys: {list(word_timestamps[0].keys())}")
-        else:
-            print(f"DEBUG: word_timestamps is None or empty")
+        logger.debug("Search input: transcript %d chars, %d word timestamps (first: %r)",
+                     len(transcript) if transcript else 0, len(word_timestamps) if word_timestamps else 0,
+                     word_timestamps[0] if word_timestamps else None, video_id=video_id)
         
         search_results = []
         
@@ -3845,42 +4242,46 @@ def search_video():
                     if isinstance(ts, dict) and 'word' in ts and 'start_time' in ts and 'end_time' in ts:
                         valid_timestamps.append(ts)
                     else:
-                        print(f"DEBUG: Skipping invalid timestamp entry: {ts}")
+                        logger.debug_sampled('search.invalid_timestamp', "Skipping invalid timestamp entry: %r", ts)
                 
-                print(f"DEBUG: Valid timestamps: {len(valid_timestamps)} out of {len(word_timestamps)}")
+                logger.debug("Valid timestamps: %d out of %d", len(valid_timestamps), len(word_timestamps))
                 
                 if valid_timestamps:
-                    print(f"DEBUG: Using exact timestamp search with {len(valid_timestamps)} timestamps")
                     transcript_results = search_transcript_with_timestamps(transcript, valid_timestamps, query, video_id)
                     search_results.extend(transcript_results)
                 else:
-                    print(f"DEBUG: No valid timestamps, falling back to text search")
+                    logger.debug("No valid timestamps, falling back to text search")
                     transcript_results = search_transcript(transcript, query, video_id)
                     search_results.extend(transcript_results)
             else:
-                print(f"DEBUG: word_timestamps is not a list, falling back to text search")
+                logger.debug("word_timestamps is not a list, falling back to text search")
                 transcript_results = search_transcript(transcript, query, video_id)
                 search_results.extend(transcript_results)
         elif transcript:
             # Fallback to old method if no timestamps available
-            print(f"DEBUG: Using fallback search (no timestamps available)")
+            logger.debug("Using fallback search (no timestamps available)")
             transcript_results = search_transcript(transcript, query, video_id)
             search_results.extend(transcript_results)
         
-        # Search in tags
-        if visual_tags:
+        # Search in tags: prefer the tag timeline (real on-screen ranges), fall back
+        # to the single best timestamp stored with each aggregated tag
+        tag_results = search_tag_timeline(query, video_id)
+        if not tag_results and visual_tags:
             tag_results = search_tags(visual_tags, query, video_id)
-            search_results.extend(tag_results)
+        search_results.extend(tag_results)
+
+        # Semantic frame search over stored local embeddings ("show me the beach")
+        search_results.extend(search_frames_semantic(query, video_id))
         
         # Sort results by score (highest first)
         search_results.sort(key=lambda x: x['score'], reverse=True)
         
-        print(f"DEBUG: Search returned {len(search_results)} results")
-        for i, result in enumerate(search_results[:3]):  # Show first 3 results
-            print(f"DEBUG: Result {i+1}: {result.get('type')} at {result.get('start_time')}-{result.get('end_time')}s, match_type: {result.get('match_type')}")
-            print(f"DEBUG: Result {i+1} preview: {result.get('preview_text', '')[:50]}...")
-        
-        print(f"DEBUG: Final response - success: True, totalResults: {len(search_results)}")
+        if logger.debug_enabled:
+            for i, result in enumerate(search_results[:3]):  # Show first 3 results
+                logger.debug("Result %d: %s at %s-%ss, match_type: %s, preview: %s...", i + 1, result.get('type'),
+                             result.get('start_time'), result.get('end_time'), result.get('match_type'),
+                             result.get('preview_text', '')[:50])
+        logger.info("Search returned %d results", len(search_results), video_id=video_id)
         return jsonify({
             'success': True,
             'query': query,
@@ -3890,9 +4291,7 @@ def search_video():
         })
         
     except Exception as e:
-        import traceback
-        print("Search error:")
-        traceback.print_exc()
+        logger.exception("Search error")
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
 
 @app.route('/global-search', methods=['POST'])
@@ -3925,7 +4324,9 @@ def global_search():
                 'relevance_score': video['relevance_score'],
                 'transcript_preview': video['transcript'][:200] + '...' if video['transcript'] and len(video['transcript']) > 200 else video['transcript'],
                 'visual_tags': video['visual_tags'][:5] if video['visual_tags'] else [],  # Limit to 5 tags
-                'story_count': len(video['story_ids']) if video['story_ids'] and isinstance(video['story_ids'], list) else 0
+                'story_count': len(video['story_ids']) if video['story_ids'] and isinstance(video['story_ids'], list) else 0,
+                'thumbnailUrl': preview_url(video.get('thumbnail_path')),
+                'thumbnailsVttUrl': preview_url(video.get('preview_path'))
             })
         
         print(f"Global search found {len(formatted_results)} videos")
@@ -3949,12 +4350,8 @@ def get_videos():
     try:
         user_id = request.args.get('userId')  # Optional: filter by user
         
-        print(f"DEBUG: Requested videos for user: {user_id}")
         videos = get_all_videos(user_id)
-        print(f"DEBUG: Found {len(videos)} videos in database")
-        
-        for video in videos:
-            print(f"DEBUG: Video ID: {video.get('videoId')}, Filename: {video.get('filename')}, User: {video.get('userEmail')}")
+        logger.debug("Found %d videos in database", len(videos), user_id=user_id)
         
         # Format results for frontend
         formatted_videos = []
@@ -3969,7 +4366,9 @@ def get_videos():
                 'status': video['status'],
                 'transcript_preview': video['transcript'][:200] + '...' if video['transcript'] and len(video['transcript']) > 200 else video['transcript'],
                 'visual_tags': video['visual_tags'][:5] if video['visual_tags'] else [],
-                'story_count': len(video['story_ids']) if video['story_ids'] else 0
+                'story_count': len(video['story_ids']) if video['story_ids'] else 0,
+                'thumbnailUrl': preview_url(video.get('thumbnail_path')),
+                'thumbnailsVttUrl': preview_url(video.get('preview_path'))
             })
         
         return jsonify({
@@ -3979,53 +4378,33 @@ def get_videos():
         })
         
     except Exception as e:
-        import traceback
-        print("Get videos error:")
-        traceback.print_exc()
+        logger.exception("Get videos error")
         return jsonify({'error': f'Failed to get videos: {str(e)}'}), 500
 
 def get_video_duration(video_path):
     """Get video duration using FFmpeg"""
+    # Cached ffprobe probe first; the direct ffprobe call below is the fallback
+    duration = get_video_info(video_path).get('duration')
+    if duration:
+        return duration
     try:
-        # DEBUG: Check PATH and FFmpeg availability
-        import os
-        print(f"DEBUG: Current PATH: {os.environ.get('PATH', 'PATH_NOT_SET')}")
-        print(f"DEBUG: Looking for ffprobe in PATH...")
-        
-        # Check if ffprobe exists
-        import shutil
-        ffprobe_path = shutil.which('ffprobe')
-        print(f"DEBUG: ffprobe found at: {ffprobe_path}")
-        
+        ffprobe_path = find_ffprobe()
         if not ffprobe_path:
-            print("DEBUG: ffprobe not found in PATH, trying direct path...")
-            # Try direct path
-            direct_path = "C:\\ffmpeg\\bin\\ffprobe.exe"
-            if os.path.exists(direct_path):
-                print(f"DEBUG: Using direct path: {direct_path}")
-                cmd = [
-                    direct_path, '-v', 'quiet', '-show_entries', 'format=duration',
-                    '-of', 'csv=p=0', video_path
-                ]
-            else:
-                print(f"DEBUG: Direct path {direct_path} does not exist")
-                return None
-        else:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
-                '-of', 'csv=p=0', video_path
-            ]
+            logger.debug("ffprobe not available")
+            return None
+        cmd = [
+            ffprobe_path, '-v', 'quiet', '-show_entries', 'format=duration',
+            '-of', 'csv=p=0', video_path
+        ]
         
-        print(f"DEBUG: Running command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        logger.debug("Running command: %s", Lazy(' '.join, cmd))
+        with observe_stage('ffprobe', {'process.command': cmd[0]}):
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
         duration = float(result.stdout.strip())
-        print(f"DEBUG: Successfully extracted duration: {duration}")
+        logger.debug("Successfully extracted duration: %s", duration)
         return duration
     except Exception as e:
-        print(f"Error getting video duration: {str(e)}")
-        print(f"DEBUG: Full error details: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error getting video duration: %s: %s", type(e).__name__, str(e))
         return None
 
 def search_transcript_with_timestamps(transcript, word_timestamps, query, video_id):
@@ -4039,14 +4418,13 @@ def search_transcript_with_timestamps(transcript, word_timestamps, query, video_
     video_duration = None
     if os.path.exists(video_metadata_file):
         try:
-            with open(video_metadata_file, 'r') as f:
-                video_metadata = json.load(f)
+            video_metadata = read_metadata_json(video_metadata_file)
             video_path = video_metadata.get('localPath')
             if video_path and os.path.exists(video_path):
                 video_duration = get_video_duration(video_path)
-                print(f"DEBUG: Video duration: {video_duration} seconds")
+                logger.debug("Video duration: %s seconds", video_duration)
         except Exception as e:
-            print(f"DEBUG: Could not get video duration: {str(e)}")
+            logger.debug("Could not get video duration: %s", e)
     
     # Use video duration for validation, or fallback to 1 hour
     max_duration = video_duration if video_duration else 3600
@@ -4054,18 +4432,9 @@ def search_transcript_with_timestamps(transcript, word_timestamps, query, video_
     # Validate timestamps - filter out any that seem unreasonable
     valid_word_timestamps = []
     for word_info in word_timestamps:
-        # Debug: Check the structure of word_info
-        print(f"DEBUG: Processing word_info: {word_info}")
-        print(f"DEBUG: word_info type: {type(word_info)}")
-        print(f"DEBUG: word_info keys: {list(word_info.keys()) if isinstance(word_info, dict) else 'Not a dict'}")
-        
         # Check if word_info has the required structure
-        if not isinstance(word_info, dict):
-            print(f"DEBUG: Skipping non-dict word_info: {word_info}")
-            continue
-            
-        if 'word' not in word_info:
-            print(f"DEBUG: Skipping word_info without 'word' key: {word_info}")
+        if not isinstance(word_info, dict) or 'word' not in word_info:
+            logger.debug_sampled('search.malformed_word', "Skipping malformed word_info: %r", word_info)
             continue
             
         start_time = word_info.get('start_time', 0)
@@ -4078,12 +4447,13 @@ def search_transcript_with_timestamps(transcript, word_timestamps, query, video_
             start_time < max_duration):
             valid_word_timestamps.append(word_info)
         else:
-            print(f"DEBUG: Skipping invalid timestamp: {word_info} (max_duration: {max_duration})")
+            logger.debug_sampled('search.out_of_range', "Skipping invalid timestamp: %r (max_duration: %s)",
+                                 word_info, max_duration)
     
-    print(f"DEBUG: Valid timestamps: {len(valid_word_timestamps)} out of {len(word_timestamps)}")
+    logger.debug("Timestamps within duration: %d out of %d", len(valid_word_timestamps), len(word_timestamps))
     
     if not valid_word_timestamps:
-        print(f"DEBUG: No valid timestamps found, falling back to text search")
+        logger.debug("No valid timestamps found, falling back to text search")
         return search_transcript(transcript, query, video_id)
     
     # Find all words that match any part of the query
@@ -4095,12 +4465,8 @@ def search_transcript_with_timestamps(transcript, word_timestamps, query, video_
                 if query_word in word_lower:
                     matching_word_indices.append(i)
                     break
-        except KeyError as e:
-            print(f"DEBUG: KeyError accessing word_info[{i}]: {e}")
-            print(f"DEBUG: word_info[{i}] content: {word_info}")
-            continue
         except Exception as e:
-            print(f"DEBUG: Error processing word_info[{i}]: {e}")
+            logger.debug_sampled('search.word_error', "Error processing word_info[%d] %r: %s", i, word_info, e)
             continue
     
     if not matching_word_indices:
@@ -4301,61 +4667,115 @@ def search_tags(tags, query, video_id):
     
     return results
 
-def render_video_with_scenes(video_path, scenes, output_path, transition_duration=0.5):
+def search_tag_timeline(query, video_id):
+    """Search the stored tag timeline; each matching interval becomes one result"""
+    results = []
+
+    query_words = query.split()
+    if not query_words:
+        return results
+
+    intervals = {}
+    for word in query_words:
+        for interval in get_tag_timeline(video_id, tag=word):
+            intervals[(interval['tag'].lower(), interval['start'])] = interval
+
+    for interval in intervals.values():
+        tag_text = interval['tag'].lower()
+        matches = sum(1 for word in query_words if word in tag_text)
+
+        results.append({
+            'type': 'tag',
+            'start_time': interval['start'],
+            'end_time': interval['end'],
+            'score': (matches / len(query_words)) * 0.9,
+            'preview_text': f"Tag: {interval['tag']}",
+            'full_text': f"Visual tag '{interval['tag']}' visible from {interval['start']:.1f}s to {interval['end']:.1f}s",
+            'match_type': 'tag_interval',
+            'tag_confidence': interval['score']
+        })
+
+    return results
+
+def search_frames_semantic(query, video_id, top_k=5, min_similarity=0.2):
+    """Search stored frame embeddings with the local model; empty when it is not enabled"""
+    embedding_service = get_frame_embedding_service()
+    if not embedding_service:
+        return []
+
+    results = []
+    try:
+        for match in embedding_service.search_frames(video_id, query, top_k=top_k):
+            if match['score'] < min_similarity:
+                continue
+            results.append({
+                'type': 'visual',
+                'start_time': max(0, match['timestamp'] - 1),
+                'end_time': match['timestamp'] + 1,
+                # CLIP cosine similarities sit around 0.2-0.35 for good matches
+                'score': min(1.0, match['score'] * 2.5),
+                'preview_text': f"Frame at {match['timestamp']:.1f}s",
+                'full_text': f"Frame visually matching '{query}'",
+                'match_type': 'semantic_frame',
+                'similarity': match['score']
+            })
+    except Exception as e:
+        print(f"Semantic frame search error: {str(e)}")
+    return results
+
+def render_video_with_scenes(video_path, scenes, output_path, transition_duration=0.5, video_info=None):
     """Render video from scenes with transitions"""
     try:
-        print(f"Starting video render: {video_path}")
-        print(f"Output path: {output_path}")
-        print(f"Scenes: {len(scenes)}")
-        print(f"Transition duration: {transition_duration}")
+        logger.info("Starting video render: %s", video_path)
+        logger.debug("Output path: %s", output_path)
+        logger.debug("Scenes: %s", len(scenes))
+        logger.debug("Transition duration: %s", transition_duration)
         
         # Verify input video exists
         if not os.path.exists(video_path):
-            print(f"ERROR: Input video file not found: {video_path}")
+            logger.error("Input video file not found: %s", video_path)
             return False
         
         # Create temporary directory
         temp_dir = tempfile.mkdtemp()
-        print(f"Created temp directory: {temp_dir}")
-        print(f"Temp directory exists: {os.path.exists(temp_dir)}")
+        logger.debug("Created temp directory: %s", temp_dir)
+        
+        # Stream info from the cached probe: clamp scenes to the real duration and
+        # skip audio encoding for silent sources instead of probing per clip
+        video_info = video_info if video_info is not None else get_video_info(video_path)
+        source_duration = video_info.get('duration')
+        has_audio = video_info.get('has_audio', True) if video_info else True
         
         # Extract clips for each scene
         clip_paths = []
         for i, scene in enumerate(scenes):
             start_time = scene.get('start', 0)
             end_time = scene.get('end', 0)
+            if source_duration:
+                end_time = min(end_time, source_duration)
             duration = end_time - start_time
             
-            print(f"Processing scene {i+1}: start={start_time}, end={end_time}, duration={duration}")
+            logger.debug("Processing scene %s: start=%s, end=%s, duration=%s", i+1, start_time, end_time, duration)
             
             if duration <= 0:
-                print(f"Skipping scene {i+1}: invalid duration")
+                logger.debug("Skipping scene %s: invalid duration", i+1)
                 continue
             
             clip_path = os.path.join(temp_dir, f'clip_{i+1:03d}.mp4')
             
             # Use more robust FFmpeg command with optimized compression
             # Check if ffmpeg is in PATH, otherwise use direct path
-            ffmpeg_path = 'ffmpeg'
-            try:
-                import shutil
-                if not shutil.which('ffmpeg'):
-                    direct_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"
-                    if os.path.exists(direct_path):
-                        ffmpeg_path = direct_path
-                        print(f"Using direct FFmpeg path: {ffmpeg_path}")
-                    else:
-                        print("ERROR: FFmpeg not found in PATH or direct path")
-                        continue
-            except Exception as e:
-                print(f"Warning: Could not check FFmpeg path: {e}")
+            ffmpeg_path = find_ffmpeg()
+            if not ffmpeg_path:
+                logger.error("FFmpeg not found in PATH or common install locations")
+                continue
             
             cmd = [
                 ffmpeg_path, '-i', video_path,
                 '-ss', str(start_time),
                 '-t', str(duration),
                 '-c:v', 'libx264',  # Use H.264 codec instead of copy
-                '-c:a', 'aac',      # Use AAC audio codec
+                *(['-c:a', 'aac'] if has_audio else ['-an']),  # AAC audio, or none for silent sources
                 '-preset', 'medium', # Better compression than 'fast'
                 '-crf', '28',       # Higher CRF for smaller file size
                 '-maxrate', '2M',   # Limit bitrate to 2Mbps
@@ -4365,38 +4785,39 @@ def render_video_with_scenes(video_path, scenes, output_path, transition_duratio
             ]
             
             try:
-                print(f"Running FFmpeg command: {' '.join(cmd)}")
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-                print(f"Clip {i+1} extracted successfully")
+                logger.debug("Running FFmpeg command: %s", Lazy(' '.join, cmd))
+                with observe_stage('render_encode', {'process.command': cmd[0]}):
+                    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+                logger.debug("Clip %s extracted successfully", i+1)
                 
                 if os.path.exists(clip_path):
                     file_size = os.path.getsize(clip_path)
-                    print(f"Clip {i+1} file size: {file_size} bytes")
+                    logger.debug("Clip %s file size: %s bytes", i+1, file_size)
                     if file_size > 0:
                         clip_paths.append(clip_path)
                     else:
-                        print(f"Clip {i+1} file is empty, skipping")
+                        logger.warning("Clip %s file is empty, skipping", i+1)
                 else:
-                    print(f"Clip {i+1} file was not created")
+                    logger.warning("Clip %s file was not created", i+1)
                     
             except subprocess.CalledProcessError as e:
-                print(f"Error extracting clip {i+1}: {e.stderr}")
-                print(f"FFmpeg return code: {e.returncode}")
-                print(f"FFmpeg stdout: {e.stdout}")
+                logger.error("Error extracting clip %s: %s", i+1, e.stderr)
+                logger.debug("FFmpeg return code: %s", e.returncode)
+                logger.debug("FFmpeg stdout: %s", e.stdout)
                 continue
         
         if not clip_paths:
-            print("No clips were successfully extracted")
+            logger.warning("No clips were successfully extracted")
             return False
         
-        print(f"Successfully extracted {len(clip_paths)} clips")
+        logger.info("Successfully extracted %s clips", len(clip_paths))
         
         # Apply transitions if multiple clips, otherwise use simple concatenation
         if len(clip_paths) > 1 and transition_duration > 0:
-            print(f"Applying transitions with duration: {transition_duration}s")
+            logger.debug("Applying transitions with duration: %ss", transition_duration)
             success = apply_transitions(clip_paths, output_path, temp_dir, transition_duration)
         else:
-            print("Using simple concatenation (no transitions)")
+            logger.info("Using simple concatenation (no transitions)")
             success = simple_concat(clip_paths, output_path, temp_dir)
         
         # Clean up temp files
@@ -4409,22 +4830,20 @@ def render_video_with_scenes(video_path, scenes, output_path, transition_duratio
                 import shutil
                 shutil.rmtree(temp_dir)
         except Exception as e:
-            print(f"Warning: Error cleaning up temp files: {e}")
+            logger.warning("Error cleaning up temp files: %s", e)
         
-        print(f"Video rendering {'successful' if success else 'failed'}")
+        logger.info("Video rendering %s", 'successful' if success else 'failed')
         return success
         
     except Exception as e:
-        import traceback
-        print(f"Render error: {str(e)}")
-        print(f"Render traceback: {traceback.format_exc()}")
+        logger.exception("Render error: %s", str(e))
         return False
 
 def apply_transitions(clip_paths, output_path, temp_dir, transition_duration):
     """Apply crossfade transitions between clips"""
     try:
-        print(f"Applying transitions to {len(clip_paths)} clips with {transition_duration}s duration")
-        print(f"Expected total duration: {len(clip_paths) * 5 + (len(clip_paths) - 1) * transition_duration}s (5s per scene + transitions)")
+        logger.info("Applying transitions to %s clips with %ss duration", len(clip_paths), transition_duration)
+        logger.debug("Expected total duration: %ss (5s per scene + transitions)", len(clip_paths) * 5 + (len(clip_paths) - 1) * transition_duration)
         
         # Create inputs list for FFmpeg
         inputs = []
@@ -4457,23 +4876,14 @@ def apply_transitions(clip_paths, output_path, temp_dir, transition_duration):
                 # If the last part doesn't end with [v][a], add it
                 filter_str = filter_str.rstrip(';') + '[v][a]'
         
-        print(f"Filter complex: {filter_str}")
+        logger.debug("Filter complex: %s", filter_str)
         
         # Execute FFmpeg command with transitions and optimized compression
         # Check if ffmpeg is in PATH, otherwise use direct path
-        ffmpeg_path = 'ffmpeg'
-        try:
-            import shutil
-            if not shutil.which('ffmpeg'):
-                direct_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"
-                if os.path.exists(direct_path):
-                    ffmpeg_path = direct_path
-                    print(f"Using direct FFmpeg path for transitions: {ffmpeg_path}")
-                else:
-                    print("ERROR: FFmpeg not found in PATH or direct path for transitions")
-                    return False
-        except Exception as e:
-            print(f"Warning: Could not check FFmpeg path for transitions: {e}")
+        ffmpeg_path = find_ffmpeg()
+        if not ffmpeg_path:
+            logger.error("FFmpeg not found in PATH or common install locations for transitions")
+            return False
         
         ffmpeg_cmd = [
             ffmpeg_path
@@ -4492,46 +4902,45 @@ def apply_transitions(clip_paths, output_path, temp_dir, transition_duration):
             output_path
         ]
         
-        print(f"Running transition command: {' '.join(ffmpeg_cmd)}")
+        logger.debug("Running transition command: %s", Lazy(' '.join, ffmpeg_cmd))
         
         try:
-            result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=True)
-            print("Transitions applied successfully")
+            with observe_stage('render_encode', {'process.command': ffmpeg_cmd[0]}):
+                result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=True)
+            logger.info("Transitions applied successfully")
             
             if os.path.exists(output_path):
                 file_size = os.path.getsize(output_path)
-                print(f"Output file size: {file_size} bytes ({file_size/1024/1024:.2f} MB)")
+                logger.debug("Output file size: %s bytes (%.2f MB)", file_size, file_size/1024/1024)
                 return True
             else:
-                print("Output file was not created")
+                logger.warning("Output file was not created")
                 return False
                 
         except subprocess.CalledProcessError as e:
-            print(f"Transition error: {e.stderr}")
-            print(f"FFmpeg return code: {e.returncode}")
-            print("Falling back to simple concatenation...")
+            logger.error("Transition error: %s", e.stderr)
+            logger.debug("FFmpeg return code: %s", e.returncode)
+            logger.info("Falling back to simple concatenation...")
             return simple_concat(clip_paths, output_path, temp_dir)
         
     except Exception as e:
-        print(f"Transition error: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
-        print("Falling back to simple concatenation...")
+        logger.exception("Transition error: %s", str(e))
+        logger.info("Falling back to simple concatenation...")
         return simple_concat(clip_paths, output_path, temp_dir)
 
 def simple_concat(clip_paths, output_path, temp_dir):
     """Simple concatenation without transitions"""
     try:
-        print(f"Starting concatenation of {len(clip_paths)} clips")
-        print(f"Output path: {output_path}")
+        logger.info("Starting concatenation of %s clips", len(clip_paths))
+        logger.debug("Output path: %s", output_path)
         
         # Verify all clip files exist
         for i, clip_path in enumerate(clip_paths):
             if not os.path.exists(clip_path):
-                print(f"ERROR: Clip {i+1} not found: {clip_path}")
+                logger.error("Clip %s not found: %s", i+1, clip_path)
                 return False
             file_size = os.path.getsize(clip_path)
-            print(f"Clip {i+1}: {clip_path} ({file_size} bytes)")
+            logger.debug("Clip %s: %s (%s bytes)", i+1, clip_path, file_size)
         
         # Create concat file with absolute paths
         concat_file = os.path.join(temp_dir, 'concat.txt')
@@ -4543,25 +4952,16 @@ def simple_concat(clip_paths, output_path, temp_dir):
                 escaped_path = abs_path.replace("'", "\\'")
                 f.write(f"file '{escaped_path}'\n")
         
-        print(f"Created concat file: {concat_file}")
-        with open(concat_file, 'r') as f:
-            print(f"Concat file contents:\n{f.read()}")
+        if logger.debug_enabled:
+            with open(concat_file, 'r') as f:
+                logger.debug("Created concat file %s:\n%s", concat_file, f.read())
         
         # Use more robust concatenation command with optimized compression
         # Check if ffmpeg is in PATH, otherwise use direct path
-        ffmpeg_path = 'ffmpeg'
-        try:
-            import shutil
-            if not shutil.which('ffmpeg'):
-                direct_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"
-                if os.path.exists(direct_path):
-                    ffmpeg_path = direct_path
-                    print(f"Using direct FFmpeg path for concatenation: {ffmpeg_path}")
-                else:
-                    print("ERROR: FFmpeg not found in PATH or direct path for concatenation")
-                    return False
-        except Exception as e:
-            print(f"Warning: Could not check FFmpeg path for concatenation: {e}")
+        ffmpeg_path = find_ffmpeg()
+        if not ffmpeg_path:
+            logger.error("FFmpeg not found in PATH or common install locations for concatenation")
+            return False
         
         ffmpeg_cmd = [
                     ffmpeg_path,
@@ -4579,37 +4979,35 @@ def simple_concat(clip_paths, output_path, temp_dir):
                     output_path
                 ]
         
-        print(f"Running concatenation command: {' '.join(ffmpeg_cmd)}")
+        logger.debug("Running concatenation command: %s", Lazy(' '.join, ffmpeg_cmd))
         
         # Run FFmpeg command
-        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=True)
+        with observe_stage('render_encode', {'process.command': ffmpeg_cmd[0]}):
+            result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True, check=True)
         
-        print("Concatenation completed successfully")
-        print(f"Output file exists: {os.path.exists(output_path)}")
+        logger.info("Concatenation completed successfully")
         
         if os.path.exists(output_path):
             file_size = os.path.getsize(output_path)
-            print(f"Output file size: {file_size} bytes")
+            logger.debug("Output file size: %s bytes", file_size)
             
             if file_size > 0:
-                print("✅ Concatenation successful!")
+                logger.info("Concatenation successful!")
                 return True
             else:
-                print("❌ Output file is empty")
+                logger.error("Output file is empty")
                 return False
         else:
-            print("❌ Output file was not created")
+            logger.error("Output file was not created")
             return False
             
     except subprocess.CalledProcessError as e:
-        print(f"❌ Concatenation error: {e.stderr}")
-        print(f"FFmpeg return code: {e.returncode}")
-        print(f"FFmpeg stdout: {e.stdout}")
+        logger.error("Concatenation error: %s", e.stderr)
+        logger.debug("FFmpeg return code: %s", e.returncode)
+        logger.debug("FFmpeg stdout: %s", e.stdout)
         return False
     except Exception as e:
-        print(f"❌ Simple concat error: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Simple concat error: %s", str(e))
         return False
 
 
@@ -4699,271 +5097,158 @@ def add_test_data():
         return jsonify({'error': f'Failed to add test data: {str(e)}'}), 500
 
 def _generate_enhanced_inspirational_story_fallback(prompt: str, mode: str) -> str:
-    """Return a specific, non-generic inspirational story without external AI, styled by `mode`.
+    """Return a specific, non-generic inspirational story without external AI, styled by `mode`."""
+    record_fallback('template_story')
+    return enhanced_inspirational_story(prompt, mode)
 
-    This enhanced version creates stories that are more specific to the user's prompt
-    and less generic than the original fallback.
+def _build_content_story_context(video_id: str, mode: str, additional_prompt: str):
+    """
+    Gemini prompt plus the video content it was built from, for /generate-content-story.
+    Returns None when the video's metadata does not exist.
     """
-    import random
-    from hashlib import sha256
+    # Load video metadata to get actual content
+    metadata_file = os.path.join('uploads', 'videos', f"{video_id}_metadata.json")
+    if not os.path.exists(metadata_file):
+        return None
 
-    prompt_clean = (prompt or 'your journey').strip().lower()
-    
-    # Extract key themes from the prompt for more specific storytelling
-    prompt_keywords = prompt_clean.split()
+    video_metadata = read_metadata_json(metadata_file, encoding='utf-8')
+
+    # Extract actual video content
+    transcript = video_metadata.get('transcript', '')
+    visual_tags = video_metadata.get('visual_tags', [])
+    word_timestamps = video_metadata.get('word_timestamps', [])
+    duration = video_metadata.get('duration', 0)
     
-    # Identify common themes for more specific content
-    themes = {
-        'learning': ['learn', 'study', 'practice', 'skill', 'knowledge', 'education'],
-        'career': ['work', 'job', 'career', 'business', 'professional', 'success'],
-        'health': ['fitness', 'health', 'exercise', 'diet', 'wellness', 'mental'],
-        'relationships': ['love', 'relationship', 'family', 'friend', 'marriage', 'dating'],
-        'creativity': ['art', 'music', 'write', 'create', 'design', 'creative'],
-        'personal': ['confidence', 'fear', 'anxiety', 'growth', 'change', 'goal'],
-        'social': ['speaking', 'social', 'network', 'communication', 'public'],
-        'financial': ['money', 'finance', 'budget', 'saving', 'investment', 'debt']
+    # Key moments (words at 25/50/75%) and tag names come precomputed from the content digest
+    digest = get_content_digest(video_id, metadata_file, video_metadata) or {}
+    key_moments = digest.get('key_moments', [])
+    duration = digest.get('duration') or duration
+
+    # Create content-based story using actual video data
+    system_instructions = (
+        "You are an expert AI story generator that creates inspirational stories based on ACTUAL video content. "
+        "Use the provided video transcript, visual tags, and key moments to create a story that directly reflects "
+        "what actually happened in the video. Make the story specific to the video content, not generic. "
+        "Write a story of 250-350 words that captures the essence, emotions, and key moments from the video. "
+        "Adjust the tone based on the selected mode while staying true to the actual video content. "
+        "Include specific details from the transcript and visual elements. "
+        "Avoid generic content - make it feel like a story about what actually happened in this specific video."
+    )
+
+    # Enhanced style guidance for content-based storytelling
+    mode_guides = {
+        'Hopeful': (
+            "Tone: warm, uplifting, compassionate. Focus on positive moments, growth, and potential in the video content. "
+            "Highlight moments of connection, learning, or progress shown in the video. "
+            "Use the actual transcript and visual elements to show hope and possibility."
+        ),
+        'Motivational': (
+            "Tone: energetic, determined, action-oriented. Focus on moments of effort, achievement, or determination in the video. "
+            "Use the actual content to inspire action and show what's possible. "
+            "Highlight specific actions, words, or moments that demonstrate motivation and drive."
+        ),
+        'Funny': (
+            "Tone: lighthearted, witty, playful. Find humor in the actual video content, interactions, or situations. "
+            "Use the transcript and visual elements to create relatable, amusing observations. "
+            "Keep humor kind and supportive while being specific to the video content."
+        ),
+        'Emotional': (
+            "Tone: tender, sincere, vulnerable. Focus on emotional moments, connections, or feelings expressed in the video. "
+            "Use the actual transcript to capture authentic emotions and relationships. "
+            "Highlight moments of vulnerability, love, or deep connection shown in the video."
+        ),
+        'Reflective': (
+            "Tone: calm, thoughtful, insightful. Focus on moments of realization, learning, or wisdom in the video. "
+            "Use the actual content to provide insights and deeper understanding. "
+            "Highlight moments of self-discovery or meaningful observations from the video."
+        ),
     }
-    
-    # Determine the primary theme
-    primary_theme = 'personal'  # default
-    for theme, keywords in themes.items():
-        if any(keyword in prompt_keywords for keyword in keywords):
-            primary_theme = theme
-            break
-
-    # Seed pseudo-randomness using prompt+mode for consistency
-    seed = int(sha256(f"{prompt_clean}|{mode}".encode("utf-8")).hexdigest(), 16) % (2**32)
-    rnd = random.Random(seed)
-
-    # Enhanced vocabulary with more specific, theme-aware content
-    vocab = {
-        'Hopeful': {
-            'learning': {
-                'openers': [
-                    f"You opened the first page of {prompt_clean}, and something shifted.",
-                    f"The moment you decided to tackle {prompt_clean}, a new chapter began.",
-                    f"Learning {prompt_clean} started with a single, brave step forward."
-                ],
-                'challenges': [
-                    f"The first attempts at {prompt_clean} felt clumsy and uncertain.",
-                    f"You stumbled through the basics of {prompt_clean}, making mistakes.",
-                    f"Progress with {prompt_clean} came slowly, one small victory at a time."
-                ],
-                'breakthroughs': [
-                    f"Then came the day when {prompt_clean} started making sense.",
-                    f"Something clicked with {prompt_clean}, and you felt a spark of confidence.",
-                    f"You realized that {prompt_clean} wasn't impossible—just unfamiliar."
-                ]
-            },
-            'career': {
-                'openers': [
-                    f"You looked at your {prompt_clean} goals and felt both excited and nervous.",
-                    f"The path toward {prompt_clean} success began with honest self-assessment.",
-                    f"Your {prompt_clean} journey started when you dared to dream bigger."
-                ],
-                'challenges': [
-                    f"The road to {prompt_clean} wasn't smooth—there were setbacks and doubts.",
-                    f"You faced rejection and criticism while pursuing {prompt_clean}.",
-                    f"Balancing {prompt_clean} ambitions with daily responsibilities felt overwhelming."
-                ],
-                'breakthroughs': [
-                    f"But you kept showing up for {prompt_clean}, even on the hard days.",
-                    f"Small wins in {prompt_clean} started adding up to real progress.",
-                    f"You discovered that {prompt_clean} success came from consistent effort."
-                ]
-            },
-            'health': {
-                'openers': [
-                    f"You decided that {prompt_clean} was worth the effort, no matter how small.",
-                    f"Your {prompt_clean} journey began with a simple promise to yourself.",
-                    f"Taking care of your {prompt_clean} felt like an act of self-love."
-                ],
-                'challenges': [
-                    f"Old habits around {prompt_clean} were hard to break.",
-                    f"You faced days when {prompt_clean} felt impossible to prioritize.",
-                    f"Progress with {prompt_clean} came in waves, not steady lines."
-                ],
-                'breakthroughs': [
-                    f"But you learned that {prompt_clean} was about consistency, not perfection.",
-                    f"Small changes in {prompt_clean} started creating bigger results.",
-                    f"You discovered that {prompt_clean} was a journey, not a destination."
-                ]
-            },
-            'relationships': {
-                'openers': [
-                    f"You realized that {prompt_clean} relationships required vulnerability.",
-                    f"Your {prompt_clean} journey began with honest communication.",
-                    f"Building better {prompt_clean} connections started with self-reflection."
-                ],
-                'challenges': [
-                    f"Opening up about {prompt_clean} felt scary and uncertain.",
-                    f"You faced misunderstandings and conflicts in your {prompt_clean} journey.",
-                    f"Trusting others with your {prompt_clean} feelings took courage."
-                ],
-                'breakthroughs': [
-                    f"But you learned that {prompt_clean} relationships grow through honesty.",
-                    f"Small moments of connection in {prompt_clean} became meaningful.",
-                    f"You discovered that {prompt_clean} love and friendship require patience."
-                ]
-            },
-            'personal': {
-                'openers': [
-                    f"You looked at {prompt_clean} and decided it was time for change.",
-                    f"Your {prompt_clean} journey began with a moment of honest self-reflection.",
-                    f"Facing your {prompt_clean} fears felt like stepping into unknown territory."
-                ],
-                'challenges': [
-                    f"The path through {prompt_clean} was filled with uncertainty and doubt.",
-                    f"You faced setbacks and moments of wanting to give up on {prompt_clean}.",
-                    f"Progress with {prompt_clean} came slowly, testing your patience."
-                ],
-                'breakthroughs': [
-                    f"But you discovered that {prompt_clean} growth happens in small steps.",
-                    f"Each day of working on {prompt_clean} made you stronger.",
-                    f"You learned that {prompt_clean} transformation takes time and kindness."
-                ]
-            }
-        },
-        'Motivational': {
-            'learning': {
-                'openers': [
-                    f"You committed to mastering {prompt_clean}, no matter what it took.",
-                    f"The decision to excel at {prompt_clean} became your driving force.",
-                    f"You set your sights on {prompt_clean} and refused to look back."
-                ],
-                'strategies': [
-                    f"You broke down {prompt_clean} into manageable, daily actions.",
-                    f"Every morning, you focused on one specific aspect of {prompt_clean}.",
-                    f"You created a system for practicing {prompt_clean} consistently."
-                ],
-                'results': [
-                    f"Your dedication to {prompt_clean} started showing real results.",
-                    f"People noticed your growing expertise in {prompt_clean}.",
-                    f"You became the person others turned to for {prompt_clean} advice."
-                ]
-            },
-            'career': {
-                'openers': [
-                    f"You mapped out your {prompt_clean} success plan with precision.",
-                    f"The vision of your {prompt_clean} future became your daily motivation.",
-                    f"You decided that {prompt_clean} excellence was non-negotiable."
-                ],
-                'strategies': [
-                    f"You invested in {prompt_clean} skills that would set you apart.",
-                    f"Every decision you made aligned with your {prompt_clean} goals.",
-                    f"You built a network of {prompt_clean} professionals who inspired you."
-                ],
-                'results': [
-                    f"Your {prompt_clean} efforts started opening new opportunities.",
-                    f"Recognition for your {prompt_clean} work began to flow naturally.",
-                    f"You became known as someone who delivered {prompt_clean} results."
-                ]
-            },
-            'health': {
-                'openers': [
-                    f"You committed to transforming your {prompt_clean} habits permanently.",
-                    f"The vision of your {prompt_clean} future self became your motivation.",
-                    f"You decided that {prompt_clean} excellence was worth every effort."
-                ],
-                'strategies': [
-                    f"You created a {prompt_clean} routine that worked for your lifestyle.",
-                    f"Every choice you made supported your {prompt_clean} goals.",
-                    f"You surrounded yourself with {prompt_clean} inspiration and support."
-                ],
-                'results': [
-                    f"Your {prompt_clean} transformation became visible to others.",
-                    f"You started feeling stronger and more confident in your {prompt_clean} journey.",
-                    f"Your {prompt_clean} success inspired others to make changes too."
-                ]
-            },
-            'relationships': {
-                'openers': [
-                    f"You committed to building the {prompt_clean} relationships you deserved.",
-                    f"The vision of deeper {prompt_clean} connections drove your actions.",
-                    f"You decided that {prompt_clean} love and friendship were worth fighting for."
-                ],
-                'strategies': [
-                    f"You learned to communicate {prompt_clean} needs clearly and kindly.",
-                    f"Every interaction became an opportunity to strengthen {prompt_clean} bonds.",
-                    f"You invested time and energy in the {prompt_clean} relationships that mattered."
-                ],
-                'results': [
-                    f"Your {prompt_clean} relationships started growing deeper and stronger.",
-                    f"You became known as someone who nurtured {prompt_clean} connections.",
-                    f"Your {prompt_clean} love and friendship became a source of strength."
-                ]
-            },
-            'personal': {
-                'openers': [
-                    f"You committed to conquering {prompt_clean} once and for all.",
-                    f"The vision of your {prompt_clean} future self became your daily motivation.",
-                    f"You decided that {prompt_clean} growth was non-negotiable."
-                ],
-                'strategies': [
-                    f"You faced {prompt_clean} challenges head-on, one day at a time.",
-                    f"Every setback in {prompt_clean} became a lesson in resilience.",
-                    f"You built a support system for your {prompt_clean} journey."
-                ],
-                'results': [
-                    f"Your {prompt_clean} transformation became visible to everyone around you.",
-                    f"You became an inspiration to others facing similar {prompt_clean} challenges.",
-                    f"Your {prompt_clean} success story became a testament to perseverance."
-                ]
-            }
-        }
+    style_guide = mode_guides.get(mode, mode_guides['Hopeful'])
+
+    # Prepare content summary for AI
+    content_summary = f"""
+VIDEO CONTENT ANALYSIS:
+- Transcript: "{condense_transcript(transcript, word_timestamps, max_chars=1000)}"
+- Visual Elements: {', '.join(digest.get('visual_tag_names', [])[:10])}
+- Duration: {duration:.1f} seconds
+- Key Moments: {[f"{m['word']} at {m['time_str']}" for m in key_moments]}
+- Additional Context: {additional_prompt if additional_prompt else 'None provided'}
+"""
+
+    full_prompt = (
+        f"{system_instructions}\n\n"
+        f"STYLE GUIDE FOR {mode}: {style_guide}\n\n"
+        f"{content_summary}\n\n"
+        f"STORY MODE: {mode}\n\n"
+        f"Create an inspirational story that is SPECIFICALLY based on this video content. "
+        f"Use the actual transcript, visual elements, and key moments to tell a story about what happened in this video. "
+        f"Make it feel personal and authentic to the actual content, not generic. "
+        f"Write a story that captures the essence and meaning of what was shared in this specific video."
+    )
+    return {
+        'full_prompt': full_prompt,
+        'style_guide': style_guide,
+        'transcript': transcript,
+        'visual_tags': visual_tags,
+        'key_moments': key_moments,
+        'duration': duration
     }
 
-    # Get the appropriate theme content for the mode
-    mode_content = vocab.get(mode, vocab['Hopeful'])
-    theme_content = mode_content.get(primary_theme, mode_content.get('personal', mode_content))
-    
-    # Generate the story using theme-specific content
-    if mode == 'Hopeful':
-        opener = rnd.choice(theme_content['openers'])
-        challenge = rnd.choice(theme_content['challenges'])
-        breakthrough = rnd.choice(theme_content['breakthroughs'])
-        
-        story = (
-            f"{opener} At first, the path seemed overwhelming, but you took that first step anyway. "
-            f"{challenge} There were moments when you wanted to give up, when the progress felt too slow. "
-            f"But you reminded yourself that every expert was once a beginner, every master started with uncertainty. "
-            f"{breakthrough} You learned to celebrate small victories and to be patient with the process. "
-            f"Today, you're not the same person who started this journey. You're stronger, wiser, and more resilient. "
-            f"Your {prompt_clean} story is still being written, but you're the author now, and every chapter gets better."
-        )
-    
-    elif mode == 'Motivational':
-        opener = rnd.choice(theme_content['openers'])
-        strategy = rnd.choice(theme_content['strategies'])
-        result = rnd.choice(theme_content['results'])
-        
-        story = (
-            f"{opener} You knew that success in {prompt_clean} wouldn't come from wishing—it would come from doing. "
-            f"{strategy} You refused to let excuses stand in your way. Every day, you showed up for your {prompt_clean} goals. "
-            f"When others doubted, you doubled down. When obstacles appeared, you found ways around them. "
-            f"{result} Your commitment to {prompt_clean} excellence became your signature. "
-            f"People started noticing your dedication, your consistency, your refusal to settle for anything less than your best. "
-            f"Your {prompt_clean} journey proves that when you commit fully to your goals, the universe conspires to help you succeed."
-        )
-    
+
+def _content_story_refine_instructions(style_guide: str) -> str:
+    return (
+        f"Expand this story to 250-350 words while keeping it SPECIFIC to the video content. "
+        f"Add more details from the transcript and visual elements. "
+        f"Follow this style guide: {style_guide}."
+    )
+
+
+def _content_story_used(context: dict) -> dict:
+    return {
+        "transcriptLength": len(context['transcript']),
+        "visualTags": len(context['visual_tags']),
+        "keyMoments": len(context['key_moments']),
+        "duration": context['duration']
+    }
+
+
+def _generate_content_story(context: dict, video_id: str, mode: str, additional_prompt: str) -> dict:
+    """Content-based story response body for a built context (Gemini, else the local generator)."""
+    story_text = None
+    if text_client:
+        try:
+            response = text_client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=context['full_prompt']
+            )
+            story_text = (response.text or '').strip()
+        except Exception as model_err:
+            print(f"Gemini content-based story error: {str(model_err)}")
+            # Fallback to content-based local generator
+            story_text = _generate_content_based_story_fallback(
+                context['transcript'], context['visual_tags'], context['key_moments'], mode, additional_prompt)
     else:
-        # For other modes, use a more generic but still specific approach
-        story = (
-            f"Your journey with {prompt_clean} began with a simple decision to change. "
-            f"You faced challenges, learned from setbacks, and kept moving forward. "
-            f"Today, you're stronger because of your {prompt_clean} experience. "
-            f"Your story inspires others who are on similar paths. "
-            f"Remember: every expert was once a beginner, and every success story started with a single step."
-        )
+        story_text = _generate_content_based_story_fallback(
+            context['transcript'], context['visual_tags'], context['key_moments'], mode, additional_prompt)
+
+    # Ensure target length
+    story_text = _refine_short_story(story_text, _content_story_refine_instructions(context['style_guide']))
+    story_text = _strip_code_fences(story_text)
+
+    return {
+        "story": story_text,
+        "videoId": video_id,
+        "mode": mode,
+        "contentUsed": _content_story_used(context)
+    }
 
-    return story
 
 @app.route('/generate-content-story', methods=['POST'])
 def generate_content_based_inspirational_story():
     """Generate an inspirational story based on ACTUAL video content (transcript, visual tags, timestamps).
-    
-    Request JSON: { 
-        "videoId": "...", 
+
+    Request JSON: {
+        "videoId": "...",
         "mode": "Hopeful|Motivational|Funny|Emotional|Reflective",
         "prompt": "optional additional context"
     }
@@ -4972,389 +5257,258 @@ def generate_content_based_inspirational_story():
     try:
         data = request.get_json(silent=True) or {}
         video_id = data.get('videoId', '').strip()
-        mode = (data.get('mode') or 'Hopeful').strip()
+        mode = _normalize_story_mode((data.get('mode') or 'Hopeful').strip())
         additional_prompt = (data.get('prompt') or '').strip()
 
         if not video_id:
             return jsonify({'error': 'Video ID is required'}), 400
 
-        # Normalize and validate mode
-        allowed_modes = {"Hopeful", "Motivational", "Funny", "Emotional", "Reflective"}
-        if mode not in allowed_modes:
-            mode = 'Hopeful'
-
-        # Load video metadata to get actual content
-        metadata_file = os.path.join('uploads', 'videos', f"{video_id}_metadata.json")
-        if not os.path.exists(metadata_file):
+        context = _build_content_story_context(video_id, mode, additional_prompt)
+        if context is None:
             return jsonify({'error': 'Video not found'}), 404
 
-        with open(metadata_file, 'r', encoding='utf-8') as f:
-            video_metadata = json.load(f)
+        return jsonify(_generate_content_story(context, video_id, mode, additional_prompt))
 
-        # Extract actual video content
-        transcript = video_metadata.get('transcript', '')
-        visual_tags = video_metadata.get('visual_tags', [])
-        word_timestamps = video_metadata.get('word_timestamps', [])
-        duration = video_metadata.get('duration', 0)
-        
-        # Get key moments from timestamps
-        key_moments = []
-        if word_timestamps:
-            # Extract key moments at different time intervals
-            total_words = len(word_timestamps)
-            if total_words > 0:
-                # Get words at 25%, 50%, 75% of the video
-                key_indices = [int(total_words * 0.25), int(total_words * 0.5), int(total_words * 0.75)]
-                for idx in key_indices:
-                    if idx < total_words:
-                        moment = word_timestamps[idx]
-                        key_moments.append({
-                            'word': moment.get('word', ''),
-                            'timestamp': moment.get('timestamp', 0),
-                            'time_str': f"{moment.get('timestamp', 0):.1f}s"
-                        })
-
-        # Create content-based story using actual video data
-        system_instructions = (
-            "You are an expert AI story generator that creates inspirational stories based on ACTUAL video content. "
-            "Use the provided video transcript, visual tags, and key moments to create a story that directly reflects "
-            "what actually happened in the video. Make the story specific to the video content, not generic. "
-            "Write a story of 250-350 words that captures the essence, emotions, and key moments from the video. "
-            "Adjust the tone based on the selected mode while staying true to the actual video content. "
-            "Include specific details from the transcript and visual elements. "
-            "Avoid generic content - make it feel like a story about what actually happened in this specific video."
-        )
+    except Exception as e:
+        import traceback
+        print("Content-based inspirational story generation error:\n" + traceback.format_exc())
+        return jsonify({'error': f'Failed to generate content-based story: {str(e)}'}), 500
 
-        # Enhanced style guidance for content-based storytelling
-        mode_guides = {
-            'Hopeful': (
-                "Tone: warm, uplifting, compassionate. Focus on positive moments, growth, and potential in the video content. "
-                "Highlight moments of connection, learning, or progress shown in the video. "
-                "Use the actual transcript and visual elements to show hope and possibility."
-            ),
-            'Motivational': (
-                "Tone: energetic, determined, action-oriented. Focus on moments of effort, achievement, or determination in the video. "
-                "Use the actual content to inspire action and show what's possible. "
-                "Highlight specific actions, words, or moments that demonstrate motivation and drive."
-            ),
-            'Funny': (
-                "Tone: lighthearted, witty, playful. Find humor in the actual video content, interactions, or situations. "
-                "Use the transcript and visual elements to create relatable, amusing observations. "
-                "Keep humor kind and supportive while being specific to the video content."
-            ),
-            'Emotional': (
-                "Tone: tender, sincere, vulnerable. Focus on emotional moments, connections, or feelings expressed in the video. "
-                "Use the actual transcript to capture authentic emotions and relationships. "
-                "Highlight moments of vulnerability, love, or deep connection shown in the video."
-            ),
-            'Reflective': (
-                "Tone: calm, thoughtful, insightful. Focus on moments of realization, learning, or wisdom in the video. "
-                "Use the actual content to provide insights and deeper understanding. "
-                "Highlight moments of self-discovery or meaningful observations from the video."
-            ),
-        }
-        style_guide = mode_guides.get(mode, mode_guides['Hopeful'])
 
-        # Prepare content summary for AI
-        content_summary = f"""
-VIDEO CONTENT ANALYSIS:
-- Transcript: "{transcript[:500]}{'...' if len(transcript) > 500 else ''}"
-- Visual Elements: {', '.join([tag.get('tag', '') for tag in visual_tags[:10]])}
-- Duration: {duration:.1f} seconds
-- Key Moments: {[f"{m['word']} at {m['time_str']}" for m in key_moments]}
-- Additional Context: {additional_prompt if additional_prompt else 'None provided'}
-"""
+@app.route('/generate-content-story/stream', methods=['POST'])
+def generate_content_based_inspirational_story_stream():
+    """SSE variant of /generate-content-story; the `done` event carries the same fields as the JSON response."""
+    data = request.get_json(silent=True) or {}
+    video_id = data.get('videoId', '').strip()
+    mode = _normalize_story_mode((data.get('mode') or 'Hopeful').strip())
+    additional_prompt = (data.get('prompt') or '').strip()
 
-        # Generate content-based story using Gemini AI
-        story_text = None
-        if gemini_client:
-            try:
-                full_prompt = (
-                    f"{system_instructions}\n\n"
-                    f"STYLE GUIDE FOR {mode}: {style_guide}\n\n"
-                    f"{content_summary}\n\n"
-                    f"STORY MODE: {mode}\n\n"
-                    f"Create an inspirational story that is SPECIFICALLY based on this video content. "
-                    f"Use the actual transcript, visual elements, and key moments to tell a story about what happened in this video. "
-                    f"Make it feel personal and authentic to the actual content, not generic. "
-                    f"Write a story that captures the essence and meaning of what was shared in this specific video."
-                )
-                response = gemini_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=full_prompt
-                )
-                story_text = (response.text or '').strip()
-            except Exception as model_err:
-                print(f"Gemini content-based story error: {str(model_err)}")
-                # Fallback to content-based local generator
-                story_text = _generate_content_based_story_fallback(transcript, visual_tags, key_moments, mode, additional_prompt)
-        else:
-            story_text = _generate_content_based_story_fallback(transcript, visual_tags, key_moments, mode, additional_prompt)
+    if not video_id:
+        return jsonify({'error': 'Video ID is required'}), 400
 
-        # Ensure target length
-        try:
-            import re as _re
-            word_count = len([w for w in _re.findall(r"\b\w+\b", story_text)])
-            if word_count < 200 and gemini_client:
-                refine_prompt = (
-                    f"Expand this story to 250-350 words while keeping it SPECIFIC to the video content. "
-                    f"Add more details from the transcript and visual elements. "
-                    f"Follow this style guide: {style_guide}. "
-                    f"Return only the expanded story as plain paragraphs.\n\nCURRENT STORY:\n{story_text}"
-                )
-                refine_resp = gemini_client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=refine_prompt
-                )
-                refined = (refine_resp.text or '').strip()
-                if refined:
-                    story_text = refined
-        except Exception as _:
-            pass
+    context = _build_content_story_context(video_id, mode, additional_prompt)
+    if context is None:
+        return jsonify({'error': 'Video not found'}), 404
 
-        # Cleanup
-        try:
-            cleaned = story_text.strip()
-            if cleaned.startswith('```'):
-                lines = [l for l in cleaned.split('\n') if not l.strip().startswith('```')]
-                cleaned = '\n'.join(lines).strip()
-            story_text = cleaned
-        except Exception:
-            pass
+    refine_instructions = _content_story_refine_instructions(context['style_guide'])
+    return _sse_response(_stream_story_events(
+        context['full_prompt'],
+        fallback=lambda: _generate_content_based_story_fallback(
+            context['transcript'], context['visual_tags'], context['key_moments'], mode, additional_prompt),
+        finalize=_strip_code_fences,
+        extra={'videoId': video_id, 'mode': mode, 'contentUsed': _content_story_used(context)},
+        refine_instructions=refine_instructions
+    ))
 
-        return jsonify({
-            "story": story_text,
-            "videoId": video_id,
-            "mode": mode,
-            "contentUsed": {
-                "transcriptLength": len(transcript),
-                "visualTags": len(visual_tags),
-                "keyMoments": len(key_moments),
-                "duration": duration
-            }
+def _generate_content_based_story_fallback(transcript: str, visual_tags: list, key_moments: list, mode: str, additional_prompt: str = "") -> str:
+    """Generate a story based on actual video content when Gemini is unavailable."""
+    record_fallback('template_story')
+    return content_based_story(transcript, visual_tags, key_moments, mode, additional_prompt)
+
+
+# Batch endpoints: many videos per request, one SSE `item` event per video as it completes
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '100'))
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def get_batch_pool():
+    """Shared worker pool for batch items (Gemini concurrency is still bounded by the LLM executor)"""
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                # Jobs run in the submitting request's context, so their spans join its trace
+                _batch_pool = ContextThreadPoolExecutor(max_workers=max(1, int(os.getenv('BATCH_MAX_WORKERS', '4'))),
+                                                        thread_name_prefix='batch')
+    return _batch_pool
+
+
+def _batch_video_ids(data: dict):
+    """De-duplicated videoIds of a batch request as (ids, None), or (None, error message)"""
+    raw_ids = data.get('videoIds')
+    if not isinstance(raw_ids, list):
+        return None, 'videoIds must be a list of video IDs'
+    video_ids = []
+    for raw_id in raw_ids:
+        video_id = str(raw_id or '').strip()
+        if video_id and video_id not in video_ids:
+            video_ids.append(video_id)
+    if not video_ids:
+        return None, 'videoIds must contain at least one video ID'
+    if len(video_ids) > BATCH_MAX_ITEMS:
+        return None, f'At most {BATCH_MAX_ITEMS} videoIds per batch request'
+    return video_ids, None
+
+
+def _submit_batch(fn, *args):
+    """Submit fn(*args) to the batch pool, counted as in-flight kind=batch_pending until a worker starts it"""
+    def start():
+        IN_FLIGHT.dec(kind='batch_pending')
+        return fn(*args)
+
+    IN_FLIGHT.inc(kind='batch_pending')
+    try:
+        future = get_batch_pool().submit(start)
+    except Exception:
+        IN_FLIGHT.dec(kind='batch_pending')
+        raise
+    # A job cancelled before it started never runs start()
+    future.add_done_callback(lambda f: f.cancelled() and IN_FLIGHT.dec(kind='batch_pending'))
+    return future
+
+
+def _run_batch_item(video_id, fn, *args):
+    """Run fn(video_id, *args) -> (body, status) as a batch job: returns ([(video_id, body, status)], [])"""
+    try:
+        with IN_FLIGHT.track_inprogress(kind='batch_item'), trace_span('batch.item', {'video.id': video_id}):
+            body, status = fn(video_id, *args)
+    except MemoryBudgetExceeded as e:
+        body, status = {'error': str(e), 'retryAfter': e.retry_after}, 503
+    except Exception as e:
+        print(f"Batch item {video_id} failed: {str(e)}")
+        body, status = {'error': str(e)}, 500
+    return [(video_id, body, status)], []
+
+
+def _batch_events(video_ids, futures):
+    """
+    SSE stream for a batch: `start`, then one `item` event per video in completion order,
+    then `done` with totals. Each future returns (items, follow_up_futures), so a job can
+    fan out into per-video jobs (e.g. packed text tagging, then per-video tagging).
+    Pending work is cancelled if the client disconnects.
+    """
+    started = time.time()
+    pending = set(futures)
+    succeeded = failed = 0
+    try:
+        yield _sse_event('start', {'videoIds': video_ids, 'total': len(video_ids)})
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                items, follow_up = future.result()
+                pending.update(follow_up)
+                for video_id, body, status in items:
+                    ok = status < 400
+                    if ok:
+                        succeeded += 1
+                    else:
+                        failed += 1
+                    event = {'videoId': video_id, 'status': status, 'ok': ok}
+                    event['result' if ok else 'error'] = body if ok else body.get('error', 'Failed')
+                    yield _sse_event('item', event)
+        yield _sse_event('done', {
+            'total': len(video_ids),
+            'succeeded': succeeded,
+            'failed': failed,
+            'elapsedMs': int((time.time() - started) * 1000)
         })
+    finally:
+        for future in pending:
+            future.cancel()
 
+
+def _ai_tags_pack_job(pack, emotion):
+    try:
+        tags_by_id = generate_text_tags_packed(pack, emotion)
     except Exception as e:
-        import traceback
-        print("Content-based inspirational story generation error:\n" + traceback.format_exc())
-        return jsonify({'error': f'Failed to generate content-based story: {str(e)}'}), 500
+        print(f"Batch text tagging failed: {str(e)}")
+        return [(video_id, {'error': f'AI tag generation failed: {str(e)}'}, 500) for video_id, _ in pack], []
+    return [(video_id, {'videoId': video_id, 'emotion': emotion, 'tags': tags_by_id.get(video_id, [])}, 200)
+            for video_id, _ in pack], []
 
-def _generate_content_based_story_fallback(transcript: str, visual_tags: list, key_moments: list, mode: str, additional_prompt: str = "") -> str:
-    """Generate a content-based inspirational story using actual video content when Gemini AI is unavailable.
-    
-    This function creates stories that are specifically based on the video's transcript, visual elements, and key moments.
+
+def _generate_tags_pack_job(pack, emotion):
+    # Text tags for the whole pack in one call, then visual tagging per video on the shared pool
+    try:
+        tags_by_id = generate_text_tags_packed(pack, emotion)
+    except Exception as e:
+        print(f"Batch text tagging failed: {str(e)}")
+        tags_by_id = {}
+    return [], [_submit_batch(_run_batch_item, video_id, _tag_video, emotion, None, None, tags_by_id.get(video_id))
+                for video_id, _ in pack]
+
+
+def _content_story_job(video_id, mode, additional_prompt):
+    context = _build_content_story_context(video_id, mode, additional_prompt)
+    if context is None:
+        return {'error': 'Video not found'}, 404
+    return _generate_content_story(context, video_id, mode, additional_prompt), 200
+
+
+def _batch_tag_inputs(video_ids):
+    """Split ids into ([(videoId, tag text)] for videos with metadata, [missing ids])"""
+    inputs, missing = [], []
+    for video_id in video_ids:
+        metadata_path = os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json")
+        digest = get_content_digest(video_id, metadata_path) if os.path.exists(metadata_path) else None
+        if digest is None:
+            missing.append(video_id)
+        else:
+            inputs.append((video_id, digest.get('tag_text', '')))
+    return inputs, missing
+
+
+def _not_found_job(video_id):
+    return [(video_id, {'error': 'Video not found'}, 404)], []
+
+
+@app.route('/batch/ai-tags', methods=['POST'])
+def batch_ai_tags():
+    """Emotion-biased text tags for many videos; small inputs are packed into shared Gemini calls.
+
+    Request JSON: { "videoIds": ["...", ...], "emotion": "optional" }
+    Response: text/event-stream of `start`, `item` ({videoId, status, ok, result|error}) and `done` events
     """
-    import random
-    from hashlib import sha256
+    data = request.get_json(silent=True) or {}
+    video_ids, error = _batch_video_ids(data)
+    if error:
+        return jsonify({'error': error}), 400
+    emotion = (data.get('emotion') or '').strip()
 
-    # Clean and prepare content
-    transcript_clean = (transcript or '').strip()
-    visual_elements = [tag.get('tag', '') for tag in visual_tags if tag.get('tag')]
-    key_words = [moment.get('word', '') for moment in key_moments if moment.get('word')]
-    
-    # Extract key themes from transcript
-    transcript_words = transcript_clean.lower().split()
-    
-    # Identify content themes
-    content_themes = {
-        'personal': ['i', 'me', 'my', 'myself', 'personal', 'experience'],
-        'relationship': ['love', 'relationship', 'partner', 'family', 'friend', 'together'],
-        'achievement': ['success', 'achieved', 'accomplished', 'goal', 'dream', 'reached'],
-        'learning': ['learned', 'discovered', 'realized', 'understood', 'found'],
-        'challenge': ['difficult', 'challenge', 'struggle', 'overcame', 'faced'],
-        'emotion': ['feel', 'felt', 'happy', 'sad', 'excited', 'nervous', 'proud']
-    }
-    
-    # Determine primary content theme
-    primary_theme = 'personal'  # default
-    theme_scores = {}
-    for theme, keywords in content_themes.items():
-        score = sum(1 for word in transcript_words if word in keywords)
-        theme_scores[theme] = score
-    
-    if theme_scores:
-        primary_theme = max(theme_scores, key=theme_scores.get)
+    inputs, missing = _batch_tag_inputs(video_ids)
+    futures = [_submit_batch(_not_found_job, video_id) for video_id in missing]
+    futures += [_submit_batch(_ai_tags_pack_job, pack, emotion) for pack in pack_text_tag_inputs(inputs)]
+    return _sse_response(_batch_events(video_ids, futures))
 
-    # Seed for consistency
-    content_hash = f"{transcript_clean[:100]}|{mode}|{primary_theme}"
-    seed = int(sha256(content_hash.encode("utf-8")).hexdigest(), 16) % (2**32)
-    rnd = random.Random(seed)
 
-    # Get key content elements
-    key_visuals = visual_elements[:5] if visual_elements else ['video content']
-    key_transcript_words = transcript_words[:20] if transcript_words else ['content']
-    
-    # Extract meaningful phrases from transcript
-    meaningful_phrases = []
-    if transcript_clean:
-        sentences = transcript_clean.split('.')
-        meaningful_phrases = [s.strip() for s in sentences if len(s.strip()) > 10][:3]
-
-    # Create content-based story structure
-    if mode == 'Hopeful':
-        story = _create_hopeful_content_story(transcript_clean, key_visuals, meaningful_phrases, primary_theme, rnd)
-    elif mode == 'Motivational':
-        story = _create_motivational_content_story(transcript_clean, key_visuals, meaningful_phrases, primary_theme, rnd)
-    elif mode == 'Funny':
-        story = _create_funny_content_story(transcript_clean, key_visuals, meaningful_phrases, primary_theme, rnd)
-    elif mode == 'Emotional':
-        story = _create_emotional_content_story(transcript_clean, key_visuals, meaningful_phrases, primary_theme, rnd)
-    elif mode == 'Reflective':
-        story = _create_reflective_content_story(transcript_clean, key_visuals, meaningful_phrases, primary_theme, rnd)
-    else:
-        story = _create_hopeful_content_story(transcript_clean, key_visuals, meaningful_phrases, primary_theme, rnd)
+@app.route('/batch/generate-tags', methods=['POST'])
+def batch_generate_tags():
+    """Visual + text tagging for many videos (same per-video result as /generate-tags).
 
-    return story
+    Request JSON: { "videoIds": ["...", ...], "emotion": "optional" }
+    Response: text/event-stream of `start`, `item` and `done` events
+    """
+    data = request.get_json(silent=True) or {}
+    video_ids, error = _batch_video_ids(data)
+    if error:
+        return jsonify({'error': error}), 400
+    emotion = (data.get('emotion') or '').strip()
 
-def _create_hopeful_content_story(transcript: str, visuals: list, phrases: list, theme: str, rnd) -> str:
-    """Create a hopeful story based on actual video content."""
-    
-    # Extract positive elements from content
-    positive_words = ['love', 'happy', 'good', 'great', 'wonderful', 'amazing', 'beautiful', 'success', 'achievement']
-    found_positives = [word for word in transcript.lower().split() if word in positive_words]
-    
-    visual_desc = ', '.join(visuals[:3]) if visuals else 'this moment'
-    key_phrase = phrases[0] if phrases else 'this experience'
-    
-    story = (
-        f"In this video, we see {visual_desc} come to life through authentic moments and genuine expression. "
-        f"The words shared—'{key_phrase}'—reveal a journey of growth and discovery. "
-    )
-    
-    if found_positives:
-        story += (
-            f"There's something beautiful about how {found_positives[0]} emerges naturally from this experience. "
-            f"It's a reminder that even in our everyday moments, there's potential for connection and meaning. "
-        )
-    
-    story += (
-        f"What makes this content special is its authenticity. It's not about perfection—it's about real moments, "
-        f"real emotions, and real connections. The visual elements of {visual_desc} create a backdrop for "
-        f"stories that resonate with our own experiences. "
-        f"Every video like this reminds us that hope isn't found in grand gestures, but in the small, "
-        f"genuine moments we share with others. This content captures that truth beautifully."
-    )
-    
-    return story
+    inputs, missing = _batch_tag_inputs(video_ids)
+    futures = [_submit_batch(_not_found_job, video_id) for video_id in missing]
+    futures += [_submit_batch(_generate_tags_pack_job, pack, emotion) for pack in pack_text_tag_inputs(inputs)]
+    return _sse_response(_batch_events(video_ids, futures))
 
-def _create_motivational_content_story(transcript: str, visuals: list, phrases: list, theme: str, rnd) -> str:
-    """Create a motivational story based on actual video content."""
-    
-    action_words = ['did', 'made', 'created', 'built', 'achieved', 'accomplished', 'reached', 'overcame']
-    found_actions = [word for word in transcript.lower().split() if word in action_words]
-    
-    visual_desc = ', '.join(visuals[:3]) if visuals else 'this content'
-    key_phrase = phrases[0] if phrases else 'this achievement'
-    
-    story = (
-        f"This video captures the essence of action and determination. Through {visual_desc}, "
-        f"we witness the power of showing up and doing the work. "
-        f"The message here—'{key_phrase}'—speaks to the importance of taking steps forward. "
-    )
-    
-    if found_actions:
-        story += (
-            f"What's inspiring is how this content demonstrates that {found_actions[0]} is possible "
-            f"when we commit to our goals. It's not about having all the answers—it's about "
-            f"starting with what we have and building from there. "
-        )
-    
-    story += (
-        f"The visual elements of {visual_desc} serve as a powerful reminder that our actions "
-        f"create our reality. Every frame of this video shows what's possible when we "
-        f"refuse to let fear or doubt stop us from moving forward. "
-        f"This content proves that motivation isn't something we wait for—it's something we create "
-        f"through consistent action and unwavering commitment to our vision."
-    )
-    
-    return story
 
-def _create_funny_content_story(transcript: str, visuals: list, phrases: list, theme: str, rnd) -> str:
-    """Create a funny story based on actual video content."""
-    
-    visual_desc = ', '.join(visuals[:3]) if visuals else 'this delightful moment'
-    key_phrase = phrases[0] if phrases else 'this amusing situation'
-    
-    story = (
-        f"There's something wonderfully human about this video. Through {visual_desc}, "
-        f"we get a front-row seat to the kind of moments that make life entertaining. "
-        f"The content here—'{key_phrase}'—captures that perfect blend of effort and "
-        f"the inevitable plot twists that make any good story worth watching. "
-    )
-    
-    story += (
-        f"What makes this content so relatable is its authenticity. It's not trying to be perfect—"
-        f"it's just being real, and that's where the humor naturally emerges. "
-        f"The visual elements of {visual_desc} create a backdrop for the kind of "
-        f"everyday adventures that we all experience but rarely capture on camera. "
-        f"This video reminds us that sometimes the best comedy comes from simply "
-        f"showing up and being willing to laugh at ourselves along the way."
-    )
-    
-    return story
+@app.route('/batch/generate-content-story', methods=['POST'])
+def batch_generate_content_story():
+    """Content-based stories for many videos (same per-video result as /generate-content-story).
 
-def _create_emotional_content_story(transcript: str, visuals: list, phrases: list, theme: str, rnd) -> str:
-    """Create an emotional story based on actual video content."""
-    
-    emotion_words = ['love', 'feel', 'heart', 'sad', 'happy', 'miss', 'care', 'important']
-    found_emotions = [word for word in transcript.lower().split() if word in emotion_words]
-    
-    visual_desc = ', '.join(visuals[:3]) if visuals else 'this intimate moment'
-    key_phrase = phrases[0] if phrases else 'this emotional experience'
-    
-    story = (
-        f"This video captures something deeply human and profoundly moving. Through {visual_desc}, "
-        f"we witness the raw beauty of authentic emotion and genuine connection. "
-        f"The words shared—'{key_phrase}'—speak to the heart of what makes us human. "
-    )
-    
-    if found_emotions:
-        story += (
-            f"There's a tenderness in how this content explores {found_emotions[0]}, "
-            f"reminding us that vulnerability is not weakness—it's strength in its purest form. "
-            f"It's about the courage to feel deeply and share those feelings with others. "
-        )
-    
-    story += (
-        f"The visual elements of {visual_desc} create a safe space for emotions to unfold naturally. "
-        f"This content reminds us that the most meaningful moments in life aren't always "
-        f"the loudest or most dramatic—they're often the quiet ones where we allow ourselves "
-        f"to be seen and heard exactly as we are."
-    )
-    
-    return story
+    Request JSON: { "videoIds": ["...", ...], "mode": "Hopeful|...", "prompt": "optional" }
+    Response: text/event-stream of `start`, `item` and `done` events
+    """
+    data = request.get_json(silent=True) or {}
+    video_ids, error = _batch_video_ids(data)
+    if error:
+        return jsonify({'error': error}), 400
+    mode = _normalize_story_mode((data.get('mode') or 'Hopeful').strip())
+    additional_prompt = (data.get('prompt') or '').strip()
+
+    futures = [_submit_batch(_run_batch_item, video_id, _content_story_job, mode, additional_prompt)
+               for video_id in video_ids]
+    return _sse_response(_batch_events(video_ids, futures))
 
-def _create_reflective_content_story(transcript: str, visuals: list, phrases: list, theme: str, rnd) -> str:
-    """Create a reflective story based on actual video content."""
-    
-    insight_words = ['realized', 'learned', 'discovered', 'understood', 'found', 'saw', 'recognized']
-    found_insights = [word for word in transcript.lower().split() if word in insight_words]
-    
-    visual_desc = ', '.join(visuals[:3]) if visuals else 'this thoughtful moment'
-    key_phrase = phrases[0] if phrases else 'this realization'
-    
-    story = (
-        f"This video invites us into a moment of genuine reflection and self-discovery. "
-        f"Through {visual_desc}, we witness the kind of insight that comes from "
-        f"paying attention to our experiences. The content here—'{key_phrase}'—"
-        f"captures a moment of clarity that many of us can relate to. "
-    )
-    
-    if found_insights:
-        story += (
-            f"There's wisdom in how this content explores what it means to {found_insights[0]}, "
-            f"reminding us that growth often comes from simply being present with our experiences. "
-            f"It's about the quiet moments of understanding that change everything. "
-        )
-    
-    story += (
-        f"The visual elements of {visual_desc} serve as a metaphor for the way we process "
-        f"our own experiences. This content reminds us that reflection isn't about "
-        f"finding all the answers—it's about asking better questions and being open "
-        f"to the insights that emerge when we slow down and pay attention."
-    )
-    
-    return story
 
 @app.route('/generate-content-emotional-journey', methods=['POST'])
 def generate_content_based_emotional_journey():
@@ -5383,8 +5537,7 @@ def generate_content_based_emotional_journey():
         if not metadata_file:
             return jsonify({'error': 'Video not found - metadata file missing'}), 404
 
-        with open(metadata_file, 'r', encoding='utf-8') as f:
-            video_metadata = json.load(f)
+        video_metadata = read_metadata_json(metadata_file, encoding='utf-8')
 
         # Extract actual video content
         transcript = video_metadata.get('transcript', '')
@@ -5392,17 +5545,19 @@ def generate_content_based_emotional_journey():
         word_timestamps = video_metadata.get('word_timestamps', [])
         duration = video_metadata.get('duration', 0)
         
-        # Get emotional keywords from transcript
-        emotional_keywords = analyze_emotions_from_text(transcript)
+        # Emotional keywords, tag names and counts come precomputed from the content digest
+        digest = get_content_digest(video_id, metadata_file, video_metadata) or {}
+        emotional_keywords = digest.get('emotional_keywords', [])
+        duration = digest.get('duration') or duration
         
         # Prepare content summary for AI
         content_summary = f"""
 VIDEO CONTENT ANALYSIS:
-- Transcript: "{transcript[:800]}{'...' if len(transcript) > 800 else ''}"
-- Visual Elements: {', '.join([tag.get('tag', '') for tag in visual_tags[:15]])}
+- Transcript: "{condense_transcript(transcript, word_timestamps)}"
+- Visual Elements: {', '.join(digest.get('visual_tag_names', [])[:15])}
 - Duration: {duration:.1f} seconds
 - Emotional Keywords Detected: {', '.join(emotional_keywords[:10])}
-- Word Count: {len(transcript.split())}
+- Word Count: {digest.get('word_count', len(transcript.split()))}
 """
 
         emotional_analysis = ""
@@ -5463,9 +5618,9 @@ def _generate_content_based_emotional_analysis(transcript: str, visual_tags: lis
         f"the emotional depth and psychological aspects of this specific video content."
     )
 
-    if gemini_client:
+    if text_client:
         try:
-            response = gemini_client.models.generate_content(
+            response = text_client.models.generate_content(
                 model="gemini-2.5-flash",
                 contents=analysis_prompt
             )
@@ -5502,86 +5657,30 @@ def _generate_content_based_contrasting_stories(transcript: str, visual_tags: li
         f"Write a detailed story (150-200 words) showing how the same themes and emotions could lead to "
         f"struggles, setbacks, and difficult lessons. Focus on challenges, obstacles, and learning opportunities.\n\n"
         f"FORMAT REQUIREMENTS:\n"
-        f"- Start each story with 'POSITIVE PATH:' and 'NEGATIVE PATH:' headers\n"
+        f"- Return JSON with 'positivePath' and 'negativePath' fields, each holding the full story text\n"
         f"- Make both stories equally detailed and engaging\n"
         f"- Base stories directly on the video content provided\n"
         f"- Ensure both stories are complete and well-developed"
     )
 
-    if gemini_client:
+    if text_client:
         try:
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=stories_prompt
-            )
-            stories_text = (response.text or '').strip()
-            
-            # Parse the response to extract both stories
-            stories = _parse_contrasting_stories(stories_text)
-            return stories
+            stories = generate_json(text_client, "gemini-2.5-flash", stories_prompt, CONTRASTING_STORIES_SCHEMA)
+            if not stories['positivePath'].strip() or not stories['negativePath'].strip():
+                raise StructuredOutputError("Empty story path")
+            return {
+                "positivePath": stories['positivePath'].strip(),
+                "negativePath": stories['negativePath'].strip()
+            }
         except Exception as model_err:
             print(f"Gemini contrasting stories error: {str(model_err)}")
             return _generate_contrasting_stories_fallback(transcript, visual_tags, emotional_keywords)
     else:
         return _generate_contrasting_stories_fallback(transcript, visual_tags, emotional_keywords)
 
-def _parse_contrasting_stories(stories_text: str) -> dict:
-    """Parse the AI response to extract positive and negative path stories."""
-    
-    # Try to extract stories based on specific headers
-    positive_story = ""
-    negative_story = ""
-    
-    # Split by lines and look for specific headers
-    lines = stories_text.split('\n')
-    current_section = None
-    current_content = []
-    
-    for line in lines:
-        line_lower = line.strip().lower()
-        
-        # Check for section headers
-        if 'positive path' in line_lower:
-            if current_section == 'positive' and current_content:
-                positive_story = '\n'.join(current_content).strip()
-            current_section = 'positive'
-            current_content = []
-        elif 'negative path' in line_lower or 'challenging path' in line_lower:
-            if current_section == 'positive' and current_content:
-                positive_story = '\n'.join(current_content).strip()
-            current_section = 'negative'
-            current_content = []
-        else:
-            if current_section:
-                current_content.append(line)
-    
-    # Save the last section
-    if current_section == 'positive' and current_content:
-        positive_story = '\n'.join(current_content).strip()
-    elif current_section == 'negative' and current_content:
-        negative_story = '\n'.join(current_content).strip()
-    
-    # If we still don't have both stories, try alternative parsing
-    if not positive_story or not negative_story:
-        # Try splitting by double newlines
-        sections = stories_text.split('\n\n')
-        if len(sections) >= 2:
-            positive_story = sections[0].strip()
-            negative_story = sections[1].strip()
-        else:
-            # Final fallback: split by length
-            mid_point = len(stories_text) // 2
-            positive_story = stories_text[:mid_point].strip()
-            negative_story = stories_text[mid_point:].strip()
-    
-    return {
-        "positivePath": positive_story,
-        "negativePath": negative_story
-    }
-
 def _generate_emotional_analysis_fallback(transcript: str, visual_tags: list, emotional_keywords: list) -> str:
     """Generate emotional analysis fallback using actual video content."""
-    
+    record_fallback('template_story')
     visual_elements = [tag.get('tag', '') for tag in visual_tags if tag.get('tag')]
     key_emotions = emotional_keywords[:5] if emotional_keywords else ['content']
     
@@ -5601,7 +5700,7 @@ def _generate_emotional_analysis_fallback(transcript: str, visual_tags: list, em
 
 def _generate_contrasting_stories_fallback(transcript: str, visual_tags: list, emotional_keywords: list) -> dict:
     """Generate contrasting stories fallback using actual video content."""
-    
+    record_fallback('template_story')
     visual_elements = [tag.get('tag', '') for tag in visual_tags if tag.get('tag')]
     key_emotions = emotional_keywords[:3] if emotional_keywords else ['experience']
     
@@ -5633,6 +5732,7 @@ def _generate_contrasting_stories_fallback(transcript: str, visual_tags: list, e
 def find_video_metadata_file(video_id: str) -> str:
     """Find video metadata file with multiple path fallbacks."""
     possible_paths = [
+        os.path.join(UPLOAD_FOLDER, f"{video_id}_metadata.json"),
         os.path.join('uploads', 'videos', f"{video_id}_metadata.json"),
         os.path.join('uploads', f"{video_id}_metadata.json"),
         os.path.join('backend', 'uploads', 'videos', f"{video_id}_metadata.json"),
@@ -5647,50 +5747,14 @@ def find_video_metadata_file(video_id: str) -> str:
     
     return None
 
-def analyze_emotions_from_text(transcript: str) -> list:
-    """Analyze emotions from text and return emotional keywords."""
-    if not transcript:
-        return []
-    
-    transcript_lower = transcript.lower()
-    
-    # Define emotional keyword categories
-    emotion_categories = {
-        'happy': ['happy', 'joy', 'fun', 'great', 'awesome', 'love', 'excited', 'wonderful', 'amazing', 'delight', 'smile', 'celebrate'],
-        'sad': ['sad', 'sorry', 'cry', 'bad', 'upset', 'lonely', 'pain', 'tears', 'loss', 'grief', 'depressed'],
-        'angry': ['angry', 'mad', 'furious', 'rage', 'annoyed', 'frustrated', 'irritated', 'furious'],
-        'calm': ['calm', 'relax', 'peace', 'serene', 'quiet', 'gentle', 'soothing', 'tranquil'],
-        'excited': ['excited', 'thrill', 'wow', 'incredible', 'epic', 'energy', 'hype', 'amazing'],
-        'nervous': ['nervous', 'anxious', 'worried', 'scared', 'fear', 'afraid', 'tense'],
-        'confident': ['confident', 'proud', 'strong', 'capable', 'sure', 'certain', 'determined'],
-        'grateful': ['grateful', 'thankful', 'blessed', 'appreciate', 'thank', 'gratitude'],
-        'surprised': ['surprised', 'shocked', 'amazed', 'astonished', 'unexpected', 'wow'],
-        'hopeful': ['hopeful', 'hope', 'optimistic', 'positive', 'future', 'dream', 'aspire']
-    }
-    
-    # Count emotional keywords in transcript
-    emotion_counts = {}
-    for emotion, keywords in emotion_categories.items():
-        count = sum(1 for keyword in keywords if keyword in transcript_lower)
-        if count > 0:
-            emotion_counts[emotion] = count
-    
-    # Convert to list of emotional keywords
-    emotional_keywords = []
-    for emotion, count in emotion_counts.items():
-        emotional_keywords.append(emotion)
-        # Add some variations based on count
-        if count > 2:
-            emotional_keywords.append(f"strong_{emotion}")
-        if count > 5:
-            emotional_keywords.append(f"intense_{emotion}")
-    
-    return emotional_keywords
-
 if __name__ == "__main__":
+    if '--startup-report' in sys.argv:
+        # Cold-start cost of importing this module in a fresh interpreter (python -X importtime)
+        print(format_startup_report(startup_report('app')))
+        sys.exit(0)
+
     # Initialize database and users table
-    init_database()
-    ensure_users_table()
+    ensure_database()
     
     print("🚀 Starting Footage Flow Backend Server...")
     print("📍 Server will run on: http://127.0.0.1:5000")
@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+
+# Structured, leveled logging for the backend.
+#   log = get_logger(__name__)
+#   log.debug("Search returned %d results", len(results), video_id=video_id)
+# Messages use %-style args and are only formatted when a record is emitted, so a
+# disabled level costs one boolean check. Keyword arguments become structured
+# fields (key=value in text mode, top-level keys with LOG_FORMAT=json).
+# DEBUG can be switched on for a single request with the X-Debug-Log header when
+# it matches LOG_DEBUG_TOKEN; per-item messages in loops go through
+# debug_sampled() so that even then only one in LOG_SAMPLE_EVERY is written.
+
+_request_debug = contextvars.ContextVar('request_debug', default=False)
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+_RESERVED = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'fields'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, request_id, structured fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        fields = dict(getattr(record, 'fields', None) or {})
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            fields = {'request_id': request_id, **fields}
+        if fields:
+            suffix = ' '.join(f"{key}={value}" for key, value in fields.items())
+            text = f"{text} [{suffix}]" if '\n' not in text else text.replace('\n', f" [{suffix}]\n", 1)
+        return text
+
+
+class _RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get()
+        return True
+
+
+def configure_logging(level=None, fmt=None, stream=None):
+    """Install the root handler (idempotent): LOG_LEVEL (default info), LOG_FORMAT text|json"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        level_name = (level or os.getenv('LOG_LEVEL', 'info')).upper()
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(JsonFormatter() if (fmt or os.getenv('LOG_FORMAT', 'text')).lower() == 'json'
+                             else TextFormatter())
+        handler.addFilter(_RequestContextFilter())
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(getattr(logging, level_name, logging.INFO))
+        _configured = True
+
+
+class StructuredLogger:
+    """Thin wrapper over a stdlib logger adding fields, per-request DEBUG and sampling"""
+
+    def __init__(self, name, sample_every=None):
+        self._logger = logging.getLogger(name)
+        self.sample_every = max(1, int(sample_every if sample_every is not None
+                                       else os.getenv('LOG_SAMPLE_EVERY', '100')))
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+
+    @property
+    def name(self):
+        return self._logger.name
+
+    @property
+    def debug_enabled(self):
+        """Guard for debug output whose arguments are expensive to compute"""
+        return self.is_enabled(logging.DEBUG)
+
+    def is_enabled(self, level):
+        return self._logger.isEnabledFor(level) or (level >= logging.DEBUG and _request_debug.get())
+
+    def log(self, level, msg, *args, exc_info=None, **fields):
+        if not self.is_enabled(level):
+            return
+        # stacklevel 3: caller -> debug/info/... -> log
+        fn, lno, func, _ = self._logger.findCaller(stack_info=False, stacklevel=3)
+        if exc_info is True:
+            exc_info = sys.exc_info()
+        record = self._logger.makeRecord(self._logger.name, level, fn, lno, msg, args, exc_info, func,
+                                         {'fields': {k: v for k, v in fields.items() if k not in _RESERVED}})
+        # handle() applies filters/handlers without re-checking the logger level, which
+        # is what lets a debug-enabled request through while the logger stays at INFO
+        self._logger.handle(record)
+
+    def debug(self, msg, *args, **fields):
+        self.log(logging.DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(logging.INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(logging.WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, **fields)
+
+    def exception(self, msg, *args, **fields):
+        self.log(logging.ERROR, msg, *args, exc_info=True, **fields)
+
+    def sampled(self, key, every=None):
+        """True for the 1st, (N+1)th, (2N+1)th... call with this key"""
+        every = every or self.sample_every
+        with self._counts_lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % every == 0
+
+    def debug_sampled(self, key, msg, *args, every=None, **fields):
+        """DEBUG for per-item messages in loops: at most one in `every` calls per key is written"""
+        if self.is_enabled(logging.DEBUG) and self.sampled(key, every):
+            self.log(logging.DEBUG, msg, *args, sample_key=key, **fields)
+
+
+class Lazy:
+    """Log argument computed only if the record is emitted: Lazy(' '.join, cmd)"""
+
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+
+    def __str__(self):
+        return str(self.fn(*self.args))
+
+    __repr__ = __str__
+
+
+_loggers = {}
+
+
+def get_logger(name):
+    logger = _loggers.get(name)
+    if logger is None:
+        logger = _loggers.setdefault(name, StructuredLogger(name))
+    return logger
+
+
+def init_request_logging(app):
+    """
+    Tag log records with a request id (X-Request-ID or a generated one, echoed back)
+    and enable DEBUG for the request when X-Debug-Log matches LOG_DEBUG_TOKEN.
+    """
+    from flask import request, g
+
+    debug_token = os.getenv('LOG_DEBUG_TOKEN', '')
+    access_log = get_logger('access')
+
+    @app.before_request
+    def _start_request_logging():
+        g.log_request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])[:64]
+        g.log_started = time.perf_counter()
+        g.log_tokens = [
+            _request_id.set(g.log_request_id),
+            _request_debug.set(bool(debug_token) and request.headers.get('X-Debug-Log') == debug_token)
+        ]
+
+    @app.after_request
+    def _finish_request_logging(response):
+        request_id = getattr(g, 'log_request_id', None)
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+            access_log.debug("%s %s -> %s", request.method, request.path, response.status_code,
+                             duration_ms=round((time.perf_counter() - g.log_started) * 1000, 1))
+        return response
+
+    @app.teardown_request
+    def _reset_request_logging(exc=None):
+        tokens = getattr(g, 'log_tokens', None)
+        if tokens:
+            g.log_tokens = None
+            try:
+                _request_debug.reset(tokens[1])
+                _request_id.reset(tokens[0])
+            except ValueError:
+                # Streamed responses may finish in another context; the values die with it
+                pass
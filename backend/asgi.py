@@ -0,0 +1,223 @@
+import os
+import sys
+import asyncio
+import tempfile
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ASGI serving mode: one event loop accepts connections, and each request runs the Flask
+# app on one of two thread pools:
+#   - an I/O pool (ASYNC_IO_WORKERS, default 64) for light routes that mostly wait on disk,
+#     SQLite or Gemini (/videos, /search, /global-search, /tags, /transcript/<id>, stories)
+#   - a small CPU pool (ASYNC_CPU_WORKERS, default 2) for heavy routes (ASYNC_HEAVY_PATHS:
+#     uploads, Whisper, renders, visual tagging, clip extraction)
+# so a long render can no longer hold up hundreds of light requests. Request bodies are
+# spooled to a temp file past ASYNC_SPOOL_BYTES, and streamed (SSE) responses are relayed
+# chunk by chunk. All calls for one response (start, each chunk, close) run in one copied
+# context, so Flask's stream_with_context keeps its app/request context across pool threads.
+# Run with an ASGI server, e.g.
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+#   gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:application
+
+DEFAULT_HEAVY_PATHS = ('/upload', '/transcribe', '/render-story', '/generate-tags', '/generate_tags',
+                       '/extract-clip', '/batch/generate-tags')
+
+_DONE = object()
+
+
+def _is_heavy(path, heavy_paths):
+    return any(path == prefix or path.startswith(prefix + '/') or path.startswith(prefix + '-')
+               for prefix in heavy_paths)
+
+
+def build_environ(scope, body, body_size=None):
+    """
+    PEP 3333 environ for an ASGI http scope; body is a readable file positioned at 0.
+    body_size (the fully read body) sets CONTENT_LENGTH, so chunked uploads are readable.
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.input_terminated': True,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        if name == 'TRANSFER_ENCODING' and body_size is not None:
+            # The server already de-chunked the body, which is now fully read: CONTENT_LENGTH describes it
+            continue
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    if body_size is not None:
+        environ['CONTENT_LENGTH'] = str(body_size)
+    return environ
+
+
+class _WSGICall:
+    """One WSGI invocation, driven from the event loop but executed on pool threads in one context"""
+
+    def __init__(self, wsgi_app, environ):
+        self.wsgi_app = wsgi_app
+        self.environ = environ
+        # Successive calls may land on different threads; context variables set by the
+        # app (e.g. Flask's app/request context in a streamed response) must follow them
+        self.context = contextvars.copy_context()
+        self.status = None
+        self.headers = None
+        self.written = []
+        self.iterable = None
+        self.iterator = None
+
+    def start_response(self, status, headers, exc_info=None):
+        if exc_info and self.status is not None:
+            raise exc_info[1].with_traceback(exc_info[2])
+        self.status = status
+        self.headers = headers
+        return self.written.append
+
+    def start(self):
+        """Call the app and produce the first chunk(s): (chunks, finished)"""
+        self.iterable = self.wsgi_app(self.environ, self.start_response)
+        if isinstance(self.iterable, (list, tuple)):
+            # Buffered responses (most Flask responses) cross the thread boundary once
+            return self.written + list(self.iterable), True
+        self.iterator = iter(self.iterable)
+        # Generators may call start_response lazily, on their first chunk
+        return self.written + [self.next_chunk()], False
+
+    def next_chunk(self):
+        return next(self.iterator, _DONE)
+
+    def close(self):
+        close = getattr(self.iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+class AsyncGateway:
+    """ASGI application serving a WSGI app from I/O and CPU thread pools"""
+
+    def __init__(self, wsgi_app, io_workers=None, cpu_workers=None, heavy_paths=None, spool_bytes=None):
+        self.wsgi_app = wsgi_app
+        self.io_workers = int(io_workers if io_workers is not None else os.getenv('ASYNC_IO_WORKERS', '64'))
+        self.cpu_workers = int(cpu_workers if cpu_workers is not None else os.getenv('ASYNC_CPU_WORKERS', '2'))
+        if heavy_paths is None:
+            configured = os.getenv('ASYNC_HEAVY_PATHS', '')
+            heavy_paths = [p.strip() for p in configured.split(',') if p.strip()] or DEFAULT_HEAVY_PATHS
+        self.heavy_paths = tuple(heavy_paths)
+        self.spool_bytes = int(spool_bytes if spool_bytes is not None else os.getenv('ASYNC_SPOOL_BYTES', str(1024 * 1024)))
+        self.io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix='asgi-io')
+        self.cpu_pool = ThreadPoolExecutor(max_workers=self.cpu_workers, thread_name_prefix='asgi-cpu')
+
+    def pool_for(self, path):
+        return self.cpu_pool if _is_heavy(path, self.heavy_paths) else self.io_pool
+
+    def status(self):
+        return {'ioWorkers': self.io_workers, 'cpuWorkers': self.cpu_workers, 'heavyPaths': list(self.heavy_paths)}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.io_pool.shutdown(wait=False)
+                self.cpu_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None, 0
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        size = body.tell()
+        body.seek(0)
+        return body, size
+
+    async def _http(self, scope, receive, send):
+        body, size = await self._read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self.pool_for(scope['path'])
+        call = _WSGICall(self.wsgi_app, build_environ(scope, body, size))
+        try:
+            chunks, finished = await loop.run_in_executor(pool, call.context.run, call.start)
+            status_code = int(call.status.split(' ', 1)[0])
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in call.headers]
+            await send({'type': 'http.response.start', 'status': status_code, 'headers': headers})
+            for chunk in chunks:
+                if chunk is not _DONE and chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not finished and chunks[-1] is not _DONE:
+                while True:
+                    chunk = await loop.run_in_executor(pool, call.context.run, call.next_chunk)
+                    if chunk is _DONE:
+                        break
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            # Closing the iterable runs generator cleanup (e.g. a batch stream cancels its pending jobs)
+            await loop.run_in_executor(pool, call.context.run, call.close)
+            body.close()
+
+
+def create_application(wsgi_app=None):
+    """ASGI app for the Flask backend (imports app.py unless a WSGI app is given)"""
+    if wsgi_app is None:
+        from app import app as wsgi_app
+    gateway = AsyncGateway(wsgi_app)
+    logger.info("ASGI gateway: %d I/O workers, %d CPU workers", gateway.io_workers, gateway.cpu_workers)
+    return gateway
+
+
+_application = None
+
+
+def __getattr__(name):
+    # `asgi:application` builds the gateway (and imports app.py) when the server first looks it up
+    global _application
+    if name == 'application':
+        if _application is None:
+            _application = create_application()
+        return _application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,592 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the media pipeline, run against the bundled test_clip.mp4.
+
+Times upload ingestion, audio extraction, Whisper transcription per model size,
+frame extraction, tagging, /search over synthetic long transcripts, the story
+fallback generators and rendering at several scene counts. Gemini is replaced by
+an in-process mock (schema-shaped JSON, optional fixed latency), so no network or
+API key is needed. The app runs in a throwaway working directory.
+
+    python benchmark.py                                   # everything -> benchmark_results.json
+    python benchmark.py --only search,story --repeat 10
+    python benchmark.py --whisper-models tiny.en,base.en
+    python benchmark.py --save-baseline benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json  # exit 1 on a regression
+
+Benchmarks whose requirements are missing (ffmpeg, faster-whisper, a model that
+cannot be loaded offline) are reported as skipped rather than failing the run.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_CLIP = os.path.join(BACKEND_DIR, 'test_clip.mp4')
+RESULTS_VERSION = 1
+
+SEARCH_TRANSCRIPT_WORDS = (1000, 10000, 50000)
+RENDER_SCENE_COUNTS = (1, 3, 6)
+SEARCH_VOCABULARY = ('journey', 'mountain', 'river', 'city', 'morning', 'friends', 'laughing', 'quiet', 'sunset',
+                     'road', 'music', 'coffee', 'dog', 'beach', 'storm', 'garden', 'train', 'window', 'family',
+                     'market', 'bicycle', 'snow', 'forest', 'night', 'festival', 'kitchen', 'story', 'dream')
+
+
+class Skip(Exception):
+    """Raised by a benchmark whose requirements are not available here"""
+
+
+class MockResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class MockModels:
+    """Stands in for genai.Client().models: schema-shaped JSON for JSON mode, plain text otherwise"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _text(self, config):
+        schema = _config_value(config, 'response_schema')
+        if _config_value(config, 'response_mime_type') == 'application/json':
+            return json.dumps(_example_for_schema(schema or {'type': 'OBJECT'}))
+        return ("A calm morning turns into a journey along the river; friends laugh, the city wakes, "
+                "and the day closes with a quiet sunset.")
+
+    def generate_content(self, model=None, contents=None, config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return MockResponse(self._text(config))
+
+    def generate_content_stream(self, model=None, contents=None, config=None, **kwargs):
+        text = self.generate_content(model=model, contents=contents, config=config).text
+        for start in range(0, len(text), 40):
+            yield MockResponse(text[start:start + 40])
+
+    def get(self, model=None, **kwargs):
+        return {'name': model}
+
+
+class MockGeminiClient:
+    def __init__(self, latency=0.0):
+        self.models = MockModels(latency)
+
+
+def _config_value(config, name):
+    if config is None:
+        return None
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+
+def _example_for_schema(schema, name=''):
+    """Small valid instance of a Gemini response_schema"""
+    kind = str(schema.get('type', 'OBJECT')).upper()
+    if schema.get('enum'):
+        return schema['enum'][0]
+    if kind == 'OBJECT':
+        return {key: _example_for_schema(sub, key) for key, sub in (schema.get('properties') or {}).items()}
+    if kind == 'ARRAY':
+        items = schema.get('items') or {'type': 'STRING'}
+        return [_example_for_schema(items, f"{name}{i}") for i in range(3)]
+    if kind == 'INTEGER':
+        return 1
+    if kind == 'NUMBER':
+        return 0.8
+    if kind == 'BOOLEAN':
+        return True
+    seed = sum(map(ord, name))
+    words = SEARCH_VOCABULARY
+    return f"{words[seed % len(words)]} {words[(seed * 7 + 3) % len(words)]}"
+
+
+def synthetic_transcript(word_count, seed=0):
+    """Deterministic transcript text and word timestamps (0.4s per word)"""
+    words = []
+    timestamps = []
+    vocabulary = SEARCH_VOCABULARY
+    for i in range(word_count):
+        word = vocabulary[(i * 31 + seed * 17 + (i // 7)) % len(vocabulary)]
+        words.append(word)
+        timestamps.append({'word': word, 'start_time': round(i * 0.4, 2), 'end_time': round(i * 0.4 + 0.35, 2),
+                           'confidence': 0.9})
+    return ' '.join(words), timestamps
+
+
+def prepare_offline_app(workspace, mock_latency_ms):
+    """Point the app at the workspace and make its start-up offline; must run before `import app`"""
+    os.environ.update({
+        'UPLOAD_FOLDER': os.path.join(workspace, 'uploads'),
+        'GEMINI_API_KEY': '',
+        'GEMINI_CACHE_ENABLED': 'false',
+        'GEMINI_RPM': '1000000',
+        'GEMINI_BURST': '1000000',
+        'GEMINI_HEALTH_INTERVAL': '0',
+        'GENERATION_BACKEND': 'gemini',
+        'FRAME_EMBEDDING_ENABLED': 'false',
+        'TRACE_EXPORTER': 'none',
+        'LOG_LEVEL': os.getenv('BENCH_LOG_LEVEL', 'warning')
+    })
+    os.chdir(workspace)
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    import app as app_module
+    # Mocked Gemini: a configured provider whose client is the in-process mock
+    provider = app_module.gemini_provider
+    provider.api_key = 'benchmark'
+    provider._client = MockGeminiClient(latency=mock_latency_ms / 1000.0)
+    return app_module
+
+
+class BenchmarkContext:
+    """Shared state for one run: the app module, a Flask test client and a seeded video"""
+
+    def __init__(self, app_module, workspace):
+        self.app = app_module
+        self.client = app_module.app.test_client()
+        self.workspace = workspace
+        self.upload_dir = app_module.UPLOAD_FOLDER
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self.clip_path = os.path.join(self.upload_dir, 'benchmark_clip.mp4')
+        shutil.copyfile(TEST_CLIP, self.clip_path)
+        self._seeded = {}
+
+    def require_ffmpeg(self):
+        if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+            raise Skip('ffmpeg/ffprobe not on PATH')
+
+    def clip_duration(self):
+        self.require_ffmpeg()
+        duration = self.app.get_video_duration(self.clip_path)
+        if not duration:
+            raise Skip('could not probe test_clip.mp4')
+        return duration
+
+    def seed_video(self, transcript='', word_timestamps=None, key=None):
+        """Metadata (JSON + DB row) for a video backed by the test clip; returns its id"""
+        key = key or f"clip:{len(transcript)}"
+        if key in self._seeded:
+            return self._seeded[key]
+        video_id = f"bench-{uuid.uuid4().hex[:12]}"
+        metadata = {
+            'videoId': video_id,
+            'userId': 'benchmark',
+            'userEmail': 'benchmark@localhost',
+            'filename': 'test_clip.mp4',
+            'localPath': self.clip_path,
+            'fileSize': os.path.getsize(self.clip_path),
+            'fileType': 'mp4',
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'status': 'transcribed',
+            'duration': None,
+            'transcript': transcript,
+            'word_timestamps': word_timestamps or [],
+            'visual_tags': [{'tag': 'video', 'confidence': 0.8}]
+        }
+        # Seeding runs outside a request, so before_request has not created the tables yet
+        self.app.ensure_database()
+        # The videos table stores word timestamps as JSON text, like /transcribe does
+        row = dict(metadata, word_timestamps=json.dumps(word_timestamps) if word_timestamps else None)
+        if not self.app.save_video_metadata(row):
+            raise RuntimeError(f"could not seed video metadata for {video_id}")
+        self.app.write_metadata_json(os.path.join(self.upload_dir, f"{video_id}_metadata.json"), metadata)
+        self._seeded[key] = video_id
+        return video_id
+
+
+def wait_for_background_threads(before, timeout=120.0):
+    """Let daemon work started by a request (e.g. upload previews) finish so it does not skew the next run"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        extra = [t for t in threading.enumerate() if t not in before and t.is_alive() and t.daemon
+                 and not t.name.startswith(('gemini-health', 'trace-exporter', 'ThreadPoolExecutor', 'batch', 'llm'))]
+        if not extra:
+            return
+        time.sleep(0.05)
+
+
+# --- benchmark definitions: (name, group, params, setup(ctx) -> state, run(ctx, state, i)) ---
+
+def _upload_setup(ctx):
+    ctx.require_ffmpeg()
+    return None
+
+
+def _upload_run(ctx, state, i):
+    before = set(threading.enumerate())
+    with open(TEST_CLIP, 'rb') as f:
+        response = ctx.client.post('/upload', data={'video': (f, 'test_clip.mp4')},
+                                   content_type='multipart/form-data')
+    if response.status_code != 200:
+        raise RuntimeError(f"/upload returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return lambda: wait_for_background_threads(before)
+
+
+def _audio_setup(ctx):
+    ctx.require_ffmpeg()
+    return os.path.join(ctx.workspace, 'bench_audio.wav')
+
+
+def _audio_run(ctx, audio_path, i):
+    # Same command as the /transcribe audio pass
+    subprocess.run(['ffmpeg', '-i', ctx.clip_path, '-vn', '-acodec', 'pcm_s16le', '-ar', '16000', '-ac', '1',
+                    audio_path, '-y'], check=True, capture_output=True)
+
+
+def _whisper_setup_for(model_size):
+    def setup(ctx):
+        ctx.require_ffmpeg()
+        try:
+            from faster_whisper import WhisperModel
+        except Exception:
+            raise Skip('faster-whisper not installed')
+        audio_path = os.path.join(ctx.workspace, 'bench_whisper.wav')
+        if not os.path.exists(audio_path):
+            _audio_run(ctx, audio_path, 0)
+        started = time.perf_counter()
+        try:
+            model = WhisperModel(model_size, device='cpu', compute_type=os.getenv('WHISPER_COMPUTE_TYPE', 'int8'))
+        except Exception as e:
+            raise Skip(f"model {model_size} not loadable (offline?): {str(e)[:120]}")
+        return {'model': model, 'audio': audio_path, 'load_seconds': round(time.perf_counter() - started, 4)}
+    return setup
+
+
+def _whisper_run(ctx, state, i):
+    segments, info = state['model'].transcribe(state['audio'], beam_size=1, best_of=1, temperature=0.0,
+                                               condition_on_previous_text=False, word_timestamps=False,
+                                               vad_filter=False, language='en')
+    # Segments are decoded lazily
+    list(segments)
+
+
+def _frames_setup(ctx):
+    ctx.require_ffmpeg()
+    return ctx.app.get_visual_tagging_service()
+
+
+def _frames_run(ctx, service, i):
+    video_id = f"bench-frames-{i}"
+    frames = service.extract_frames_from_video(ctx.clip_path, video_id, fps=1.0)
+    if not frames:
+        raise RuntimeError('no frames extracted')
+    return lambda: shutil.rmtree(os.path.join('tmp_frames', video_id), ignore_errors=True)
+
+
+def _tag_video_setup(ctx):
+    ctx.require_ffmpeg()
+    transcript, timestamps = synthetic_transcript(600)
+    return ctx.seed_video(transcript, timestamps, key='tagging')
+
+
+def _tag_video_run(ctx, video_id, i):
+    body, status = ctx.app._tag_video(video_id)
+    if status != 200:
+        raise RuntimeError(f"_tag_video returned {status}: {body}")
+
+
+def _text_tags_setup(ctx):
+    return synthetic_transcript(5000)[0]
+
+
+def _text_tags_run(ctx, text, i):
+    ctx.app.generate_intelligent_tags_from_text(f"{text} run{i}")
+
+
+def _search_setup_for(word_count):
+    def setup(ctx):
+        transcript, timestamps = synthetic_transcript(word_count, seed=word_count)
+        return ctx.seed_video(transcript, timestamps, key=f"search:{word_count}")
+    return setup
+
+
+def _search_run(ctx, video_id, i):
+    query = ('friends laughing by the river', 'sunset', 'quiet morning coffee')[i % 3]
+    response = ctx.client.post('/search', json={'query': query, 'videoId': video_id})
+    if response.status_code != 200:
+        raise RuntimeError(f"/search returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+
+def _story_setup(ctx):
+    transcript, timestamps = synthetic_transcript(2000)
+    tags = [{'tag': word, 'confidence': 0.8} for word in SEARCH_VOCABULARY[:12]]
+    return {'transcript': transcript, 'timestamps': timestamps, 'tags': tags}
+
+
+def _story_mock_run(ctx, state, i):
+    # A distinct prompt per run, so the template memo does not turn this into a cache benchmark
+    ctx.app.generate_mock_story(state['transcript'], state['timestamps'], state['tags'],
+                                f"a hopeful journey {i}", 'bench-story', 'inspirational')
+
+
+def _story_content_run(ctx, state, i):
+    ctx.app._generate_content_based_story_fallback(state['transcript'], state['tags'], [], 'inspirational',
+                                                   f"focus {i}")
+
+
+def _story_inspirational_run(ctx, state, i):
+    ctx.app._generate_enhanced_inspirational_story_fallback(f"overcoming a storm {i}", 'inspirational')
+
+
+def _story_journey_run(ctx, state, i):
+    ctx.app._generate_emotional_journey_fallback(f"{state['transcript'][:4000]} {i}")
+
+
+def _render_setup_for(scene_count):
+    def setup(ctx):
+        duration = ctx.clip_duration()
+        span = duration / scene_count
+        scenes = [{'start': round(n * span, 2), 'end': round(min(duration, n * span + max(0.5, span * 0.8)), 2)}
+                  for n in range(scene_count)]
+        return {'scenes': scenes, 'info': ctx.app.get_video_info(ctx.clip_path)}
+    return setup
+
+
+def _render_run_for(scene_count):
+    def run(ctx, state, i):
+        output_path = os.path.join(ctx.workspace, f"bench_render_{scene_count}_{i}.mp4")
+        if not ctx.app.render_video_with_scenes(ctx.clip_path, state['scenes'], output_path,
+                                                transition_duration=0.5, video_info=state['info']):
+            raise RuntimeError('render_video_with_scenes failed')
+        return lambda: os.path.exists(output_path) and os.remove(output_path)
+    return run
+
+
+def build_benchmarks(whisper_models):
+    benchmarks = [
+        ('upload.ingest', 'upload', {}, _upload_setup, _upload_run),
+        ('audio.extract', 'audio', {}, _audio_setup, _audio_run),
+    ]
+    for model_size in whisper_models:
+        benchmarks.append((f"whisper.transcribe[{model_size}]", 'whisper', {'model': model_size},
+                           _whisper_setup_for(model_size), _whisper_run))
+    benchmarks += [
+        ('frames.extract', 'frames', {'fps': 1.0}, _frames_setup, _frames_run),
+        ('tagging.video', 'tagging', {'gemini': 'mock'}, _tag_video_setup, _tag_video_run),
+        ('tagging.text_fallback', 'tagging', {'words': 5000}, _text_tags_setup, _text_tags_run),
+    ]
+    for word_count in SEARCH_TRANSCRIPT_WORDS:
+        benchmarks.append((f"search.transcript[{word_count}]", 'search', {'words': word_count},
+                           _search_setup_for(word_count), _search_run))
+    benchmarks += [
+        ('story.mock_story', 'story', {}, _story_setup, _story_mock_run),
+        ('story.content_fallback', 'story', {}, _story_setup, _story_content_run),
+        ('story.inspirational_fallback', 'story', {}, _story_setup, _story_inspirational_run),
+        ('story.emotional_journey_fallback', 'story', {}, _story_setup, _story_journey_run),
+    ]
+    for scene_count in RENDER_SCENE_COUNTS:
+        benchmarks.append((f"render.scenes[{scene_count}]", 'render', {'scenes': scene_count},
+                           _render_setup_for(scene_count), _render_run_for(scene_count)))
+    return benchmarks
+
+
+def run_benchmark(ctx, name, group, params, setup, run, repeat, warmup):
+    result = {'group': group, 'params': dict(params)}
+    try:
+        state = setup(ctx)
+        if isinstance(state, dict) and 'load_seconds' in state:
+            result['params']['loadSeconds'] = state['load_seconds']
+        timings = []
+        for i in range(warmup + repeat):
+            started = time.perf_counter()
+            cleanup = run(ctx, state, i)
+            elapsed = time.perf_counter() - started
+            if callable(cleanup):
+                cleanup()
+            if i >= warmup:
+                timings.append(elapsed)
+    except Skip as e:
+        result.update({'status': 'skipped', 'reason': str(e)})
+        return result
+    except Exception as e:
+        result.update({'status': 'error', 'reason': f"{type(e).__name__}: {str(e)[:300]}"})
+        return result
+    result.update({
+        'status': 'ok',
+        'runs': len(timings),
+        'median': round(statistics.median(timings), 6),
+        'mean': round(statistics.fmean(timings), 6),
+        'min': round(min(timings), 6),
+        'max': round(max(timings), 6),
+        'stdev': round(statistics.stdev(timings), 6) if len(timings) > 1 else 0.0
+    })
+    return result
+
+
+def environment_info():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'ffmpeg': None,
+        'gitCommit': None
+    }
+    try:
+        info['ffmpeg'] = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True,
+                                        timeout=10).stdout.splitlines()[0]
+    except Exception:
+        pass
+    try:
+        info['gitCommit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                           cwd=BACKEND_DIR, timeout=10).stdout.strip() or None
+    except Exception:
+        pass
+    return info
+
+
+def compare_to_baseline(results, baseline, tolerance, min_delta):
+    """
+    Per benchmark: median vs the baseline median. A regression is slower by more than
+    `tolerance` (fraction) and by more than `min_delta` seconds, so sub-millisecond
+    noise on the fast benchmarks does not fail a run.
+    """
+    rows = []
+    baseline_results = baseline.get('results', {})
+    for name in sorted(set(results) | set(baseline_results)):
+        current = results.get(name) or {'status': 'missing'}
+        previous = baseline_results.get(name) or {'status': 'missing'}
+        row = {
+            'name': name,
+            'baseline': previous['median'] if previous['status'] == 'ok' else None,
+            'current': current['median'] if current['status'] == 'ok' else None,
+            'ratio': None
+        }
+        if row['current'] is None:
+            row['status'] = current['status']
+        elif row['baseline'] is None:
+            row['status'] = 'new'
+        else:
+            delta = row['current'] - row['baseline']
+            row['ratio'] = round(row['current'] / row['baseline'], 3) if row['baseline'] else None
+            ratio = row['ratio'] if row['ratio'] is not None else 1.0
+            if delta > min_delta and ratio > 1 + tolerance:
+                row['status'] = 'regression'
+            elif -delta > min_delta and ratio < 1 - tolerance:
+                row['status'] = 'improvement'
+            else:
+                row['status'] = 'ok'
+        rows.append(row)
+    return rows
+
+
+def format_results(results):
+    lines = [f"{'benchmark':42} {'median':>10} {'min':>10} {'max':>10}  runs"]
+    for name, result in results.items():
+        if result['status'] == 'ok':
+            lines.append(f"{name:42} {result['median']:10.4f} {result['min']:10.4f} {result['max']:10.4f}  {result['runs']}")
+        else:
+            lines.append(f"{name:42} {result['status']}: {result.get('reason', '')}")
+    return '\n'.join(lines)
+
+
+def format_comparison(rows):
+    lines = [f"{'benchmark':42} {'baseline':>10} {'current':>10} {'ratio':>7}  status"]
+    for row in rows:
+        baseline = f"{row['baseline']:.4f}" if row['baseline'] is not None else '-'
+        current = f"{row['current']:.4f}" if row['current'] is not None else '-'
+        ratio = f"{row['ratio']:.2f}x" if row['ratio'] is not None else '-'
+        lines.append(f"{row['name']:42} {baseline:>10} {current:>10} {ratio:>7}  {row['status']}")
+    return '\n'.join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Offline media pipeline benchmarks (Gemini mocked)')
+    parser.add_argument('--only', default='', help='comma-separated groups or benchmark names '
+                        '(upload, audio, whisper, frames, tagging, search, story, render)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark (default 3)')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs before timing (default 1)')
+    parser.add_argument('--whisper-models', default='tiny.en', help='comma-separated faster-whisper model sizes')
+    parser.add_argument('--mock-latency-ms', type=float, default=0.0, help='simulated Gemini latency per call')
+    parser.add_argument('--output', default='benchmark_results.json', help='results file (default benchmark_results.json)')
+    parser.add_argument('--baseline', help='compare against this results file; exit 1 on a regression')
+    parser.add_argument('--save-baseline', help='also write the results to this path as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown as a fraction (default 0.25)')
+    parser.add_argument('--min-delta', type=float, default=0.005, help='ignore differences below this many seconds')
+    parser.add_argument('--keep-workspace', action='store_true', help='keep the temporary working directory')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.exists(TEST_CLIP):
+        print(f"Test clip not found: {TEST_CLIP}")
+        return 2
+    original_cwd = os.getcwd()
+
+    def resolve(path):
+        return path if os.path.isabs(path) else os.path.join(original_cwd, path)
+
+    workspace = tempfile.mkdtemp(prefix='footage-bench-')
+    try:
+        app_module = prepare_offline_app(workspace, args.mock_latency_ms)
+        ctx = BenchmarkContext(app_module, workspace)
+        selected = {item.strip() for item in args.only.split(',') if item.strip()}
+        whisper_models = [size.strip() for size in args.whisper_models.split(',') if size.strip()]
+
+        results = {}
+        for name, group, params, setup, run in build_benchmarks(whisper_models):
+            if selected and group not in selected and name not in selected:
+                continue
+            print(f"▶ {name}", flush=True)
+            results[name] = run_benchmark(ctx, name, group, params, setup, run, max(1, args.repeat),
+                                          max(0, args.warmup))
+        report = {
+            'version': RESULTS_VERSION,
+            'createdAt': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'environment': environment_info(),
+            'config': {'repeat': args.repeat, 'warmup': args.warmup, 'whisperModels': whisper_models,
+                       'mockLatencyMs': args.mock_latency_ms,
+                       'mockGeminiCalls': app_module.gemini_provider._client.models.calls},
+            'results': results
+        }
+    finally:
+        os.chdir(original_cwd)
+        if not args.keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+        else:
+            print(f"Workspace kept at {workspace}")
+
+    print()
+    print(format_results(results))
+    for path in filter(None, (args.output, args.save_baseline)):
+        path = resolve(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+        print(f"\nResults written to {path}")
+
+    if args.baseline:
+        with open(resolve(args.baseline), 'r') as f:
+            baseline = json.load(f)
+        rows = compare_to_baseline(results, baseline, args.tolerance, args.min_delta)
+        print()
+        print(format_comparison(rows))
+        regressions = [row['name'] for row in rows if row['status'] == 'regression']
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TranscriptCondenser:
+    """
+    Map-reduce condensation of long transcripts into a bounded-size digest for prompts.
+    The timestamped transcript is cut into chunks, each chunk is summarized in parallel
+    (map), and the time-anchored summaries are merged until they fit `max_chars` (reduce).
+    Every digest line keeps its [start-end] anchor in seconds, so downstream prompts can
+    place scenes anywhere in the video instead of only in the first minute.
+
+    Digests are cached by transcript content under cache_dir, so repeated story calls
+    for a video cost no model calls. When the model is unavailable an extractive digest
+    (the head of every chunk) is returned instead and not cached.
+    """
+
+    def __init__(self, client=None, model='gemini-2.5-flash', cache_dir=None, max_chars=None,
+                 chunk_words=None, max_workers=None):
+        self.client = client
+        self.model = model
+        self.cache_dir = cache_dir or os.path.join('uploads', 'transcript_summaries')
+        self.max_chars = int(max_chars if max_chars is not None else os.getenv('TRANSCRIPT_DIGEST_MAX_CHARS', '1500'))
+        self.chunk_words = int(chunk_words if chunk_words is not None else os.getenv('TRANSCRIPT_CHUNK_WORDS', '300'))
+        self.max_workers = int(max_workers if max_workers is not None else os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+        self._memory = OrderedDict()
+        self._memory_entries = 128
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _word_time(entry, key):
+        value = entry.get(key)
+        if value is None:
+            value = entry.get('timestamp')
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def chunk_transcript(self, transcript, word_timestamps=None):
+        """Split into [{'start', 'end', 'text'}] chunks of about chunk_words words (times None if unknown)"""
+        chunk_words = max(20, self.chunk_words)
+        words = [w for w in (word_timestamps or []) if isinstance(w, dict) and str(w.get('word', '')).strip()]
+        chunks = []
+        if words:
+            for i in range(0, len(words), chunk_words):
+                group = words[i:i + chunk_words]
+                chunks.append({
+                    'start': self._word_time(group[0], 'start_time'),
+                    'end': self._word_time(group[-1], 'end_time'),
+                    'text': ' '.join(str(w['word']).strip() for w in group)
+                })
+            return chunks
+
+        tokens = (transcript or '').split()
+        for i in range(0, len(tokens), chunk_words):
+            chunks.append({'start': None, 'end': None, 'text': ' '.join(tokens[i:i + chunk_words])})
+        return chunks
+
+    @staticmethod
+    def _anchor(start, end):
+        if start is None or end is None:
+            return ''
+        return f"[{start:.1f}s-{end:.1f}s] "
+
+    def _summarize(self, text, start, end, max_sentences=2):
+        span = f" (from {start:.1f}s to {end:.1f}s)" if start is not None and end is not None else ''
+        prompt = (
+            f"Summarize this segment of a video transcript{span} in at most {max_sentences} sentences. "
+            "Keep names, concrete actions, objects and emotional turns; do not add anything not in the text. "
+            "Return plain text only.\n\n"
+            f"SEGMENT:\n{text}"
+        )
+        response = self.client.models.generate_content(model=self.model, contents=prompt)
+        summary = ' '.join((getattr(response, 'text', '') or '').split())
+        if not summary:
+            raise ValueError('Empty summary')
+        return summary
+
+    def _summarize_all(self, items):
+        """Summarize [(text, start, end)] in parallel; the model executor bounds real concurrency"""
+        workers = max(1, min(self.max_workers, len(items)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='condense') as pool:
+            return list(pool.map(lambda item: self._summarize(*item), items))
+
+    def _fit(self, segments, max_chars, min_line=40):
+        """
+        Digest lines of [{'start', 'end', 'text'}] segments within max_chars. Every line is
+        trimmed to an equal share of the budget, so coverage stays spread over the video;
+        when a share would be under min_line, neighbouring segments are first merged
+        evenly into fewer lines instead of dropping the end of the video.
+        """
+        lines = [self._anchor(s['start'], s['end']) + s['text'] for s in segments]
+        if len('\n'.join(lines)) <= max_chars:
+            return '\n'.join(lines)
+        count = max(1, min(len(segments), (max_chars + 1) // (min_line + 1)))
+        if count < len(segments):
+            groups = [segments[i * len(segments) // count:(i + 1) * len(segments) // count] for i in range(count)]
+            lines = [self._anchor(g[0]['start'], g[-1]['end']) + ' '.join(s['text'] for s in g) for g in groups]
+        share = max(1, (max_chars - (count - 1)) // count)
+        fitted = []
+        for line in lines:
+            if len(line) > share:
+                line = line[:share - 3].rstrip() + '...' if share > 3 else line[:share]
+            fitted.append(line)
+        return '\n'.join(fitted)
+
+    def _cache_key(self, transcript, anchored, max_chars):
+        payload = json.dumps({
+            'transcript': transcript,
+            'anchored': anchored,
+            'max_chars': max_chars,
+            'chunk_words': self.chunk_words,
+            'model': self.model
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _cache_get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        try:
+            with open(self._cache_path(key), 'r', encoding='utf-8') as f:
+                digest = f.read()
+            self._remember(key, digest)
+            return digest
+        except OSError:
+            return None
+
+    def _remember(self, key, digest):
+        with self._lock:
+            self._memory[key] = digest
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._memory_entries:
+                self._memory.popitem(last=False)
+
+    def _cache_set(self, key, digest):
+        self._remember(key, digest)
+        try:
+            path = self._cache_path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(digest)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to cache transcript digest: {str(e)}")
+
+    def condense(self, transcript, word_timestamps=None, max_chars=None):
+        """
+        Bounded-size digest of a transcript. Transcripts that already fit are returned
+        unchanged; longer ones become time-anchored summary lines (one per chunk or
+        merged group of chunks), at most max_chars long.
+        """
+        transcript = (transcript or '').strip()
+        max_chars = max_chars or self.max_chars
+        if len(transcript) <= max_chars:
+            return transcript
+
+        chunks = self.chunk_transcript(transcript, word_timestamps)
+        if not chunks:
+            return transcript[:max_chars]
+
+        # Keyed on the transcript and whether digest lines carry time anchors
+        key = self._cache_key(transcript, chunks[0]['start'] is not None, max_chars)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+
+        if not self.client:
+            return self._fit(chunks, max_chars)
+
+        try:
+            # Map: one short summary per chunk
+            summaries = self._summarize_all([(c['text'], c['start'], c['end']) for c in chunks])
+            segments = [{'start': c['start'], 'end': c['end'], 'text': s} for c, s in zip(chunks, summaries)]
+
+            # Reduce: merge neighbouring summaries until the digest fits (bounded rounds)
+            rounds = 0
+            while len('\n'.join(self._anchor(s['start'], s['end']) + s['text'] for s in segments)) > max_chars \
+                    and len(segments) > 1 and rounds < 3:
+                groups = [segments[i:i + 4] for i in range(0, len(segments), 4)]
+                merged = self._summarize_all([
+                    ('\n'.join(self._anchor(s['start'], s['end']) + s['text'] for s in group),
+                     group[0]['start'], group[-1]['end'])
+                    for group in groups
+                ])
+                segments = [{'start': g[0]['start'], 'end': g[-1]['end'], 'text': m} for g, m in zip(groups, merged)]
+                rounds += 1
+
+            digest = self._fit(segments, max_chars)
+            self._cache_set(key, digest)
+            logger.info(f"Condensed transcript {len(transcript)} -> {len(digest)} chars "
+                        f"({len(chunks)} chunks, {rounds} reduce rounds)")
+            return digest
+        except Exception as e:
+            logger.warning(f"Transcript condensation failed, using extractive digest: {str(e)}")
+            return self._fit(chunks, max_chars)
+
+
+def compact_tag_names(names, limit=25):
+    """Case-insensitive de-duplication of tag names, keeping first-seen order, capped at limit"""
+    seen = set()
+    compact = []
+    for name in names or []:
+        text = ' '.join(str(name).split())
+        if text and text.lower() not in seen:
+            seen.add(text.lower())
+            compact.append(text)
+            if len(compact) >= limit:
+                break
+    return compact
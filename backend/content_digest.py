@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import threading
+import logging
+from collections import Counter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIGEST_VERSION = 1
+
+EMOTION_CATEGORIES = {
+    'happy': ['happy', 'joy', 'fun', 'great', 'awesome', 'love', 'excited', 'wonderful', 'amazing', 'delight', 'smile', 'celebrate'],
+    'sad': ['sad', 'sorry', 'cry', 'bad', 'upset', 'lonely', 'pain', 'tears', 'loss', 'grief', 'depressed'],
+    'angry': ['angry', 'mad', 'furious', 'rage', 'annoyed', 'frustrated', 'irritated', 'furious'],
+    'calm': ['calm', 'relax', 'peace', 'serene', 'quiet', 'gentle', 'soothing', 'tranquil'],
+    'excited': ['excited', 'thrill', 'wow', 'incredible', 'epic', 'energy', 'hype', 'amazing'],
+    'nervous': ['nervous', 'anxious', 'worried', 'scared', 'fear', 'afraid', 'tense'],
+    'confident': ['confident', 'proud', 'strong', 'capable', 'sure', 'certain', 'determined'],
+    'grateful': ['grateful', 'thankful', 'blessed', 'appreciate', 'thank', 'gratitude'],
+    'surprised': ['surprised', 'shocked', 'amazed', 'astonished', 'unexpected', 'wow'],
+    'hopeful': ['hopeful', 'hope', 'optimistic', 'positive', 'future', 'dream', 'aspire']
+}
+
+STOPWORDS = {
+    'about', 'after', 'again', 'also', 'because', 'been', 'before', 'being', 'could', 'didn', 'does', 'doing',
+    'don', 'down', 'each', 'even', 'from', 'gonna', 'have', 'having', 'here', 'into', 'just', 'know', 'like',
+    'made', 'make', 'more', 'much', 'only', 'other', 'over', 'really', 'right', 'said', 'same', 'should',
+    'some', 'still', 'such', 'than', 'that', 'their', 'them', 'then', 'there', 'these', 'they', 'thing',
+    'things', 'think', 'this', 'those', 'through', 'very', 'want', 'well', 'were', 'what', 'when', 'where',
+    'which', 'while', 'will', 'with', 'would', 'yeah', 'your', 'going', 'okay', 'actually', 'maybe'
+}
+
+
+def count_emotions(text):
+    """Number of keyword hits per emotion category (only categories with hits)"""
+    text_lower = (text or '').lower()
+    counts = {}
+    for emotion, keywords in EMOTION_CATEGORIES.items():
+        count = sum(1 for keyword in keywords if keyword in text_lower)
+        if count > 0:
+            counts[emotion] = count
+    return counts
+
+
+def emotional_keywords_from_counts(emotion_counts):
+    """Emotion labels, with strong_/intense_ variants for frequent categories"""
+    keywords = []
+    for emotion, count in emotion_counts.items():
+        keywords.append(emotion)
+        if count > 2:
+            keywords.append(f"strong_{emotion}")
+        if count > 5:
+            keywords.append(f"intense_{emotion}")
+    return keywords
+
+
+def extract_keywords(text, limit=15):
+    """Most frequent content words (4+ letters, stopwords removed)"""
+    words = re.findall(r"[a-z][a-z']{3,}", (text or '').lower())
+    counts = Counter(w for w in words if w not in STOPWORDS)
+    return [word for word, _ in counts.most_common(limit)]
+
+
+def _load_word_timestamps(value):
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def _word_start(entry):
+    value = entry.get('start_time', entry.get('timestamp', 0))
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _unique_names(tags):
+    """Tag names from dict or string tags, case-insensitively de-duplicated in order"""
+    names = []
+    seen = set()
+    for tag in tags:
+        name = tag.get('tag', '') if isinstance(tag, dict) else tag
+        name = ' '.join(str(name or '').split())
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def build_content_digest(metadata, text_limit=8000):
+    """
+    Derive the prompt inputs shared by the story and tag endpoints from a video's
+    metadata: keywords, emotion counts, key moments at 25/50/75% of the words,
+    de-duplicated tag names, duration and the text used for text tagging.
+    """
+    transcription = metadata.get('transcription') if isinstance(metadata.get('transcription'), dict) else {}
+    transcript = transcription.get('transcript') or metadata.get('transcript') or ''
+    word_timestamps = _load_word_timestamps(transcription.get('word_timestamps') or metadata.get('word_timestamps'))
+    description = metadata.get('description') or ''
+
+    key_moments = []
+    total_words = len(word_timestamps)
+    for fraction in (0.25, 0.5, 0.75):
+        idx = int(total_words * fraction)
+        if idx < total_words and isinstance(word_timestamps[idx], dict):
+            moment = word_timestamps[idx]
+            timestamp = _word_start(moment)
+            key_moments.append({
+                'word': moment.get('word', ''),
+                'timestamp': timestamp,
+                'time_str': f"{timestamp:.1f}s"
+            })
+
+    visual_tag_names = _unique_names(metadata.get('visual_tags') or [])
+    tag_names = _unique_names(list(metadata.get('visual_tags') or []) + list(metadata.get('ai_text_tags') or []))
+
+    duration = metadata.get('duration')
+    try:
+        duration = float(duration) if duration is not None else 0.0
+    except (TypeError, ValueError):
+        duration = 0.0
+    if not duration and word_timestamps and isinstance(word_timestamps[-1], dict):
+        duration = float(word_timestamps[-1].get('end_time') or 0)
+
+    emotion_counts = count_emotions(transcript)
+    tag_text = ' '.join(t.strip() for t in (transcript, description) if isinstance(t, str) and t.strip())
+    return {
+        'version': DIGEST_VERSION,
+        'keywords': extract_keywords(transcript),
+        'emotion_counts': emotion_counts,
+        'emotional_keywords': emotional_keywords_from_counts(emotion_counts),
+        'key_moments': key_moments,
+        'visual_tag_names': visual_tag_names,
+        'tag_names': tag_names,
+        'duration': duration,
+        'word_count': len(transcript.split()),
+        'transcript_chars': len(transcript),
+        'timed_words': total_words,
+        'tag_text': tag_text[:text_limit]
+    }
+
+
+class ContentDigestStore:
+    """
+    Per-video content digests, computed once and reused by every story/tag request.
+    A digest is valid for the (mtime_ns, size) of the metadata file it was built from,
+    so any rewrite of the metadata invalidates it; lookups are a dict hit plus one stat.
+    Digests are also written to uploads/content_digests/{videoId}.json so they survive restarts.
+    """
+
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.path.join('uploads', 'content_digests')
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _path(self, video_id):
+        return os.path.join(self.base_dir, f"{video_id}.json")
+
+    @staticmethod
+    def _signature(metadata_path):
+        try:
+            stat = os.stat(metadata_path)
+            return [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            return None
+
+    def get(self, video_id, metadata_path, metadata=None):
+        """Current digest for a video, building (and storing) it if missing or stale; None if no metadata"""
+        signature = self._signature(metadata_path)
+        if signature is None:
+            return None
+        with self._lock:
+            entry = self._memory.get(video_id)
+        if entry and entry[0] == signature:
+            return entry[1]
+
+        try:
+            with open(self._path(video_id), 'r') as f:
+                stored = json.load(f)
+            if stored.get('signature') == signature and stored.get('digest', {}).get('version') == DIGEST_VERSION:
+                with self._lock:
+                    self._memory[video_id] = (signature, stored['digest'])
+                return stored['digest']
+        except (OSError, ValueError):
+            pass
+
+        return self.refresh(video_id, metadata_path, metadata)
+
+    def refresh(self, video_id, metadata_path, metadata=None):
+        """Rebuild the digest from the metadata file (or the already-loaded metadata dict)"""
+        try:
+            if metadata is None:
+                with open(metadata_path, 'r') as f:
+                    metadata = json.load(f)
+            signature = self._signature(metadata_path)
+            digest = build_content_digest(metadata)
+            with self._lock:
+                self._memory[video_id] = (signature, digest)
+
+            os.makedirs(self.base_dir, exist_ok=True)
+            path = self._path(video_id)
+            tmp_path = f"{path}.tmp{os.getpid()}"
+            with open(tmp_path, 'w') as f:
+                json.dump({'signature': signature, 'digest': digest}, f)
+            os.replace(tmp_path, path)
+            return digest
+        except Exception as e:
+            logger.warning(f"Failed to build content digest for {video_id}: {str(e)}")
+            return None
+
+    def invalidate(self, video_id):
+        with self._lock:
+            self._memory.pop(video_id, None)
+        try:
+            os.remove(self._path(video_id))
+        except OSError:
+            pass
@@ -0,0 +1,288 @@
+import os
+import threading
+import logging
+try:
+    import numpy as np
+except Exception:
+    np = None
+try:
+    import onnxruntime as ort
+except Exception:
+    ort = None
+try:
+    from tokenizers import Tokenizer
+except Exception:
+    Tokenizer = None
+try:
+    from PIL import Image
+except Exception:
+    Image = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# CLIP image preprocessing constants
+CLIP_IMAGE_SIZE = 224
+CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+CLIP_CONTEXT_LENGTH = 77
+CLIP_LOGIT_SCALE = 100.0
+
+DEFAULT_VOCABULARY = [
+    'person', 'people', 'child', 'crowd', 'face', 'dog', 'cat', 'bird', 'horse',
+    'car', 'bicycle', 'boat', 'airplane', 'train', 'street', 'city', 'building',
+    'house', 'room', 'kitchen', 'office', 'classroom', 'stage', 'restaurant',
+    'beach', 'ocean', 'lake', 'river', 'mountain', 'forest', 'park', 'garden',
+    'snow', 'desert', 'sky', 'sunset', 'night', 'rain', 'food', 'drink',
+    'computer', 'phone', 'book', 'screen', 'text', 'music', 'guitar', 'sports',
+    'football', 'running', 'dancing', 'cooking', 'meeting', 'presentation',
+    'wedding', 'party', 'celebration', 'family', 'smile', 'laughing'
+]
+
+
+class FrameEmbeddingStore:
+    """
+    Persist per-frame embedding vectors with their timestamps for semantic frame search.
+    Stored as local numpy archives under {base_dir}/{videoId}_embeddings.npz
+    """
+
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.path.join('uploads', 'frame_embeddings')
+        self._lock = threading.Lock()
+
+    def _path(self, video_id):
+        return os.path.join(self.base_dir, f"{video_id}_embeddings.npz")
+
+    def load(self, video_id):
+        """Return (timestamps, vectors) arrays for a video, or (None, None)"""
+        try:
+            path = self._path(video_id)
+            if np is None or not os.path.exists(path):
+                return None, None
+            with np.load(path) as data:
+                return data['timestamps'], data['vectors']
+        except Exception as e:
+            logger.warning(f"Failed to load frame embeddings for {video_id}: {str(e)}")
+            return None, None
+
+    def save(self, video_id, timestamps, vectors):
+        """Merge new (timestamp, vector) rows into the stored set; newer rows win"""
+        if np is None or vectors is None or len(timestamps) == 0:
+            return
+        with self._lock:
+            try:
+                rows = {}
+                old_timestamps, old_vectors = self.load(video_id)
+                if old_timestamps is not None and old_vectors.shape[1] == vectors.shape[1]:
+                    for ts, vec in zip(old_timestamps, old_vectors):
+                        rows[round(float(ts), 3)] = vec
+                for ts, vec in zip(timestamps, vectors):
+                    rows[round(float(ts), 3)] = vec
+                ordered = sorted(rows)
+                os.makedirs(self.base_dir, exist_ok=True)
+                path = self._path(video_id)
+                tmp_path = f"{path}.tmp.npz"
+                np.savez(tmp_path,
+                         timestamps=np.asarray(ordered, dtype=np.float32),
+                         vectors=np.stack([rows[ts] for ts in ordered]).astype(np.float32))
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error(f"Failed to save frame embeddings for {video_id}: {str(e)}")
+
+    def search(self, video_id, query_vector, top_k=10):
+        """Return [{'timestamp', 'score'}] of the frames most similar to query_vector"""
+        timestamps, vectors = self.load(video_id)
+        if timestamps is None or len(timestamps) == 0 or vectors.shape[1] != query_vector.shape[0]:
+            return []
+        scores = vectors @ query_vector
+        order = np.argsort(-scores)[:top_k]
+        return [{'timestamp': float(timestamps[i]), 'score': float(scores[i])} for i in order]
+
+    def delete(self, video_id):
+        try:
+            path = self._path(video_id)
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.warning(f"Failed to delete frame embeddings for {video_id}: {str(e)}")
+
+
+class FrameEmbeddingService:
+    """
+    On-box CPU image/text embedding with a CLIP-style ONNX model pair (int8-quantized
+    exports work as-is). Frames are embedded in batches, labeled zero-shot against a
+    configurable vocabulary and their vectors kept for semantic frame search.
+
+    Expected files in FRAME_EMBEDDING_MODEL_DIR: image_encoder.onnx, text_encoder.onnx,
+    tokenizer.json (HuggingFace tokenizers format). The first output of each encoder
+    must be the projected embedding (image_embeds / text_embeds).
+    """
+
+    def __init__(self, model_dir=None, vocabulary=None, store=None):
+        self.model_dir = model_dir or os.environ.get('FRAME_EMBEDDING_MODEL_DIR', os.path.join('models', 'clip'))
+        self.batch_size = max(1, int(os.environ.get('FRAME_EMBEDDING_BATCH_SIZE', '16')))
+        self.num_threads = max(1, int(os.environ.get('FRAME_EMBEDDING_THREADS', '2')))
+        self.min_label_score = float(os.environ.get('FRAME_EMBEDDING_MIN_SCORE', '0.1'))
+        self.vocabulary = vocabulary or self._load_vocabulary()
+        self.store = store or FrameEmbeddingStore()
+
+        self._image_session = None
+        self._text_session = None
+        self._tokenizer = None
+        self._vocabulary_vectors = None
+        self._load_lock = threading.Lock()
+        self._load_failed = False
+
+    def _load_vocabulary(self):
+        """Vocabulary from FRAME_EMBEDDING_VOCABULARY_FILE (one label per line) or FRAME_EMBEDDING_VOCABULARY (comma list)"""
+        vocab_file = os.environ.get('FRAME_EMBEDDING_VOCABULARY_FILE')
+        if vocab_file and os.path.exists(vocab_file):
+            with open(vocab_file, 'r') as f:
+                labels = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            if labels:
+                return labels
+        vocab_env = os.environ.get('FRAME_EMBEDDING_VOCABULARY', '')
+        labels = [label.strip() for label in vocab_env.split(',') if label.strip()]
+        return labels or list(DEFAULT_VOCABULARY)
+
+    def _model_path(self, name):
+        return os.path.join(self.model_dir, name)
+
+    def is_available(self):
+        """True when the runtime dependencies and model files are present"""
+        if self._load_failed or np is None or ort is None or Tokenizer is None or Image is None:
+            return False
+        return all(os.path.exists(self._model_path(name))
+                   for name in ('image_encoder.onnx', 'text_encoder.onnx', 'tokenizer.json'))
+
+    def _ensure_loaded(self):
+        """Create ONNX sessions and tokenizer on first use"""
+        if self._image_session is not None:
+            return True
+        with self._load_lock:
+            if self._image_session is not None:
+                return True
+            if not self.is_available():
+                return False
+            try:
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = self.num_threads
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                providers = ['CPUExecutionProvider']
+                text_session = ort.InferenceSession(self._model_path('text_encoder.onnx'), options, providers=providers)
+                tokenizer = Tokenizer.from_file(self._model_path('tokenizer.json'))
+                tokenizer.enable_truncation(max_length=CLIP_CONTEXT_LENGTH)
+                tokenizer.enable_padding(length=CLIP_CONTEXT_LENGTH)
+                image_session = ort.InferenceSession(self._model_path('image_encoder.onnx'), options, providers=providers)
+                self._text_session = text_session
+                self._tokenizer = tokenizer
+                self._image_session = image_session
+                logger.info(f"Frame embedding model loaded from {self.model_dir} "
+                            f"({len(self.vocabulary)} vocabulary labels)")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to load frame embedding model: {str(e)}")
+                self._load_failed = True
+                return False
+
+    @staticmethod
+    def _normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _preprocess(self, image_path):
+        """Resize shorter side to 224, center crop, CLIP-normalize; returns CHW float32"""
+        with Image.open(image_path) as img:
+            img = img.convert('RGB')
+            width, height = img.size
+            scale = CLIP_IMAGE_SIZE / min(width, height)
+            img = img.resize((max(CLIP_IMAGE_SIZE, round(width * scale)), max(CLIP_IMAGE_SIZE, round(height * scale))),
+                             Image.BICUBIC)
+            left = (img.size[0] - CLIP_IMAGE_SIZE) // 2
+            top = (img.size[1] - CLIP_IMAGE_SIZE) // 2
+            img = img.crop((left, top, left + CLIP_IMAGE_SIZE, top + CLIP_IMAGE_SIZE))
+            pixels = np.asarray(img, dtype=np.float32) / 255.0
+        pixels = (pixels - np.asarray(CLIP_MEAN, dtype=np.float32)) / np.asarray(CLIP_STD, dtype=np.float32)
+        return pixels.transpose(2, 0, 1)
+
+    def embed_images(self, image_paths):
+        """Embed image files in batches; returns an (N, D) L2-normalized array or None"""
+        if not image_paths or not self._ensure_loaded():
+            return None
+        input_name = self._image_session.get_inputs()[0].name
+        batches = []
+        for i in range(0, len(image_paths), self.batch_size):
+            pixel_values = np.stack([self._preprocess(path) for path in image_paths[i:i + self.batch_size]])
+            outputs = self._image_session.run(None, {input_name: pixel_values})
+            batches.append(outputs[0].astype(np.float32))
+        return self._normalize(np.concatenate(batches, axis=0))
+
+    def embed_texts(self, texts):
+        """Embed text strings; returns an (N, D) L2-normalized array or None"""
+        if not texts or not self._ensure_loaded():
+            return None
+        encodings = self._tokenizer.encode_batch(list(texts))
+        feed = {}
+        for model_input in self._text_session.get_inputs():
+            if model_input.name == 'attention_mask':
+                feed[model_input.name] = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+            else:
+                feed[model_input.name] = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        outputs = self._text_session.run(None, feed)
+        return self._normalize(outputs[0].astype(np.float32))
+
+    def _get_vocabulary_vectors(self):
+        """Vocabulary prompt embeddings, computed once per process"""
+        if self._vocabulary_vectors is None:
+            self._vocabulary_vectors = self.embed_texts([f"a photo of {label}" for label in self.vocabulary])
+        return self._vocabulary_vectors
+
+    def zero_shot_labels(self, image_vectors, top_k=5):
+        """Label each embedded frame against the vocabulary; returns [[{'tag', 'score'}], ...]"""
+        vocabulary_vectors = self._get_vocabulary_vectors()
+        if image_vectors is None or vocabulary_vectors is None:
+            return []
+        logits = CLIP_LOGIT_SCALE * (image_vectors @ vocabulary_vectors.T)
+        logits -= logits.max(axis=1, keepdims=True)
+        probabilities = np.exp(logits)
+        probabilities /= probabilities.sum(axis=1, keepdims=True)
+
+        frame_labels = []
+        for row in probabilities:
+            labels = []
+            for index in np.argsort(-row)[:top_k]:
+                if row[index] < self.min_label_score:
+                    break
+                labels.append({'tag': self.vocabulary[index], 'score': float(row[index])})
+            frame_labels.append(labels)
+        return frame_labels
+
+    def embedded_timestamps(self, video_id):
+        """Timestamps of the frames that already have a stored vector"""
+        timestamps, _ = self.store.load(video_id)
+        return [] if timestamps is None else [float(ts) for ts in timestamps]
+
+    def embed_frames(self, video_id, frames):
+        """Embed extracted frames ([{'path', 'timestamp'}]) and store their vectors; returns the vectors or None"""
+        vectors = self.embed_images([frame['path'] for frame in frames])
+        if vectors is not None:
+            self.store.save(video_id, [frame['timestamp'] for frame in frames], vectors)
+        return vectors
+
+    def analyze_frame_batch(self, video_id, frames):
+        """
+        Embed a batch of extracted frames ([{'path', 'timestamp'}]), store their vectors
+        and return zero-shot labels for each frame in the same order
+        """
+        vectors = self.embed_frames(video_id, frames)
+        if vectors is None:
+            return [[] for _ in frames]
+        return self.zero_shot_labels(vectors)
+
+    def search_frames(self, video_id, query, top_k=10):
+        """Semantic frame search: [{'timestamp', 'score'}] for frames matching a text query"""
+        query_vectors = self.embed_texts([query])
+        if query_vectors is None:
+            return []
+        return self.store.search(video_id, query_vectors[0], top_k=top_k)
@@ -11,11 +11,15 @@ import time
 import logging
 import tempfile
 import shutil
+import threading
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Dict, Optional, Tuple
 import cv2
 import numpy as np
 
+from media_tools import find_ffmpeg, find_ffprobe
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -42,50 +46,18 @@ class UniversalVideoProcessor:
         self.ffmpeg_path = self._find_ffmpeg()
         self.ffprobe_path = self._find_ffprobe()
         
-    def _find_ffmpeg(self) -> Optional[str]:
-        """Find FFmpeg executable with multiple fallback paths"""
-        # Try system PATH first
-        import shutil
-        ffmpeg_path = shutil.which('ffmpeg')
-        if ffmpeg_path:
-            return ffmpeg_path
-            
-        # Try common installation paths
-        common_paths = [
-            "C:\\ffmpeg\\bin\\ffmpeg.exe",
-            "C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe",
-            "/usr/bin/ffmpeg",
-            "/usr/local/bin/ffmpeg",
-            "/opt/homebrew/bin/ffmpeg"
-        ]
+        # Parsed ffprobe output memoized by (path, mtime, size)
+        self._probe_cache = OrderedDict()
+        self._probe_cache_size = 256
+        self._probe_lock = threading.Lock()
         
-        for path in common_paths:
-            if os.path.exists(path):
-                return path
-                
-        return None
+    def _find_ffmpeg(self) -> Optional[str]:
+        """Find FFmpeg executable (PATH, then common installation paths; resolved once per process)"""
+        return find_ffmpeg()
         
     def _find_ffprobe(self) -> Optional[str]:
         """Find FFprobe executable"""
-        import shutil
-        ffprobe_path = shutil.which('ffprobe')
-        if ffprobe_path:
-            return ffprobe_path
-            
-        # Try common installation paths
-        common_paths = [
-            "C:\\ffmpeg\\bin\\ffprobe.exe",
-            "C:\\Program Files\\ffmpeg\\bin\\ffprobe.exe",
-            "/usr/bin/ffprobe",
-            "/usr/local/bin/ffprobe",
-            "/opt/homebrew/bin/ffprobe"
-        ]
-        
-        for path in common_paths:
-            if os.path.exists(path):
-                return path
-                
-        return None
+        return find_ffprobe()
     
     def is_video_supported(self, file_path: str) -> bool:
         """Check if video format is supported (always returns True for universal compatibility)"""
@@ -105,8 +77,61 @@ class UniversalVideoProcessor:
             logger.warning(f"Error checking video support: {e}")
             return True  # Assume supported for universal compatibility
     
+    def probe(self, file_path: str) -> Optional[Dict]:
+        """
+        Run `ffprobe -show_streams -show_format -of json` once per file version.
+        Results are memoized by (path, mtime, size), so a re-uploaded or edited file
+        is probed again while every other caller reuses the parsed output.
+        """
+        if not self.ffprobe_path:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError as e:
+            logger.warning(f"Cannot probe missing file {file_path}: {e}")
+            return None
+        cache_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        
+        with self._probe_lock:
+            if cache_key in self._probe_cache:
+                self._probe_cache.move_to_end(cache_key)
+                return self._probe_cache[cache_key]
+        
+        try:
+            cmd = [
+                self.ffprobe_path,
+                '-v', 'quiet',
+                '-show_streams',
+                '-show_format',
+                '-of', 'json',
+                file_path
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=60)
+            data = json.loads(result.stdout or '{}')
+        except Exception as e:
+            logger.warning(f"FFprobe failed for {file_path}: {e}")
+            return None
+        
+        with self._probe_lock:
+            self._probe_cache[cache_key] = data
+            self._probe_cache.move_to_end(cache_key)
+            while len(self._probe_cache) > self._probe_cache_size:
+                self._probe_cache.popitem(last=False)
+        return data
+    
+    @staticmethod
+    def _parse_frame_rate(rate: str) -> Optional[float]:
+        """Parse ffprobe rates like '30000/1001' without eval"""
+        try:
+            if '/' in rate:
+                num, den = rate.split('/', 1)
+                return float(num) / float(den) if float(den) else None
+            return float(rate)
+        except (TypeError, ValueError):
+            return None
+    
     def get_video_info(self, file_path: str) -> Dict:
-        """Get comprehensive video information using multiple methods"""
+        """Get comprehensive video information from the cached ffprobe probe (OpenCV/basic fallbacks)"""
         info = {
             'duration': None,
             'width': None,
@@ -116,19 +141,21 @@ class UniversalVideoProcessor:
             'size': None,
             'has_audio': False,
             'has_video': False,
-            'codec': None
+            'codec': None,
+            'audio_codec': None
         }
         
         try:
             # Get file size
             info['size'] = os.path.getsize(file_path)
             
-            # Method 1: Use FFprobe (most reliable)
-            if self.ffprobe_path:
-                info = self._get_info_with_ffprobe(file_path, info)
+            # Method 1: Parse the cached FFprobe output (most reliable)
+            data = self.probe(file_path)
+            if data:
+                info = self._get_info_from_probe(data, info)
             
-            # Method 2: Use OpenCV as fallback
-            if not info['duration'] or not info['width']:
+            # Method 2: Use OpenCV only when ffprobe is unavailable or failed
+            if data is None and (not info['duration'] or not info['width']):
                 info = self._get_info_with_opencv(file_path, info)
                 
             # Method 3: Use basic file analysis
@@ -140,41 +167,33 @@ class UniversalVideoProcessor:
             
         return info
     
-    def _get_info_with_ffprobe(self, file_path: str, info: Dict) -> Dict:
-        """Get video info using FFprobe"""
+    def _get_info_from_probe(self, data: Dict, info: Dict) -> Dict:
+        """Fill video info from parsed ffprobe JSON"""
         try:
-            cmd = [
-                self.ffprobe_path,
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_streams',
-                file_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            data = json.loads(result.stdout)
-            
             # Extract format info
             if 'format' in data:
                 format_info = data['format']
-                info['duration'] = float(format_info.get('duration', 0))
+                if format_info.get('duration'):
+                    info['duration'] = float(format_info['duration'])
                 info['format'] = format_info.get('format_name', '').split(',')[0]
             
             # Extract stream info
-            if 'streams' in data:
-                for stream in data['streams']:
-                    if stream.get('codec_type') == 'video':
-                        info['has_video'] = True
-                        info['width'] = int(stream.get('width', 0))
-                        info['height'] = int(stream.get('height', 0))
-                        info['fps'] = eval(stream.get('r_frame_rate', '0/1'))
-                        info['codec'] = stream.get('codec_name', '')
-                    elif stream.get('codec_type') == 'audio':
-                        info['has_audio'] = True
+            for stream in data.get('streams', []):
+                if stream.get('codec_type') == 'video' and not info['has_video']:
+                    info['has_video'] = True
+                    info['width'] = int(stream.get('width', 0))
+                    info['height'] = int(stream.get('height', 0))
+                    info['fps'] = self._parse_frame_rate(stream.get('avg_frame_rate') or '') \
+                        or self._parse_frame_rate(stream.get('r_frame_rate', '0/1'))
+                    info['codec'] = stream.get('codec_name', '')
+                    if not info['duration'] and stream.get('duration'):
+                        info['duration'] = float(stream['duration'])
+                elif stream.get('codec_type') == 'audio' and not info['has_audio']:
+                    info['has_audio'] = True
+                    info['audio_codec'] = stream.get('codec_name', '')
                         
         except Exception as e:
-            logger.warning(f"FFprobe info extraction failed: {e}")
+            logger.warning(f"FFprobe info parsing failed: {e}")
             
         return info
     
@@ -212,20 +231,22 @@ class UniversalVideoProcessor:
         return info
     
     def extract_frames_universal(self, video_path: str, video_id: str, 
-                                fps: float = 0.5, max_frames: int = 10) -> List[Dict]:
+                                fps: float = 0.5, max_frames: int = 10,
+                                video_info: Optional[Dict] = None) -> List[Dict]:
         """
-        Extract frames from ANY video format with multiple fallback methods
+        Extract frames from ANY video format with multiple fallback methods.
+        Pass video_info from get_video_info() to avoid reopening the container.
         """
         frame_files = []
         
         try:
             # Method 1: FFmpeg (primary method)
-            if self.ffmpeg_path:
+            if self.ffmpeg_path and (video_info is None or video_info.get('has_video', True)):
                 frame_files = self._extract_frames_ffmpeg(video_path, video_id, fps, max_frames)
             
             # Method 2: OpenCV fallback
             if not frame_files:
-                frame_files = self._extract_frames_opencv(video_path, video_id, fps, max_frames)
+                frame_files = self._extract_frames_opencv(video_path, video_id, fps, max_frames, video_info)
             
             # Method 3: Generate placeholder frames
             if not frame_files:
@@ -255,6 +276,7 @@ class UniversalVideoProcessor:
                 self.ffmpeg_path,
                 '-i', video_path,
                 '-vf', f'fps={fps}',
+                '-frames:v', str(max_frames),  # Stop decoding once enough frames are out
                 '-q:v', '2',
                 '-y',
                 output_pattern
@@ -291,7 +313,8 @@ class UniversalVideoProcessor:
             return []
     
     def _extract_frames_opencv(self, video_path: str, video_id: str, 
-                              fps: float, max_frames: int) -> List[Dict]:
+                              fps: float, max_frames: int,
+                              video_info: Optional[Dict] = None) -> List[Dict]:
         """Extract frames using OpenCV as fallback"""
         try:
             frames_dir = os.path.join('tmp_frames', video_id)
@@ -302,7 +325,7 @@ class UniversalVideoProcessor:
                 return []
             
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            video_fps = cap.get(cv2.CAP_PROP_FPS)
+            video_fps = (video_info or {}).get('fps') or cap.get(cv2.CAP_PROP_FPS)
             
             if total_frames <= 0 or video_fps <= 0:
                 cap.release()
@@ -393,8 +416,9 @@ class UniversalVideoProcessor:
             # Step 1: Get video information
             result['video_info'] = self.get_video_info(video_path)
             
-            # Step 2: Extract frames
-            result['frames'] = self.extract_frames_universal(video_path, video_id)
+            # Step 2: Extract frames (reusing the probe instead of reopening the file)
+            result['frames'] = self.extract_frames_universal(video_path, video_id,
+                                                             video_info=result['video_info'])
             
             # Step 3: Generate basic tags
             result['tags'] = self._generate_basic_tags(result['video_info'], result['frames'])
@@ -467,6 +491,10 @@ def process_any_video(video_path: str, video_id: str) -> Dict:
     """
     return universal_processor.process_video_universal(video_path, video_id)
 
+def get_video_info(file_path: str) -> Dict:
+    """Cached video information (single ffprobe per file version)"""
+    return universal_processor.get_video_info(file_path)
+
 def is_video_supported(file_path: str) -> bool:
     """Check if video is supported (always returns True for universal compatibility)"""
     return universal_processor.is_video_supported(file_path)
\ No newline at end of file
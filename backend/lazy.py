@@ -0,0 +1,149 @@
+import os
+import re
+import sys
+import json
+import time
+import importlib
+import threading
+import subprocess
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Heavy SDKs/models are imported on first use instead of at worker boot; the
+# first-use cost of each is recorded here for the startup report.
+_load_times = {}
+_load_lock = threading.Lock()
+
+
+def record_load(name, seconds):
+    with _load_lock:
+        _load_times[name] = round(seconds, 4)
+
+
+def load_times():
+    """{module or model name: seconds spent loading it on first use} for this process"""
+    with _load_lock:
+        return dict(_load_times)
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access.
+    Truthiness tries the import, so `if cv2:` style availability checks keep working
+    (a failed optional import is remembered and the proxy is falsy).
+    """
+
+    def __init__(self, name, optional=True):
+        self.__dict__['_name'] = name
+        self.__dict__['_optional'] = optional
+        self.__dict__['_module'] = None
+        self.__dict__['_error'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None and self._error is None:
+                started = time.perf_counter()
+                try:
+                    self.__dict__['_module'] = importlib.import_module(self._name)
+                    record_load(self._name, time.perf_counter() - started)
+                except Exception as e:
+                    self.__dict__['_error'] = e
+                    if self._optional:
+                        logger.warning(f"Optional module {self._name} not available: {str(e)}")
+        if self._module is None:
+            raise ImportError(f"{self._name} is not available: {self._error}")
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __bool__(self):
+        try:
+            self._load()
+            return True
+        except ImportError:
+            return False
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else ('failed' if self._error else 'not loaded')
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name, optional=True):
+    return LazyModule(name, optional=optional)
+
+
+_IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+_REPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print('STARTUP_REPORT ' + json.dumps({{'seconds': elapsed, 'modules': len(sys.modules)}}))\n"
+)
+
+
+def startup_report(module='app', top=15, cwd=None):
+    """
+    Import `module` in a fresh interpreter under `python -X importtime` and summarize it:
+    wall time of the import, number of loaded modules and the slowest of its direct imports.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _REPORT_SCRIPT.format(module=module)],
+        capture_output=True, text=True, cwd=cwd or os.path.dirname(os.path.abspath(__file__))
+    )
+    summary = {}
+    for line in result.stdout.splitlines():
+        if line.startswith('STARTUP_REPORT '):
+            summary = json.loads(line[len('STARTUP_REPORT '):])
+
+    # importtime lists nested imports before their parent, indented two spaces per level;
+    # keep the direct imports of `module` (cumulative, i.e. including what they import)
+    children = {}
+    direct = {}
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        name = match.group(4)
+        if depth == 1:
+            children[name] = int(match.group(2)) / 1e6
+        elif depth == 0:
+            if name == module:
+                direct = children
+            children = {}
+
+    slowest = sorted(direct.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'module': module,
+        'ok': result.returncode == 0,
+        'seconds': round(summary.get('seconds', 0.0), 3),
+        'modules': summary.get('modules', 0),
+        'slowest': [{'module': name, 'seconds': round(seconds, 3)} for name, seconds in slowest],
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode != 0 and result.stderr.strip() else None
+    }
+
+
+def format_startup_report(report):
+    lines = [f"Startup report for '{report['module']}': "
+             f"{report['seconds']:.3f}s, {report['modules']} modules loaded"]
+    if not report['ok']:
+        lines.append(f"  import failed: {report['error']}")
+    for entry in report['slowest']:
+        lines.append(f"  {entry['seconds']:8.3f}s  {entry['module']}")
+    return '\n'.join(lines)
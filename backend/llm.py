@@ -0,0 +1,809 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import LLM_CALL_SECONDS, current_call_site
+from tracing import span, tracer
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class GeminiUnavailableError(RuntimeError):
+    """Raised instead of calling Gemini while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed -> open after `failure_threshold` failures in a row; open -> half_open once
+    `reset_timeout` seconds passed (a single trial call is let through);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Gemini circuit closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_ignored(self):
+        """A call failed for reasons unrelated to service health (e.g. a bad request): frees a half-open trial"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Gemini circuit opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class CachedResponse:
+    """Minimal stand-in for a generate_content response served from cache"""
+
+    def __init__(self, text):
+        self.text = text
+        self.cached = True
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM text responses: an in-process LRU in front of a
+    persistent SQLite table. Entries expire after `ttl` seconds; both tiers are
+    size-bounded (least recently used entries are evicted first).
+    """
+
+    def __init__(self, db_path=None, ttl=None, memory_entries=None, max_entries=None, enabled=None):
+        self.db_path = db_path or os.getenv('GEMINI_CACHE_PATH', os.path.join(os.getcwd(), 'llm_cache.db'))
+        self.ttl = float(ttl if ttl is not None else os.getenv('GEMINI_CACHE_TTL', str(7 * 24 * 3600)))
+        self.memory_entries = int(memory_entries if memory_entries is not None
+                                  else os.getenv('GEMINI_CACHE_MEMORY_ENTRIES', '256'))
+        self.max_entries = int(max_entries if max_entries is not None
+                               else os.getenv('GEMINI_CACHE_MAX_ENTRIES', '5000'))
+        self.enabled = enabled if enabled is not None else os.getenv('GEMINI_CACHE_ENABLED', 'true').lower() == 'true'
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_ready = False
+        self._stores_since_prune = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+
+    @staticmethod
+    def _normalize_part(part):
+        """Stable text for one contents part: whitespace-collapsed text or a hash of binary data"""
+        if isinstance(part, str):
+            return ' '.join(part.split())
+        if isinstance(part, bytes):
+            return 'bytes:' + hashlib.sha256(part).hexdigest()
+        for attr in ('data', 'image_bytes'):
+            data = getattr(part, attr, None)
+            if isinstance(data, bytes):
+                return f"{type(part).__name__}:{getattr(part, 'mime_type', '')}:{hashlib.sha256(data).hexdigest()}"
+        inline = getattr(part, 'inline_data', None)
+        if inline is not None:
+            return ResponseCache._normalize_part(inline)
+        text = getattr(part, 'text', None)
+        if isinstance(text, str):
+            return ' '.join(text.split())
+        return repr(part)
+
+    def fingerprint(self, model, contents, config=None):
+        """Cache key from the model name, normalized prompt parts and generation config"""
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        payload = {
+            'model': model,
+            'contents': [self._normalize_part(part) for part in parts],
+            'config': repr(config) if config is not None else None
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._db_ready:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_access ON llm_responses(last_access)')
+            conn.commit()
+            self._db_ready = True
+        return conn
+
+    def _remember(self, key, text, created_at):
+        with self._lock:
+            self._memory[key] = (text, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Cached response text or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[0]
+            if entry:
+                del self._memory[key]
+        try:
+            conn = self._connect()
+            row = conn.execute('SELECT response, created_at FROM llm_responses WHERE key = ?', (key,)).fetchone()
+            if row and now - row[1] < self.ttl:
+                conn.execute('UPDATE llm_responses SET last_access = ? WHERE key = ?', (now, key))
+                conn.commit()
+                conn.close()
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.stats['disk_hits'] += 1
+                return row[0]
+            conn.close()
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+        with self._lock:
+            self.stats['misses'] += 1
+        return None
+
+    def set(self, key, model, text):
+        if not self.enabled or not text:
+            return
+        now = time.time()
+        self._remember(key, text, now)
+        try:
+            conn = self._connect()
+            conn.execute('''
+                INSERT OR REPLACE INTO llm_responses (key, model, response, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, text, now, now))
+            conn.commit()
+            with self._lock:
+                self.stats['stores'] += 1
+                self._stores_since_prune += 1
+                prune = self._stores_since_prune >= 50
+                if prune:
+                    self._stores_since_prune = 0
+            if prune:
+                self._prune(conn, now)
+            conn.close()
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+
+    def delete(self, key):
+        """Drop one entry from both tiers"""
+        with self._lock:
+            self._memory.pop(key, None)
+        if not self.enabled:
+            return
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM llm_responses WHERE key = ?', (key,))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            logger.warning(f"LLM cache delete failed: {str(e)}")
+            with self._lock:
+                self.stats['errors'] += 1
+
+    def _prune(self, conn, now):
+        """Drop expired rows, then least recently used rows beyond max_entries"""
+        expired = conn.execute('DELETE FROM llm_responses WHERE created_at < ?', (now - self.ttl,)).rowcount
+        overflow = conn.execute('''
+            DELETE FROM llm_responses WHERE key IN (
+                SELECT key FROM llm_responses ORDER BY last_access ASC
+                LIMIT MAX(0, (SELECT COUNT(*) FROM llm_responses) - ?)
+            )
+        ''', (self.max_entries,)).rowcount
+        conn.commit()
+        with self._lock:
+            self.stats['evictions'] += max(0, expired) + max(0, overflow)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+class TokenBucket:
+    """Token bucket limiter: `rate_per_minute` sustained, up to `burst` back-to-back"""
+
+    def __init__(self, rate_per_minute=60.0, burst=10):
+        self.rate = max(0.001, float(rate_per_minute)) / 60.0
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, timeout=None):
+        """Block until a token is available; False if that would take longer than timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return True
+                wait = (1.0 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(min(wait, 1.0))
+
+
+class LLMExecutor:
+    """
+    Shared executor for outgoing LLM calls: a bounded thread pool, a token bucket
+    matched to the API quota, single-flight coalescing of identical in-flight
+    requests and jittered exponential backoff on retryable errors.
+    """
+
+    RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, max_workers=None, rate_per_minute=None, burst=None, max_retries=None,
+                 base_delay=None, call_timeout=None):
+        self.max_workers = int(max_workers if max_workers is not None else os.getenv('GEMINI_MAX_CONCURRENCY', '4'))
+        self.bucket = TokenBucket(
+            rate_per_minute=float(rate_per_minute if rate_per_minute is not None else os.getenv('GEMINI_RPM', '60')),
+            burst=float(burst if burst is not None else os.getenv('GEMINI_BURST', '10'))
+        )
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv('GEMINI_MAX_RETRIES', '2'))
+        self.base_delay = float(base_delay if base_delay is not None else os.getenv('GEMINI_RETRY_BASE_DELAY', '1.0'))
+        self.call_timeout = float(call_timeout if call_timeout is not None else os.getenv('GEMINI_CALL_TIMEOUT', '120'))
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {'submitted': 0, 'coalesced': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0}
+
+    def _get_pool(self):
+        # Created on first use so forked workers do not inherit idle threads
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix='llm')
+        return self._pool
+
+    @classmethod
+    def is_retryable(cls, error):
+        if isinstance(error, GeminiUnavailableError):
+            return False
+        code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+        if isinstance(code, int):
+            return code in cls.RETRYABLE_CODES
+        name = type(error).__name__.lower()
+        return isinstance(error, (TimeoutError, ConnectionError)) or 'timeout' in name or 'unavailable' in name
+
+    def _run_with_retries(self, fn, on_give_up=None):
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(timeout=self.call_timeout):
+                with self._lock:
+                    self.stats['rate_limited'] += 1
+                raise GeminiUnavailableError('LLM rate limit budget exhausted')
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    with self._lock:
+                        self.stats['failed'] += 1
+                    if on_give_up is not None:
+                        on_give_up(e)
+                    raise
+                # Full jitter: sleep a random share of the exponential backoff window
+                delay = random.uniform(0, self.base_delay * (2 ** attempt))
+                attempt += 1
+                with self._lock:
+                    self.stats['retries'] += 1
+                logger.warning(f"LLM call failed ({str(e)}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+    def submit(self, key, fn, on_give_up=None):
+        """
+        Future for fn(); callers submitting the same key while it runs share one call.
+        on_give_up(error) runs once when the call fails for good (after any retries).
+        """
+        pool = self._get_pool()
+        with self._lock:
+            future = self._in_flight.get(key) if key else None
+            if future is not None:
+                self.stats['coalesced'] += 1
+                return future
+            self.stats['submitted'] += 1
+            future = pool.submit(self._run_with_retries, fn, on_give_up)
+            if key:
+                self._in_flight[key] = future
+        if key:
+            future.add_done_callback(lambda _f: self._forget(key, _f))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def run(self, key, fn, timeout=None, on_give_up=None):
+        """Submit and wait for the result (raises the call's exception)"""
+        return self.submit(key, fn, on_give_up).result(timeout=timeout or self.call_timeout)
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['in_flight'] = len(self._in_flight)
+        return stats
+
+
+class GeminiClientProvider:
+    """
+    Lazy, thread-safe owner of the google-genai client.
+    Nothing touches the network at import: the client is built on first use, a
+    daemon thread checks health in the background, and a circuit breaker makes
+    calls fail immediately (so callers drop to their fallbacks) while Gemini is down.
+    """
+
+    def __init__(self, api_key=None, model=None, failure_threshold=None, reset_timeout=None, health_interval=None,
+                 cache=None, executor=None):
+        self.api_key = api_key if api_key is not None else os.getenv('GEMINI_API_KEY')
+        self.model = model or os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+        self.health_interval = float(health_interval if health_interval is not None
+                                     else os.getenv('GEMINI_HEALTH_INTERVAL', '60'))
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(failure_threshold if failure_threshold is not None
+                                  else os.getenv('GEMINI_CIRCUIT_FAILURES', '3')),
+            reset_timeout=float(reset_timeout if reset_timeout is not None
+                                else os.getenv('GEMINI_CIRCUIT_RESET_SECONDS', '30'))
+        )
+        self.cache = cache if cache is not None else ResponseCache()
+        self.executor = executor if executor is not None else LLMExecutor()
+        self._client = None
+        self._client_error = None
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    @property
+    def configured(self):
+        return bool(self.api_key)
+
+    def get_client(self):
+        """Build the SDK client on first use (local only, no request is made)"""
+        if self._client is not None or not self.configured:
+            return self._client
+        with self._lock:
+            if self._client is None and self._client_error is None:
+                try:
+                    import google.genai as genai
+                    self._client = genai.Client(api_key=self.api_key)
+                    logger.info(f"Gemini client created for {self.model}")
+                except Exception as e:
+                    self._client_error = e
+                    logger.error(f"Gemini client creation failed: {str(e)}")
+        self._start_health_check()
+        return self._client
+
+    def is_available(self):
+        """Cheap check for call sites: configured, client built and circuit not open"""
+        return self.get_client() is not None and not self.breaker.is_open()
+
+    @staticmethod
+    def is_health_failure(error):
+        """Errors that say Gemini is unhealthy (server-side, timeouts, throttling), not bad requests or safety blocks"""
+        return LLMExecutor.is_retryable(error)
+
+    def record_outcome(self, error):
+        """Record one failed logical call (after retries) with the circuit breaker"""
+        if self.is_health_failure(error):
+            # A retried call whose half-open trial failed has already reopened the circuit
+            if self.breaker.state != CircuitBreaker.OPEN:
+                self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+
+    def call(self, fn, *args, **kwargs):
+        """Invoke fn(client, ...) through the circuit breaker (one call, no retries)"""
+        try:
+            return self.attempt(fn, *args, **kwargs)
+        except GeminiUnavailableError:
+            raise
+        except Exception as e:
+            self.record_outcome(e)
+            raise
+
+    def attempt(self, fn, *args, **kwargs):
+        """
+        One attempt of a call the executor may retry. Only a failed half-open trial is
+        recorded here (it reopens the circuit); the call's final error is recorded once
+        through record_outcome when the executor gives up.
+        """
+        client = self.get_client()
+        if client is None:
+            raise GeminiUnavailableError('Gemini is not configured')
+        if not self.breaker.allow():
+            raise GeminiUnavailableError('Gemini circuit is open')
+        try:
+            result = fn(client, *args, **kwargs)
+        except Exception as e:
+            if self.breaker.state == CircuitBreaker.HALF_OPEN:
+                if self.is_health_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_ignored()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def health_check(self):
+        """Probe the model metadata endpoint (no tokens billed) and update the breaker"""
+        client = self.get_client()
+        if client is None:
+            return False
+        try:
+            client.models.get(model=self.model)
+            self.breaker.record_success()
+            return True
+        except Exception as e:
+            logger.warning(f"Gemini health check failed: {str(e)}")
+            self.breaker.record_failure()
+            return False
+
+    def _start_health_check(self):
+        if self.health_interval <= 0 or self._health_thread is not None or self._client is None:
+            return
+        with self._lock:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name='gemini-health', daemon=True)
+            self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            # Re-probe soon after the circuit opens so it closes without waiting for traffic
+            wait = self.breaker.reset_timeout if self.breaker.state != CircuitBreaker.CLOSED else self.health_interval
+            time.sleep(max(1.0, wait))
+            self.health_check()
+
+    def status(self):
+        return {
+            'configured': self.configured,
+            'model': self.model,
+            'clientReady': self._client is not None,
+            'circuit': self.breaker.state,
+            'consecutiveFailures': self.breaker.failures,
+            'cache': self.cache.metrics(),
+            'executor': self.executor.metrics()
+        }
+
+
+def _span_attributes(backend, call_site, kwargs):
+    return {'llm.backend': backend, 'llm.call_site': call_site, 'llm.model': kwargs.get('model')}
+
+
+class _GeminiModelsProxy:
+    def __init__(self, provider):
+        self._provider = provider
+
+    def generate_content(self, cache=True, **kwargs):
+        """
+        generate_content through the response cache, then the shared executor
+        (rate limit, coalescing, retries) and the circuit breaker.
+        cache=False skips the response cache.
+        """
+        call_site = current_call_site()
+        started = time.perf_counter()
+        outcome = 'error'
+        with span('llm.generate_content', _span_attributes('gemini', call_site, kwargs), kind='client') as current:
+            try:
+                response = self._generate_content(cache, kwargs)
+                outcome = 'cached' if isinstance(response, CachedResponse) else 'ok'
+                return response
+            finally:
+                current.set_attribute('llm.outcome', outcome)
+                LLM_CALL_SECONDS.observe(time.perf_counter() - started, backend='gemini', call_site=call_site,
+                                         outcome=outcome)
+
+    def _generate_content(self, cache, kwargs):
+        provider = self._provider
+        response_cache = provider.cache
+        use_cache = cache and response_cache.enabled
+        key = response_cache.fingerprint(kwargs.get('model'), kwargs.get('contents'), kwargs.get('config'))
+        if use_cache:
+            cached_text = response_cache.get(key)
+            if cached_text is not None:
+                return CachedResponse(cached_text)
+
+        def invoke():
+            response = provider.attempt(lambda client: client.models.generate_content(**kwargs))
+            if use_cache:
+                try:
+                    response_cache.set(key, kwargs.get('model') or '', getattr(response, 'text', None))
+                except Exception as e:
+                    logger.warning(f"LLM cache store skipped: {str(e)}")
+            return response
+
+        # Cached and uncached calls must not share one in-flight request
+        return provider.executor.run(f"{key}:{'c' if use_cache else 'n'}", invoke, on_give_up=provider.record_outcome)
+
+    def generate_content_stream(self, cache=True, **kwargs):
+        """
+        Streaming generate_content: yields response chunks as they arrive.
+        A cached answer is replayed as a single chunk; otherwise the call takes a
+        rate-limit token, goes through the circuit breaker, and the concatenated
+        text is stored under the same key as generate_content once the stream ends.
+        Streams are not retried or coalesced, since chunks may already be delivered.
+        Latency is observed when the stream ends.
+        """
+        call_site = current_call_site()
+        started = time.perf_counter()
+        outcome = None
+        # Not made current: the generator suspends between chunks, in the consumer's context
+        current = tracer.start_span('llm.generate_content_stream', _span_attributes('gemini', call_site, kwargs),
+                                    kind='client')
+        try:
+            for chunk in self._generate_content_stream(cache, kwargs):
+                if outcome is None:
+                    outcome = 'cached' if isinstance(chunk, CachedResponse) else 'ok'
+                yield chunk
+            outcome = outcome or 'ok'
+        except GeneratorExit:
+            outcome = 'cancelled'
+            raise
+        except Exception as e:
+            outcome = 'error'
+            current.set_error(e)
+            raise
+        finally:
+            current.set_attribute('llm.outcome', outcome or 'error')
+            current.end()
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started, backend='gemini', call_site=call_site,
+                                     outcome=outcome or 'error')
+
+    def _generate_content_stream(self, cache, kwargs):
+        provider = self._provider
+        response_cache = provider.cache
+        use_cache = cache and response_cache.enabled
+        key = response_cache.fingerprint(kwargs.get('model'), kwargs.get('contents'), kwargs.get('config'))
+        if use_cache:
+            cached_text = response_cache.get(key)
+            if cached_text is not None:
+                yield CachedResponse(cached_text)
+                return
+
+        client = provider.get_client()
+        if client is None:
+            raise GeminiUnavailableError('Gemini is not configured')
+        if not provider.executor.bucket.acquire(timeout=provider.executor.call_timeout):
+            raise GeminiUnavailableError('LLM rate limit budget exhausted')
+        if not provider.breaker.allow():
+            raise GeminiUnavailableError('Gemini circuit is open')
+
+        parts = []
+        try:
+            for chunk in client.models.generate_content_stream(**kwargs):
+                text = getattr(chunk, 'text', None)
+                if text:
+                    parts.append(text)
+                yield chunk
+        except GeneratorExit:
+            # Client went away mid-stream: Gemini did answer, but the text is incomplete so it is not cached
+            provider.breaker.record_success()
+            raise
+        except Exception as e:
+            provider.record_outcome(e)
+            raise
+        provider.breaker.record_success()
+        if use_cache and parts:
+            try:
+                response_cache.set(key, kwargs.get('model') or '', ''.join(parts))
+            except Exception as e:
+                logger.warning(f"LLM cache store skipped: {str(e)}")
+
+    def replace_cached(self, text, **kwargs):
+        """Replace the cached response of a generate_content call, or drop it when text is None"""
+        response_cache = self._provider.cache
+        key = response_cache.fingerprint(kwargs.get('model'), kwargs.get('contents'), kwargs.get('config'))
+        if text is None:
+            response_cache.delete(key)
+        else:
+            response_cache.set(key, kwargs.get('model') or '', text)
+
+    def __getattr__(self, name):
+        client = self._provider.get_client()
+        if client is None:
+            raise GeminiUnavailableError('Gemini is not configured')
+        return getattr(client.models, name)
+
+
+class GeminiClientProxy:
+    """
+    Drop-in stand-in for a genai.Client: truthy only while Gemini is usable, and
+    `.models.generate_content(...)` goes through the provider's circuit breaker.
+    """
+
+    def __init__(self, provider):
+        self._provider = provider
+        self.models = _GeminiModelsProxy(provider)
+
+    def __bool__(self):
+        return self._provider.is_available()
+
+    def __getattr__(self, name):
+        client = self._provider.get_client()
+        if client is None:
+            raise GeminiUnavailableError('Gemini is not configured')
+        return getattr(client, name)
+
+
+class StructuredOutputError(ValueError):
+    """The model's JSON output could not be parsed or validated, even after repair"""
+
+
+def parse_json_text(raw_text):
+    """Parse model output as JSON, tolerating code fences and text around the outermost object"""
+    if not isinstance(raw_text, str):
+        raise ValueError('No text in model response')
+    text = raw_text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    if text.startswith('```'):
+        lines = [l for l in text.split('\n') if not l.strip().startswith('```')]
+        text = '\n'.join(lines).strip()
+    start = text.find('{')
+    end = text.rfind('}')
+    if start != -1 and end > start:
+        return json.loads(text[start:end + 1])
+    return json.loads(text)
+
+
+_JSON_TYPES = {
+    'object': dict,
+    'array': list,
+    'string': str,
+    'number': (int, float),
+    'integer': int,
+    'boolean': bool
+}
+
+
+def validate_json(data, schema, path='$'):
+    """
+    Validate data against the OpenAPI-style schema subset used for response_schema
+    (type, properties, required, items, minItems). Returns a list of error strings.
+    """
+    errors = []
+    expected = (schema.get('type') or '').lower()
+    python_type = _JSON_TYPES.get(expected)
+    if python_type and (not isinstance(data, python_type) or (expected in ('number', 'integer') and isinstance(data, bool))):
+        return [f"{path}: expected {expected}, got {type(data).__name__}"]
+
+    if expected == 'object':
+        for name in schema.get('required', []):
+            if name not in data:
+                errors.append(f"{path}.{name}: missing")
+        for name, sub_schema in (schema.get('properties') or {}).items():
+            if name in data:
+                errors.extend(validate_json(data[name], sub_schema, f"{path}.{name}"))
+    elif expected == 'array':
+        if len(data) < schema.get('minItems', 0):
+            errors.append(f"{path}: expected at least {schema['minItems']} items, got {len(data)}")
+        item_schema = schema.get('items')
+        if item_schema:
+            for index, item in enumerate(data):
+                errors.extend(validate_json(item, item_schema, f"{path}[{index}]"))
+                if len(errors) > 20:
+                    break
+    return errors
+
+
+def _replace_cached(client, text, **kwargs):
+    replace = getattr(type(client.models), 'replace_cached', None)
+    if replace is not None:
+        replace(client.models, text, **kwargs)
+
+
+def generate_json(client, model, contents, schema, repair=True, cache=True):
+    """
+    Call the model in JSON mode with `schema` as the response schema and return the
+    parsed, validated object. If the output does not parse or validate, one cheap
+    repair call (text only, no images) is made on the output itself before raising
+    StructuredOutputError, so a malformed answer does not cost a full re-run.
+    Invalid outputs are dropped from the response cache; a repaired answer is cached
+    under the original request, so the next identical call is a valid cache hit.
+    """
+    config = {'response_mime_type': 'application/json', 'response_schema': schema}
+    response = client.models.generate_content(model=model, contents=contents, config=config, cache=cache)
+    raw_text = getattr(response, 'text', '') or ''
+
+    try:
+        data = parse_json_text(raw_text)
+        errors = validate_json(data, schema)
+    except ValueError as e:
+        errors = [f"invalid JSON: {str(e)}"]
+    if not errors:
+        return data
+    if cache:
+        _replace_cached(client, None, model=model, contents=contents, config=config)
+    if not repair:
+        raise StructuredOutputError('; '.join(errors[:5]))
+
+    logger.warning(f"Structured output invalid ({'; '.join(errors[:3])}), attempting repair")
+    repair_prompt = (
+        "The following output was supposed to be JSON matching this schema but is invalid.\n"
+        f"SCHEMA:\n{json.dumps(schema)}\n\nERRORS:\n" + '\n'.join(errors[:10]) +
+        f"\n\nOUTPUT:\n{raw_text[:8000]}\n\n"
+        "Return only the corrected JSON. Keep all content that fits the schema; do not add commentary."
+    )
+    response = client.models.generate_content(model=model, contents=repair_prompt, config=config, cache=cache)
+    try:
+        data = parse_json_text(getattr(response, 'text', '') or '')
+        errors = validate_json(data, schema)
+    except ValueError as e:
+        errors = [f"repair produced invalid JSON: {str(e)}"]
+    if errors:
+        if cache:
+            _replace_cached(client, None, model=model, contents=repair_prompt, config=config)
+        raise StructuredOutputError('; '.join(errors[:5]))
+    if cache:
+        _replace_cached(client, json.dumps(data), model=model, contents=contents, config=config)
+    return data
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the Flask API with synthetic users.
+
+Each virtual user uploads test_clip.mp4 once, then loops over a weighted mix of
+the real client flows (transcribe, tag, search, generate story, render, list
+videos) with think time in between. Latency percentiles (p50/p95/p99),
+throughput and error rate are reported per endpoint, so worker model and pool
+size changes in gunicorn.conf.py can be compared with numbers.
+
+    # server: the app under gunicorn with Gemini stubbed (benchmark.py's mock)
+    python loadtest.py serve --port 5055 --workers 2 --threads 4
+    # client: 20 users for 2 minutes against it
+    python loadtest.py run --url http://127.0.0.1:5055 --users 20 --duration 120
+    # both in one go
+    python loadtest.py run --spawn --workers 2 --threads 4 --users 20 --duration 120
+
+The stubbed server uses a throwaway working directory, so runs never touch real
+uploads or the production database. Only the standard library is used on the
+client side.
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TEST_CLIP = os.path.join(BACKEND_DIR, 'test_clip.mp4')
+
+DEFAULT_MIX = 'search=6,videos=3,tag=2,story=2,transcribe=1,render=1,upload=1'
+SEARCH_QUERIES = ('sunset', 'friends laughing', 'quiet morning', 'river journey', 'music at night', 'dog on the beach')
+STORY_PROMPTS = ('a hopeful journey', 'overcoming the storm', 'a day with friends', 'finding quiet')
+
+
+def create_stub_app():
+    """
+    WSGI app factory for gunicorn (`loadtest:create_stub_app()`): the real app in a
+    temporary working directory with Gemini replaced by the benchmark mock
+    (LOADTEST_GEMINI_LATENCY_MS of simulated latency per call).
+    """
+    from benchmark import prepare_offline_app
+    workspace = os.getenv('LOADTEST_WORKSPACE') or tempfile.mkdtemp(prefix='footage-load-')
+    os.makedirs(workspace, exist_ok=True)
+    app_module = prepare_offline_app(workspace, float(os.getenv('LOADTEST_GEMINI_LATENCY_MS', '300')))
+    return app_module.app
+
+
+class Recorder:
+    """Thread-safe latency/status samples per endpoint"""
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok, status):
+        with self._lock:
+            entry = self._samples.setdefault(endpoint, {'latencies': [], 'errors': 0, 'statuses': {}})
+            entry['latencies'].append(seconds)
+            if not ok:
+                entry['errors'] += 1
+            key = str(status)
+            entry['statuses'][key] = entry['statuses'].get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: {'latencies': list(entry['latencies']), 'errors': entry['errors'],
+                               'statuses': dict(entry['statuses'])}
+                    for endpoint, entry in self._samples.items()}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples, elapsed):
+    """Per-endpoint and overall count, throughput, error rate and latency percentiles (ms)"""
+    def stats(latencies, errors, statuses=None):
+        latencies = sorted(latencies)
+        count = len(latencies)
+        summary = {
+            'requests': count,
+            'errors': errors,
+            'errorRate': round(errors / count, 4) if count else 0.0,
+            'throughputRps': round(count / elapsed, 3) if elapsed > 0 else 0.0,
+            'p50Ms': None, 'p95Ms': None, 'p99Ms': None, 'maxMs': None, 'meanMs': None
+        }
+        if count:
+            summary.update({
+                'p50Ms': round(percentile(latencies, 50) * 1000, 1),
+                'p95Ms': round(percentile(latencies, 95) * 1000, 1),
+                'p99Ms': round(percentile(latencies, 99) * 1000, 1),
+                'maxMs': round(latencies[-1] * 1000, 1),
+                'meanMs': round(sum(latencies) / count * 1000, 1)
+            })
+        if statuses is not None:
+            summary['statuses'] = statuses
+        return summary
+
+    endpoints = {endpoint: stats(entry['latencies'], entry['errors'], entry['statuses'])
+                 for endpoint, entry in sorted(samples.items())}
+    overall = stats([value for entry in samples.values() for value in entry['latencies']],
+                    sum(entry['errors'] for entry in samples.values()))
+    return {'elapsedSeconds': round(elapsed, 2), 'overall': overall, 'endpoints': endpoints}
+
+
+def format_summary(summary):
+    lines = [f"{'endpoint':28} {'reqs':>6} {'rps':>8} {'err%':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"]
+
+    def row(name, s):
+        fmt = lambda value: f"{value:9.1f}" if value is not None else f"{'-':>9}"
+        return (f"{name:28} {s['requests']:6d} {s['throughputRps']:8.2f} {s['errorRate'] * 100:6.1f} "
+                f"{fmt(s['p50Ms'])} {fmt(s['p95Ms'])} {fmt(s['p99Ms'])} {fmt(s['maxMs'])}")
+
+    for endpoint, s in summary['endpoints'].items():
+        lines.append(row(endpoint, s))
+    lines.append(row('TOTAL', summary['overall']))
+    lines.append(f"(latencies in ms over {summary['elapsedSeconds']}s)")
+    return '\n'.join(lines)
+
+
+def parse_mix(text):
+    """'search=6,tag=2' -> [(scenario, weight)] restricted to known scenarios"""
+    mix = []
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (known: {', '.join(sorted(SCENARIOS))})")
+        mix.append((name, float(weight or 1)))
+    if not mix:
+        raise ValueError('The scenario mix is empty')
+    return mix
+
+
+def _multipart(field, filename, payload, content_type='video/mp4'):
+    boundary = uuid.uuid4().hex
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n").encode('utf-8')
+    tail = f"\r\n--{boundary}--\r\n".encode('utf-8')
+    return head + payload + tail, f"multipart/form-data; boundary={boundary}"
+
+
+class VirtualUser:
+    """One synthetic client on its own keep-alive connection"""
+
+    def __init__(self, base_url, recorder, mix, think, timeout, clip_bytes, rng):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.recorder = recorder
+        self.names = [name for name, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.think = think
+        self.timeout = timeout
+        self.clip_bytes = clip_bytes
+        self.rng = rng
+        self.video_id = None
+        self.duration = None
+        self.conn = None
+
+    def _connection(self):
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, self.port, timeout=self.timeout)
+        return self.conn
+
+    def request(self, endpoint, method, path, body=None, content_type='application/json'):
+        """Send one request, record it under `endpoint` and return (status, parsed JSON or None)"""
+        headers = {'User-Agent': 'footage-loadtest'}
+        if body is not None:
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = content_type
+        started = time.perf_counter()
+        status, payload = 0, None
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            raw = response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close':
+                self.close()
+            try:
+                payload = json.loads(raw) if raw else None
+            except ValueError:
+                payload = None
+        except Exception:
+            self.close()
+        self.recorder.record(endpoint, time.perf_counter() - started, 200 <= status < 400, status or 'error')
+        return status, payload
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def pause(self):
+        if self.think > 0:
+            time.sleep(self.rng.expovariate(1.0 / self.think))
+
+    def run(self, stop_at):
+        SCENARIOS['upload'](self)
+        while time.time() < stop_at:
+            self.pause()
+            if time.time() >= stop_at:
+                break
+            name = self.rng.choices(self.names, weights=self.weights)[0]
+            if self.video_id is None and name not in ('upload', 'videos'):
+                name = 'upload'
+            SCENARIOS[name](self)
+        self.close()
+
+
+def scenario_upload(user):
+    body, content_type = _multipart('video', 'test_clip.mp4', user.clip_bytes)
+    status, payload = user.request('POST /upload', 'POST', '/upload', body, content_type)
+    if status == 200 and payload and payload.get('videoId'):
+        user.video_id = payload['videoId']
+
+
+def scenario_transcribe(user):
+    user.request('POST /transcribe', 'POST', '/transcribe', {'videoId': user.video_id, 'outputFormat': 'wav'})
+
+
+def scenario_tag(user):
+    user.request('POST /generate-tags', 'POST', '/generate-tags', {'videoId': user.video_id})
+
+
+def scenario_search(user):
+    user.request('POST /search', 'POST', '/search',
+                 {'videoId': user.video_id, 'query': user.rng.choice(SEARCH_QUERIES)})
+
+
+def scenario_story(user):
+    user.request('POST /generate-story', 'POST', '/generate-story',
+                 {'videoId': user.video_id, 'prompt': user.rng.choice(STORY_PROMPTS),
+                  'mode': user.rng.choice(('positive', 'inspirational'))})
+
+
+def scenario_render(user):
+    # Two short scenes from the start of the clip (the server clamps to its duration)
+    user.request('POST /render-story', 'POST', '/render-story',
+                 {'videoId': user.video_id, 'scenes': [{'start': 0.0, 'end': 1.5}, {'start': 2.0, 'end': 3.5}],
+                  'transitionDuration': 0.5})
+
+
+def scenario_videos(user):
+    user.request('GET /videos', 'GET', '/videos')
+
+
+SCENARIOS = {
+    'upload': scenario_upload,
+    'transcribe': scenario_transcribe,
+    'tag': scenario_tag,
+    'search': scenario_search,
+    'story': scenario_story,
+    'render': scenario_render,
+    'videos': scenario_videos
+}
+
+
+def run_load(base_url, users=10, duration=60.0, ramp_up=5.0, think=0.5, mix=None, timeout=600.0, seed=None):
+    """Closed-loop load: `users` virtual users started evenly over `ramp_up` seconds, for `duration` seconds"""
+    mix = mix or parse_mix(DEFAULT_MIX)
+    with open(TEST_CLIP, 'rb') as f:
+        clip_bytes = f.read()
+    recorder = Recorder()
+    master_rng = random.Random(seed)
+    started = time.time()
+    stop_at = started + ramp_up + duration
+    threads = []
+    for index in range(users):
+        user = VirtualUser(base_url, recorder, mix, think, timeout, clip_bytes, random.Random(master_rng.random()))
+        thread = threading.Thread(target=user.run, args=(stop_at,), name=f"vuser-{index}", daemon=True)
+        threads.append(thread)
+        thread.start()
+        if ramp_up > 0 and users > 1:
+            time.sleep(ramp_up / users)
+    for thread in threads:
+        # Requests in flight at the deadline are allowed to finish (up to the request timeout)
+        thread.join(timeout=max(0.0, stop_at - time.time()) + timeout)
+    return summarize(recorder.snapshot(), time.time() - started)
+
+
+def wait_until_healthy(base_url, timeout=120.0):
+    parts = urlsplit(base_url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=5)
+            conn.request('GET', '/health')
+            if conn.getresponse().status == 200:
+                return True
+        except Exception:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def server_command(port, workers=None, threads=None, worker_class=None, host='127.0.0.1'):
+    """gunicorn with the repo config plus overrides, or the Werkzeug server when gunicorn is not installed"""
+    if shutil.which('gunicorn') or _has_module('gunicorn'):
+        cmd = [sys.executable, '-m', 'gunicorn', '--config', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+               '--chdir', BACKEND_DIR, '--bind', f"{host}:{port}", '--access-logfile', os.devnull]
+        if workers:
+            cmd += ['--workers', str(workers)]
+        if threads:
+            cmd += ['--threads', str(threads)]
+        if worker_class:
+            cmd += ['--worker-class', worker_class]
+        return cmd + ['loadtest:create_stub_app()']
+    return [sys.executable, os.path.abspath(__file__), 'serve', '--dev-server', '--host', host, '--port', str(port)]
+
+
+def _has_module(name):
+    import importlib.util
+    return importlib.util.find_spec(name) is not None
+
+
+def start_server(port, workers=None, threads=None, worker_class=None, gemini_latency_ms=300.0):
+    env = dict(os.environ)
+    env['LOADTEST_GEMINI_LATENCY_MS'] = str(gemini_latency_ms)
+    env['LOADTEST_WORKSPACE'] = tempfile.mkdtemp(prefix='footage-load-')
+    process = subprocess.Popen(server_command(port, workers, threads, worker_class), cwd=BACKEND_DIR, env=env)
+    return process, env['LOADTEST_WORKSPACE']
+
+
+def stop_server(process, workspace=None):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    if workspace:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the Flask API with synthetic users')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help='run the app with Gemini stubbed')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=5055)
+    serve.add_argument('--workers', type=int, help='gunicorn workers (default: gunicorn.conf.py)')
+    serve.add_argument('--threads', type=int, help='gunicorn threads per worker (sync becomes gthread)')
+    serve.add_argument('--worker-class', help='gunicorn worker class')
+    serve.add_argument('--gemini-latency-ms', type=float, default=300.0, help='stubbed Gemini latency per call')
+    serve.add_argument('--dev-server', action='store_true', help='use the Werkzeug server instead of gunicorn')
+
+    run = commands.add_parser('run', help='generate load and report per-endpoint latency')
+    run.add_argument('--url', default='http://127.0.0.1:5055')
+    run.add_argument('--users', type=int, default=10)
+    run.add_argument('--duration', type=float, default=60.0, help='seconds of load after ramp-up')
+    run.add_argument('--ramp-up', type=float, default=5.0, help='seconds over which users start')
+    run.add_argument('--think-ms', type=float, default=500.0, help='mean think time between a user\'s requests')
+    run.add_argument('--mix', default=DEFAULT_MIX, help=f"scenario weights (default {DEFAULT_MIX})")
+    run.add_argument('--timeout', type=float, default=600.0, help='per-request timeout in seconds')
+    run.add_argument('--seed', type=int, help='random seed for reproducible user behaviour')
+    run.add_argument('--output', default='loadtest_results.json')
+    run.add_argument('--spawn', action='store_true', help='start a stubbed server for the run and stop it after')
+    run.add_argument('--port', type=int, default=5055, help='port for --spawn')
+    run.add_argument('--workers', type=int, help='gunicorn workers for --spawn')
+    run.add_argument('--threads', type=int, help='gunicorn threads for --spawn')
+    run.add_argument('--worker-class', help='gunicorn worker class for --spawn')
+    run.add_argument('--gemini-latency-ms', type=float, default=300.0, help='stubbed Gemini latency for --spawn')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'serve':
+        os.environ['LOADTEST_GEMINI_LATENCY_MS'] = str(args.gemini_latency_ms)
+        if args.dev_server or not _has_module('gunicorn'):
+            create_stub_app().run(host=args.host, port=args.port, threaded=True, debug=False)
+            return 0
+        return subprocess.call(server_command(args.port, args.workers, args.threads, args.worker_class, args.host),
+                               cwd=BACKEND_DIR)
+
+    mix = parse_mix(args.mix)
+    base_url = args.url
+    process = workspace = None
+    if args.spawn:
+        base_url = f"http://127.0.0.1:{args.port}"
+        process, workspace = start_server(args.port, args.workers, args.threads, args.worker_class,
+                                          args.gemini_latency_ms)
+    try:
+        if not wait_until_healthy(base_url):
+            print(f"Server at {base_url} did not become healthy")
+            return 2
+        print(f"Load: {args.users} users, {args.duration}s (+{args.ramp_up}s ramp-up) against {base_url}", flush=True)
+        summary = run_load(base_url, users=args.users, duration=args.duration, ramp_up=args.ramp_up,
+                           think=args.think_ms / 1000.0, mix=mix, timeout=args.timeout, seed=args.seed)
+    finally:
+        if process is not None:
+            stop_server(process, workspace)
+
+    summary['config'] = {
+        'url': base_url, 'users': args.users, 'duration': args.duration, 'rampUp': args.ramp_up,
+        'thinkMs': args.think_ms, 'mix': dict(mix), 'seed': args.seed,
+        'server': {'workers': args.workers, 'threads': args.threads, 'workerClass': args.worker_class,
+                   'geminiLatencyMs': args.gemini_latency_ms} if args.spawn else None
+    }
+    print()
+    print(format_summary(summary))
+    tmp_path = f"{args.output}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, args.output)
+    print(f"\nResults written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
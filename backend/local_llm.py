@@ -0,0 +1,274 @@
+import os
+import time
+import threading
+import importlib.util
+import logging
+
+from lazy import lazy_import, record_load
+from llm import CachedResponse, ResponseCache
+from metrics import LLM_CALL_SECONDS, current_call_site
+from tracing import span
+
+# llama-cpp-python loads libllama on import, so it is imported with the first local
+# generation, never at worker boot (most workers run GENERATION_BACKEND=gemini)
+llama_cpp = lazy_import('llama_cpp')
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GENERATION_BACKENDS = ('gemini', 'local', 'auto')
+
+
+class LocalLLMUnavailableError(RuntimeError):
+    """Raised when the local model is not installed/configured or cannot serve the request"""
+
+
+_llama_cpp_spec = None
+
+
+def _llama_cpp_installed():
+    global _llama_cpp_spec
+    if _llama_cpp_spec is None:
+        _llama_cpp_spec = importlib.util.find_spec('llama_cpp') is not None
+    return _llama_cpp_spec
+
+
+def _config_value(config, name):
+    if config is None:
+        return None
+    if isinstance(config, dict):
+        return config.get(name)
+    return getattr(config, name, None)
+
+
+def to_json_schema(schema):
+    """Convert a Gemini response_schema (OpenAPI subset, upper-case types) to JSON Schema"""
+    if not isinstance(schema, dict):
+        return schema
+    converted = {}
+    for key, value in schema.items():
+        if key == 'type' and isinstance(value, str):
+            converted[key] = value.lower()
+        elif key == 'properties' and isinstance(value, dict):
+            converted[key] = {name: to_json_schema(sub) for name, sub in value.items()}
+        elif key == 'items':
+            converted[key] = to_json_schema(value)
+        else:
+            converted[key] = value
+    return converted
+
+
+class LocalLLM:
+    """
+    CPU llama.cpp model (quantized GGUF) loaded once per worker on first use.
+    The context is not thread-safe, so calls are serialized; llama.cpp reuses the
+    evaluated prefix of the previous prompt, and a RAM prompt cache keeps KV state
+    for recent prompts, so the long shared instruction prefixes of the tagging and
+    story prompts are not re-evaluated on every request.
+    """
+
+    def __init__(self, model_path=None, n_ctx=None, n_threads=None, max_tokens=None, temperature=None,
+                 kv_cache_bytes=None):
+        self.model_path = model_path if model_path is not None else os.getenv('LOCAL_LLM_MODEL_PATH', '')
+        self.n_ctx = int(n_ctx if n_ctx is not None else os.getenv('LOCAL_LLM_CONTEXT', '4096'))
+        self.n_threads = int(n_threads if n_threads is not None else os.getenv('LOCAL_LLM_THREADS', '4'))
+        self.max_tokens = int(max_tokens if max_tokens is not None else os.getenv('LOCAL_LLM_MAX_TOKENS', '1024'))
+        self.temperature = float(temperature if temperature is not None else os.getenv('LOCAL_LLM_TEMPERATURE', '0.7'))
+        self.kv_cache_bytes = int(kv_cache_bytes if kv_cache_bytes is not None
+                                  else os.getenv('LOCAL_LLM_KV_CACHE_MB', '512')) * 1024 * 1024
+        self.name = f"local:{os.path.basename(self.model_path) or 'unset'}"
+        self._model = None
+        self._load_error = None
+        self._lock = threading.Lock()
+        self._call_lock = threading.Lock()
+
+    @property
+    def configured(self):
+        """Model file present and llama-cpp-python installed (located, not imported)"""
+        return bool(self.model_path) and os.path.exists(self.model_path) and _llama_cpp_installed()
+
+    def is_available(self):
+        return self.configured and self._load_error is None
+
+    def get_model(self):
+        """Load the model on first use; a failed load is remembered so requests fall back immediately"""
+        if self._model is not None:
+            return self._model
+        if not self.configured:
+            raise LocalLLMUnavailableError('Local LLM is not configured (set LOCAL_LLM_MODEL_PATH, install llama-cpp-python)')
+        with self._lock:
+            if self._model is None and self._load_error is None:
+                try:
+                    started = time.perf_counter()
+                    model = llama_cpp.Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads,
+                                            n_gpu_layers=0, verbose=False)
+                    ram_cache = getattr(llama_cpp, 'LlamaRAMCache', None)
+                    if self.kv_cache_bytes > 0 and ram_cache is not None:
+                        model.set_cache(ram_cache(capacity_bytes=self.kv_cache_bytes))
+                    self._model = model
+                    record_load(self.name, time.perf_counter() - started)
+                    logger.info(f"Local LLM loaded from {self.model_path} ({self.n_threads} threads, ctx {self.n_ctx})")
+                except Exception as e:
+                    self._load_error = e
+                    logger.error(f"Local LLM load failed: {str(e)}")
+        if self._model is None:
+            raise LocalLLMUnavailableError(f'Local LLM failed to load: {self._load_error}')
+        return self._model
+
+    def _request(self, prompt, json_schema=None, stream=False):
+        request = {
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': self.max_tokens,
+            'temperature': self.temperature,
+            'stream': stream
+        }
+        if json_schema is not None:
+            # Grammar-constrained decoding: the output is valid JSON for the schema
+            request['response_format'] = {'type': 'json_object', 'schema': to_json_schema(json_schema)}
+        return request
+
+    def complete(self, prompt, json_schema=None):
+        model = self.get_model()
+        with self._call_lock:
+            result = model.create_chat_completion(**self._request(prompt, json_schema))
+        return result['choices'][0]['message'].get('content') or ''
+
+    def stream(self, prompt, json_schema=None):
+        """Yield text pieces as they are decoded (the model stays locked until the stream ends)"""
+        model = self.get_model()
+        with self._call_lock:
+            for chunk in model.create_chat_completion(**self._request(prompt, json_schema, stream=True)):
+                text = chunk['choices'][0].get('delta', {}).get('content')
+                if text:
+                    yield text
+
+    def status(self):
+        return {
+            'configured': self.configured,
+            'model': self.name,
+            'loaded': self._model is not None,
+            'error': str(self._load_error) if self._load_error else None
+        }
+
+
+def _prompt_text(contents):
+    """Text prompt from generate_content contents; the local model is text-only"""
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)) and all(isinstance(part, str) for part in contents):
+        return '\n\n'.join(contents)
+    raise LocalLLMUnavailableError('Local LLM only accepts text prompts')
+
+
+class _LocalModelsProxy:
+    def __init__(self, llm, cache):
+        self._llm = llm
+        self._cache = cache
+
+    def _json_schema(self, config):
+        if _config_value(config, 'response_mime_type') == 'application/json':
+            return _config_value(config, 'response_schema') or {'type': 'OBJECT'}
+        return None
+
+    def generate_content(self, model=None, contents=None, config=None, cache=True, **kwargs):
+        """Same call shape as the Gemini client; `model` is ignored (the local model is fixed per worker)"""
+        prompt = _prompt_text(contents)
+        use_cache = cache and self._cache.enabled
+        key = self._cache.fingerprint(self._llm.name, prompt, config)
+        if use_cache:
+            cached_text = self._cache.get(key)
+            if cached_text is not None:
+                return CachedResponse(cached_text)
+        call_site = current_call_site()
+        started = time.perf_counter()
+        outcome = 'error'
+        with span('llm.generate_content', {'llm.backend': 'local', 'llm.call_site': call_site,
+                                           'llm.model': self._llm.name}, kind='client'):
+            try:
+                text = self._llm.complete(prompt, self._json_schema(config))
+                outcome = 'ok'
+            finally:
+                LLM_CALL_SECONDS.observe(time.perf_counter() - started, backend='local', call_site=call_site,
+                                         outcome=outcome)
+        if use_cache and text:
+            try:
+                self._cache.set(key, self._llm.name, text)
+            except Exception as e:
+                logger.warning(f"LLM cache store skipped: {str(e)}")
+        return CachedResponse(text)
+
+    def replace_cached(self, text, model=None, contents=None, config=None, **kwargs):
+        """Replace the cached response of a generate_content call, or drop it when text is None"""
+        key = self._cache.fingerprint(self._llm.name, _prompt_text(contents), config)
+        if text is None:
+            self._cache.delete(key)
+        else:
+            self._cache.set(key, self._llm.name, text)
+
+    def generate_content_stream(self, model=None, contents=None, config=None, cache=True, **kwargs):
+        prompt = _prompt_text(contents)
+        use_cache = cache and self._cache.enabled
+        key = self._cache.fingerprint(self._llm.name, prompt, config)
+        if use_cache:
+            cached_text = self._cache.get(key)
+            if cached_text is not None:
+                yield CachedResponse(cached_text)
+                return
+        parts = []
+        for text in self._llm.stream(prompt, self._json_schema(config)):
+            parts.append(text)
+            yield CachedResponse(text)
+        if use_cache and parts:
+            try:
+                self._cache.set(key, self._llm.name, ''.join(parts))
+            except Exception as e:
+                logger.warning(f"LLM cache store skipped: {str(e)}")
+
+
+class LocalLLMClient:
+    """Text-only stand-in for a genai.Client backed by LocalLLM; truthy while the model is usable"""
+
+    def __init__(self, llm, cache=None):
+        self._llm = llm
+        self.models = _LocalModelsProxy(llm, cache if cache is not None else ResponseCache(enabled=False))
+
+    def __bool__(self):
+        return self._llm.is_available()
+
+
+class FirstAvailableClient:
+    """Routes each call to the first truthy client (e.g. Gemini, then the local model)"""
+
+    def __init__(self, *clients):
+        self._clients = clients
+
+    def _current(self):
+        for client in self._clients:
+            if client:
+                return client
+        raise LocalLLMUnavailableError('No generation backend is available')
+
+    def __bool__(self):
+        return any(bool(client) for client in self._clients)
+
+    @property
+    def models(self):
+        return self._current().models
+
+
+def select_text_client(backend, gemini_client, local_client):
+    """
+    Client for text-only generation (tags, stories, summaries) by GENERATION_BACKEND:
+    'gemini' (default), 'local' (llama.cpp, no network) or 'auto' (Gemini while it is
+    usable, otherwise the local model). Multimodal calls always use Gemini.
+    """
+    backend = (backend or 'gemini').strip().lower()
+    if backend not in GENERATION_BACKENDS:
+        logger.warning(f"Unknown GENERATION_BACKEND '{backend}', using gemini")
+        backend = 'gemini'
+    if backend == 'local':
+        return local_client
+    if backend == 'auto':
+        return FirstAvailableClient(gemini_client, local_client)
+    return gemini_client
@@ -0,0 +1,50 @@
+import os
+import shutil
+import threading
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ffmpeg/ffprobe are resolved once per process (PATH, then common install locations)
+# rather than with shutil.which() before every subprocess call; /ready reports the result.
+
+COMMON_PATHS = {
+    'ffmpeg': ["C:\\ffmpeg\\bin\\ffmpeg.exe", "C:\\Program Files\\ffmpeg\\bin\\ffmpeg.exe",
+               "/usr/bin/ffmpeg", "/usr/local/bin/ffmpeg", "/opt/homebrew/bin/ffmpeg"],
+    'ffprobe': ["C:\\ffmpeg\\bin\\ffprobe.exe", "C:\\Program Files\\ffmpeg\\bin\\ffprobe.exe",
+                "/usr/bin/ffprobe", "/usr/local/bin/ffprobe", "/opt/homebrew/bin/ffprobe"],
+}
+
+_resolved = {}
+_lock = threading.Lock()
+
+
+def resolve_binary(name):
+    """Path of an executable, or None if it is not installed (looked up once per process)"""
+    if name in _resolved:
+        return _resolved[name]
+    with _lock:
+        if name not in _resolved:
+            path = shutil.which(name)
+            if not path:
+                path = next((p for p in COMMON_PATHS.get(name, []) if os.path.exists(p)), None)
+            if path:
+                logger.info("Using %s at %s", name, path)
+            else:
+                logger.warning("%s not found in PATH or common install locations", name)
+            _resolved[name] = path
+    return _resolved[name]
+
+
+def find_ffmpeg():
+    return resolve_binary('ffmpeg')
+
+
+def find_ffprobe():
+    return resolve_binary('ffprobe')
+
+
+def binaries_status():
+    return {'ffmpeg': find_ffmpeg(), 'ffprobe': find_ffprobe()}
@@ -0,0 +1,377 @@
+import os
+import gc
+import sys
+import time
+import ctypes
+import ctypes.util
+import resource
+import functools
+import threading
+from contextlib import contextmanager
+import logging
+
+from metrics import REGISTRY, counter, process_rss_bytes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Memory governor for one worker process.
+#   with memory_governor.job('whisper'): ...      or   @memory_governor.governed('render')
+# Heavy jobs (Whisper, renders, frame extraction) are admitted only while
+#   current RSS + headroom still reserved by running jobs + this job's estimate <= budget,
+# where a running job's headroom is its estimate minus the RSS growth seen since it
+# started (that growth is already part of current RSS, so it is not counted twice).
+# Otherwise the caller waits up to MEMORY_QUEUE_TIMEOUT seconds for running jobs to
+# finish, then gets MemoryBudgetExceeded (the app answers 503 + Retry-After). A sampler
+# thread polls RSS while jobs run, so each job kind learns its real peak growth and the
+# configured estimates only seed admission until a few runs have been observed.
+# GC runs after jobs only when warranted: a full collection (plus malloc_trim) when RSS
+# is near the budget, otherwise only generations whose allocation counts are over their
+# thresholds. There is no unconditional gc.collect() on the request path.
+
+MB = 1024 * 1024
+
+DEFAULT_ESTIMATES_MB = {'whisper': 600, 'render': 400, 'frames': 200}
+
+ADMISSIONS = counter(
+    'footage_memory_admissions_total',
+    'Heavy job admission decisions by job kind (admitted, queued, rejected)',
+    ('kind', 'outcome')
+)
+GC_RUNS = counter(
+    'footage_memory_gc_total',
+    'Garbage collections triggered by the memory governor (pressure, generation)',
+    ('reason',)
+)
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """A heavy job could not be admitted within the queue timeout"""
+
+    def __init__(self, kind, projected_bytes, budget_bytes, retry_after):
+        super().__init__(f"Not enough memory to start {kind} job: projected {projected_bytes // MB} MB "
+                         f"exceeds budget {budget_bytes // MB} MB")
+        self.kind = kind
+        self.projected_bytes = projected_bytes
+        self.budget_bytes = budget_bytes
+        self.retry_after = retry_after
+
+
+def _read_int(path):
+    try:
+        with open(path, 'r') as f:
+            value = f.read().strip()
+        return None if value == 'max' else int(value)
+    except (OSError, ValueError):
+        return None
+
+
+def memory_limit_bytes():
+    """Container memory limit (cgroup v2, then v1), else physical RAM, else None"""
+    for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        limit = _read_int(path)
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        if limit and limit < (1 << 60):
+            return limit
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    """High-water RSS of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+_malloc_trim = None
+_malloc_trim_loaded = False
+
+
+def malloc_trim():
+    """Return freed heap pages to the OS (glibc only); False when unavailable"""
+    global _malloc_trim, _malloc_trim_loaded
+    if not _malloc_trim_loaded:
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6')
+            _malloc_trim = libc.malloc_trim
+        except (OSError, AttributeError):
+            _malloc_trim = None
+        _malloc_trim_loaded = True
+    if _malloc_trim is None:
+        return False
+    _malloc_trim(0)
+    return True
+
+
+class _Job:
+    __slots__ = ('kind', 'reserved', 'start_rss', 'peak_rss', 'started')
+
+    def __init__(self, kind, reserved, start_rss):
+        self.kind = kind
+        self.reserved = reserved
+        self.start_rss = start_rss
+        self.peak_rss = start_rss
+        self.started = time.time()
+
+
+class MemoryGovernor:
+    def __init__(self, budget_bytes=None, estimates_mb=None, queue_timeout=None, sample_interval=None,
+                 gc_pressure=None, gc_min_interval=None, rss=process_rss_bytes):
+        self.rss = rss
+        if budget_bytes is None:
+            budget_mb = float(os.getenv('MEMORY_BUDGET_MB', '0'))
+            if budget_mb > 0:
+                budget_bytes = int(budget_mb * MB)
+            else:
+                # Default: a share of the container limit, split across gunicorn workers
+                limit = memory_limit_bytes() or 4096 * MB
+                fraction = float(os.getenv('MEMORY_BUDGET_FRACTION', '0.8'))
+                workers = max(1, int(os.getenv('WEB_CONCURRENCY', '1')))
+                budget_bytes = int(limit * fraction / workers)
+        self.budget_bytes = budget_bytes
+        self.estimates_mb = dict(DEFAULT_ESTIMATES_MB)
+        for kind in DEFAULT_ESTIMATES_MB:
+            value = os.getenv(f'MEMORY_ESTIMATE_{kind.upper()}_MB')
+            if value:
+                self.estimates_mb[kind] = float(value)
+        self.estimates_mb.update(estimates_mb or {})
+        self.queue_timeout = float(queue_timeout if queue_timeout is not None else os.getenv('MEMORY_QUEUE_TIMEOUT', '30'))
+        self.sample_interval = float(sample_interval if sample_interval is not None
+                                     else os.getenv('MEMORY_SAMPLE_INTERVAL', '0.25'))
+        self.gc_pressure = float(gc_pressure if gc_pressure is not None else os.getenv('MEMORY_GC_PRESSURE', '0.85'))
+        self.gc_min_interval = float(gc_min_interval if gc_min_interval is not None
+                                     else os.getenv('MEMORY_GC_MIN_INTERVAL', '10'))
+        self.min_samples = 3
+        self._cond = threading.Condition()
+        self._active = []
+        self._queued = 0
+        self._learned = {}  # kind -> [runs, ewma growth bytes, max growth bytes]
+        self._last_full_gc = 0.0
+        self._sampler = None
+
+    # -- estimates ----------------------------------------------------------------------
+
+    def estimate_bytes(self, kind):
+        """Expected RSS growth of one job: learned peak growth once observed, else the configured estimate"""
+        learned = self._learned.get(kind)
+        if learned and learned[0] >= self.min_samples:
+            return int(learned[1])
+        return int(self.estimates_mb.get(kind, 100) * MB)
+
+    def _learn(self, kind, growth):
+        entry = self._learned.setdefault(kind, [0, float(growth), 0])
+        entry[0] += 1
+        # EWMA biased toward recent runs; growth can be 0 once the model is resident
+        entry[1] = growth if entry[0] == 1 else 0.7 * entry[1] + 0.3 * growth
+        entry[2] = max(entry[2], growth)
+
+    def _observe(self, rss):
+        # Called with the condition held
+        for job in self._active:
+            if rss > job.peak_rss:
+                job.peak_rss = rss
+
+    def _reserved(self, rss=None):
+        """Reservations running jobs have not grown into yet (their growth is already in RSS)"""
+        rss = self.rss() if rss is None else rss
+        return sum(max(0, job.reserved - (max(job.peak_rss, rss) - job.start_rss)) for job in self._active)
+
+    def projected_bytes(self, kind):
+        with self._cond:
+            rss = self.rss()
+            return rss + self._reserved(rss) + self.estimate_bytes(kind)
+
+    # -- admission ----------------------------------------------------------------------
+
+    def can_admit(self, kind):
+        """Whether a job of this kind would start now without queueing"""
+        with self._cond:
+            if self._queued or not self._active:
+                return not self._queued
+            rss = self.rss()
+            return rss + self._reserved(rss) + self.estimate_bytes(kind) <= self.budget_bytes
+
+    def _try_admit(self, kind, estimate):
+        rss = self.rss()
+        self._observe(rss)
+        projected = rss + self._reserved(rss) + estimate
+        # A lone job always runs: refusing it could only starve the worker, never free memory
+        if projected <= self.budget_bytes or not self._active:
+            if projected > self.budget_bytes:
+                logger.warning("Admitting %s job over memory budget (projected %d MB, budget %d MB): no other jobs running",
+                               kind, projected // MB, self.budget_bytes // MB)
+            job = _Job(kind, estimate, rss)
+            self._active.append(job)
+            self._ensure_sampler()
+            return job, projected
+        return None, projected
+
+    def acquire(self, kind, timeout=None):
+        """Reserve memory for a job, waiting up to timeout seconds; raises MemoryBudgetExceeded"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        estimate = self.estimate_bytes(kind)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            job, projected = self._try_admit(kind, estimate)
+            if job is not None:
+                ADMISSIONS.inc(kind=kind, outcome='admitted')
+                return job
+            self._queued += 1
+        ADMISSIONS.inc(kind=kind, outcome='queued')
+        logger.info("Queueing %s job: projected %d MB exceeds budget %d MB",
+                    kind, projected // MB, self.budget_bytes // MB)
+        # Freeing garbage may be enough to fit the job
+        self.maybe_collect(pressure=True)
+        with self._cond:
+            try:
+                while True:
+                    job, projected = self._try_admit(kind, estimate)
+                    if job is not None:
+                        ADMISSIONS.inc(kind=kind, outcome='admitted')
+                        return job
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    # Woken when a job finishes; re-check RSS periodically as other memory is freed
+                    self._cond.wait(min(remaining, 1.0))
+            finally:
+                self._queued -= 1
+        ADMISSIONS.inc(kind=kind, outcome='rejected')
+        retry_after = self._retry_after()
+        logger.warning("Rejecting %s job: projected %d MB exceeds budget %d MB", kind, projected // MB,
+                       self.budget_bytes // MB)
+        raise MemoryBudgetExceeded(kind, projected, self.budget_bytes, retry_after)
+
+    def _retry_after(self):
+        with self._cond:
+            elapsed = [time.time() - job.started for job in self._active]
+        # Rough hint: about as long as the longest-running job has taken so far
+        return int(min(300, max(5, max(elapsed, default=5))))
+
+    def release(self, job):
+        with self._cond:
+            if job in self._active:
+                self._active.remove(job)
+            peak = max(job.peak_rss, self.rss())
+            self._learn(job.kind, max(0, peak - job.start_rss))
+            self._cond.notify_all()
+        self.maybe_collect()
+
+    @contextmanager
+    def job(self, kind, timeout=None):
+        """Run the block as a heavy job of this kind (admission control + RSS tracking)"""
+        job = self.acquire(kind, timeout)
+        try:
+            yield job
+        finally:
+            self.release(job)
+
+    def governed(self, kind, timeout=None):
+        """Decorator form of job()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.job(kind, timeout):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    # -- RSS sampling -------------------------------------------------------------------
+
+    def _ensure_sampler(self):
+        # Called with the condition held
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name='memory-governor-sampler', daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            rss = self.rss()
+            with self._cond:
+                if not self._active:
+                    self._sampler = None
+                    return
+                self._observe(rss)
+            time.sleep(self.sample_interval)
+
+    # -- garbage collection -------------------------------------------------------------
+
+    def maybe_collect(self, pressure=False):
+        """
+        Collect only when warranted: a full collection + malloc_trim when RSS is near the
+        budget (rate-limited), else the oldest generation over its allocation threshold.
+        Returns the generation collected, or None.
+        """
+        rss = self.rss()
+        now = time.monotonic()
+        if (pressure or rss >= self.budget_bytes * self.gc_pressure) and now - self._last_full_gc >= self.gc_min_interval:
+            self._last_full_gc = now
+            gc.collect()
+            malloc_trim()
+            GC_RUNS.inc(reason='pressure')
+            logger.info("Memory pressure: full GC at %d MB RSS (now %d MB, budget %d MB)",
+                        rss // MB, self.rss() // MB, self.budget_bytes // MB)
+            return 2
+        counts, thresholds = gc.get_count(), gc.get_threshold()
+        for generation in (2, 1, 0):
+            if thresholds[generation] and counts[generation] >= thresholds[generation]:
+                gc.collect(generation)
+                GC_RUNS.inc(reason='generation')
+                return generation
+        return None
+
+    # -- reporting ----------------------------------------------------------------------
+
+    def status(self):
+        with self._cond:
+            active = {}
+            for job in self._active:
+                active[job.kind] = active.get(job.kind, 0) + 1
+            rss = self.rss()
+            reserved = self._reserved(rss)
+            queued = self._queued
+            learned = {kind: {'runs': runs, 'avgGrowthMb': round(avg / MB, 1), 'maxGrowthMb': round(peak / MB, 1)}
+                       for kind, (runs, avg, peak) in self._learned.items()}
+        kinds = sorted(set(self.estimates_mb) | set(learned))
+        return {
+            'rssMb': round(rss / MB, 1),
+            'peakRssMb': round(peak_rss_bytes() / MB, 1),
+            'budgetMb': round(self.budget_bytes / MB, 1),
+            'reservedMb': round(reserved / MB, 1),
+            'activeJobs': active,
+            'queuedJobs': queued,
+            'estimatesMb': {kind: round(self.estimate_bytes(kind) / MB, 1) for kind in kinds},
+            'learned': learned,
+            'headroomMb': round((self.budget_bytes - rss - reserved) / MB, 1),
+        }
+
+    def collector(self):
+        """Registry collector for footage_memory_* gauges"""
+        with self._cond:
+            active = {}
+            for job in self._active:
+                active[job.kind] = active.get(job.kind, 0) + 1
+            reserved = self._reserved()
+            queued = self._queued
+        kinds = sorted(set(self.estimates_mb) | set(self._learned))
+        return [
+            ('footage_memory_budget_bytes', 'gauge', 'Memory budget for heavy jobs in this worker', [({}, self.budget_bytes)]),
+            ('footage_memory_reserved_bytes', 'gauge', 'Reserved memory running heavy jobs have not used yet', [({}, reserved)]),
+            ('footage_memory_peak_resident_bytes', 'gauge', 'High-water resident memory of this worker', [({}, peak_rss_bytes())]),
+            ('footage_memory_active_jobs', 'gauge', 'Heavy jobs currently running',
+             [({'kind': kind}, active.get(kind, 0)) for kind in kinds]),
+            ('footage_memory_queued_jobs', 'gauge', 'Heavy jobs waiting for memory', [({}, queued)]),
+            ('footage_memory_job_estimate_bytes', 'gauge', 'Expected RSS growth per heavy job kind',
+             [({'kind': kind}, self.estimate_bytes(kind)) for kind in kinds]),
+        ]
+
+
+def governor_from_env():
+    """Build the worker's governor from MEMORY_* env vars and expose its gauges on /metrics"""
+    governor = MemoryGovernor()
+    REGISTRY.add_collector(governor.collector)
+    logger.info("Memory governor: budget %d MB, estimates %s", governor.budget_bytes // MB, governor.estimates_mb)
+    return governor
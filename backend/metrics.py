@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+from tracing import span
+
+# In-process Prometheus-style metrics (text exposition format 0.0.4) for /metrics.
+# Histograms/counters/gauges are updated on the hot path with one lock per metric;
+# collectors are callables evaluated only at scrape time, for stats that other
+# components already keep (LLM cache, executor, memo hit counts).
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_call_site = contextvars.ContextVar('llm_call_site', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels):
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return entry[1] if entry else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        lines = self.header()
+        for key, (bucket_counts, count, total) in items:
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector):
+        """collector() -> [(name, kind, help, [(labels dict, value), ...])], evaluated per scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {_escape(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    labels = labels or {}
+                    lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Pipeline metrics shared by app.py, tagging.py and llm.py
+STAGE_SECONDS = histogram(
+    'footage_stage_seconds',
+    'Duration of pipeline stages (audio_extraction, whisper_inference, frame_extraction, clip_extract, ffprobe, '
+    'render_encode, db_query, metadata_io)',
+    ('stage',)
+)
+LLM_CALL_SECONDS = histogram(
+    'footage_llm_call_seconds',
+    'Latency of LLM generate calls by backend and call site, including cache hits and queueing',
+    ('backend', 'call_site', 'outcome')
+)
+FALLBACKS = counter(
+    'footage_fallbacks_total',
+    'Times a local fallback replaced a model result (mock_transcript, fallback_visual_tags, fallback_text_tags, mock_story, template_story)',
+    ('kind',)
+)
+IN_FLIGHT = gauge(
+    'footage_in_flight',
+    'Work currently in progress (http requests, batch items) or waiting for a batch worker (batch_pending)',
+    ('kind',)
+)
+
+
+@contextmanager
+def observe_stage(stage, attributes=None):
+    """Time one pipeline stage into footage_stage_seconds, traced as a span of the same name"""
+    with span(stage, attributes), STAGE_SECONDS.time(stage=stage):
+        yield
+
+
+def timed_stage(stage):
+    """Decorator form of observe_stage; the span records the function name"""
+    def decorator(fn):
+        attributes = {'code.function': fn.__name__}
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, attributes), STAGE_SECONDS.time(stage=stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_fallback(kind):
+    FALLBACKS.inc(kind=kind)
+
+
+@contextmanager
+def llm_call_site(name):
+    """Label LLM calls made inside the block with an explicit call site"""
+    token = _call_site.set(name)
+    try:
+        yield
+    finally:
+        _call_site.reset(token)
+
+
+_LLM_MODULES = ('llm.py', 'local_llm.py', 'metrics.py', 'contextlib.py')
+
+
+def current_call_site():
+    """Explicit llm_call_site() name, else the first calling function outside the LLM plumbing"""
+    name = _call_site.get()
+    if name:
+        return name
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        if filename not in _LLM_MODULES:
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return 'unknown'
+
+
+def process_rss_bytes():
+    """Resident set size of this worker (Linux /proc, else psutil, else 0)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def _process_collector():
+    return [('footage_process_resident_memory_bytes', 'gauge', 'Resident memory of this worker process',
+             [({}, process_rss_bytes())])]
+
+
+REGISTRY.add_collector(_process_collector)
@@ -0,0 +1,169 @@
+import os
+import math
+import json
+import shutil
+import hashlib
+import subprocess
+import logging
+from datetime import datetime
+
+from media_tools import find_ffmpeg
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class PreviewService:
+    """
+    Upload-time preview stage: one ffmpeg decode pass emits a poster thumbnail and
+    a tiled scrub sprite sheet, plus a WebVTT thumbnail track pointing into the sprite.
+    Outputs are content-addressed by the video's SHA-256 under
+    uploads/previews/{hash[:2]}/{hash}/ so identical uploads share one set of files.
+    """
+
+    POSTER_NAME = 'poster.jpg'
+    SPRITE_NAME = 'sprite.jpg'
+    VTT_NAME = 'thumbnails.vtt'
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, base_dir=None, tile_width=160, tile_height=90, columns=10, max_tiles=100,
+                 min_interval=2.0, poster_width=640):
+        self.base_dir = base_dir or os.path.join('uploads', 'previews')
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.columns = columns
+        self.max_tiles = max_tiles
+        self.min_interval = min_interval
+        self.poster_width = poster_width
+        self.ffmpeg_path = find_ffmpeg() or 'ffmpeg'
+
+    @staticmethod
+    def hash_file(path, chunk_size=1024 * 1024):
+        """SHA-256 of a file, streamed in chunks"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def preview_dir(self, content_hash):
+        return os.path.join(self.base_dir, content_hash[:2], content_hash)
+
+    def _plan(self, duration):
+        """Pick the sprite sampling interval and grid so the sheet holds at most max_tiles frames"""
+        interval = max(self.min_interval, duration / self.max_tiles)
+        tiles = max(1, min(self.max_tiles, int(math.ceil(duration / interval))))
+        columns = min(self.columns, tiles)
+        rows = int(math.ceil(tiles / columns))
+        return interval, tiles, columns, rows
+
+    @staticmethod
+    def _vtt_time(seconds):
+        hours, rem = divmod(seconds, 3600)
+        minutes, secs = divmod(rem, 60)
+        return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+    def _write_vtt(self, path, duration, interval, tiles, columns):
+        """WebVTT thumbnail track: one cue per tile, addressed with #xywh= into the sprite"""
+        lines = ['WEBVTT', '']
+        for index in range(tiles):
+            start = index * interval
+            if start >= duration:
+                break
+            end = min(duration, start + interval)
+            x = (index % columns) * self.tile_width
+            y = (index // columns) * self.tile_height
+            lines.append(f"{self._vtt_time(start)} --> {self._vtt_time(end)}")
+            lines.append(f"{self.SPRITE_NAME}#xywh={x},{y},{self.tile_width},{self.tile_height}")
+            lines.append('')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines))
+
+    def generate(self, video_path, duration, content_hash=None):
+        """
+        Generate (or reuse) previews for a video.
+        Returns {'contentHash', 'posterPath', 'spritePath', 'vttPath', 'reused'} or None on failure
+        """
+        tmp_dir = None
+        try:
+            if not duration or duration <= 0:
+                logger.warning(f"Skipping previews for {video_path}: unknown duration")
+                return None
+
+            content_hash = content_hash or self.hash_file(video_path)
+            out_dir = self.preview_dir(content_hash)
+            result = {
+                'contentHash': content_hash,
+                'posterPath': os.path.join(out_dir, self.POSTER_NAME),
+                'spritePath': os.path.join(out_dir, self.SPRITE_NAME),
+                'vttPath': os.path.join(out_dir, self.VTT_NAME),
+                'reused': False
+            }
+            if os.path.exists(os.path.join(out_dir, self.MANIFEST_NAME)):
+                result['reused'] = True
+                return result
+
+            # Work in a sibling temp dir and rename into place so readers never see partial output
+            tmp_dir = f"{out_dir}.tmp{os.getpid()}"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir, exist_ok=True)
+
+            interval, tiles, columns, rows = self._plan(duration)
+            poster_at = min(duration * 0.1, 5.0)
+            tile_filter = (
+                f"fps=1/{interval:.3f},"
+                f"scale={self.tile_width}:{self.tile_height}:force_original_aspect_ratio=decrease,"
+                f"pad={self.tile_width}:{self.tile_height}:(ow-iw)/2:(oh-ih)/2,"
+                f"tile={columns}x{rows}"
+            )
+            poster_filter = (
+                f"trim=start={poster_at:.3f},setpts=PTS-STARTPTS,"
+                f"scale={self.poster_width}:-2"
+            )
+            cmd = [
+                self.ffmpeg_path, '-v', 'error', '-i', video_path,
+                '-filter_complex', f"[0:v]split=2[p][s];[p]{poster_filter}[poster];[s]{tile_filter}[sprite]",
+                '-map', '[poster]', '-frames:v', '1', '-q:v', '3', os.path.join(tmp_dir, self.POSTER_NAME),
+                '-map', '[sprite]', '-frames:v', '1', '-q:v', '5', os.path.join(tmp_dir, self.SPRITE_NAME),
+                '-an', '-y'
+            ]
+            subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+            if not os.path.exists(os.path.join(tmp_dir, self.SPRITE_NAME)):
+                logger.error(f"Preview generation produced no sprite for {video_path}")
+                return None
+
+            self._write_vtt(os.path.join(tmp_dir, self.VTT_NAME), duration, interval, tiles, columns)
+            with open(os.path.join(tmp_dir, self.MANIFEST_NAME), 'w') as f:
+                json.dump({
+                    'contentHash': content_hash,
+                    'duration': duration,
+                    'interval': interval,
+                    'tiles': tiles,
+                    'columns': columns,
+                    'rows': rows,
+                    'tileWidth': self.tile_width,
+                    'tileHeight': self.tile_height,
+                    'createdAt': datetime.now().isoformat()
+                }, f, indent=2)
+
+            os.makedirs(os.path.dirname(out_dir), exist_ok=True)
+            try:
+                os.replace(tmp_dir, out_dir)
+            except OSError:
+                # Another upload of the same content won the race; keep its copy
+                result['reused'] = True
+
+            logger.info(f"Previews generated for {video_path}: {tiles} tiles every {interval:.1f}s")
+            return result
+
+        except subprocess.CalledProcessError as e:
+            logger.error(f"ffmpeg preview generation failed: {e.stderr}")
+            return None
+        except Exception as e:
+            logger.error(f"Preview generation error: {str(e)}")
+            return None
+        finally:
+            if tmp_dir:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,256 @@
+import os
+import re
+import sys
+import time
+import uuid
+import random
+import threading
+from collections import Counter, deque
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Opt-in sampling profiler for production requests. A request is profiled when its
+# X-Profile header matches PROFILE_TOKEN, or at random with probability PROFILE_SAMPLE_RATE.
+# While profiled requests are running, one daemon thread reads sys._current_frames() every
+# PROFILE_INTERVAL_MS and counts the stack of each profiled request thread; nothing runs
+# when no request is being profiled. Each profile is written to PROFILE_DIR in collapsed
+# ("folded") format, one `root;...;leaf count` line per stack, ready for flamegraph.pl or
+# speedscope, and per-route hot functions are kept in memory for /debug/profiles.
+# Only the request thread is sampled: work handed to the batch or LLM pools is not.
+# Reports (/debug/profiles) need X-Profile: <PROFILE_TOKEN>; without a token they are
+# served only to direct loopback clients (no X-Forwarded-For, i.e. not via a proxy).
+
+_SLUG = re.compile(r'[^A-Za-z0-9_.-]+')
+LOOPBACK_ADDRS = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+
+class ProfileSession:
+    __slots__ = ('id', 'method', 'path', 'route', 'thread_id', 'started', 'duration', 'stacks', 'samples')
+
+    def __init__(self, method, path, route, thread_id):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route = route
+        self.thread_id = thread_id
+        self.started = time.time()
+        self.duration = None
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class SamplingProfiler:
+    def __init__(self, output_dir=None, sample_rate=None, token=None, interval_ms=None, max_depth=None,
+                 max_files=None, recent=50):
+        self.output_dir = output_dir or os.getenv('PROFILE_DIR', 'profiles')
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.token = token if token is not None else os.getenv('PROFILE_TOKEN', '')
+        self.interval = float(interval_ms if interval_ms is not None else os.getenv('PROFILE_INTERVAL_MS', '10')) / 1000.0
+        self.max_depth = int(max_depth if max_depth is not None else os.getenv('PROFILE_MAX_DEPTH', '128'))
+        self.max_files = int(max_files if max_files is not None else os.getenv('PROFILE_MAX_FILES', '200'))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._labels = {}
+        self._recent = deque(maxlen=recent)
+        self._routes = {}
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or bool(self.token)
+
+    def should_profile(self, header_value=None):
+        if self.token and header_value == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def authorized(self, header_value=None, remote_addr=None, forwarded=False):
+        """Profile reports need the token; without one, only direct loopback requests get them"""
+        if self.token:
+            return header_value == self.token
+        return remote_addr in LOOPBACK_ADDRS and not forwarded
+
+    # -- sessions -----------------------------------------------------------------------
+
+    def start(self, method, path, route=None):
+        """Start sampling the calling thread"""
+        session = ProfileSession(method, path, route or path, threading.get_ident())
+        with self._lock:
+            self._sessions[session.thread_id] = session
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+                self._sampler.start()
+        return session
+
+    def stop(self, session, status=None):
+        """Stop sampling, write the collapsed stacks and fold them into the route summary"""
+        with self._lock:
+            if self._sessions.get(session.thread_id) is session:
+                del self._sessions[session.thread_id]
+        session.duration = time.time() - session.started
+        path = self._write(session) if session.samples else None
+        self._record(session, status, path)
+        return path
+
+    # -- sampling -----------------------------------------------------------------------
+
+    def _sample_loop(self):
+        while True:
+            # Sampled under the lock, so a stopped session never changes while it is written
+            with self._lock:
+                if not self._sessions:
+                    self._sampler = None
+                    return
+                frames = sys._current_frames()
+                for session in self._sessions.values():
+                    frame = frames.get(session.thread_id)
+                    if frame is not None:
+                        session.stacks[self._stack(frame)] += 1
+                        session.samples += 1
+                frames = frame = None
+            time.sleep(self.interval)
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)})"
+        return label
+
+    def _stack(self, frame):
+        # The leaf keeps its line number so hot loops inside one function stand out
+        leaf = f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+        labels = [leaf]
+        frame = frame.f_back
+        while frame is not None and len(labels) < self.max_depth:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ';'.join(labels)
+
+    # -- output -------------------------------------------------------------------------
+
+    def _write(self, session):
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            name = (f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(session.started))}-{session.method}-"
+                    f"{_SLUG.sub('_', session.path.strip('/')) or 'root'}-{session.id}.folded")[:200]
+            path = os.path.join(self.output_dir, name)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for stack, count in session.stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            os.replace(tmp_path, path)
+            self._prune()
+            return path
+        except OSError as e:
+            logger.warning("Could not write profile %s: %s", session.id, e)
+            return None
+
+    def _prune(self):
+        try:
+            names = sorted(n for n in os.listdir(self.output_dir) if n.endswith('.folded'))
+        except OSError:
+            return
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.output_dir, name))
+            except OSError:
+                pass
+
+    def profile_path(self, name):
+        """Absolute path of a written profile by file name, or None (no path traversal)"""
+        if os.path.basename(name) != name or not name.endswith('.folded'):
+            return None
+        path = os.path.join(self.output_dir, name)
+        return os.path.abspath(path) if os.path.isfile(path) else None
+
+    # -- summary ------------------------------------------------------------------------
+
+    def _record(self, session, status, path):
+        own, inclusive = Counter(), Counter()
+        for stack, count in session.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            # Count each function once per stack, so recursion does not inflate it
+            for label in set(re.sub(r':\d+\)$', ')', frame) for frame in frames):
+                inclusive[label] += count
+        with self._lock:
+            self._recent.append({
+                'id': session.id, 'method': session.method, 'path': session.path, 'route': session.route,
+                'status': status, 'durationMs': round(session.duration * 1000, 1), 'samples': session.samples,
+                'file': os.path.basename(path) if path else None,
+                'startedAt': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(session.started))
+            })
+            summary = self._routes.setdefault(session.route, {'profiles': 0, 'samples': 0, 'seconds': 0.0,
+                                                              'self': Counter(), 'total': Counter()})
+            summary['profiles'] += 1
+            summary['samples'] += session.samples
+            summary['seconds'] += session.duration
+            summary['self'].update(own)
+            summary['total'].update(inclusive)
+
+    def summary(self, top=15):
+        with self._lock:
+            routes = {
+                route: {
+                    'profiles': data['profiles'],
+                    'samples': data['samples'],
+                    'avgDurationMs': round(data['seconds'] / data['profiles'] * 1000, 1),
+                    'topSelf': [{'frame': label, 'samples': count,
+                                 'share': round(count / data['samples'], 4) if data['samples'] else 0.0}
+                                for label, count in data['self'].most_common(top)],
+                    'topTotal': [{'frame': label, 'samples': count,
+                                  'share': round(count / data['samples'], 4) if data['samples'] else 0.0}
+                                 for label, count in data['total'].most_common(top)]
+                }
+                for route, data in self._routes.items()
+            }
+            recent = list(reversed(self._recent))
+            active = len(self._sessions)
+        return {
+            'enabled': self.enabled,
+            'sampleRate': self.sample_rate,
+            'tokenConfigured': bool(self.token),
+            'intervalMs': round(self.interval * 1000, 2),
+            'outputDir': os.path.abspath(self.output_dir),
+            'active': active,
+            'recent': recent,
+            'routes': routes
+        }
+
+
+profiler = SamplingProfiler()
+
+
+def init_request_profiling(app):
+    """
+    Profile requests selected by X-Profile: <PROFILE_TOKEN> or PROFILE_SAMPLE_RATE; the
+    response carries X-Profile-ID and the collapsed stacks land in PROFILE_DIR.
+    """
+    from flask import request, g
+
+    if not profiler.enabled:
+        return
+
+    @app.before_request
+    def _start_request_profile():
+        if profiler.should_profile(request.headers.get('X-Profile')):
+            route = request.url_rule.rule if request.url_rule is not None else request.path
+            g.profile_session = profiler.start(request.method, request.path, route)
+
+    @app.after_request
+    def _profile_headers(response):
+        session = getattr(g, 'profile_session', None)
+        if session is not None:
+            response.headers['X-Profile-ID'] = session.id
+            g.profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _stop_request_profile(exc=None):
+        session = g.pop('profile_session', None)
+        if session is not None:
+            profiler.stop(session, g.pop('profile_status', 500 if exc is not None else None))
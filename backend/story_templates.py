@@ -0,0 +1,758 @@
+import random
+import hashlib
+import threading
+import copy
+from collections import OrderedDict
+
+# Fallback story engine used whenever Gemini is unavailable or out of quota.
+# Phrase tables are module constants (built once at import, templates use
+# str.format slots such as {subject}); rendered results are memoized by the
+# same seed key that drives the pseudo-random phrase choice, so a repeated
+# fallback request is a dictionary lookup.
+
+STORY_MODES = ('Hopeful', 'Motivational', 'Funny', 'Emotional', 'Reflective')
+
+INSPIRATIONAL_VOCAB = {
+    'Hopeful': {
+        'openers': [
+            "It began quietly, like a window opening to softer light.",
+            "Morning arrived with a gentle kind of clarity.",
+            "A small brightness found its way into the room."
+        ],
+        'metaphors': [
+            "paths unfolding like pages not yet written",
+            "seedlings pushing up through patient soil",
+            "new sky after passing rain"
+        ],
+        'verbs': ["invite", "nurture", "grow", "open"],
+        'closers': [
+            "Tomorrow will meet you halfway.",
+            "Even small light can guide a long way.",
+            "What you tend today becomes a horizon."
+        ],
+    },
+    'Motivational': {
+        'openers': [
+            "It started when you decided to move—no applause, just action.",
+            "The day sharpened the moment you took control.",
+            "Momentum noticed the instant you showed up."
+        ],
+        'metaphors': [
+            "gears catching, power building",
+            "distance closing with every step",
+            "sparks stacking into bright flame"
+        ],
+        'verbs': ["commit", "build", "push", "advance"],
+        'closers': [
+            "Discipline writes the ending you want.",
+            "Progress rewards the ones who keep showing up.",
+            "You're closer because you chose to move."
+        ],
+    },
+    'Funny': {
+        'openers': [
+            "It kicked off with a plan that looked suspiciously like improvisation.",
+            "You announced a brilliant idea; the universe replied, 'Interesting, proceed.'",
+            "Step one was confidence. Step two was Googling how to do step one."
+        ],
+        'metaphors': [
+            "a circus of tiny miracles",
+            "plot twists tripping over each other",
+            "chaos politely waiting its turn"
+        ],
+        'verbs': ["wing", "juggle", "tumble", "sparkle"],
+        'closers': [
+            "If life is a sitcom, today's episode ends with a fist‑pump.",
+            "You laughed, learned, and somehow it worked.",
+            "Comedy aside, look at you—actually nailing it."
+        ],
+    },
+    'Emotional': {
+        'openers': [
+            "It began with a feeling you could almost name.",
+            "A quiet ache turned into a gentle vow.",
+            "You carried it carefully, like a photograph you didn't want to bend."
+        ],
+        'metaphors': [
+            "memory threading itself through the present",
+            "tides returning to the shore they trust",
+            "warmth finding a hand in the dark"
+        ],
+        'verbs': ["listen", "hold", "honor", "heal"],
+        'closers': [
+            "What matters is held here, and it remains.",
+            "The heart remembers, and it keeps going.",
+            "You are allowed to feel this and still move forward."
+        ],
+    },
+    'Reflective': {
+        'openers': [
+            "You paused long enough for the day to make sense.",
+            "Questions settled like dust, revealing shape.",
+            "A little distance turned noise into meaning."
+        ],
+        'metaphors': [
+            "a map redrawn with truer lines",
+            "water clearing until the stones show",
+            "threads weaving into a patient pattern"
+        ],
+        'verbs': ["observe", "clarify", "align", "tend"],
+        'closers': [
+            "Clarity is quiet progress.",
+            "Understanding is also a kind of arrival.",
+            "You leave the day more aligned than you found it."
+        ],
+    },
+}
+
+INSPIRATIONAL_EXTRA = {
+    'Hopeful': (
+        "Tomorrow's plan is small and kind to your future self: one focused task,"
+        " one mindful pause, and permission to celebrate what goes right."
+    ),
+    'Motivational': (
+        "Set the next rep now: clear target, short deadline, honest effort."
+        " Consistency will do the heavy lifting if you show up."
+    ),
+    'Funny': (
+        "Note to self: label your boxes, hydrate, and keep the soundtrack upbeat."
+        " Hero arcs love good snacks."
+    ),
+    'Emotional': (
+        "You honor where you've been and trust where you're going."
+        " That tenderness is strength making room for growth."
+    ),
+    'Reflective': (
+        "You mark a lesson or two in the margins and travel lighter."
+        " Insight quietly changes the route."
+    ),
+}
+
+PROMPT_THEMES = {
+    'learning': ['learn', 'study', 'practice', 'skill', 'knowledge', 'education'],
+    'career': ['work', 'job', 'career', 'business', 'professional', 'success'],
+    'health': ['fitness', 'health', 'exercise', 'diet', 'wellness', 'mental'],
+    'relationships': ['love', 'relationship', 'family', 'friend', 'marriage', 'dating'],
+    'creativity': ['art', 'music', 'write', 'create', 'design', 'creative'],
+    'personal': ['confidence', 'fear', 'anxiety', 'growth', 'change', 'goal'],
+    'social': ['speaking', 'social', 'network', 'communication', 'public'],
+    'financial': ['money', 'finance', 'budget', 'saving', 'investment', 'debt']
+}
+
+# Theme-aware phrase pools; {subject} is the user's prompt (lowercased)
+ENHANCED_VOCAB = {
+    'Hopeful': {
+        'learning': {
+            'openers': [
+                "You opened the first page of {subject}, and something shifted.",
+                "The moment you decided to tackle {subject}, a new chapter began.",
+                "Learning {subject} started with a single, brave step forward."
+            ],
+            'challenges': [
+                "The first attempts at {subject} felt clumsy and uncertain.",
+                "You stumbled through the basics of {subject}, making mistakes.",
+                "Progress with {subject} came slowly, one small victory at a time."
+            ],
+            'breakthroughs': [
+                "Then came the day when {subject} started making sense.",
+                "Something clicked with {subject}, and you felt a spark of confidence.",
+                "You realized that {subject} wasn't impossible—just unfamiliar."
+            ]
+        },
+        'career': {
+            'openers': [
+                "You looked at your {subject} goals and felt both excited and nervous.",
+                "The path toward {subject} success began with honest self-assessment.",
+                "Your {subject} journey started when you dared to dream bigger."
+            ],
+            'challenges': [
+                "The road to {subject} wasn't smooth—there were setbacks and doubts.",
+                "You faced rejection and criticism while pursuing {subject}.",
+                "Balancing {subject} ambitions with daily responsibilities felt overwhelming."
+            ],
+            'breakthroughs': [
+                "But you kept showing up for {subject}, even on the hard days.",
+                "Small wins in {subject} started adding up to real progress.",
+                "You discovered that {subject} success came from consistent effort."
+            ]
+        },
+        'health': {
+            'openers': [
+                "You decided that {subject} was worth the effort, no matter how small.",
+                "Your {subject} journey began with a simple promise to yourself.",
+                "Taking care of your {subject} felt like an act of self-love."
+            ],
+            'challenges': [
+                "Old habits around {subject} were hard to break.",
+                "You faced days when {subject} felt impossible to prioritize.",
+                "Progress with {subject} came in waves, not steady lines."
+            ],
+            'breakthroughs': [
+                "But you learned that {subject} was about consistency, not perfection.",
+                "Small changes in {subject} started creating bigger results.",
+                "You discovered that {subject} was a journey, not a destination."
+            ]
+        },
+        'relationships': {
+            'openers': [
+                "You realized that {subject} relationships required vulnerability.",
+                "Your {subject} journey began with honest communication.",
+                "Building better {subject} connections started with self-reflection."
+            ],
+            'challenges': [
+                "Opening up about {subject} felt scary and uncertain.",
+                "You faced misunderstandings and conflicts in your {subject} journey.",
+                "Trusting others with your {subject} feelings took courage."
+            ],
+            'breakthroughs': [
+                "But you learned that {subject} relationships grow through honesty.",
+                "Small moments of connection in {subject} became meaningful.",
+                "You discovered that {subject} love and friendship require patience."
+            ]
+        },
+        'personal': {
+            'openers': [
+                "You looked at {subject} and decided it was time for change.",
+                "Your {subject} journey began with a moment of honest self-reflection.",
+                "Facing your {subject} fears felt like stepping into unknown territory."
+            ],
+            'challenges': [
+                "The path through {subject} was filled with uncertainty and doubt.",
+                "You faced setbacks and moments of wanting to give up on {subject}.",
+                "Progress with {subject} came slowly, testing your patience."
+            ],
+            'breakthroughs': [
+                "But you discovered that {subject} growth happens in small steps.",
+                "Each day of working on {subject} made you stronger.",
+                "You learned that {subject} transformation takes time and kindness."
+            ]
+        }
+    },
+    'Motivational': {
+        'learning': {
+            'openers': [
+                "You committed to mastering {subject}, no matter what it took.",
+                "The decision to excel at {subject} became your driving force.",
+                "You set your sights on {subject} and refused to look back."
+            ],
+            'strategies': [
+                "You broke down {subject} into manageable, daily actions.",
+                "Every morning, you focused on one specific aspect of {subject}.",
+                "You created a system for practicing {subject} consistently."
+            ],
+            'results': [
+                "Your dedication to {subject} started showing real results.",
+                "People noticed your growing expertise in {subject}.",
+                "You became the person others turned to for {subject} advice."
+            ]
+        },
+        'career': {
+            'openers': [
+                "You mapped out your {subject} success plan with precision.",
+                "The vision of your {subject} future became your daily motivation.",
+                "You decided that {subject} excellence was non-negotiable."
+            ],
+            'strategies': [
+                "You invested in {subject} skills that would set you apart.",
+                "Every decision you made aligned with your {subject} goals.",
+                "You built a network of {subject} professionals who inspired you."
+            ],
+            'results': [
+                "Your {subject} efforts started opening new opportunities.",
+                "Recognition for your {subject} work began to flow naturally.",
+                "You became known as someone who delivered {subject} results."
+            ]
+        },
+        'health': {
+            'openers': [
+                "You committed to transforming your {subject} habits permanently.",
+                "The vision of your {subject} future self became your motivation.",
+                "You decided that {subject} excellence was worth every effort."
+            ],
+            'strategies': [
+                "You created a {subject} routine that worked for your lifestyle.",
+                "Every choice you made supported your {subject} goals.",
+                "You surrounded yourself with {subject} inspiration and support."
+            ],
+            'results': [
+                "Your {subject} transformation became visible to others.",
+                "You started feeling stronger and more confident in your {subject} journey.",
+                "Your {subject} success inspired others to make changes too."
+            ]
+        },
+        'relationships': {
+            'openers': [
+                "You committed to building the {subject} relationships you deserved.",
+                "The vision of deeper {subject} connections drove your actions.",
+                "You decided that {subject} love and friendship were worth fighting for."
+            ],
+            'strategies': [
+                "You learned to communicate {subject} needs clearly and kindly.",
+                "Every interaction became an opportunity to strengthen {subject} bonds.",
+                "You invested time and energy in the {subject} relationships that mattered."
+            ],
+            'results': [
+                "Your {subject} relationships started growing deeper and stronger.",
+                "You became known as someone who nurtured {subject} connections.",
+                "Your {subject} love and friendship became a source of strength."
+            ]
+        },
+        'personal': {
+            'openers': [
+                "You committed to conquering {subject} once and for all.",
+                "The vision of your {subject} future self became your daily motivation.",
+                "You decided that {subject} growth was non-negotiable."
+            ],
+            'strategies': [
+                "You faced {subject} challenges head-on, one day at a time.",
+                "Every setback in {subject} became a lesson in resilience.",
+                "You built a support system for your {subject} journey."
+            ],
+            'results': [
+                "Your {subject} transformation became visible to everyone around you.",
+                "You became an inspiration to others facing similar {subject} challenges.",
+                "Your {subject} success story became a testament to perseverance."
+            ]
+        }
+    }
+}
+
+# Word lists used to detect the dominant theme of a transcript
+CONTENT_THEMES = {
+    'personal': ['i', 'me', 'my', 'myself', 'personal', 'experience'],
+    'relationship': ['love', 'relationship', 'partner', 'family', 'friend', 'together'],
+    'achievement': ['success', 'achieved', 'accomplished', 'goal', 'dream', 'reached'],
+    'learning': ['learned', 'discovered', 'realized', 'understood', 'found'],
+    'challenge': ['difficult', 'challenge', 'struggle', 'overcame', 'faced'],
+    'emotion': ['feel', 'felt', 'happy', 'sad', 'excited', 'nervous', 'proud']
+}
+
+# Content-based story templates per mode. Slots: {visuals} (up to three visual tags),
+# {phrase} (first meaningful transcript sentence), {signal} (first transcript word
+# found in signal_words; the 'signal' paragraph is skipped when none is found).
+CONTENT_STORY_TEMPLATES = {
+    'Hopeful': {
+        'signal_words': frozenset(['love', 'happy', 'good', 'great', 'wonderful', 'amazing', 'beautiful', 'success', 'achievement']),
+        'default_visuals': 'this moment',
+        'default_phrase': 'this experience',
+        'intro': (
+            "In this video, we see {visuals} come to life through authentic moments and genuine expression. "
+            "The words shared—'{phrase}'—reveal a journey of growth and discovery. "
+        ),
+        'signal': (
+            "There's something beautiful about how {signal} emerges naturally from this experience. "
+            "It's a reminder that even in our everyday moments, there's potential for connection and meaning. "
+        ),
+        'outro': (
+            "What makes this content special is its authenticity. It's not about perfection—it's about real moments, "
+            "real emotions, and real connections. The visual elements of {visuals} create a backdrop for "
+            "stories that resonate with our own experiences. "
+            "Every video like this reminds us that hope isn't found in grand gestures, but in the small, "
+            "genuine moments we share with others. This content captures that truth beautifully."
+        )
+    },
+    'Motivational': {
+        'signal_words': frozenset(['did', 'made', 'created', 'built', 'achieved', 'accomplished', 'reached', 'overcame']),
+        'default_visuals': 'this content',
+        'default_phrase': 'this achievement',
+        'intro': (
+            "This video captures the essence of action and determination. Through {visuals}, "
+            "we witness the power of showing up and doing the work. "
+            "The message here—'{phrase}'—speaks to the importance of taking steps forward. "
+        ),
+        'signal': (
+            "What's inspiring is how this content demonstrates that {signal} is possible "
+            "when we commit to our goals. It's not about having all the answers—it's about "
+            "starting with what we have and building from there. "
+        ),
+        'outro': (
+            "The visual elements of {visuals} serve as a powerful reminder that our actions "
+            "create our reality. Every frame of this video shows what's possible when we "
+            "refuse to let fear or doubt stop us from moving forward. "
+            "This content proves that motivation isn't something we wait for—it's something we create "
+            "through consistent action and unwavering commitment to our vision."
+        )
+    },
+    'Funny': {
+        'signal_words': frozenset(),
+        'default_visuals': 'this delightful moment',
+        'default_phrase': 'this amusing situation',
+        'intro': (
+            "There's something wonderfully human about this video. Through {visuals}, "
+            "we get a front-row seat to the kind of moments that make life entertaining. "
+            "The content here—'{phrase}'—captures that perfect blend of effort and "
+            "the inevitable plot twists that make any good story worth watching. "
+        ),
+        'signal': '',
+        'outro': (
+            "What makes this content so relatable is its authenticity. It's not trying to be perfect—"
+            "it's just being real, and that's where the humor naturally emerges. "
+            "The visual elements of {visuals} create a backdrop for the kind of "
+            "everyday adventures that we all experience but rarely capture on camera. "
+            "This video reminds us that sometimes the best comedy comes from simply "
+            "showing up and being willing to laugh at ourselves along the way."
+        )
+    },
+    'Emotional': {
+        'signal_words': frozenset(['love', 'feel', 'heart', 'sad', 'happy', 'miss', 'care', 'important']),
+        'default_visuals': 'this intimate moment',
+        'default_phrase': 'this emotional experience',
+        'intro': (
+            "This video captures something deeply human and profoundly moving. Through {visuals}, "
+            "we witness the raw beauty of authentic emotion and genuine connection. "
+            "The words shared—'{phrase}'—speak to the heart of what makes us human. "
+        ),
+        'signal': (
+            "There's a tenderness in how this content explores {signal}, "
+            "reminding us that vulnerability is not weakness—it's strength in its purest form. "
+            "It's about the courage to feel deeply and share those feelings with others. "
+        ),
+        'outro': (
+            "The visual elements of {visuals} create a safe space for emotions to unfold naturally. "
+            "This content reminds us that the most meaningful moments in life aren't always "
+            "the loudest or most dramatic—they're often the quiet ones where we allow ourselves "
+            "to be seen and heard exactly as we are."
+        )
+    },
+    'Reflective': {
+        'signal_words': frozenset(['realized', 'learned', 'discovered', 'understood', 'found', 'saw', 'recognized']),
+        'default_visuals': 'this thoughtful moment',
+        'default_phrase': 'this realization',
+        'intro': (
+            "This video invites us into a moment of genuine reflection and self-discovery. "
+            "Through {visuals}, we witness the kind of insight that comes from "
+            "paying attention to our experiences. The content here—'{phrase}'—"
+            "captures a moment of clarity that many of us can relate to. "
+        ),
+        'signal': (
+            "There's wisdom in how this content explores what it means to {signal}, "
+            "reminding us that growth often comes from simply being present with our experiences. "
+            "It's about the quiet moments of understanding that change everything. "
+        ),
+        'outro': (
+            "The visual elements of {visuals} serve as a metaphor for the way we process "
+            "our own experiences. This content reminds us that reflection isn't about "
+            "finding all the answers—it's about asking better questions and being open "
+            "to the insights that emerge when we slow down and pay attention."
+        )
+    }
+}
+
+# Scene caption/narration templates for the mock story, by story mode and whether
+# the transcript is about snow cones. Slots: {title} (prompt in title case), {prompt}
+MOCK_SCENE_TEMPLATES = {
+    ('positive', True): (
+        [
+            "🍦 Wonderful {title} Adventure",
+            "❄️ Magical {title} Moments",
+            "🎉 Joyful {title} Experience",
+            "🌟 Perfect {title} Delight"
+        ],
+        [
+            "Our wonderful {prompt} adventure begins with pure excitement and joy.",
+            "The magical {prompt} moments unfold with amazing energy and happiness.",
+            "Joyful {prompt} experience brings incredible satisfaction and delight.",
+            "Perfect {prompt} delight concludes with fantastic memories and bliss."
+        ]
+    ),
+    ('positive', False): (
+        [
+            "🌟 Wonderful {title} Begins",
+            "✨ Magical {title} Unfolds",
+            "🎉 Joyful {title} Continues",
+            "💫 Perfect {title} Emerges"
+        ],
+        [
+            "Our wonderful {prompt} begins with pure excitement and joy.",
+            "Magical {prompt} unfolds with amazing energy and happiness.",
+            "Joyful {prompt} continues with incredible satisfaction and delight.",
+            "Perfect {prompt} emerges with fantastic memories and bliss."
+        ]
+    ),
+    ('negative', True): (
+        [
+            "🍦 Intense {title} Challenge",
+            "❄️ Dramatic {title} Struggle",
+            "🎯 Powerful {title} Conflict",
+            "🌟 Compelling {title} Drama"
+        ],
+        [
+            "Our intense {prompt} challenge begins with dramatic tension and conflict.",
+            "The dramatic {prompt} struggle unfolds with powerful determination and resilience.",
+            "Powerful {prompt} conflict brings emotional intensity and transformation.",
+            "Compelling {prompt} drama concludes with striking impact and growth."
+        ]
+    ),
+    ('negative', False): (
+        [
+            "🌟 Intense {title} Challenge",
+            "✨ Dramatic {title} Struggle",
+            "🎯 Powerful {title} Conflict",
+            "💫 Compelling {title} Drama"
+        ],
+        [
+            "Our intense {prompt} challenge begins with dramatic tension and conflict.",
+            "Dramatic {prompt} struggle unfolds with powerful determination and resilience.",
+            "Powerful {prompt} conflict continues with emotional intensity and transformation.",
+            "Compelling {prompt} drama emerges with striking impact and growth."
+        ]
+    ),
+    ('normal', True): (
+        [
+            "🍦 Dynamic {title} Journey",
+            "❄️ Engaging {title} Experience",
+            "🎯 Captivating {title} Story",
+            "🌟 Memorable {title} Adventure"
+        ],
+        [
+            "Our dynamic {prompt} journey begins with engaging energy and focus.",
+            "The engaging {prompt} experience unfolds with captivating precision and drive.",
+            "Captivating {prompt} story brings memorable presentation and spirit.",
+            "Memorable {prompt} adventure concludes with impressive satisfaction and vitality."
+        ]
+    ),
+    ('normal', False): (
+        [
+            "🌟 Dynamic {title} Journey",
+            "✨ Engaging {title} Experience",
+            "🎯 Captivating {title} Story",
+            "💫 Memorable {title} Adventure"
+        ],
+        [
+            "Our dynamic {prompt} journey begins with engaging energy and focus.",
+            "Engaging {prompt} experience unfolds with captivating precision and drive.",
+            "Captivating {prompt} story continues with memorable presentation and spirit.",
+            "Memorable {prompt} adventure emerges with impressive satisfaction and vitality."
+        ]
+    )
+}
+
+# Word swaps applied at random (p=0.5 each) to mock scene captions
+MOCK_CAPTION_VARIANTS = (
+    ("Begins", ("Starts", "Unfolds", "Emerges", "Takes Off", "Launches", "Commences")),
+    ("Unfolds", ("Develops", "Progresses", "Advances", "Evolves", "Grows", "Expands")),
+    ("Continues", ("Persists", "Endures", "Sustains", "Maintains", "Keeps Going", "Proceeds")),
+    ("Emerges", ("Appears", "Surfaces", "Rises", "Manifests", "Comes Forth", "Shows Up")),
+    ("Wonderful", ("Amazing", "Incredible", "Fantastic", "Brilliant", "Spectacular", "Marvelous")),
+    ("Magical", ("Enchanting", "Mystical", "Spellbinding", "Fascinating", "Captivating", "Mesmerizing")),
+    ("Perfect", ("Ideal", "Flawless", "Excellent", "Superb", "Outstanding", "Exceptional")),
+)
+
+SNOW_CONE_WORDS = ('cup', 'cups', 'ice', 'snow', 'cone', 'cones')
+
+# (max duration, scene count, seconds per scene)
+MOCK_SCENE_PLAN = ((30, 2, 5), (60, 3, 6), (120, 4, 7), (float('inf'), 5, 8))
+
+
+class TemplateMemo:
+    """Bounded LRU of rendered fallback results keyed by their seed key"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+
+_memo = TemplateMemo()
+
+
+def seeded_random(seed_key):
+    """random.Random seeded from the SHA-256 of seed_key, so equal inputs pick equal phrases"""
+    seed = int(hashlib.sha256(seed_key.encode("utf-8")).hexdigest(), 16) % (2**32)
+    return random.Random(seed)
+
+
+def inspirational_story(prompt, mode):
+    """Prompt-driven inspirational story (≈220–320 words) styled by mode"""
+    prompt_clean = (prompt or 'your journey').strip()
+    seed_key = f"{prompt_clean}|{mode}"
+
+    def render():
+        rnd = seeded_random(seed_key)
+        style = INSPIRATIONAL_VOCAB.get(mode, INSPIRATIONAL_VOCAB['Hopeful'])
+        opener = rnd.choice(style['openers'])
+        metaphor = rnd.choice(style['metaphors'])
+        verb_pair = ", ".join(rnd.sample(style['verbs'], k=min(2, len(style['verbs']))))
+        closer = rnd.choice(style['closers'])
+
+        p1 = (
+            f"{opener} You looked at {prompt_clean} and the day tilted in your favor,"
+            f" {metaphor}. What seemed distant stepped a little closer,"
+            f" and you decided to {verb_pair}."
+        )
+        p2 = (
+            f"You tried, adjusted, and tried again. The imperfect first draft of action"
+            f" became a clearer sketch: smaller goals, steadier breaths, a rhythm you could keep."
+            f" Setbacks didn't erase progress; they revealed where strength belonged."
+            f" With each pass, {prompt_clean} felt more possible, more yours."
+        )
+        p3 = (
+            f"By evening there was proof—subtle but real. You learned what to keep and what to let go."
+            f" You closed the day with gratitude and a simple promise to continue. {closer}"
+        )
+        story = "\n\n".join([p1, p2, p3])
+
+        # If a bit short, extend with a concise paragraph tailored to the mode
+        if len(story.split()) < 220:
+            story = story + "\n\n" + INSPIRATIONAL_EXTRA.get(mode, "Tomorrow will meet you halfway.")
+        return story
+
+    return _memo.get_or_render(('inspirational', seed_key), render)
+
+
+def enhanced_inspirational_story(prompt, mode):
+    """Theme-aware inspirational story specific to the user's prompt"""
+    prompt_clean = (prompt or 'your journey').strip().lower()
+    seed_key = f"{prompt_clean}|{mode}"
+
+    def render():
+        prompt_keywords = prompt_clean.split()
+        primary_theme = 'personal'
+        for theme, keywords in PROMPT_THEMES.items():
+            if any(keyword in prompt_keywords for keyword in keywords):
+                primary_theme = theme
+                break
+
+        rnd = seeded_random(seed_key)
+        mode_content = ENHANCED_VOCAB.get(mode, ENHANCED_VOCAB['Hopeful'])
+        theme_content = mode_content.get(primary_theme, mode_content.get('personal', mode_content))
+
+        if mode == 'Hopeful':
+            opener = rnd.choice(theme_content['openers']).format(subject=prompt_clean)
+            challenge = rnd.choice(theme_content['challenges']).format(subject=prompt_clean)
+            breakthrough = rnd.choice(theme_content['breakthroughs']).format(subject=prompt_clean)
+            return (
+                f"{opener} At first, the path seemed overwhelming, but you took that first step anyway. "
+                f"{challenge} There were moments when you wanted to give up, when the progress felt too slow. "
+                f"But you reminded yourself that every expert was once a beginner, every master started with uncertainty. "
+                f"{breakthrough} You learned to celebrate small victories and to be patient with the process. "
+                f"Today, you're not the same person who started this journey. You're stronger, wiser, and more resilient. "
+                f"Your {prompt_clean} story is still being written, but you're the author now, and every chapter gets better."
+            )
+
+        if mode == 'Motivational':
+            opener = rnd.choice(theme_content['openers']).format(subject=prompt_clean)
+            strategy = rnd.choice(theme_content['strategies']).format(subject=prompt_clean)
+            result = rnd.choice(theme_content['results']).format(subject=prompt_clean)
+            return (
+                f"{opener} You knew that success in {prompt_clean} wouldn't come from wishing—it would come from doing. "
+                f"{strategy} You refused to let excuses stand in your way. Every day, you showed up for your {prompt_clean} goals. "
+                f"When others doubted, you doubled down. When obstacles appeared, you found ways around them. "
+                f"{result} Your commitment to {prompt_clean} excellence became your signature. "
+                f"People started noticing your dedication, your consistency, your refusal to settle for anything less than your best. "
+                f"Your {prompt_clean} journey proves that when you commit fully to your goals, the universe conspires to help you succeed."
+            )
+
+        # For other modes, use a more generic but still specific approach
+        return (
+            f"Your journey with {prompt_clean} began with a simple decision to change. "
+            f"You faced challenges, learned from setbacks, and kept moving forward. "
+            f"Today, you're stronger because of your {prompt_clean} experience. "
+            f"Your story inspires others who are on similar paths. "
+            f"Remember: every expert was once a beginner, and every success story started with a single step."
+        )
+
+    return _memo.get_or_render(('enhanced', seed_key), render)
+
+
+def content_based_story(transcript, visual_tags, key_moments, mode, additional_prompt=""):
+    """Story built from the video's transcript and visual tags, styled by mode"""
+    transcript_clean = (transcript or '').strip()
+    visual_elements = [tag.get('tag', '') for tag in visual_tags or [] if tag.get('tag')]
+    key_visuals = tuple(visual_elements[:5]) if visual_elements else ('video content',)
+    template = CONTENT_STORY_TEMPLATES.get(mode, CONTENT_STORY_TEMPLATES['Hopeful'])
+    # The rendered text depends only on the transcript, the visuals and the mode
+    digest = hashlib.sha256(f"{transcript_clean}|{'|'.join(key_visuals)}|{mode}".encode("utf-8")).hexdigest()
+
+    def render():
+        words = transcript_clean.lower().split()
+        sentences = transcript_clean.split('.') if transcript_clean else []
+        phrases = [s.strip() for s in sentences if len(s.strip()) > 10][:3]
+
+        visuals = ', '.join(key_visuals[:3]) if key_visuals else template['default_visuals']
+        slots = {'visuals': visuals, 'phrase': phrases[0] if phrases else template['default_phrase']}
+        story = template['intro'].format(**slots)
+        signal = next((word for word in words if word in template['signal_words']), None)
+        if signal and template['signal']:
+            story += template['signal'].format(signal=signal, **slots)
+        return story + template['outro'].format(**slots)
+
+    return _memo.get_or_render(('content', digest), render)
+
+
+def mock_story_scenes(transcript, word_timestamps, prompt, mode):
+    """
+    Scene list for the offline story generator: 2-5 short scenes spread over the
+    video with gaps between them, captions/narration from the mode templates.
+    Returns [{'start', 'end', 'caption', 'narration'}] (a fresh copy per call).
+    """
+    duration = 60
+    try:
+        valid_timestamps = [ts for ts in word_timestamps or [] if ts and isinstance(ts, dict) and 'end_time' in ts]
+        if valid_timestamps:
+            duration = max(ts['end_time'] for ts in valid_timestamps)
+    except (TypeError, ValueError):
+        duration = 60
+
+    transcript_lower = (transcript or '').lower()
+    snow_cones = any(word in transcript_lower for word in SNOW_CONE_WORDS)
+    mode_key = (mode or '').lower()
+    if mode_key not in ('positive', 'negative'):
+        mode_key = 'normal'
+    prompt = prompt or ''
+    seed_key = f"{prompt}|{mode_key}|{snow_cones}|{duration}"
+
+    def render():
+        rnd = seeded_random(seed_key)
+        scene_count, scene_duration = next((count, length) for limit, count, length in MOCK_SCENE_PLAN
+                                           if duration <= limit)
+        caption_templates, narration_templates = MOCK_SCENE_TEMPLATES[(mode_key, snow_cones)]
+        slots = {'title': prompt.title(), 'prompt': prompt}
+
+        scenes = []
+        for i in range(scene_count):
+            # Start at 10% of the video and spread scenes over 60% of it, leaving gaps
+            base_start = duration * 0.1
+            gap_between_scenes = (duration * 0.6) / (scene_count + 1)
+            start_time = base_start + (i * gap_between_scenes)
+            end_time = start_time + scene_duration
+            if end_time > duration:
+                end_time = duration
+                start_time = max(0, end_time - scene_duration)
+
+            caption = caption_templates[i % len(caption_templates)].format(**slots)
+            narration = narration_templates[i % len(narration_templates)].format(**slots)
+            for word, replacements in MOCK_CAPTION_VARIANTS:
+                if rnd.random() < 0.5:
+                    caption = caption.replace(word, rnd.choice(replacements))
+
+            scenes.append({
+                "start": round(start_time, 2),
+                "end": round(end_time, 2),
+                "caption": caption,
+                "narration": narration
+            })
+        return scenes
+
+    return copy.deepcopy(_memo.get_or_render(('mock', seed_key), render))
+
+
+def memo_stats():
+    return {'hits': _memo.hits, 'misses': _memo.misses, 'entries': len(_memo._entries)}
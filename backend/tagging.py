@@ -3,6 +3,7 @@ import subprocess
 import json
 import time
 import logging
+import threading
 from datetime import datetime
 try:
     from google.cloud import vision
@@ -14,13 +15,120 @@ except Exception:
     service_account = None
 from collections import defaultdict
 
+from metrics import observe_stage
+from media_tools import find_ffmpeg
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FALLBACK_SOURCE = 'fallback'
+
+
+def frame_source(labels):
+    """'fallback' when every label came from the heuristic analysis, else 'model'"""
+    if labels and all(label.get('source') == FALLBACK_SOURCE for label in labels):
+        return FALLBACK_SOURCE
+    return 'model'
+
+
+class FrameAnalysisStore:
+    """
+    Persist per-frame label analyses with their timestamps so that later tag
+    requests (especially time-windowed ones) only analyze frames not seen before.
+    Stored as local JSON under {base_dir}/{videoId}_frames.json. Frames labelled by
+    the heuristic fallback are kept with source 'fallback' and count as missing,
+    so a later request re-analyzes them with the model.
+    """
+
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.path.join('uploads', 'frame_analyses')
+        self._lock = threading.Lock()
+
+    def _path(self, video_id):
+        return os.path.join(self.base_dir, f"{video_id}_frames.json")
+
+    @staticmethod
+    def key(timestamp):
+        return f"{float(timestamp):.3f}"
+
+    def load(self, video_id):
+        """Return {timestamp_key: {'timestamp', 'labels', 'analyzedAt'}} for a video"""
+        try:
+            path = self._path(video_id)
+            if not os.path.exists(path):
+                return {}
+            with open(path, 'r') as f:
+                data = json.load(f)
+            return data.get('frames', {}) or {}
+        except Exception as e:
+            logger.warning(f"Failed to load frame analyses for {video_id}: {str(e)}")
+            return {}
+
+    def has(self, frames, timestamp):
+        entry = frames.get(self.key(timestamp))
+        return entry is not None and entry.get('source') != FALLBACK_SOURCE
+
+    def save(self, video_id, frame_analyses):
+        """Merge new frame analyses into the stored set for a video"""
+        if not frame_analyses:
+            return
+        with self._lock:
+            try:
+                frames = self.load(video_id)
+                now = datetime.now().isoformat()
+                for frame_data in frame_analyses:
+                    frames[self.key(frame_data['timestamp'])] = {
+                        'timestamp': float(frame_data['timestamp']),
+                        'labels': frame_data.get('labels', []),
+                        'source': frame_source(frame_data.get('labels')),
+                        'analyzedAt': now
+                    }
+                os.makedirs(self.base_dir, exist_ok=True)
+                path = self._path(video_id)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({
+                        'videoId': video_id,
+                        'frames': frames,
+                        'updatedAt': now,
+                        'totalFrames': len(frames)
+                    }, f, indent=2)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                logger.error(f"Failed to save frame analyses for {video_id}: {str(e)}")
+
+    def get_range(self, video_id, start_time=None, end_time=None, frames=None, include_fallback=True):
+        """Return stored frame analyses within [start_time, end_time), sorted by timestamp"""
+        frames = self.load(video_id) if frames is None else frames
+        selected = []
+        for entry in frames.values():
+            if not include_fallback and (entry.get('source') or frame_source(entry.get('labels'))) == FALLBACK_SOURCE:
+                continue
+            ts = entry.get('timestamp', 0.0)
+            if start_time is not None and ts < start_time:
+                continue
+            if end_time is not None and ts >= end_time - 1e-6:
+                continue
+            selected.append({'timestamp': ts, 'labels': entry.get('labels', [])})
+        selected.sort(key=lambda x: x['timestamp'])
+        return selected
+
+    def delete(self, video_id):
+        try:
+            path = self._path(video_id)
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logger.warning(f"Failed to delete frame analyses for {video_id}: {str(e)}")
+
+
 class VisualTaggingService:
-    def __init__(self, project_id):
+    def __init__(self, project_id, frame_store=None, video_info_provider=None):
         self.project_id = project_id
+        self.frame_store = frame_store or FrameAnalysisStore()
+        # Optional callable(path) -> info dict with 'duration' (e.g. the cached ffprobe probe)
+        self.video_info_provider = video_info_provider
         
         # Set Google Cloud credentials
         credentials_path = os.path.join(os.path.dirname(__file__), 'google-credentials.json')
@@ -97,26 +205,16 @@ class VisualTaggingService:
                 output_pattern
             ]
             
-            # DEBUG: Check PATH and FFmpeg availability
-            import shutil
-            ffmpeg_path = shutil.which('ffmpeg')
-            logger.info(f"DEBUG: Current PATH: {os.environ.get('PATH', 'PATH_NOT_SET')}")
-            logger.info(f"DEBUG: ffmpeg found at: {ffmpeg_path}")
-            
+            ffmpeg_path = find_ffmpeg()
             if not ffmpeg_path:
-                logger.info("DEBUG: ffmpeg not found in PATH, trying direct path...")
-                # Try direct path
-                direct_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"
-                if os.path.exists(direct_path):
-                    logger.info(f"DEBUG: Using direct path: {direct_path}")
-                    cmd = [direct_path] + cmd[1:]  # Replace first element with direct path
-                else:
-                    logger.error(f"DEBUG: Direct path {direct_path} does not exist")
-                    return []
+                logger.error("ffmpeg not available, cannot extract frames")
+                return []
+            cmd[0] = ffmpeg_path
             
             logger.info(f"DEBUG: Running command: {' '.join(cmd)}")
             # Run ffmpeg command
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            with observe_stage('frame_extraction', {'process.command': cmd[0]}):
+                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
             
             # Get list of extracted frames
             frame_files = []
@@ -239,14 +337,14 @@ class VisualTaggingService:
                 tags.append({'tag': 'low-resolution', 'score': 0.7})
             
             logger.info(f"Fallback analysis detected {len(tags)} tags in {os.path.basename(frame_path)}")
-            return tags
+            return [dict(tag, source=FALLBACK_SOURCE) for tag in tags]
             
         except ImportError:
             logger.warning("OpenCV not available for fallback analysis")
-            return [{'tag': 'video-frame', 'score': 0.9}]
+            return [{'tag': 'video-frame', 'score': 0.9, 'source': FALLBACK_SOURCE}]
         except Exception as e:
             logger.error(f"Fallback analysis error: {str(e)}")
-            return [{'tag': 'video-frame', 'score': 0.9}]
+            return [{'tag': 'video-frame', 'score': 0.9, 'source': FALLBACK_SOURCE}]
     
     def aggregate_tags_from_frames(self, frame_analyses):
         """
@@ -296,7 +394,59 @@ class VisualTaggingService:
         except Exception as e:
             logger.error(f"Tag aggregation error: {str(e)}")
             return []
-    
+
+    def build_tag_timeline(self, frame_analyses, frame_interval: float = 2.0, min_score: float = 0.3):
+        """
+        Coalesce per-frame labels into tag occurrence intervals.
+        Consecutive sample frames carrying the same (normalized) tag are merged
+        into one interval; a frame is taken to cover one sampling interval.
+        Returns a list of {'tag', 'start', 'end', 'score', 'occurrences'} sorted by start
+        """
+        try:
+            frames_by_tag = defaultdict(list)
+            for frame_data in frame_analyses:
+                timestamp = float(frame_data.get('timestamp', 0.0))
+                for label in frame_data.get('labels') or []:
+                    name = (label.get('tag') or '').strip()
+                    if not name:
+                        continue
+                    frames_by_tag[name.lower()].append((timestamp, float(label.get('score', 0.0)), name))
+
+            timeline = []
+            for occurrences in frames_by_tag.values():
+                occurrences.sort(key=lambda x: x[0])
+                current = None
+                for timestamp, score, name in occurrences:
+                    # Gap of more than one sampling step (plus jitter) ends the interval
+                    if current and timestamp - current['last'] <= frame_interval * 1.5:
+                        current['last'] = timestamp
+                        current['scores'].append(score)
+                        continue
+                    if current:
+                        timeline.append(current)
+                    current = {'tag': name, 'start': timestamp, 'last': timestamp, 'scores': [score]}
+                if current:
+                    timeline.append(current)
+
+            intervals = []
+            for item in timeline:
+                avg_score = sum(item['scores']) / len(item['scores'])
+                if avg_score < min_score:
+                    continue
+                intervals.append({
+                    'tag': item['tag'],
+                    'start': round(item['start'], 3),
+                    'end': round(item['last'] + frame_interval, 3),
+                    'score': avg_score,
+                    'occurrences': len(item['scores'])
+                })
+            intervals.sort(key=lambda x: (x['start'], -x['score']))
+            return intervals
+
+        except Exception as e:
+            logger.error(f"Tag timeline error: {str(e)}")
+            return []
+
     def cleanup_frames(self, video_id):
         """
         Clean up extracted frames for a video
@@ -310,6 +460,143 @@ class VisualTaggingService:
         except Exception as e:
             logger.warning(f"Failed to cleanup frames: {str(e)}")
     
+    def _get_video_duration(self, video_path):
+        """Get video duration in seconds using ffprobe (None if unavailable)"""
+        if self.video_info_provider:
+            try:
+                duration = (self.video_info_provider(video_path) or {}).get('duration')
+                if duration:
+                    return float(duration)
+            except Exception as e:
+                logger.warning(f"Video info provider failed: {str(e)}")
+        try:
+            cmd = ['ffprobe', '-v', 'quiet', '-show_entries', 'format=duration', '-of', 'csv=p=0', video_path]
+            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            return float(result.stdout.strip())
+        except Exception as e:
+            logger.warning(f"Could not determine video duration: {str(e)}")
+            return None
+
+    def _missing_runs(self, grid, stored_frames, frame_interval, embedded=None):
+        """
+        Group sample timestamps without a stored analysis (or, when `embedded` keys are
+        given, without a stored embedding) into contiguous (start, end) runs
+        """
+        runs = []
+        for ts in grid:
+            if self.frame_store.has(stored_frames, ts) and (embedded is None or self.frame_store.key(ts) in embedded):
+                continue
+            if runs and abs(ts - runs[-1][1] - frame_interval) < 1e-6:
+                runs[-1][1] = ts
+            else:
+                runs.append([ts, ts])
+        return [(start, end) for start, end in runs]
+
+    def tag_video_incremental(self, video_path, video_id, start_time: float | None = None, end_time: float | None = None,
+                              fps: float = 0.5, analyze_frame=None, analyze_batch=None, frame_embedder=None):
+        """
+        Tag a video (or a time window of it) reusing previously stored frame analyses.
+        Frames are sampled on a fixed grid (multiples of 1/fps) so that analyses from
+        earlier requests line up with later windows. Only grid frames without a stored
+        analysis are extracted and analyzed; the rest are aggregated from storage.
+        analyze_batch(video_id, [{'path', 'timestamp'}]) -> [labels] analyzes all frames
+        of a run at once and takes precedence over the per-frame analyze_frame.
+        frame_embedder (embedded_timestamps(video_id) -> keys, embed_frames(video_id, frames))
+        backfills vectors for analyzed frames that have none, e.g. frames analyzed before
+        embeddings were enabled; their stored labels are kept.
+        Returns {'tags', 'analyzed', 'reused', 'start_time', 'end_time', 'timeline'}
+        """
+        result = {'tags': [], 'analyzed': 0, 'reused': 0, 'start_time': start_time, 'end_time': end_time,
+                  'timeline': []}
+        analyze_frame = analyze_frame or self.analyze_frame_with_vision_api
+        frame_interval = 1.0 / max(0.1, fps)
+
+        if end_time is None:
+            end_time = self._get_video_duration(video_path)
+            if end_time is None:
+                logger.error("Cannot tag video without a known end time")
+                return result
+        window_start = max(0.0, float(start_time or 0.0))
+        window_end = float(end_time)
+        if window_end <= window_start:
+            return result
+        result['start_time'], result['end_time'] = window_start, window_end
+
+        # Snap to the shared sampling grid
+        first_index = int(window_start // frame_interval)
+        if first_index * frame_interval < window_start - 1e-6:
+            first_index += 1
+        grid = []
+        index = first_index
+        while index * frame_interval < window_end:
+            grid.append(round(index * frame_interval, 3))
+            index += 1
+
+        stored_frames = self.frame_store.load(video_id)
+        embedded = None
+        if frame_embedder is not None:
+            embedded = {self.frame_store.key(ts) for ts in frame_embedder.embedded_timestamps(video_id)}
+        missing_runs = self._missing_runs(grid, stored_frames, frame_interval, embedded)
+        missing_count = sum(int(round((run_end - run_start) / frame_interval)) + 1 for run_start, run_end in missing_runs)
+        logger.info(f"Tagging window {window_start:.1f}-{window_end:.1f}s for {video_id}: "
+                    f"{len(grid)} sample frames, {missing_count} to analyze or embed")
+
+        new_analyses = []
+        try:
+            for run_start, run_end in missing_runs:
+                frame_files = self.extract_frames_from_video(
+                    video_path, video_id, fps=fps, start_time=run_start, end_time=run_end + frame_interval
+                )
+                run_frames, embed_only = [], []
+                for frame_data in frame_files:
+                    timestamp = round(frame_data['timestamp'], 3)
+                    if timestamp > run_end + 1e-6:
+                        break
+                    frame = {'path': frame_data['path'], 'timestamp': timestamp}
+                    if self.frame_store.has(stored_frames, timestamp):
+                        embed_only.append(frame)
+                    else:
+                        run_frames.append(frame)
+                if embed_only:
+                    frame_embedder.embed_frames(video_id, embed_only)
+                if run_frames and frame_embedder is not None and not analyze_batch:
+                    frame_embedder.embed_frames(video_id, run_frames)
+                if analyze_batch:
+                    batch_labels = analyze_batch(video_id, run_frames)
+                    for frame_data, labels in zip(run_frames, batch_labels):
+                        new_analyses.append({'timestamp': frame_data['timestamp'], 'labels': labels or []})
+                else:
+                    for frame_data in run_frames:
+                        labels = analyze_frame(frame_data['path'])
+                        new_analyses.append({'timestamp': frame_data['timestamp'], 'labels': labels or []})
+                        # Small delay to avoid rate limiting
+                        time.sleep(0.1)
+                # Frames of one run must not leak into the next extraction
+                self.cleanup_frames(video_id)
+        finally:
+            self.cleanup_frames(video_id)
+
+        self.frame_store.save(video_id, new_analyses)
+        for frame_data in new_analyses:
+            stored_frames[self.frame_store.key(frame_data['timestamp'])] = frame_data
+
+        # Heuristic fallback labels (brightness, edge density) are not tags of the video
+        frame_analyses = self.frame_store.get_range(video_id, window_start, window_end, frames=stored_frames,
+                                                    include_fallback=False)
+        result['analyzed'] = len(new_analyses)
+        result['reused'] = max(0, len(frame_analyses) - len(new_analyses))
+        result['tags'] = self.aggregate_tags_from_frames(frame_analyses)
+        # Timeline always covers every frame analyzed so far, not just this window
+        result['timeline'] = self.stored_timeline(video_id, fps=fps, frames=stored_frames)
+        return result
+
+    def stored_timeline(self, video_id, fps: float = 0.5, frames=None):
+        """Tag timeline from the model-analyzed frames already stored for a video (nothing is analyzed)"""
+        return self.build_tag_timeline(
+            self.frame_store.get_range(video_id, frames=frames, include_fallback=False),
+            frame_interval=1.0 / max(0.1, fps)
+        )
+
     def tag_video(self, video_path, video_id, start_time: float | None = None, end_time: float | None = None):
         """
         Complete visual tagging pipeline for a video
@@ -318,43 +605,20 @@ class VisualTaggingService:
         try:
             logger.info(f"Starting visual tagging for video: {video_id}")
             
-            # Step 1: Extract frames from video at 0.5 FPS
-            logger.info("Step 1: Extracting frames from video at 0.5 FPS...")
-            frame_files = self.extract_frames_from_video(video_path, video_id, fps=0.5, start_time=start_time, end_time=end_time)
+            # Steps 1-3: extract and analyze frames not analyzed before, aggregate with stored ones
+            result = self.tag_video_incremental(video_path, video_id, start_time=start_time, end_time=end_time, fps=0.5)
+            aggregated_tags = result['tags']
             
-            if not frame_files:
-                logger.error("No frames extracted from video")
+            if not aggregated_tags:
+                logger.error("No tags produced for video")
                 return []
             
-            # Step 2: Analyze each frame with Google Vision API
-            logger.info("Step 2: Analyzing frames with Google Vision API...")
-            frame_analyses = []
-            
-            for i, frame_data in enumerate(frame_files):
-                logger.info(f"Analyzing frame {i+1}/{len(frame_files)}")
-                labels = self.analyze_frame_with_vision_api(frame_data['path'])
-                
-                frame_analyses.append({
-                    'timestamp': frame_data['timestamp'],
-                    'labels': labels
-                })
-                
-                # Small delay to avoid rate limiting
-                time.sleep(0.1)
-            
-            # Step 3: Aggregate tags and filter by confidence > 0.5
-            logger.info("Step 3: Aggregating tags and filtering by confidence > 0.5...")
-            aggregated_tags = self.aggregate_tags_from_frames(frame_analyses)
-            
             # Step 4: Save to Firestore
             logger.info("Step 4: Saving tags to Firestore...")
             self.save_tags_to_firestore(video_id, aggregated_tags)
             
-            # Step 5: Clean up frames
-            logger.info("Step 5: Cleaning up temporary frames...")
-            self.cleanup_frames(video_id)
-            
-            logger.info(f"Visual tagging completed. Found {len(aggregated_tags)} tags")
+            logger.info(f"Visual tagging completed. Found {len(aggregated_tags)} tags "
+                        f"({result['analyzed']} frames analyzed, {result['reused']} reused)")
             return aggregated_tags
             
         except Exception as e:
@@ -0,0 +1,374 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+import contextvars
+import functools
+import urllib.request
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Lightweight request tracing with OpenTelemetry-compatible spans.
+#   with span('render_encode', {'process.command': 'ffmpeg'}): ...
+# Spans nest through a contextvar, so pipeline stages, DB helpers, metadata I/O and
+# LLM calls made while serving a request become children of the request's root
+# span. Finished traces are exported as OTLP/JSON (ExportTraceServiceRequest), one
+# object per line to TRACE_FILE, or POSTed to an OTLP/HTTP collector, from a
+# background thread. TRACE_EXPORTER=none (the default) disables tracing entirely.
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+SPAN_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns', 'attributes',
+                 'status', 'status_message', 'sampled', '_tracer')
+
+    def __init__(self, tracer, name, trace_id, parent_id, kind, attributes, sampled):
+        self._tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_UNSET
+        self.status_message = ''
+        self.sampled = sampled
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, error):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"[:500]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self._tracer._finish(self)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self):
+        entry = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': SPAN_KINDS.get(self.kind, 1),
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns or time.time_ns()),
+            'attributes': _otlp_attributes(self.attributes),
+            'status': {'code': self.status, 'message': self.status_message} if self.status_message
+            else {'code': self.status}
+        }
+        if self.parent_id:
+            entry['parentSpanId'] = self.parent_id
+        return entry
+
+
+class _NoopSpan:
+    trace_id = None
+    span_id = None
+    sampled = False
+    duration_ms = 0.0
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+    def end(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def parse_traceparent(header):
+    """(trace_id, parent span id, sampled) from a W3C traceparent header, or None"""
+    parts = (header or '').strip().lower().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(int(parts[3], 16) & 1)
+
+
+class FileExporter:
+    """Append OTLP/JSON export requests, one per line (readable by the collector's otlpjsonfile receiver)"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, payload):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(payload, separators=(',', ':')) + '\n')
+
+
+class OTLPHttpExporter:
+    """POST OTLP/JSON to a collector's /v1/traces endpoint"""
+
+    def __init__(self, endpoint, timeout=5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, payload):
+        request = urllib.request.Request(self.endpoint, data=json.dumps(payload).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class Tracer:
+    """
+    Creates spans and buffers them per trace; when a trace's root span ends the trace
+    is exported if it took at least TRACE_SLOW_MS (0 exports every sampled trace).
+    Spans that finish after their trace was flushed (background work) are exported alone.
+    """
+
+    def __init__(self, exporter=None, service_name=None, sample_rate=None, slow_ms=None, max_queue=None):
+        self.exporter = exporter
+        self.service_name = service_name or os.getenv('TRACE_SERVICE_NAME', 'footage-backend')
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+        self.slow_ms = float(slow_ms if slow_ms is not None else os.getenv('TRACE_SLOW_MS', '0'))
+        self.max_queue = int(max_queue if max_queue is not None else os.getenv('TRACE_MAX_QUEUE', '1000'))
+        self._traces = {}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self.stats = {'exported_traces': 0, 'exported_spans': 0, 'dropped': 0, 'export_errors': 0}
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def start_span(self, name, attributes=None, kind='internal', parent=None, trace_id=None, sampled=None):
+        """Start a span under `parent` (default: the current span); a new trace if there is none"""
+        if not self.enabled:
+            return NOOP_SPAN
+        parent = parent if parent is not None else _current_span.get()
+        if isinstance(parent, Span):
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            parent_id = parent if isinstance(parent, str) else None
+            trace_id = trace_id or '%032x' % random.getrandbits(128)
+            if sampled is None:
+                sampled = random.random() < self.sample_rate
+        span = Span(self, name, trace_id, parent_id, kind, attributes, sampled)
+        if sampled and not isinstance(parent, Span):
+            # Local root: collect its trace until it ends
+            with self._lock:
+                self._traces.setdefault(trace_id, {'root': span.span_id, 'spans': []})
+        return span
+
+    def _finish(self, span):
+        if not span.sampled:
+            return
+        with self._lock:
+            trace = self._traces.get(span.trace_id)
+            if trace is None:
+                batch = [span]
+            else:
+                trace['spans'].append(span)
+                if trace['root'] != span.span_id:
+                    return
+                del self._traces[span.trace_id]
+                batch = trace['spans'] if span.duration_ms >= self.slow_ms else None
+        if batch:
+            self._enqueue(batch)
+
+    def _enqueue(self, spans):
+        if self._worker is None:
+            with self._lock:
+                # Started on first use so forked workers do not inherit a dead thread
+                if self._worker is None:
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                    self._worker = threading.Thread(target=self._export_loop, name='trace-exporter', daemon=True)
+                    self._worker.start()
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.stats['dropped'] += len(spans)
+
+    def _payload(self, spans):
+        return {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': self.service_name,
+                                                         'process.pid': os.getpid()})},
+            'scopeSpans': [{'scope': {'name': 'footage.tracing'}, 'spans': [span.to_otlp() for span in spans]}]
+        }]}
+
+    def _export_loop(self):
+        while True:
+            spans = self._queue.get()
+            # Drain what else is waiting into the same export request
+            while len(spans) < 512:
+                try:
+                    spans = spans + self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self.exporter.export(self._payload(spans))
+                self.stats['exported_traces'] += 1
+                self.stats['exported_spans'] += len(spans)
+            except Exception as e:
+                self.stats['export_errors'] += 1
+                logger.warning(f"Trace export failed: {str(e)}")
+
+    def flush(self, timeout=5.0):
+        """Wait until queued traces are exported (used by scripts before exit)"""
+        deadline = time.time() + timeout
+        while self._queue is not None and not self._queue.empty() and time.time() < deadline:
+            time.sleep(0.01)
+
+    def status(self):
+        return {'enabled': self.enabled, 'exporter': type(self.exporter).__name__ if self.exporter else None,
+                'sampleRate': self.sample_rate, 'slowMs': self.slow_ms, **self.stats}
+
+
+def exporter_from_env():
+    """TRACE_EXPORTER=none|file|otlp (TRACE_FILE, TRACE_OTLP_ENDPOINT)"""
+    kind = os.getenv('TRACE_EXPORTER', 'none').strip().lower()
+    if kind == 'file':
+        return FileExporter(os.getenv('TRACE_FILE', os.path.join('traces', 'spans.jsonl')))
+    if kind == 'otlp':
+        return OTLPHttpExporter(os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'))
+    if kind not in ('', 'none'):
+        logger.warning(f"Unknown TRACE_EXPORTER '{kind}', tracing disabled")
+    return None
+
+
+tracer = Tracer(exporter=exporter_from_env())
+
+
+@contextmanager
+def span(name, attributes=None, kind='internal'):
+    """Child span of the current span for the duration of the block; exceptions mark it as an error"""
+    if not tracer.enabled:
+        yield NOOP_SPAN
+        return
+    current = tracer.start_span(name, attributes, kind=kind)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name=None, attributes=None):
+    """Decorator form of span(); the span name defaults to the function name"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    return _current_span.get() or NOOP_SPAN
+
+
+def current_trace_id():
+    return _current_span.get().trace_id if _current_span.get() is not None else None
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose jobs run in the submitter's context, so their spans join its trace"""
+
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def init_request_tracing(app):
+    """
+    One server span per request (joining an incoming W3C traceparent), returned to the
+    client as X-Trace-ID and traceparent headers so slow requests can be found later.
+    """
+    from flask import request, g
+
+    if not tracer.enabled:
+        return
+
+    @app.before_request
+    def _start_request_span():
+        incoming = parse_traceparent(request.headers.get('traceparent'))
+        trace_id, parent_id, sampled = incoming if incoming else (None, None, None)
+        root = tracer.start_span(f"{request.method} {request.path}", {
+            'http.request.method': request.method,
+            'url.path': request.path,
+            'client.address': request.remote_addr
+        }, kind='server', parent=parent_id, trace_id=trace_id, sampled=sampled)
+        g.trace_span = root
+        g.trace_token = _current_span.set(root)
+
+    @app.after_request
+    def _trace_headers(response):
+        root = getattr(g, 'trace_span', None)
+        if root is not None:
+            root.set_attribute('http.response.status_code', response.status_code)
+            if response.status_code >= 500:
+                root.status = STATUS_ERROR
+            response.headers['X-Trace-ID'] = root.trace_id
+            response.headers['traceparent'] = root.traceparent()
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc=None):
+        root = g.pop('trace_span', None)
+        if root is None:
+            return
+        if exc is not None:
+            root.set_error(exc)
+        token = g.pop('trace_token', None)
+        if token is not None:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Streamed responses may finish in another context
+                pass
+        # Ends after streamed (SSE) bodies complete, so the root covers the whole response
+        root.end()
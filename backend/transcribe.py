@@ -1,4 +1,3 @@
-import shutil
 import os
 import subprocess
 import json
@@ -31,6 +30,9 @@ except ImportError:
 # Note: faster_whisper removed due to import issues
 # Note: google.cloud.exceptions removed due to import issues
 
+from metrics import observe_stage
+from media_tools import find_ffmpeg, find_ffprobe
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -132,50 +134,41 @@ class TranscriptionService:
             else:
                 raise ValueError(f"Unsupported output format: {output_format}")
             
-            # DEBUG: Check PATH and FFmpeg availability
-            ffmpeg_path = shutil.which('ffmpeg')
-            logger.info(f"DEBUG: Current PATH: {os.environ.get('PATH', 'PATH_NOT_SET')}")
-            logger.info(f"DEBUG: ffmpeg found at: {ffmpeg_path}")
-            
+            ffmpeg_path = find_ffmpeg()
             if not ffmpeg_path:
-                logger.info("DEBUG: ffmpeg not found in PATH, trying direct path...")
-                # Try direct path
-                direct_path = "C:\\ffmpeg\\bin\\ffmpeg.exe"
-                if os.path.exists(direct_path):
-                    logger.info(f"DEBUG: Using direct path: {direct_path}")
-                    cmd = [direct_path] + cmd[1:]  # Replace first element with direct path
-                else:
-                    logger.error(f"DEBUG: Direct path {direct_path} does not exist")
-                    return None
+                logger.error("ffmpeg not available, cannot extract audio")
+                return None
+            cmd[0] = ffmpeg_path
             
             logger.info(f"DEBUG: Running command: {' '.join(cmd)}")
             # Run ffmpeg command
-            try:
-                result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            except Exception as e_subproc:
-                logger.warning(f"Subprocess ffmpeg failed ({e_subproc}); trying ffmpeg-python fallback...")
-                if ffmpeg_py is None:
-                    raise
-                # Fallback using ffmpeg-python
+            with observe_stage('audio_extraction', {'process.command': cmd[0]}):
                 try:
-                    stream = (
-                        ffmpeg_py
-                        .input(video_path)
-                        .audio
-                        .output(
-                            audio_path,
-                            acodec='pcm_s16le' if output_format == 'wav' else 'flac',
-                            ac=1,
-                            ar='16000',
-                            vn=None,
-                            y=None
+                    result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+                except Exception as e_subproc:
+                    logger.warning(f"Subprocess ffmpeg failed ({e_subproc}); trying ffmpeg-python fallback...")
+                    if ffmpeg_py is None:
+                        raise
+                    # Fallback using ffmpeg-python
+                    try:
+                        stream = (
+                            ffmpeg_py
+                            .input(video_path)
+                            .audio
+                            .output(
+                                audio_path,
+                                acodec='pcm_s16le' if output_format == 'wav' else 'flac',
+                                ac=1,
+                                ar='16000',
+                                vn=None,
+                                y=None
+                            )
+                            .overwrite_output()
                         )
-                        .overwrite_output()
-                    )
-                    ffmpeg_py.run(stream, capture_stdout=True, capture_stderr=True)
-                except Exception as e_ff:
-                    logger.error(f"ffmpeg-python extraction failed: {e_ff}")
-                    return None
+                        ffmpeg_py.run(stream, capture_stdout=True, capture_stderr=True)
+                    except Exception as e_ff:
+                        logger.error(f"ffmpeg-python extraction failed: {e_ff}")
+                        return None
             
             if os.path.exists(audio_path):
                 file_size = os.path.getsize(audio_path)
@@ -224,16 +217,19 @@ class TranscriptionService:
             if model is None:
                 return None
 
-            segments, info = model.transcribe(
-                local_audio_path,
-                language=language,
-                task='transcribe',
-                vad_filter=True,
-                word_timestamps=True,
-                beam_size=5,
-                best_of=5,
-                condition_on_previous_text=False,
-            )
+            with observe_stage('whisper_inference'):
+                segments, info = model.transcribe(
+                    local_audio_path,
+                    language=language,
+                    task='transcribe',
+                    vad_filter=True,
+                    word_timestamps=True,
+                    beam_size=5,
+                    best_of=5,
+                    condition_on_previous_text=False,
+                )
+                # Segments are decoded lazily; consume them inside the timed block
+                segments = list(segments)
 
             transcript_parts = []
             word_timestamps = []
@@ -454,17 +450,9 @@ class TranscriptionService:
             if video_path and os.path.exists(video_path):
                 try:
                     cmd = [
-                        'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
+                        find_ffprobe() or 'ffprobe', '-v', 'quiet', '-show_entries', 'format=duration',
                         '-of', 'csv=p=0', video_path
                     ]
-                    # Try direct path if ffprobe not in PATH
-                    try:
-                        subprocess.run(['ffprobe', '--version'], capture_output=True, check=True)
-                    except Exception:
-                        cmd = [
-                            'C:\\ffmpeg\\bin\\ffprobe.exe', '-v', 'quiet', '-show_entries', 'format=duration',
-                            '-of', 'csv=p=0', video_path
-                        ]
                     result = subprocess.run(cmd, capture_output=True, text=True, check=True)
                     actual_duration = float(result.stdout.strip())
                     logger.info(f"Video duration: {actual_duration} seconds")
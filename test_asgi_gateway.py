@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the ASGI serving mode (backend/asgi.py): streamed Flask responses across
+pool threads and request bodies without a Content-Length
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+flask = pytest.importorskip('flask')
+
+from asgi import AsyncGateway
+
+
+def make_app():
+    app = flask.Flask(__name__)
+
+    @app.route('/events')
+    def events():
+        def generate():
+            for index in range(5):
+                # Needs the request context on whichever pool thread produces this chunk
+                yield f"data: {flask.request.args.get('n')}:{index}\n\n"
+                time.sleep(0.01)
+        return flask.Response(flask.stream_with_context(generate()), mimetype='text/event-stream')
+
+    @app.route('/echo', methods=['POST'])
+    def echo():
+        data = flask.request.get_json()
+        return flask.jsonify({'received': data, 'length': flask.request.content_length})
+
+    return app
+
+
+async def call(gateway, method, path, query=b'', chunks=(b'',), headers=()):
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': list(headers),
+             'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 5000)}
+    await gateway(scope, receive, send)
+    return sent
+
+
+def test_streamed_responses_keep_their_context_across_threads():
+    gateway = AsyncGateway(make_app().wsgi_app, io_workers=3, cpu_workers=1, heavy_paths=(), spool_bytes=1024)
+
+    async def run():
+        return await asyncio.gather(*(call(gateway, 'GET', '/events', query=f"n={n}".encode()) for n in range(6)))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        gateway.io_pool.shutdown()
+        gateway.cpu_pool.shutdown()
+    for n, sent in enumerate(results):
+        assert sent[0]['type'] == 'http.response.start' and sent[0]['status'] == 200
+        body = b''.join(m.get('body', b'') for m in sent[1:]).decode()
+        assert body == ''.join(f"data: {n}:{index}\n\n" for index in range(5))
+        assert sent[-1] == {'type': 'http.response.body', 'body': b'', 'more_body': False}
+
+
+def test_chunked_request_body_without_content_length():
+    gateway = AsyncGateway(make_app().wsgi_app, io_workers=1, cpu_workers=1, heavy_paths=(), spool_bytes=8)
+    payload = json.dumps({'videoId': 'abc', 'tags': ['beach', 'dog']}).encode()
+    try:
+        sent = asyncio.run(call(gateway, 'POST', '/echo', chunks=(payload[:10], payload[10:]),
+                                headers=[(b'content-type', b'application/json'),
+                                         (b'transfer-encoding', b'chunked')]))
+    finally:
+        gateway.io_pool.shutdown()
+        gateway.cpu_pool.shutdown()
+    assert sent[0]['status'] == 200
+    body = json.loads(b''.join(m.get('body', b'') for m in sent[1:]))
+    assert body == {'received': {'videoId': 'abc', 'tags': ['beach', 'dog']}, 'length': len(payload)}
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
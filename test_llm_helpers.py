@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Tests for the LLM helpers in backend/llm.py: JSON parsing/validation/repair,
+the response cache, the token bucket and the circuit breaker
+"""
+import os
+import sys
+import time
+import json
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import llm
+from llm import (CircuitBreaker, GeminiClientProvider, GeminiClientProxy, LLMExecutor, ResponseCache,
+                 StructuredOutputError, TokenBucket, generate_json, parse_json_text, validate_json)
+
+TAGS_SCHEMA = {
+    'type': 'object',
+    'properties': {'tags': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 1}},
+    'required': ['tags']
+}
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = []
+
+    def generate_content(self, **kwargs):
+        self.calls.append(kwargs)
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return FakeResponse(answer)
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeClient:
+    def __init__(self, answers):
+        self.models = FakeModels(answers)
+
+
+def make_client(tmp_path, answers, max_retries=0):
+    cache = ResponseCache(db_path=str(tmp_path / 'llm_cache.db'), ttl=3600, enabled=True)
+    provider = GeminiClientProvider(api_key='test', health_interval=0, cache=cache, failure_threshold=3,
+                                    executor=LLMExecutor(rate_per_minute=6000, burst=100, max_retries=max_retries,
+                                                         base_delay=0))
+    fake = FakeClient(answers)
+    provider._client = fake
+    return GeminiClientProxy(provider), fake.models, cache
+
+
+# -- parse_json_text / validate_json ------------------------------------------------------
+
+def test_parse_json_text_strips_fences_and_prose():
+    assert parse_json_text('{"tags": ["a"]}') == {'tags': ['a']}
+    assert parse_json_text('```json\n{"tags": ["a"]}\n```') == {'tags': ['a']}
+    assert parse_json_text('Sure! Here it is: {"tags": ["b"]} Hope that helps.') == {'tags': ['b']}
+    with pytest.raises(ValueError):
+        parse_json_text('no json here')
+
+
+def test_validate_json_reports_paths():
+    assert validate_json({'tags': ['a', 'b']}, TAGS_SCHEMA) == []
+    assert validate_json({}, TAGS_SCHEMA) == ['$.tags: missing']
+    assert validate_json({'tags': []}, TAGS_SCHEMA) == ['$.tags: expected at least 1 items, got 0']
+    assert validate_json({'tags': ['a', 3]}, TAGS_SCHEMA) == ['$.tags[1]: expected string, got int']
+    assert validate_json([], TAGS_SCHEMA) == ['$: expected object, got list']
+    # bool is not a number even though it is an int subclass
+    assert validate_json(True, {'type': 'integer'}) == ['$: expected integer, got bool']
+
+
+# -- generate_json ------------------------------------------------------------------------
+
+def test_generate_json_valid_answer_is_cached(tmp_path):
+    client, models, cache = make_client(tmp_path, ['{"tags": ["beach"]}'])
+    assert generate_json(client, 'm', 'prompt', TAGS_SCHEMA) == {'tags': ['beach']}
+    assert generate_json(client, 'm', 'prompt', TAGS_SCHEMA) == {'tags': ['beach']}
+    assert len(models.calls) == 1
+    assert cache.metrics()['memory_hits'] == 1
+
+
+def test_generate_json_repairs_and_caches_the_repaired_answer(tmp_path):
+    client, models, cache = make_client(tmp_path, ['{"tags": "beach"}', '{"tags": ["beach"]}'])
+    assert generate_json(client, 'm', 'prompt', TAGS_SCHEMA) == {'tags': ['beach']}
+    assert len(models.calls) == 2
+    assert 'expected array' in models.calls[1]['contents']
+    # The original request now hits the repaired answer, not the invalid one
+    assert generate_json(client, 'm', 'prompt', TAGS_SCHEMA) == {'tags': ['beach']}
+    assert len(models.calls) == 2
+
+
+def test_generate_json_does_not_cache_invalid_answers(tmp_path):
+    client, models, cache = make_client(tmp_path, ['not json', 'still not json', '{"tags": ["dog"]}'])
+    with pytest.raises(StructuredOutputError):
+        generate_json(client, 'm', 'prompt', TAGS_SCHEMA)
+    assert len(models.calls) == 2
+    # Neither the invalid answer nor the failed repair is served from cache (memory or disk)
+    cache._memory.clear()
+    assert generate_json(client, 'm', 'prompt', TAGS_SCHEMA, repair=False) == {'tags': ['dog']}
+    assert len(models.calls) == 3
+
+
+def test_generate_json_without_repair_raises(tmp_path):
+    client, models, _ = make_client(tmp_path, ['{"tags": []}'])
+    with pytest.raises(StructuredOutputError, match='at least 1'):
+        generate_json(client, 'm', 'prompt', TAGS_SCHEMA, repair=False)
+    assert len(models.calls) == 1
+
+
+class FakeLocalLLM:
+    name = 'local:test.gguf'
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def is_available(self):
+        return True
+
+    def complete(self, prompt, json_schema=None):
+        self.prompts.append(prompt)
+        return self.answers.pop(0)
+
+
+def test_generate_json_local_backend_drops_invalid_answers(tmp_path):
+    from local_llm import LocalLLMClient
+    cache = ResponseCache(db_path=str(tmp_path / 'llm_cache.db'), ttl=3600, enabled=True)
+    local = FakeLocalLLM(['{"tags": ["be', 'not json either', '{"tags": ["beach"]}', '{"tags": "dog"}',
+                          '{"tags": ["dog"]}'])
+    client = LocalLLMClient(local, cache=cache)
+    with pytest.raises(StructuredOutputError):
+        generate_json(client, 'm', 'prompt', TAGS_SCHEMA)
+    # The truncated answer was not cached: the same request asks the model again
+    assert generate_json(client, 'm', 'prompt', TAGS_SCHEMA) == {'tags': ['beach']}
+    assert len(local.prompts) == 3
+    # A repaired answer is cached under the original request
+    assert generate_json(client, 'm', 'other', TAGS_SCHEMA) == {'tags': ['dog']}
+    assert generate_json(client, 'm', 'other', TAGS_SCHEMA) == {'tags': ['dog']}
+    assert len(local.prompts) == 5
+
+
+# -- ResponseCache ------------------------------------------------------------------------
+
+def test_response_cache_ttl_expiry(tmp_path, monkeypatch):
+    cache = ResponseCache(db_path=str(tmp_path / 'c.db'), ttl=10, enabled=True)
+    now = [1000.0]
+    monkeypatch.setattr(llm.time, 'time', lambda: now[0])
+    cache.set('k', 'm', 'answer')
+    now[0] += 9
+    assert cache.get('k') == 'answer'
+    now[0] += 2
+    assert cache.get('k') is None
+    assert cache.metrics()['misses'] == 1
+
+
+def test_response_cache_memory_lru_falls_back_to_disk(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / 'c.db'), ttl=3600, memory_entries=2, enabled=True)
+    cache.set('a', 'm', 'A')
+    cache.set('b', 'm', 'B')
+    assert cache.get('a') == 'A'          # 'a' is now most recently used
+    cache.set('c', 'm', 'C')              # evicts 'b' from memory
+    assert list(cache._memory) == ['a', 'c']
+    assert cache.get('b') == 'B'          # still on disk
+    stats = cache.metrics()
+    assert (stats['memory_hits'], stats['disk_hits']) == (1, 1)
+
+
+def test_response_cache_prunes_least_recently_used_rows(tmp_path, monkeypatch):
+    cache = ResponseCache(db_path=str(tmp_path / 'c.db'), ttl=3600, memory_entries=1, max_entries=3, enabled=True)
+    now = [1000.0]
+    monkeypatch.setattr(llm.time, 'time', lambda: now[0])
+    for key in ('a', 'b', 'c', 'd', 'e'):
+        now[0] += 1
+        cache.set(key, 'm', key.upper())
+    now[0] += 1
+    assert cache.get('a') == 'A'          # refreshes last_access of 'a' on disk
+    conn = cache._connect()
+    cache._prune(conn, now[0])
+    conn.close()
+    cache._memory.clear()
+    assert [key for key in 'abcde' if cache.get(key) is not None] == ['a', 'd', 'e']
+    assert cache.metrics()['evictions'] == 2
+
+
+def test_response_cache_delete_and_disabled(tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / 'c.db'), ttl=3600, enabled=True)
+    cache.set('k', 'm', 'answer')
+    cache.delete('k')
+    assert cache.get('k') is None
+    disabled = ResponseCache(db_path=str(tmp_path / 'd.db'), ttl=3600, enabled=False)
+    disabled.set('k', 'm', 'answer')
+    assert disabled.get('k') is None
+
+
+def test_fingerprint_normalizes_whitespace_and_binary_parts():
+    cache = ResponseCache(enabled=False)
+    assert cache.fingerprint('m', 'a  b\nc') == cache.fingerprint('m', ['a b c'])
+    assert cache.fingerprint('m', [b'x', 'p']) != cache.fingerprint('m', [b'y', 'p'])
+    assert cache.fingerprint('m', 'p', {'t': 1}) != cache.fingerprint('m', 'p', {'t': 2})
+
+
+# -- TokenBucket --------------------------------------------------------------------------
+
+def test_token_bucket_burst_then_refill(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(llm.time, 'monotonic', lambda: now[0])
+    bucket = TokenBucket(rate_per_minute=60, burst=2)
+    assert bucket.acquire(timeout=0) and bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0.5)  # next token is 1s away
+    now[0] += 1.0
+    assert bucket.acquire(timeout=0)
+    now[0] += 60.0                          # refill is capped at the burst size
+    assert bucket.acquire(timeout=0) and bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+
+
+# -- CircuitBreaker -----------------------------------------------------------------------
+
+def test_circuit_breaker_half_open_lets_one_trial_through(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(llm.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.is_open() and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()              # only one trial call while half open
+    breaker.record_failure()                # failed trial: open again for a full timeout
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0 and breaker.allow()
+
+
+def test_retried_call_counts_one_breaker_failure(tmp_path):
+    client, models, _ = make_client(tmp_path, [APIError(503), 'ok'], max_retries=2)
+    breaker = client._provider.breaker
+    # A transient 503 that succeeds on retry is not a failure
+    assert client.models.generate_content(model='m', contents='a', cache=False).text == 'ok'
+    assert (breaker.state, breaker.failures) == (CircuitBreaker.CLOSED, 0)
+
+    # Retries exhausted: three attempts, one failure
+    models.answers = [APIError(503)] * 3
+    with pytest.raises(APIError):
+        client.models.generate_content(model='m', contents='b', cache=False)
+    assert len(models.calls) == 2 + 3
+    assert (breaker.state, breaker.failures) == (CircuitBreaker.CLOSED, 1)
+
+
+def test_bad_requests_do_not_open_the_circuit(tmp_path):
+    client, models, _ = make_client(tmp_path, [APIError(400)] * 4, max_retries=2)
+    for prompt in 'abcd':
+        with pytest.raises(APIError):
+            client.models.generate_content(model='m', contents=prompt, cache=False)
+    breaker = client._provider.breaker
+    # Not retried and not counted against Gemini's health
+    assert len(models.calls) == 4
+    assert (breaker.state, breaker.failures) == (CircuitBreaker.CLOSED, 0)
+
+
+def test_failed_half_open_trial_reopens_without_retrying(tmp_path, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(llm.time, 'monotonic', lambda: now[0])
+    client, models, _ = make_client(tmp_path, [APIError(503)] * 9, max_retries=2)
+    breaker = client._provider.breaker
+    for prompt in 'abc':
+        with pytest.raises(APIError):
+            client.models.generate_content(model='m', contents=prompt, cache=False)
+    assert breaker.state == CircuitBreaker.OPEN and len(models.calls) == 9
+
+    models.answers = [APIError(503), 'ok']
+    now[0] += breaker.reset_timeout
+    with pytest.raises(llm.GeminiUnavailableError):
+        client.models.generate_content(model='m', contents='d', cache=False)
+    assert breaker.state == CircuitBreaker.OPEN and len(models.calls) == 10
+
+    # A half-open trial that fails with a bad request frees the trial slot
+    models.answers = [APIError(400), 'ok']
+    now[0] += breaker.reset_timeout
+    with pytest.raises(APIError):
+        client.models.generate_content(model='m', contents='e', cache=False)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.models.generate_content(model='m', contents='f', cache=False).text == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
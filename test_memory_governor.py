@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for heavy job admission control (backend/memory_governor.py) and where the
+app reserves memory for Whisper and render jobs
+"""
+import os
+import sys
+import json
+import time
+import threading
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from memory_governor import MemoryGovernor, MemoryBudgetExceeded, MB
+
+
+class FakeRSS:
+    def __init__(self, mb):
+        self.value = int(mb * MB)
+
+    def set(self, mb):
+        self.value = int(mb * MB)
+
+    def __call__(self):
+        return self.value
+
+
+def make_governor(budget_mb, rss_mb, queue_timeout=0, **estimates_mb):
+    rss = FakeRSS(rss_mb)
+    governor = MemoryGovernor(budget_bytes=int(budget_mb * MB), estimates_mb=estimates_mb or None,
+                              queue_timeout=queue_timeout, sample_interval=60, gc_min_interval=3600, rss=rss)
+    return governor, rss
+
+
+def test_admits_within_budget_and_rejects_over_it():
+    governor, _ = make_governor(1000, 100, whisper=600, render=400)
+    whisper = governor.acquire('whisper')
+    # 100 MB RSS + 600 MB reserved + 400 MB render = 1100 MB > 1000 MB
+    assert not governor.can_admit('render')
+    with pytest.raises(MemoryBudgetExceeded) as excinfo:
+        governor.acquire('render')
+    assert excinfo.value.kind == 'render'
+    assert excinfo.value.projected_bytes == 1100 * MB
+    assert excinfo.value.retry_after >= 5
+    assert governor.status()['queuedJobs'] == 0
+
+    governor.release(whisper)
+    assert governor.can_admit('render')
+    governor.release(governor.acquire('render'))
+    assert governor.status()['activeJobs'] == {}
+
+
+def test_lone_job_is_admitted_over_budget():
+    governor, _ = make_governor(500, 100, whisper=600)
+    with governor.job('whisper'):
+        assert governor.status()['activeJobs'] == {'whisper': 1}
+        with pytest.raises(MemoryBudgetExceeded):
+            governor.acquire('whisper')
+
+
+def test_queued_job_starts_when_a_running_job_finishes():
+    governor, _ = make_governor(1000, 100, whisper=600)
+    first = governor.acquire('whisper')
+    admitted = []
+    waiter = threading.Thread(target=lambda: admitted.append(governor.acquire('whisper', timeout=10)))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while governor.status()['queuedJobs'] != 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert governor.status()['queuedJobs'] == 1 and not admitted
+
+    governor.release(first)
+    waiter.join(5)
+    assert len(admitted) == 1
+    assert governor.status()['queuedJobs'] == 0
+    governor.release(admitted[0])
+
+
+def test_growth_of_running_jobs_is_not_counted_twice():
+    governor, rss = make_governor(2000, 1000, whisper=600, render=400)
+    whisper = governor.acquire('whisper')
+    # The Whisper job has grown into its whole reservation: 1600 MB RSS, nothing left reserved
+    rss.set(1600)
+    assert governor.projected_bytes('render') == 2000 * MB
+    render = governor.acquire('render')
+    governor.release(render)
+    governor.release(whisper)
+
+
+def test_estimates_are_learned_from_observed_growth():
+    governor, rss = make_governor(4000, 100, whisper=600)
+    for run in range(3):
+        assert governor.estimate_bytes('whisper') == 600 * MB
+        with governor.job('whisper'):
+            rss.set(150)
+        rss.set(100)
+    # After min_samples runs the observed 50 MB growth replaces the configured estimate
+    assert governor.estimate_bytes('whisper') == 50 * MB
+    assert governor.status()['learned']['whisper'] == {'runs': 3, 'avgGrowthMb': 50.0, 'maxGrowthMb': 50.0}
+
+
+def test_routes_validate_before_reserving_memory(tmp_path, monkeypatch):
+    pytest.importorskip('flask')
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.chdir(tmp_path)
+    import app
+
+    # A governor with a job running and no room for another: every reservation is rejected
+    governor, _ = make_governor(1, 100)
+    busy = governor.acquire('frames')
+    monkeypatch.setattr(app, 'memory_governor', governor)
+    # The database is created per working directory; let this test's requests create their own
+    monkeypatch.setattr(app, '_database_ready', False)
+    client = app.app.test_client()
+
+    assert client.post('/transcribe-direct-video', json={'videoId': 'missing'}).status_code == 404
+    assert client.post('/render-story', json={'videoId': 'missing', 'scenes': [{'start': 0, 'end': 1}]}).status_code == 404
+    assert client.post('/transcribe-direct', data={}).status_code == 400
+
+    upload_folder = app.UPLOAD_FOLDER
+    os.makedirs(upload_folder, exist_ok=True)
+    video_path = os.path.join(upload_folder, 'v1.mp4')
+    with open(video_path, 'wb') as f:
+        f.write(b'not really a video')
+    with open(os.path.join(upload_folder, 'v1_metadata.json'), 'w') as f:
+        json.dump({'localPath': video_path}, f)
+
+    response = client.post('/render-story', json={'videoId': 'v1', 'scenes': [{'start': 0, 'end': 1}]})
+    assert response.status_code == 503
+    assert response.headers.get('Retry-After')
+    governor.release(busy)
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for the SSE story streams (app._stream_story_events): short stories are
+expanded by a second streamed generation instead of a blocking call before `done`
+"""
+import os
+import sys
+import json
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+flask = pytest.importorskip('flask')
+
+
+class FakeStreamModels:
+    def __init__(self, streams):
+        # One list of chunks (or an Exception to raise after them) per streamed call, in order
+        self.streams = list(streams)
+        self.prompts = []
+
+    def generate_content_stream(self, model=None, contents=None, **kwargs):
+        self.prompts.append(contents)
+        chunks = self.streams.pop(0)
+        for chunk in chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield SimpleNamespace(text=chunk)
+
+    def generate_content(self, **kwargs):
+        raise AssertionError('streams must not make blocking generate_content calls')
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.chdir(tmp_path)
+    import app
+    return app
+
+
+def events(app, monkeypatch, models, **kwargs):
+    monkeypatch.setattr(app, 'text_client', SimpleNamespace(models=models))
+    parsed = []
+    for raw in app._stream_story_events('PROMPT', fallback=lambda: 'fallback story', finalize=str.strip, **kwargs):
+        name, data = raw.strip().split('\n')
+        parsed.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+
+def streamed_text(parsed):
+    # What a client shows: chunks since the last reset
+    text = ''
+    for name, data in parsed:
+        if name == 'reset':
+            text = ''
+        elif name == 'chunk':
+            text += data['text']
+    return text
+
+
+def test_short_story_is_expanded_as_a_stream(app_module, monkeypatch):
+    long_story = ' '.join(['word'] * 250)
+    models = FakeStreamModels([['A short ', 'story.'], [long_story[:100], long_story[100:]]])
+    parsed = events(app_module, monkeypatch, models, refine_instructions='Expand it.')
+
+    assert [name for name, _ in parsed] == ['chunk', 'chunk', 'reset', 'chunk', 'chunk', 'done']
+    assert parsed[-1][1]['story'] == long_story == streamed_text(parsed)
+    assert 'CURRENT STORY:\nA short story.' in models.prompts[1]
+
+
+def test_long_story_is_not_refined(app_module, monkeypatch):
+    long_story = ' '.join(['word'] * 250)
+    models = FakeStreamModels([[long_story]])
+    parsed = events(app_module, monkeypatch, models, refine_instructions='Expand it.')
+
+    assert [name for name, _ in parsed] == ['chunk', 'done']
+    assert len(models.prompts) == 1
+
+
+def test_failed_refinement_restores_the_short_story(app_module, monkeypatch):
+    models = FakeStreamModels([['A short story.'], ['Once upon', RuntimeError('stream dropped')]])
+    parsed = events(app_module, monkeypatch, models, refine_instructions='Expand it.')
+
+    assert parsed[-1][1]['story'] == 'A short story.' == streamed_text(parsed)
+    assert [name for name, _ in parsed] == ['chunk', 'reset', 'chunk', 'reset', 'chunk', 'done']
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
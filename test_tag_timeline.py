@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental frame tagging windows and the tag timeline
+(tagging.VisualTaggingService, app.save_tag_timeline / get_tag_timeline)
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from tagging import VisualTaggingService, FrameAnalysisStore, FALLBACK_SOURCE
+
+
+def make_service(duration=10.0):
+    store = FrameAnalysisStore(base_dir=tempfile.mkdtemp(prefix='frame-analyses-'))
+    service = VisualTaggingService(None, frame_store=store, video_info_provider=lambda path: {'duration': duration})
+    extracted = []
+
+    def extract_frames_from_video(video_path, video_id, fps=1.0, start_time=None, end_time=None):
+        # Frames on the sampling grid from start_time, up to (excluding) end_time
+        extracted.append((start_time, end_time))
+        interval = 1.0 / fps
+        frames, ts = [], start_time or 0.0
+        while ts < end_time - 1e-6:
+            frames.append({'path': f"frame_{ts:.3f}.jpg", 'timestamp': ts})
+            ts += interval
+        return frames
+
+    service.extract_frames_from_video = extract_frames_from_video
+    service.cleanup_frames = lambda video_id: None
+    return service, extracted
+
+
+def analyzed_timestamps(calls):
+    return [float(path[len('frame_'):-len('.jpg')]) for path in calls]
+
+
+def test_missing_runs_groups_contiguous_gaps():
+    service, _ = make_service()
+    grid = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+    stored = {FrameAnalysisStore.key(4.0): {'timestamp': 4.0, 'labels': []},
+              FrameAnalysisStore.key(6.0): {'timestamp': 6.0, 'labels': []}}
+    assert service._missing_runs(grid, stored, 2.0) == [(0.0, 2.0), (8.0, 10.0)]
+    assert service._missing_runs([4.0, 6.0], stored, 2.0) == []
+    assert service._missing_runs([], stored, 2.0) == []
+
+
+def test_missing_runs_treats_fallback_frames_as_missing():
+    service, _ = make_service()
+    stored = {FrameAnalysisStore.key(2.0): {'timestamp': 2.0, 'labels': [], 'source': FALLBACK_SOURCE},
+              FrameAnalysisStore.key(4.0): {'timestamp': 4.0, 'labels': [], 'source': 'model'}}
+    assert service._missing_runs([0.0, 2.0, 4.0, 6.0], stored, 2.0) == [(0.0, 2.0), (6.0, 6.0)]
+
+
+def test_window_snaps_to_grid_with_inclusive_start_and_exclusive_end():
+    service, _ = make_service()
+    calls = []
+    analyze = lambda path: calls.append(path) or [{'tag': 'cat', 'score': 0.9}]
+
+    result = service.tag_video_incremental('video.mp4', 'v1', start_time=3.0, end_time=9.0, fps=0.5, analyze_frame=analyze)
+    # 3.0 snaps up to 4.0; 9.0 is exclusive, so the last frame is 8.0
+    assert analyzed_timestamps(calls) == [4.0, 6.0, 8.0]
+    assert (result['start_time'], result['end_time']) == (3.0, 9.0)
+    assert (result['analyzed'], result['reused']) == (3, 0)
+
+    calls.clear()
+    result = service.tag_video_incremental('video.mp4', 'v1', start_time=4.0, end_time=8.0, fps=0.5, analyze_frame=analyze)
+    # A window on grid points: 4.0 included, 8.0 excluded, all already stored
+    assert calls == []
+    assert (result['analyzed'], result['reused']) == (0, 2)
+
+
+def test_overlapping_windows_only_analyze_new_frames():
+    service, extracted = make_service(duration=12.0)
+    calls = []
+    analyze = lambda path: calls.append(path) or [{'tag': 'dog', 'score': 0.8}]
+
+    service.tag_video_incremental('video.mp4', 'v2', start_time=4.0, end_time=8.0, fps=0.5, analyze_frame=analyze)
+    calls.clear()
+    extracted.clear()
+    # Whole video (end from the video duration): only the frames around the stored window
+    result = service.tag_video_incremental('video.mp4', 'v2', fps=0.5, analyze_frame=analyze)
+    assert analyzed_timestamps(calls) == [0.0, 2.0, 8.0, 10.0]
+    assert extracted == [(0.0, 4.0), (8.0, 12.0)]
+    assert (result['analyzed'], result['reused']) == (4, 2)
+    assert [(iv['tag'], iv['start'], iv['end'], iv['occurrences']) for iv in result['timeline']] == [('dog', 0.0, 12.0, 6)]
+
+
+def test_fallback_frames_are_reanalyzed_later():
+    service, _ = make_service(duration=4.0)
+    service.tag_video_incremental('video.mp4', 'v3', fps=0.5,
+                                  analyze_frame=lambda path: [{'tag': 'dark', 'score': 0.8, 'source': FALLBACK_SOURCE}])
+    calls = []
+    result = service.tag_video_incremental('video.mp4', 'v3', fps=0.5,
+                                           analyze_frame=lambda path: calls.append(path) or [{'tag': 'beach', 'score': 0.9}])
+    assert analyzed_timestamps(calls) == [0.0, 2.0]
+    assert [tag['tag'] for tag in result['tags']] == ['beach']
+
+
+def test_fallback_labels_are_not_video_tags():
+    service, _ = make_service(duration=6.0)
+    labels = {0.0: [{'tag': 'beach', 'score': 0.9}],
+              2.0: [{'tag': 'bright', 'score': 0.7, 'source': FALLBACK_SOURCE}],
+              4.0: [{'tag': 'beach', 'score': 0.8}]}
+    result = service.tag_video_incremental('video.mp4', 'v7', fps=0.5,
+                                           analyze_frame=lambda path: labels[analyzed_timestamps([path])[0]])
+    assert [tag['tag'] for tag in result['tags']] == ['beach']
+    # Frame 2.0 has no model labels, so 'beach' is two intervals
+    assert [(iv['tag'], iv['start'], iv['end']) for iv in result['timeline']] == [('beach', 0.0, 2.0), ('beach', 4.0, 6.0)]
+    # The timeline of stored frames needs no extraction or analysis
+    assert service.stored_timeline('v7') == result['timeline']
+    assert service.stored_timeline('unknown-video') == []
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.vectors = {}
+
+    def embedded_timestamps(self, video_id):
+        return list(self.vectors.get(video_id, {}))
+
+    def embed_frames(self, video_id, frames):
+        self.vectors.setdefault(video_id, {}).update({frame['timestamp']: frame['path'] for frame in frames})
+
+
+def test_frames_analyzed_before_embeddings_are_backfilled():
+    service, extracted = make_service(duration=8.0)
+    calls = []
+    analyze = lambda path: calls.append(path) or [{'tag': 'cat', 'score': 0.9}]
+    service.tag_video_incremental('video.mp4', 'v6', start_time=0.0, end_time=4.0, fps=0.5, analyze_frame=analyze)
+
+    # Embeddings enabled afterwards: stored frames are only embedded, new frames analyzed and embedded
+    calls.clear()
+    embedder = FakeEmbedder()
+    result = service.tag_video_incremental('video.mp4', 'v6', fps=0.5, analyze_frame=analyze, frame_embedder=embedder)
+    assert analyzed_timestamps(calls) == [4.0, 6.0]
+    assert sorted(embedder.vectors['v6']) == [0.0, 2.0, 4.0, 6.0]
+    assert (result['analyzed'], result['reused']) == (2, 2)
+
+    calls.clear()
+    extracted.clear()
+    service.tag_video_incremental('video.mp4', 'v6', fps=0.5, analyze_frame=analyze, frame_embedder=embedder)
+    assert calls == [] and extracted == []
+
+
+def test_empty_or_inverted_window_does_nothing():
+    service, extracted = make_service()
+    result = service.tag_video_incremental('video.mp4', 'v4', start_time=6.0, end_time=6.0, fps=0.5,
+                                           analyze_frame=lambda path: [])
+    assert result['tags'] == [] and result['analyzed'] == 0 and extracted == []
+
+
+def test_build_tag_timeline_merges_consecutive_frames():
+    service, _ = make_service()
+    frames = [
+        {'timestamp': 0.0, 'labels': [{'tag': 'Beach', 'score': 0.9}]},
+        {'timestamp': 2.0, 'labels': [{'tag': 'beach', 'score': 0.7}, {'tag': 'dog', 'score': 0.6}]},
+        # 2.0 -> 6.0 is a gap of two steps: a new interval
+        {'timestamp': 6.0, 'labels': [{'tag': 'beach', 'score': 0.8}]},
+        {'timestamp': 8.0, 'labels': [{'tag': 'blurry', 'score': 0.1}]},
+    ]
+    timeline = service.build_tag_timeline(frames, frame_interval=2.0)
+    assert [(iv['tag'], iv['start'], iv['end'], iv['occurrences']) for iv in timeline] == [
+        ('Beach', 0.0, 4.0, 2),
+        ('dog', 2.0, 4.0, 1),
+        ('beach', 6.0, 8.0, 1),
+    ]
+    assert abs(timeline[0]['score'] - 0.8) < 1e-9
+
+
+def test_build_tag_timeline_tolerates_sampling_jitter():
+    service, _ = make_service()
+    frames = [{'timestamp': ts, 'labels': [{'tag': 'car', 'score': 0.5}]} for ts in (0.0, 2.9, 5.8)]
+    timeline = service.build_tag_timeline(frames, frame_interval=2.0)
+    assert [(iv['start'], iv['end'], iv['occurrences']) for iv in timeline] == [(0.0, 7.8, 3)]
+
+
+def test_tag_timeline_interval_queries(tmp_path, monkeypatch):
+    import pytest
+    pytest.importorskip('flask')
+    monkeypatch.setenv('UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    monkeypatch.chdir(tmp_path)
+    import app
+
+    app.ensure_database()
+    assert app.save_tag_timeline('v5', [
+        {'tag': 'Beach', 'start': 0.0, 'end': 4.0, 'score': 0.9, 'occurrences': 2},
+        {'tag': 'beach ball', 'start': 4.0, 'end': 8.0, 'score': 0.7, 'occurrences': 2},
+        {'tag': 'dog', 'start': 10.0, 'end': 12.0, 'score': 0.6, 'occurrences': 1},
+    ])
+
+    def spans(**kwargs):
+        return [(iv['tag'], iv['start'], iv['end']) for iv in app.get_tag_timeline('v5', **kwargs)]
+
+    # Overlap is strict: intervals that only touch the window edge are excluded
+    assert spans(start_time=4.0, end_time=10.0) == [('beach ball', 4.0, 8.0)]
+    assert spans(start_time=3.0, end_time=5.0) == [('Beach', 0.0, 4.0), ('beach ball', 4.0, 8.0)]
+    assert spans(start_time=11.0) == [('dog', 10.0, 12.0)]
+    assert spans(end_time=0.5) == [('Beach', 0.0, 4.0)]
+    assert spans(tag='BEACH') == [('Beach', 0.0, 4.0), ('beach ball', 4.0, 8.0)]
+    assert spans(tag='beach', exact=True) == [('Beach', 0.0, 4.0)]
+
+    # Saving again replaces the timeline
+    assert app.save_tag_timeline('v5', [{'tag': 'sunset', 'start': 1.0, 'end': 3.0}])
+    assert spans() == [('sunset', 1.0, 3.0)]
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))